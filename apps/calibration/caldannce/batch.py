@@ -0,0 +1,340 @@
+"""Calibrate many rigs/sessions in one run, from a manifest of jobs.
+
+The manifest (JSON, or YAML with ruamel.yaml installed) lists one job per rig or
+session. Each job takes the arguments of do_calibrate_stateful; "defaults" apply to every
+job and a job may give a project_dir instead of intrinsics_dir/extrinsics_dir:
+```
+{
+  "defaults": {"rows": 6, "cols": 9, "square_size_mm": 23},
+  "jobs": [
+    {"name": "rig1", "project_dir": "/data/rig1", "output_dir": "/data/rig1/calibration"},
+    {"name": "rig2", "intrinsics_dir": "/data/rig2/intrinsic",
+     "extrinsics_dir": "/data/rig2/extrinsic", "output_dir": "/data/rig2/calibration"}
+  ]
+}
+```
+
+Jobs run concurrently in a process pool. Chessboard detections are shared through one
+CornerCache: jobs which use the same intrinsics folder are held back until the first of
+them has run, so their detections are cache hits instead of duplicated work. Each job's
+report is written to its output folder, and a summary table of all jobs is printed (and
+optionally saved as CSV or JSON).
+
+Usage (headless; exit code 1 if any job failed):
+```
+python -m caldannce.batch manifest.json --workers 8 --summary summary.csv
+```
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from caldannce.chessboard_detection import default_n_threads
+from caldannce.detection_cache import DEFAULT_CACHE_DIR, CornerCache
+from caldannce.logger import init_logger
+from caldannce.project_utils import get_extrinsics_dir, get_intrinsics_dir
+
+REPORT_FILE_NAME = "calibration_report.txt"
+
+SUMMARY_COLUMNS = [
+    "name",
+    "status",
+    "n_cameras",
+    "intrinsics_rpe_px",
+    "extrinsics_rpe_px",
+    "time_seconds",
+    "output_dir",
+    "error",
+]
+
+
+@dataclass(kw_only=True)
+class BatchJob:
+    """One do_calibrate_stateful invocation"""
+
+    name: str
+    intrinsics_dir: str
+    extrinsics_dir: str
+    output_dir: str
+    options: dict = field(default_factory=dict)
+    """Other keyword arguments of do_calibrate_stateful (rows, cols, square_size_mm, ...)"""
+
+    @property
+    def detection_group(self) -> str:
+        """Jobs in the same group detect the same intrinsics images"""
+        return os.path.normpath(
+            self.options.get("override_intrinsics_dir") or self.intrinsics_dir
+        )
+
+
+def load_manifest(path: str | Path) -> list[BatchJob]:
+    """Read the jobs of a JSON or YAML manifest (see module doc)"""
+    path = Path(path)
+    if path.suffix.lower() in [".yaml", ".yml"]:
+        # optional dependency: only needed for YAML manifests
+        from ruamel.yaml import YAML
+
+        with open(path, "rt") as f:
+            manifest = YAML(typ="safe").load(f)
+    else:
+        with open(path, "rt") as f:
+            manifest = json.load(f)
+
+    defaults = manifest.get("defaults", {})
+    jobs = []
+    names = set()
+    for idx, job_dict in enumerate(manifest["jobs"]):
+        options = {**defaults, **job_dict}
+        name = str(options.pop("name", f"job{idx + 1}"))
+        if name in names:
+            raise Exception(f"Duplicate job name in manifest: {name}")
+        names.add(name)
+
+        project_dir = options.pop("project_dir", None)
+        intrinsics_dir = options.pop("intrinsics_dir", None)
+        extrinsics_dir = options.pop("extrinsics_dir", None)
+        if project_dir:
+            intrinsics_dir = intrinsics_dir or get_intrinsics_dir(project_dir)
+            extrinsics_dir = extrinsics_dir or get_extrinsics_dir(project_dir)
+        output_dir = options.pop("output_dir", None)
+        if not (intrinsics_dir and extrinsics_dir and output_dir):
+            raise Exception(
+                f"Job {name}: requires output_dir, and project_dir or intrinsics_dir and extrinsics_dir"
+            )
+        jobs.append(
+            BatchJob(
+                name=name,
+                intrinsics_dir=str(intrinsics_dir),
+                extrinsics_dir=str(extrinsics_dir),
+                output_dir=str(output_dir),
+                options=options,
+            )
+        )
+    return jobs
+
+
+def _failed_row(job: BatchJob, error: Exception = None) -> dict:
+    """Summary row of a job which didn't (yet) succeed"""
+    return {
+        "name": job.name,
+        "status": "failed",
+        "n_cameras": None,
+        "intrinsics_rpe_px": None,
+        "extrinsics_rpe_px": None,
+        "time_seconds": None,
+        "output_dir": job.output_dir,
+        "error": f"{type(error).__name__}: {error}" if error is not None else None,
+    }
+
+
+def _run_job(job: BatchJob, cache_dir: str, detection_threads: int) -> dict:
+    """Run one job (in a worker process). Returns its summary row; errors are reported in
+    the row instead of raised, so one failing rig doesn't stop the batch"""
+    # imported here: loading the calibration stack is only needed in worker processes
+    from caldannce.do_calibrate_stateful import do_calibrate_stateful
+
+    row = _failed_row(job)
+    start = time.perf_counter()
+    try:
+        Path(job.output_dir).mkdir(parents=True, exist_ok=True)
+        options = {"detection_threads": detection_threads, **job.options}
+        results = do_calibrate_stateful(
+            intrinsics_dir=job.intrinsics_dir,
+            extrinsics_dir=job.extrinsics_dir,
+            output_dir=job.output_dir,
+            detection_cache=CornerCache(cache_dir=cache_dir),
+            prune_detection_cache=False,
+            **options,
+        )
+        with open(Path(job.output_dir, REPORT_FILE_NAME), "wt") as f:
+            f.write(results.report_summary)
+
+        report = results.calibrator.report
+        intrinsics_rpes = [x for x in report.intrinsics_rpes.values() if x is not None]
+        extrinsics_rpes = [x for x in report.extrinsics_rpes.values() if x is not None]
+        row["status"] = "ok"
+        row["n_cameras"] = results.n_cameras
+        if intrinsics_rpes:
+            row["intrinsics_rpe_px"] = float(sum(intrinsics_rpes) / len(intrinsics_rpes))
+        if extrinsics_rpes:
+            row["extrinsics_rpe_px"] = float(sum(extrinsics_rpes) / len(extrinsics_rpes))
+    except Exception as e:
+        logging.exception(f"Calibration job {job.name} failed")
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["time_seconds"] = time.perf_counter() - start
+    return row
+
+
+def run_batch(
+    jobs: list[BatchJob],
+    workers: int = None,
+    cache_dir: str | Path = DEFAULT_CACHE_DIR,
+    detection_threads: int = None,
+) -> list[dict]:
+    """Run all jobs, up to `workers` at a time (default: one per core).
+
+    Jobs with the same intrinsics folder are started once the first of them finished, so
+    they reuse its detections from the corner cache in cache_dir. Returns the summary
+    rows in manifest order."""
+    workers = workers or default_n_threads()
+    # share the cores between the concurrent jobs' detection threads
+    if detection_threads is None:
+        detection_threads = max(1, default_n_threads() // min(workers, len(jobs) or 1))
+
+    groups: dict[str, list[int]] = {}
+    for idx, job in enumerate(jobs):
+        groups.setdefault(job.detection_group, []).append(idx)
+    ready = [idxs[0] for idxs in groups.values()]
+    held_back = {idxs[0]: idxs[1:] for idxs in groups.values()}
+
+    rows: list[Optional[dict]] = [None] * len(jobs)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        running = {}
+        submitted = {}
+
+        def finish(idx: int, row: dict):
+            rows[idx] = row
+            ready.extend(held_back.pop(idx, []))
+            logging.info(
+                f"Job {jobs[idx].name}: {row['status']} in {row['time_seconds']:.2f} s [{sum(r is not None for r in rows)}/{len(jobs)} jobs]"
+            )
+
+        while ready or running:
+            while ready:
+                idx = ready.pop(0)
+                submitted[idx] = time.perf_counter()
+                try:
+                    future = pool.submit(
+                        _run_job, jobs[idx], str(cache_dir), detection_threads
+                    )
+                except BrokenProcessPool as e:
+                    # a worker died earlier: the pool doesn't accept new jobs
+                    row = _failed_row(jobs[idx], e)
+                    row["time_seconds"] = 0.0
+                    finish(idx, row)
+                    continue
+                running[future] = idx
+            if not running:
+                continue
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = running.pop(future)
+                try:
+                    row = future.result()
+                except Exception as e:
+                    # _run_job reports its own errors: this is the pool failing, e.g.
+                    # a worker killed by the OS (BrokenProcessPool)
+                    logging.exception(f"Calibration job {jobs[idx].name} failed")
+                    row = _failed_row(jobs[idx], e)
+                    row["time_seconds"] = time.perf_counter() - submitted[idx]
+                finish(idx, row)
+    # jobs share the cache: prune it once, after all of them
+    CornerCache(cache_dir=cache_dir).prune()
+    logging.info(
+        f"Finished {len(jobs)} calibration jobs in {time.perf_counter() - start:.2f} s"
+    )
+    return rows
+
+
+def format_summary_table(rows: list[dict]) -> str:
+    """Plain-text table of the summary rows"""
+
+    def fmt(value):
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
+
+    columns = [c for c in SUMMARY_COLUMNS if c != "error"]
+    cells = [columns] + [[fmt(row[c]) for c in columns] for row in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(columns))]
+    lines = [
+        "  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in cells
+    ]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    for row in rows:
+        if row["error"]:
+            lines.append(f"{row['name']}: {row['error']}")
+    return "\n".join(lines)
+
+
+def write_summary(rows: list[dict], path: str | Path):
+    """Write the summary rows as CSV, or JSON if path ends with .json"""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, "wt") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(path, "wt", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    logging.info(f"Saved batch summary to {path}")
+
+
+def parse_and_run_batch():
+    parser = argparse.ArgumentParser(
+        description="Calibrate many rigs/sessions from a manifest of jobs"
+    )
+    parser.add_argument("manifest", help="JSON or YAML manifest of calibration jobs")
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="Max. no. of jobs run concurrently (one process each). Default is one per CPU core.",
+    )
+    parser.add_argument(
+        "--detection-threads",
+        type=int,
+        default=None,
+        help="Corner detection threads per job. Default shares the CPU cores between concurrent jobs.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help=f"Corner detection cache shared by all jobs. Default is {DEFAULT_CACHE_DIR}.",
+    )
+    parser.add_argument(
+        "--summary",
+        "-o",
+        default=None,
+        help="If provided, write the summary table to this file (CSV, or JSON if it ends with .json).",
+    )
+    parser.add_argument("--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    init_logger(log_level=logging.DEBUG if args.verbose else logging.INFO)
+
+    jobs = load_manifest(args.manifest)
+    rows = run_batch(
+        jobs,
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+        detection_threads=args.detection_threads,
+    )
+    print(format_summary_table(rows))
+    if args.summary:
+        write_summary(rows, args.summary)
+
+    if any(row["status"] != "ok" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parse_and_run_batch()
@@ -0,0 +1,318 @@
+# multi-camera refinement of calibration using chessboard observations shared between cameras
+import logging
+import time
+
+import cv2
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.sparse import lil_matrix
+
+from caldannce.calibration_data import CameraParams
+from caldannce.math_utils import triangulate_batch
+
+N_POSE_PARAMS = 6  # rvec (3) + tvec (3)
+N_INTRINSICS_PARAMS = 8  # fx, fy, cx, cy, k1, k2, p1, p2
+
+
+def rodrigues_batch(rvecs: np.ndarray) -> np.ndarray:
+    """Vectorized cv2.Rodrigues: rotation vectors of shape (n, 3) -> matrices (n, 3, 3)"""
+    theta = np.linalg.norm(rvecs, axis=1)[:, None, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        k = np.where(theta[:, :, 0] > 1e-12, rvecs / theta[:, :, 0], 0.0)
+    zeros = np.zeros(len(rvecs))
+    kx = np.stack(
+        [
+            np.stack([zeros, -k[:, 2], k[:, 1]], axis=1),
+            np.stack([k[:, 2], zeros, -k[:, 0]], axis=1),
+            np.stack([-k[:, 1], k[:, 0], zeros], axis=1),
+        ],
+        axis=1,
+    )
+    eye = np.eye(3)[None]
+    return eye + np.sin(theta) * kx + (1 - np.cos(theta)) * (kx @ kx)
+
+
+def _project(points, rvecs, tvecs, intrinsics):
+    """Project points (n, 3) with per-point pose/intrinsics rows (OpenCV model, no k3)"""
+    r = rodrigues_batch(rvecs)
+    x_cam = np.einsum("nij,nj->ni", r, points) + tvecs
+    x = x_cam[:, 0] / x_cam[:, 2]
+    y = x_cam[:, 1] / x_cam[:, 2]
+    fx, fy, cx, cy, k1, k2, p1, p2 = intrinsics.T
+    r2 = x * x + y * y
+    radial = 1 + k1 * r2 + k2 * r2 * r2
+    x_d = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+    y_d = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+    return np.column_stack([fx * x_d + cx, fy * y_d + cy])
+
+
+def _compose(r_a, t_a, r_b, t_b):
+    """Compose rigid transforms: x -> R_a (R_b x + t_b) + t_a"""
+    return r_a @ r_b, r_a @ t_b + t_a
+
+
+def _intrinsics_vector(p: CameraParams) -> np.ndarray:
+    k = p.camera_matrix
+    return np.array(
+        [k[0, 0], k[1, 1], k[0, 2], k[1, 2], *p.r_distort, *p.t_distort],
+        dtype=np.float64,
+    )
+
+
+def triangulation_metrics(
+    camera_params: list[CameraParams],
+    observations: list[dict[int, np.ndarray]],
+    object_points: np.ndarray,
+) -> dict:
+    """Cross-camera triangulation error over all board frames seen by >= 2 cameras.
+
+    Returns a dict with:
+    - triangulation_rpe_px: mean reprojection error of the triangulated corners
+    - board_error_mm: mean abs. error of the triangulated distance between corners,
+        relative to the true distance on the board (from object_points)
+    - n_frames: no. of frames used
+    """
+    n_cams = len(camera_params)
+    frames = sorted(set().union(*[obs.keys() for obs in observations]))
+    proj_mtx = np.stack([p.projection_matrix for p in camera_params])
+    n_points = len(object_points)
+
+    rpes = []
+    board_errors = []
+    n_frames = 0
+    for frame in frames:
+        ipts = np.full((n_cams, n_points, 2), np.nan)
+        for cam_idx, obs in enumerate(observations):
+            if frame in obs:
+                p = camera_params[cam_idx]
+                # remove lens distortion so the points fit the linear (pinhole) model
+                ipts[cam_idx] = cv2.undistortPoints(
+                    obs[frame].reshape(-1, 1, 2).astype(np.float64),
+                    p.camera_matrix,
+                    p.dist,
+                    P=p.camera_matrix,
+                ).reshape(-1, 2)
+        visible = ~np.isnan(ipts[:, :, 0])
+        if np.sum(visible[:, 0]) < 2:
+            continue
+        n_frames += 1
+        world_pts, residuals = triangulate_batch(ipts, proj_mtx, visibility=visible)
+        rpes.append(np.nanmean(residuals))
+        # compare distances from the first corner to every other corner
+        d_true = np.linalg.norm(object_points - object_points[0], axis=1)
+        d_tri = np.linalg.norm(world_pts - world_pts[0], axis=1)
+        board_errors.append(np.nanmean(np.abs(d_tri[1:] - d_true[1:])))
+
+    return {
+        "triangulation_rpe_px": float(np.mean(rpes)) if rpes else None,
+        "board_error_mm": float(np.mean(board_errors)) if board_errors else None,
+        "n_frames": n_frames,
+    }
+
+
+def bundle_adjust(
+    camera_params: list[CameraParams],
+    observations: list[dict[int, np.ndarray]],
+    object_points: np.ndarray,
+    moving_observations: list[dict[int, np.ndarray]] = None,
+    refine_intrinsics: bool = False,
+    loss: str = "linear",
+    f_scale_px: float = 2.0,
+) -> tuple[list[CameraParams], dict]:
+    """Refine all camera poses (and optionally intrinsics) and the poses of the moved
+    chessboard by minimizing the reprojection error of every board observation.
+
+    observations[cam_idx] maps a frame index to the detected corners of the board at its
+    static pose in that camera (shape (n_points, 1, 2) or (n_points, 2)). The static
+    board defines the world frame (as it does for per-camera extrinsics), so all these
+    frames are observations of the same, fixed, board pose.
+
+    moving_observations[cam_idx] maps a (synchronized) frame index to the corners of the
+    board after it was moved away from its static pose. Each moving frame seen by at
+    least 2 cameras gets a free board pose, which couples those cameras; moving frames
+    seen by a single camera don't constrain the rig and are ignored. An exception is
+    raised if no moving frame is seen by at least 2 cameras: against a static board
+    alone, each camera would only be refined on its own.
+
+    The Jacobian sparsity structure is passed to scipy's least_squares: each
+    observation only depends on one camera and at most one board pose, so this scales
+    to many cameras and thousands of observations.
+
+    loss and f_scale_px are passed to least_squares (e.g. loss="huber" to down-weight
+    outlier detections beyond f_scale_px pixels).
+
+    Returns the refined camera params and a dict of before/after metrics.
+    """
+    start = time.perf_counter()
+    n_cams = len(camera_params)
+    object_points = np.asarray(object_points, dtype=np.float64).reshape(-1, 3)
+    n_points = len(object_points)
+    if moving_observations is None:
+        moving_observations = [{} for _ in range(n_cams)]
+
+    static_frames = set().union(*[obs.keys() for obs in observations])
+    moving_frames = sorted(set().union(*[obs.keys() for obs in moving_observations]))
+    free_frames = [
+        frame
+        for frame in moving_frames
+        if sum(frame in obs for obs in moving_observations) >= 2
+    ]
+    n_shared_frames = len(free_frames)
+    if n_shared_frames == 0:
+        raise Exception(
+            f"Bundle adjustment requires frames of the moving board seen by at least 2 cameras (got {len(static_frames)} static board frames, {len(moving_frames)} moving board frames). Record synchronized extrinsics videos in which the board is moved after the static segment, and use the extrinsics video method (ExtrinsicsChessboardVideo)"
+        )
+    frame_param_idx = {f: i for i, f in enumerate(free_frames)}
+    # moving frames seen by a single camera are dropped
+    moving_observations = [
+        {f: c for f, c in obs.items() if f in frame_param_idx}
+        for obs in moving_observations
+    ]
+
+    # initial camera poses (world -> camera)
+    cam_r = np.stack([p.rotation_matrix for p in camera_params]).astype(np.float64)
+    cam_t = np.stack([p.translation_vector.reshape(3) for p in camera_params])
+    intrinsics0 = np.stack([_intrinsics_vector(p) for p in camera_params])
+
+    # initial moved board poses (board -> world) from the first camera which saw each
+    # frame
+    board_poses = []
+    for frame in free_frames:
+        cam_idx = next(i for i, obs in enumerate(moving_observations) if frame in obs)
+        p = camera_params[cam_idx]
+        _ok, r_vec, t_vec = cv2.solvePnP(
+            object_points,
+            moving_observations[cam_idx][frame].reshape(-1, 2),
+            p.camera_matrix,
+            p.dist,
+        )
+        r_board_cam, _ = cv2.Rodrigues(r_vec)
+        # board -> world = inv(world -> cam) o (board -> cam)
+        r_inv = cam_r[cam_idx].T
+        r_bw, t_bw = _compose(
+            r_inv, -r_inv @ cam_t[cam_idx], r_board_cam, t_vec.reshape(3)
+        )
+        board_poses.append(np.concatenate([cv2.Rodrigues(r_bw)[0].ravel(), t_bw]))
+
+    # flatten observations: one row per (camera, frame) pair
+    # (static observations all share the fixed board pose: no frame index)
+    obs_cam = []
+    obs_frame = []
+    obs_pts = []
+    for is_moving, all_cam_obs in [(False, observations), (True, moving_observations)]:
+        for cam_idx, obs in enumerate(all_cam_obs):
+            for frame, corners in sorted(obs.items()):
+                obs_cam.append(cam_idx)
+                obs_frame.append(frame if is_moving else None)
+                obs_pts.append(np.asarray(corners, dtype=np.float64).reshape(-1, 2))
+    obs_cam = np.array(obs_cam)
+    obs_pts = np.stack(obs_pts)  # (n_obs, n_points, 2)
+    n_obs = len(obs_cam)
+    obs_free = np.array([f is not None for f in obs_frame])
+    obs_frame_idx = np.array([frame_param_idx.get(f, 0) for f in obs_frame])
+
+    n_cam_params = N_POSE_PARAMS + (N_INTRINSICS_PARAMS if refine_intrinsics else 0)
+    n_frame_offset = n_cams * n_cam_params
+
+    x0_cams = []
+    for cam_idx in range(n_cams):
+        x0_cams.append(cv2.Rodrigues(cam_r[cam_idx])[0].ravel())
+        x0_cams.append(cam_t[cam_idx])
+        if refine_intrinsics:
+            x0_cams.append(intrinsics0[cam_idx])
+    x0 = np.concatenate(x0_cams + board_poses)
+
+    def unpack(x):
+        cams = x[:n_frame_offset].reshape(n_cams, n_cam_params)
+        boards = x[n_frame_offset:].reshape(-1, N_POSE_PARAMS)
+        intrinsics = cams[:, N_POSE_PARAMS:] if refine_intrinsics else intrinsics0
+        return cams[:, 0:3], cams[:, 3:6], intrinsics, boards
+
+    # world coords of every board point per observation
+    def world_points(boards):
+        pts = np.broadcast_to(object_points, (n_obs, n_points, 3)).copy()
+        if len(boards) and obs_free.any():
+            r_b = rodrigues_batch(boards[:, 0:3])[obs_frame_idx[obs_free]]
+            t_b = boards[obs_frame_idx[obs_free], 3:6]
+            pts[obs_free] = np.einsum("nij,pj->npi", r_b, object_points) + t_b[:, None]
+        return pts
+
+    def residuals(x):
+        rvecs, tvecs, intrinsics, boards = unpack(x)
+        pts = world_points(boards).reshape(-1, 3)
+        rep = lambda a: np.repeat(a[obs_cam], n_points, axis=0)  # noqa: E731
+        proj = _project(pts, rep(rvecs), rep(tvecs), rep(intrinsics))
+        return (proj - obs_pts.reshape(-1, 2)).ravel()
+
+    # jacobian sparsity: each observation's residuals depend on 1 camera & at most 1
+    # board pose
+    n_params = len(x0)
+    sparsity = lil_matrix((n_obs * n_points * 2, n_params), dtype=int)
+    for i in range(n_obs):
+        rows = slice(i * n_points * 2, (i + 1) * n_points * 2)
+        c0 = obs_cam[i] * n_cam_params
+        sparsity[rows, c0 : c0 + n_cam_params] = 1
+        if obs_free[i]:
+            f0 = n_frame_offset + obs_frame_idx[i] * N_POSE_PARAMS
+            sparsity[rows, f0 : f0 + N_POSE_PARAMS] = 1
+
+    # the static board frames are synchronized too: triangulate them as well
+    all_observations = [
+        {**static, **moving}
+        for static, moving in zip(observations, moving_observations)
+    ]
+    metrics_before = triangulation_metrics(
+        camera_params, all_observations, object_points
+    )
+    rpe_before = np.mean(np.linalg.norm(residuals(x0).reshape(-1, 2), axis=1))
+
+    result = least_squares(
+        residuals,
+        x0,
+        jac_sparsity=sparsity,
+        method="trf",
+        x_scale="jac",
+        loss=loss,
+        f_scale=f_scale_px,
+        # the default lsmr iteration limit gives inexact steps which converge very
+        # slowly once intrinsics (strongly correlated parameters) are refined
+        tr_options={"atol": 1e-12, "btol": 1e-12, "maxiter": 10 * n_params},
+    )
+
+    rvecs, tvecs, intrinsics, _boards = unpack(result.x)
+    refined = []
+    for cam_idx in range(n_cams):
+        fx, fy, cx, cy, k1, k2, p1, p2 = intrinsics[cam_idx]
+        refined.append(
+            CameraParams(
+                camera_matrix=np.array([[fx, 0.0, cx], [0.0, fy, cy], [0.0, 0.0, 1.0]]),
+                r_distort=np.array([k1, k2]),
+                t_distort=np.array([p1, p2]),
+                rotation_matrix=cv2.Rodrigues(rvecs[cam_idx])[0],
+                translation_vector=tvecs[cam_idx].reshape(3, 1),
+            )
+        )
+
+    metrics_after = triangulation_metrics(refined, all_observations, object_points)
+    rpe_after = np.mean(np.linalg.norm(result.fun.reshape(-1, 2), axis=1))
+    end = time.perf_counter()
+
+    metrics = {
+        "n_cameras": n_cams,
+        "n_frames": len(static_frames | set(free_frames)),
+        "n_static_frames": len(static_frames),
+        "n_shared_frames": n_shared_frames,
+        "n_observations": n_obs,
+        "refine_intrinsics": refine_intrinsics,
+        "rpe_px_before": float(rpe_before),
+        "rpe_px_after": float(rpe_after),
+        "triangulation_rpe_px_before": metrics_before["triangulation_rpe_px"],
+        "triangulation_rpe_px_after": metrics_after["triangulation_rpe_px"],
+        "board_error_mm_before": metrics_before["board_error_mm"],
+        "board_error_mm_after": metrics_after["board_error_mm"],
+        "time_seconds": end - start,
+    }
+    logging.info(
+        f"Bundle adjustment ({n_obs} observations, {len(static_frames)} static board frames, {n_shared_frames} moving board frames shared) took {(end-start)*1000:.2f} ms. RPE (px): {rpe_before:.3f} -> {rpe_after:.3f}"
+    )
+    return refined, metrics
@@ -1,27 +1,117 @@
 ## intro module for new calibration script
 import argparse
 import logging
+import multiprocessing
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from caldannce.calibration_data import CalibrationData, CameraParams
+import numpy as np
+
+from caldannce.calibrate_stateful import CustomCalibrationData
+from caldannce.calibration_data import CameraParams
 from caldannce.extrinsics import (
     calibrate_extrinsics,
 )
-from caldannce.intrinsics import calibrate_intrinsics
+from caldannce.detection_cache import DEFAULT_CACHE_DIR, CornerCache
+from caldannce.instrumentation import (
+    TRACE_FORMATS,
+    Tracer,
+    active_tracer,
+    camera_scope,
+    get_active_tracer,
+    span,
+)
+from caldannce.intrinsics import IntrinsicsParams, calibrate_intrinsics
 from caldannce.logger import init_logger
 from caldannce.project_utils import (
+    CameraFilesSingle,
     get_calibration_paths,
+    get_hires_files,
     write_calibration_params,
 )
 from caldannce.report_utils import get_calibration_report, init_calibration_report
-from caldannce.video_utils import get_video_stats
+from caldannce.video_utils import VideoFileStats, get_video_stats
 from caldannce.math_utils import get_chessboard_coordinates
+from caldannce.view_selection import DEFAULT_MAX_VIEWS
 
 # reasonable max no. of images for a single camera
-MAX_IMAGES_ACCEPTED = 400
+# (if more are detected, a pose-diverse subset is passed to calibrateCamera)
+MAX_IMAGES_ACCEPTED = DEFAULT_MAX_VIEWS
 MIN_IMAGES_ACCEPTED = 10
 
 
+def calibrate_camera(
+    camera_idx: int,
+    camera_files_single: CameraFilesSingle,
+    rows: int,
+    cols: int,
+    object_points: np.ndarray,
+    video_info: VideoFileStats,
+    detection_threads: int = None,
+    fast_check: bool = False,
+    detection_cache: CornerCache = None,
+    max_views: int = MAX_IMAGES_ACCEPTED,
+    intrinsics_file: str = None,
+) -> CameraParams:
+    """Calibrate intrinsics, then extrinsics for a single camera. If intrinsics_file (a
+    hires_camX_params.mat file) is given, its intrinsics are used instead"""
+    logging.info(f"Camera {camera_files_single.camera_name}")
+
+    with camera_scope(camera_files_single.camera_name):
+        ##### INTRINSICS #####
+        with span("intrinsics"):
+            if intrinsics_file:
+                with span("load_hires_file", path=intrinsics_file):
+                    intrinsics = IntrinsicsParams.load_from_mat_file(intrinsics_file)
+            else:
+                intrinsics = calibrate_intrinsics(
+                    image_paths=camera_files_single.intrinsics_image_paths,
+                    rows=rows,
+                    cols=cols,
+                    object_points=object_points,
+                    image_width=video_info.width,
+                    image_height=video_info.height,
+                    camera_idx=camera_idx,
+                    n_threads=detection_threads,
+                    fast_check=fast_check,
+                    cache=detection_cache,
+                    max_views=max_views,
+                )
+
+        ##### EXTRINSICS #####
+        with span("extrinsics"):
+            extrinsics = calibrate_extrinsics(
+                media_path=camera_files_single.extrinsics_media_path,
+                rows=rows,
+                cols=cols,
+                object_points=object_points,
+                image_width=video_info.width,
+                image_height=video_info.height,
+                intrinsics=intrinsics,
+                camera_idx=camera_idx,
+            )
+
+    return CameraParams(
+        camera_matrix=intrinsics.camera_matrix,
+        r_distort=intrinsics.r_distort,
+        t_distort=intrinsics.t_distort,
+        rotation_matrix=extrinsics.rotation_matrix,
+        translation_vector=extrinsics.translation_vector,
+    )
+
+
+def _calibrate_camera_worker(n_cameras: int, trace: bool, *args, **kwargs):
+    """Run calibrate_camera in a worker process with its own report, which is returned
+    so the parent process can merge it into the global report. If trace is True, the
+    spans recorded in the worker are returned as well"""
+    init_calibration_report(n_cameras)
+    tracer = Tracer() if trace else None
+    with active_tracer(tracer):
+        camera_params = calibrate_camera(*args, **kwargs)
+    spans = tracer.spans if tracer else []
+    return camera_params, get_calibration_report(), spans
+
+
 def do_calibrate(
     intrinsics_dir: str,
     extrinsics_dir: str,
@@ -31,7 +121,17 @@ def do_calibrate(
     square_size_mm: float,
     on_progress=None,
     disable_label3d_format=False,
+    workers: int = 1,
+    detection_threads: int = None,
+    fast_check: bool = False,
+    detection_cache: CornerCache = None,
+    max_views: int = MAX_IMAGES_ACCEPTED,
+    existing_intrinsics_dir: str = None,
 ) -> None:
+    """Calibrate the intrinsics, then the extrinsics of every camera. If
+    existing_intrinsics_dir is given (a folder with the hires_camX_params.mat files of a
+    previous calibration), the intrinsics are loaded from there and only the extrinsics
+    are calibrated"""
     start = time.perf_counter()
 
     calibration_paths = get_calibration_paths(
@@ -46,80 +146,101 @@ def do_calibrate(
         square_size_mm=square_size_mm,
     )
 
-    all_camera_params = []
-
     sample_video_path = calibration_paths.camera_files[0].extrinsics_media_path
     video_info = get_video_stats(sample_video_path)
 
     logging.info("Running calibration on all cameras")
     n_cameras = len(calibration_paths.camera_files)
+    intrinsics_files = [None] * n_cameras
+    if existing_intrinsics_dir:
+        intrinsics_files = get_hires_files(existing_intrinsics_dir, n_cameras)
 
     init_calibration_report(n_cameras)
+    tracer = get_active_tracer()
+
+    if workers > 1 and n_cameras > 1:
+        n_workers = min(workers, n_cameras)
+        logging.info(f"Calibrating {n_cameras} cameras using {n_workers} processes")
+        results = [None] * n_cameras
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context) as pool:
+            futures = {
+                pool.submit(
+                    _calibrate_camera_worker,
+                    n_cameras,
+                    tracer is not None,
+                    camera_idx,
+                    camera_files_single,
+                    rows,
+                    cols,
+                    object_points,
+                    video_info,
+                    detection_threads=detection_threads,
+                    fast_check=fast_check,
+                    detection_cache=detection_cache,
+                    max_views=max_views,
+                    intrinsics_file=intrinsics_files[camera_idx],
+                ): camera_idx
+                for camera_idx, camera_files_single in enumerate(
+                    calibration_paths.camera_files
+                )
+            }
+            for n_done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if on_progress:
+                    on_progress(round(100 * n_done / n_cameras))
+
+        # merge per-camera report fragments in camera order
+        report = get_calibration_report()
+        all_camera_params = []
+        for camera_idx, (camera_params, fragment, spans) in enumerate(results):
+            report.merge_camera(camera_idx, fragment)
+            all_camera_params.append(camera_params)
+            if tracer:
+                tracer.extend(spans)
+    else:
+        all_camera_params = []
+        for camera_idx, camera_files_single in enumerate(
+            calibration_paths.camera_files
+        ):
+            camera_params = calibrate_camera(
+                camera_idx,
+                camera_files_single,
+                rows,
+                cols,
+                object_points,
+                video_info,
+                detection_threads=detection_threads,
+                fast_check=fast_check,
+                detection_cache=detection_cache,
+                max_views=max_views,
+                intrinsics_file=intrinsics_files[camera_idx],
+            )
+            all_camera_params.append(camera_params)
 
-    for camera_idx, camera_files_single in enumerate(calibration_paths.camera_files):
-        camera_name = f"Camera{camera_idx + 1}"
-        logging.info(f"Camera {camera_name}")
-
-        # if existing_intrinsics_dir is None:
-        ##### INTRINSICS #####
-        intrinsics = calibrate_intrinsics(
-            image_paths=camera_files_single.intrinsics_image_paths,
-            rows=rows,
-            cols=cols,
-            object_points=object_points,
-            image_width=video_info.width,
-            image_height=video_info.height,
-            camera_idx=camera_idx,
-        )
-
-        ##### EXTRINSICS #####
-        extrinsics = calibrate_extrinsics(
-            media_path=camera_files_single.extrinsics_media_path,
-            rows=rows,
-            cols=cols,
-            object_points=object_points,
-            image_width=video_info.width,
-            image_height=video_info.height,
-            intrinsics=intrinsics,
-            camera_idx=camera_idx,
-        )
-
-        if on_progress:
-            pct = round(100 * (camera_idx + 1) / n_cameras)
-            on_progress(pct)
-
-        camera_params = CameraParams(
-            camera_matrix=intrinsics.camera_matrix,
-            r_distort=intrinsics.r_distort,
-            t_distort=intrinsics.t_distort,
-            rotation_matrix=extrinsics.rotation_matrix,
-            translation_vector=extrinsics.translation_vector,
-        )
-        all_camera_params.append(camera_params)
-
-    now = time.time()
+            if on_progress:
+                pct = round(100 * (camera_idx + 1) / n_cameras)
+                on_progress(pct)
 
     camera_names = list(map(lambda x: x.camera_name, calibration_paths.camera_files))
 
-    calibration_data = CalibrationData(
+    calibration_data = CustomCalibrationData(
         camera_params=all_camera_params,
-        n_cameras=calibration_paths.n_cameras,
         camera_names=camera_names,
-        calibration_generated_time=now,
-        chessboard_cols=cols,
-        chessboard_rows=rows,
-        chessboard_square_size_mm=square_size_mm,
-        extrinsics_dir=extrinsics_dir,
-        intrinsics_dir=intrinsics_dir,
+        n_cameras=calibration_paths.n_cameras,
         output_dir=output_dir,
     )
 
     if output_dir:
-        write_calibration_params(
-            calibration_data=calibration_data,
-            output_dir=output_dir,
-            disable_label3d_format=disable_label3d_format,
-        )
+        with span("export"):
+            write_calibration_params(
+                calibration_data=calibration_data,
+                output_dir=output_dir,
+                disable_label3d_format=disable_label3d_format,
+            )
+
+    if detection_cache is not None:
+        detection_cache.prune()
 
     report = get_calibration_report()
     report.calibration_data = calibration_data
@@ -127,8 +248,8 @@ def do_calibrate(
     ellapsed_seconds = time.perf_counter() - start
     report.calibration_time_seconds = ellapsed_seconds
     sec = int(ellapsed_seconds % 60)
-    min = int(ellapsed_seconds // 60)
-    logging.info(f"Finished calibration in {min:02d}:{sec:02d} (mm:ss)")
+    mins = int(ellapsed_seconds // 60)
+    logging.info(f"Finished calibration in {mins:02d}:{sec:02d} (mm:ss)")
 
     return calibration_data
 
@@ -180,7 +301,7 @@ def parse_and_calibrate():
         "--existing-intrinsics-dir",
         required=False,
         default=None,
-        help="If specified and a non-empty string, the app will use the extrinsics from an existing set of .mat calibration files in this specified directory, instead of recalcuating them.",
+        help="If specified and a non-empty string, the app will use the intrinsics from an existing set of hires_cam#_params.mat files in this specified directory, instead of recalculating them (only the extrinsics are calibrated).",
     )
 
     parser.add_argument(
@@ -191,6 +312,77 @@ def parse_and_calibrate():
         help="If provided, don't transform camera parameters to label3d/old matlab format (vs opencv). This means disabling the following transformations: adjusting image origin from (0,0) to (1,1) and transposing K and R matrices.",
     )
 
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of cameras to calibrate concurrently (one process per camera). Default is 1 (serial).",
+    )
+
+    parser.add_argument(
+        "--detection-threads",
+        type=int,
+        required=False,
+        default=None,
+        help="Number of threads used for chessboard corner detection per camera. Default is one per CPU core.",
+    )
+
+    parser.add_argument(
+        "--fast-check",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Reject intrinsics images without a chessboard using a quick check on a downscaled image, then refine detected corners at full resolution.",
+    )
+
+    parser.add_argument(
+        "--max-views",
+        type=int,
+        required=False,
+        default=MAX_IMAGES_ACCEPTED,
+        help=f"Max. no. of detected intrinsics views per camera used to solve for intrinsics. If more are detected, a pose-diverse subset is selected. Default: {MAX_IMAGES_ACCEPTED}",
+    )
+
+    parser.add_argument(
+        "--no-detection-cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Don't use (or update) the on-disk cache of chessboard detections from previous runs.",
+    )
+
+    parser.add_argument(
+        "--clear-detection-cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Delete all entries in the chessboard detection cache before calibrating.",
+    )
+
+    parser.add_argument(
+        "--detection-cache-dir",
+        required=False,
+        default=None,
+        help=f"Directory for the chessboard detection cache. Default: {DEFAULT_CACHE_DIR}",
+    )
+
+    parser.add_argument(
+        "--trace",
+        required=False,
+        default=None,
+        help="If provided, save timing and peak memory spans of every calibration stage (per camera) to this file.",
+    )
+
+    parser.add_argument(
+        "--trace-format",
+        required=False,
+        default="chrome",
+        choices=TRACE_FORMATS,
+        help="Format of the --trace file: chrome (Chrome trace event format, open in chrome://tracing or ui.perfetto.dev) or json (list of spans with a per-stage summary). Default: chrome",
+    )
+
     parser.add_argument(
         "--verbose",
         "-v",
@@ -217,6 +409,15 @@ def parse_and_calibrate():
     disable_label3d_format = args.disable_label3d_format
     existing_intrinsics_dir = args.existing_intrinsics_dir
     verbose = args.verbose
+    workers = args.workers
+    detection_threads = args.detection_threads
+    fast_check = args.fast_check
+    max_views = args.max_views
+    use_detection_cache = not args.no_detection_cache
+    clear_detection_cache = args.clear_detection_cache
+    detection_cache_dir = args.detection_cache_dir
+    trace_path = args.trace
+    trace_format = args.trace_format
 
     match verbose:
         case 0:
@@ -239,20 +440,42 @@ def parse_and_calibrate():
     logging.info(f"PARAM OUTPUT DIR: {output_dir}")
     logging.info(f"CONVERT INTRINSICS TO MATLAB?: {disable_label3d_format}")
 
-    logging.info(f"INTRINSICS DIR?: {existing_intrinsics_dir}")
+    logging.info(f"EXISTING INTRINSICS DIR: {existing_intrinsics_dir}")
+    logging.info(f"WORKERS: {workers}")
+    logging.info(f"DETECTION THREADS: {detection_threads}")
+    logging.info(f"FAST CHECK: {fast_check}")
+    logging.info(f"MAX VIEWS: {max_views}")
+    logging.info(f"USE DETECTION CACHE?: {use_detection_cache}")
+    logging.info(f"TRACE FILE: {trace_path}")
 
     logging.info("-----")
 
-    do_calibrate(
-        output_dir=output_dir,
-        extrinsics_dir=extrinsics_dir,
-        intrinsics_dir=intrinsics_dir,
-        rows=rows,
-        cols=cols,
-        square_size_mm=square_size_mm,
-        disable_label3d_format=disable_label3d_format,
-        existing_intrinsics_dir=existing_intrinsics_dir,
-    )
+    detection_cache = CornerCache(cache_dir=detection_cache_dir)
+    if clear_detection_cache:
+        detection_cache.clear()
+    if not use_detection_cache:
+        detection_cache = None
+
+    tracer = Tracer() if trace_path else None
+    with active_tracer(tracer):
+        do_calibrate(
+            output_dir=output_dir,
+            extrinsics_dir=extrinsics_dir,
+            intrinsics_dir=intrinsics_dir,
+            rows=rows,
+            cols=cols,
+            square_size_mm=square_size_mm,
+            disable_label3d_format=disable_label3d_format,
+            existing_intrinsics_dir=existing_intrinsics_dir,
+            workers=workers,
+            detection_threads=detection_threads,
+            fast_check=fast_check,
+            detection_cache=detection_cache,
+            max_views=max_views,
+        )
+
+    if tracer:
+        tracer.export(trace_path, trace_format=trace_format)
 
 
 if __name__ == "__main__":
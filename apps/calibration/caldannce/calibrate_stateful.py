@@ -4,27 +4,58 @@ This allows more control of how intrinsics and extrinsics are calculated.
 
 E.g. you can have different chessboard sizes for intrinsics and extrinsics, or you can load intrinsics from hires files instead of raw images"""
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+import copy
 from dataclasses import dataclass
 import json
 import logging
+import multiprocessing
 from importlib.metadata import version
 import time
 from typing import Generic, Optional, TypeVar
+import numpy as np
+from caldannce.bundle_adjustment import bundle_adjust
 from caldannce.calibration_data import CameraParams
+from caldannce.calibration_session import (
+    CalibrationSession,
+    CameraSessionState,
+    fingerprint,
+)
+from caldannce.instrumentation import Span, Tracer, active_tracer
 from caldannce.methods import ExtrinsicsMethod, IntrinsicsMethod
+from caldannce.methods.extrinsics_chessboard_video import ExtrinsicsChessboardVideo
 
 from caldannce.project_utils import (
     write_calibration_params,
 )
 
+PIPELINE_STAGES = ("intrinsics", "extrinsics", "bundle_adjustment", "export")
+"""Top-level spans of the pipeline, see Calibrator.stage_seconds"""
+
 
 class CustomCalibrationReport:
     intrinsics_no_pattern_dict: dict[str, list]
     total_intrinsics_images: int
     successful_intrinsics_images: int
     calibration_time_seconds: int
-    extrinsics_rpes: dict = {}
-    intrinsics_rpes: dict = {}
+    extrinsics_rpes: dict
+    intrinsics_rpes: dict
+    intrinsics_view_coverage: dict
+    """Per camera: views selected for calibrateCamera and the sensor coverage they achieve"""
+    intrinsics_warm_start: dict[str, Optional[dict]]
+    """Per camera: outcome of warm-starting from previous intrinsics, with the reason if
+    it was rejected (None if not tried)"""
+    extrinsics_observations: dict[str, dict[int, np.ndarray]]
+    """Per camera: detected extrinsics target points at the static board pose, keyed by
+    (synchronized) frame index"""
+    extrinsics_moving_observations: dict[str, dict[int, np.ndarray]]
+    """Per camera: detected extrinsics target points of the moved board, keyed by
+    (synchronized) frame index"""
+    bundle_adjustment: Optional[dict]
+    """Before/after metrics of the bundle adjustment pass (None if it was not run)"""
+    reused_stages: dict[str, list[str]]
+    """Per camera: stages loaded from a calibration session instead of recomputed"""
     camera_names = list[str]
 
     def __init__(self, camera_names) -> None:
@@ -33,11 +64,48 @@ class CustomCalibrationReport:
         self.successful_intrinsics_images = 0
         self.calibration_time_seconds = None
         self.intrinsics_no_pattern_dict = {}
+        self.intrinsics_rpes = {}
+        self.extrinsics_rpes = {}
+        self.intrinsics_view_coverage = {}
+        self.intrinsics_warm_start = {}
+        self.extrinsics_observations = {}
+        self.extrinsics_moving_observations = {}
+        self.bundle_adjustment = None
+        self.reused_stages = {}
 
         for cam_name in camera_names:
             self.intrinsics_no_pattern_dict[cam_name] = []
             self.intrinsics_rpes[cam_name] = None
             self.extrinsics_rpes[cam_name] = None
+            self.intrinsics_view_coverage[cam_name] = None
+            self.intrinsics_warm_start[cam_name] = None
+            self.extrinsics_observations[cam_name] = {}
+            self.extrinsics_moving_observations[cam_name] = {}
+            self.reused_stages[cam_name] = []
+
+    def merge_camera(self, camera_name: str, fragment: "CustomCalibrationReport"):
+        """Merge the entries for a single camera from a report fragment (e.g. one produced
+        in a worker process) into this report"""
+        self.intrinsics_no_pattern_dict[camera_name] = list(
+            fragment.intrinsics_no_pattern_dict[camera_name]
+        )
+        self.intrinsics_rpes[camera_name] = fragment.intrinsics_rpes[camera_name]
+        self.extrinsics_rpes[camera_name] = fragment.extrinsics_rpes[camera_name]
+        self.intrinsics_view_coverage[camera_name] = (
+            fragment.intrinsics_view_coverage[camera_name]
+        )
+        self.intrinsics_warm_start[camera_name] = fragment.intrinsics_warm_start[
+            camera_name
+        ]
+        self.extrinsics_observations[camera_name] = dict(
+            fragment.extrinsics_observations[camera_name]
+        )
+        self.extrinsics_moving_observations[camera_name] = dict(
+            fragment.extrinsics_moving_observations[camera_name]
+        )
+        self.reused_stages[camera_name] = list(fragment.reused_stages[camera_name])
+        self.total_intrinsics_images += fragment.total_intrinsics_images
+        self.successful_intrinsics_images += fragment.successful_intrinsics_images
 
     def make_summary(self):
         avg_extrinsics_rpe = sum(self.extrinsics_rpes.values()) / len(
@@ -58,6 +126,38 @@ class CustomCalibrationReport:
             f"Avg. intrinsics RPE per camera (px): {intrinsics_rpe_string}\n"
         )
 
+        coverages = [x for x in self.intrinsics_view_coverage.values() if x]
+        if coverages:
+            coverage_string = ", ".join(
+                map(
+                    lambda x: f"{x['coverage_selected']:.0%} ({x['n_selected']} views)",
+                    coverages,
+                )
+            )
+            summary_string += (
+                f"Intrinsics sensor coverage per camera: {coverage_string}\n"
+            )
+
+        warm_starts = [x for x in self.intrinsics_warm_start.values() if x]
+        if warm_starts:
+            n_accepted = sum(x["accepted"] for x in warm_starts)
+            summary_string += f"Warm-started intrinsics accepted for {n_accepted} / {len(warm_starts)} cameras (others fully recalibrated)\n"
+
+        n_reused = {
+            stage: sum(stage in x for x in self.reused_stages.values())
+            for stage in ("intrinsics", "extrinsics")
+        }
+        if any(n_reused.values()):
+            summary_string += f"Reused from session: intrinsics of {n_reused['intrinsics']} cameras, extrinsics of {n_reused['extrinsics']} cameras\n"
+
+        if self.bundle_adjustment:
+            ba = self.bundle_adjustment
+            summary_string += f"Bundle adjustment over {ba['n_shared_frames']} moving board frames shared between cameras ({ba['n_static_frames']} static board frames)\n"
+            summary_string += f"Bundle adjustment RPE (px): {ba['rpe_px_before']:.3f} -> {ba['rpe_px_after']:.3f}\n"
+            if ba["triangulation_rpe_px_before"] is not None:
+                summary_string += f"Bundle adjustment triangulation RPE (px): {ba['triangulation_rpe_px_before']:.3f} -> {ba['triangulation_rpe_px_after']:.3f}\n"
+                summary_string += f"Bundle adjustment board error (mm): {ba['board_error_mm_before']:.3f} -> {ba['board_error_mm_after']:.3f}\n"
+
         summary_string += "\n\nYou can safely close this GUI.\n"
         return summary_string
 
@@ -119,22 +219,53 @@ T_Int = TypeVar("IntrinsicsMethod", bound=IntrinsicsMethod, covariant=True)
 T_Ext = TypeVar("ExtrinsicsMethod", bound=ExtrinsicsMethod, covariant=True)
 
 
+def _calibrate_camera_worker(
+    intrinsics_method: IntrinsicsMethod,
+    extrinsics_method: ExtrinsicsMethod,
+    camera_name: str,
+    camera_data: IntrinsicsExtrinsicsData,
+    session: Optional[CalibrationSession] = None,
+) -> tuple[CameraParams, CustomCalibrationReport, list[Span]]:
+    """Calibrate a single camera in a worker process.
+
+    The methods are bound to a fresh Calibrator with a single-camera report, which is
+    returned alongside the camera params (and the recorded trace spans) so the parent
+    can merge it."""
+    cal = Calibrator()
+    cal.set_intrinsics_method(intrinsics_method)
+    cal.set_extrinsics_method(extrinsics_method)
+    cal.set_session(session)
+    cal.init_report([camera_name])
+    with active_tracer(cal.tracer):
+        camera_params = cal._calibrate_camera(camera_name, camera_data)
+    return camera_params, cal.report, cal.tracer.spans
+
+
 class Calibrator(Generic[T_Int, T_Ext]):
     output_dir: str
 
     _intrinsics_method: T_Int
     _extrinsics_method: T_Ext
-    _camera_data_dict: dict[str, IntrinsicsExtrinsicsData] = {}
+    _camera_data_dict: dict[str, IntrinsicsExtrinsicsData]
     _calibrate_results: CustomCalibrationData = None
     report = None
+    tracer: Tracer
+    """Timing/memory spans of all pipeline stages (see caldannce.instrumentation)"""
     _progress_handler = None
+    _session: Optional[CalibrationSession] = None
 
     def __init__(self) -> None:
-        pass
+        self._camera_data_dict = {}
+        self.tracer = Tracer()
 
     def get_results(self):
         return self._calibrate_results
 
+    def stage_seconds(self) -> dict[str, float]:
+        """Wall time per pipeline stage (see PIPELINE_STAGES) recorded on the tracer,
+        summed over cameras. Stages reused from a session are not timed"""
+        return self.tracer.stage_seconds(PIPELINE_STAGES)
+
     def set_intrinsics_method(self, int_method: T_Int):
         self._intrinsics_method = int_method
         self._intrinsics_method.bind_calibrator(self)
@@ -166,35 +297,176 @@ class Calibrator(Generic[T_Int, T_Ext]):
     def set_progress_handler(self, progress_handler):
         self._progress_handler = progress_handler
 
-    def calibrate(self):
-        # for each camera:
-        # 1. compute intrinsics
-        # 2. compute extrinsics (providing intrinsics)
-        camera_params = []
-        if self._progress_handler:
-            self._progress_handler(0)
-        n_cameras = len(self._camera_data_dict)
+    def set_session(self, session: Optional[CalibrationSession]):
+        """Persist per-camera results to a session and resume from it: only stages whose
+        inputs changed, or which did not complete, are recomputed. A failing camera no
+        longer stops the other cameras (see calibrate)"""
+        self._session = session
 
-        for idx, camera_name in enumerate(self._camera_data_dict.keys()):
-            d = self._camera_data_dict[camera_name]
-            intrinsics = self._intrinsics_method.compute_intrinsics(
+    def _compute_intrinsics(self, camera_name: str, d: IntrinsicsExtrinsicsData):
+        with self.tracer.span("intrinsics"):
+            return self._intrinsics_method.compute_intrinsics(
                 camera_name=camera_name,
                 camdata=d.intrinsics_camdata,
             )
-            extrinsics = self._extrinsics_method.compute_extrinsics(
+
+    def _compute_extrinsics(
+        self, camera_name: str, d: IntrinsicsExtrinsicsData, intrinsics
+    ):
+        with self.tracer.span("extrinsics"):
+            return self._extrinsics_method.compute_extrinsics(
                 camera_name=camera_name,
                 intrinsics_params=intrinsics,
                 camdata=d.extrinsics_camdata,
             )
-            camera_params.append(
-                CameraParams.from_intrinsics_extrinsics(intrinsics, extrinsics)
+
+    def _calibrate_camera(
+        self, camera_name: str, d: IntrinsicsExtrinsicsData
+    ) -> CameraParams:
+        """Compute intrinsics, then extrinsics (providing intrinsics) for one camera"""
+        with self.tracer.camera_scope(camera_name):
+            if self._session is not None:
+                return self._calibrate_camera_resumable(camera_name, d)
+            intrinsics = self._compute_intrinsics(camera_name, d)
+            extrinsics = self._compute_extrinsics(camera_name, d, intrinsics)
+        return CameraParams.from_intrinsics_extrinsics(intrinsics, extrinsics)
+
+    @contextmanager
+    def _stage_report(self, fragment: CustomCalibrationReport):
+        """Direct the report entries of the methods to a fragment in the with-block"""
+        report = self.report
+        self.report = fragment
+        try:
+            yield fragment
+        finally:
+            self.report = report
+
+    def _calibrate_camera_resumable(
+        self, camera_name: str, d: IntrinsicsExtrinsicsData
+    ) -> CameraParams:
+        """Like _calibrate_camera, but reuse the camera's stages from the session if
+        their inputs are unchanged, and save each computed stage as it completes"""
+        session = self._session
+        state = session.load_camera(camera_name)
+        intrinsics_fingerprint = fingerprint(
+            self._intrinsics_method, d.intrinsics_camdata
+        )
+        extrinsics_fingerprint = fingerprint(
+            self._extrinsics_method, d.extrinsics_camdata, intrinsics_fingerprint
+        )
+        reused = []
+
+        if (
+            state.intrinsics is not None
+            and state.intrinsics_fingerprint == intrinsics_fingerprint
+        ):
+            reused.append("intrinsics")
+        else:
+            with self._stage_report(CustomCalibrationReport([camera_name])) as fragment:
+                intrinsics = self._compute_intrinsics(camera_name, d)
+            # the extrinsics depend on the intrinsics, so they are discarded
+            state = CameraSessionState(
+                camera_name=camera_name,
+                intrinsics_fingerprint=intrinsics_fingerprint,
+                intrinsics=intrinsics,
+                intrinsics_report=fragment,
             )
+            session.save_camera(state)
+
+        if (
+            state.extrinsics is not None
+            and state.extrinsics_fingerprint == extrinsics_fingerprint
+        ):
+            reused.append("extrinsics")
+        else:
+            with self._stage_report(copy.deepcopy(state.intrinsics_report)) as fragment:
+                extrinsics = self._compute_extrinsics(
+                    camera_name, d, state.intrinsics
+                )
+            state.extrinsics_fingerprint = extrinsics_fingerprint
+            state.extrinsics = extrinsics
+            state.report = fragment
+            state.error = None
+            session.save_camera(state)
+
+        if reused:
+            logging.info(f"Reused {' and '.join(reused)} from session (camera {camera_name})")
+        if self.report:
+            fragment = copy.deepcopy(state.report)
+            fragment.reused_stages[camera_name] = reused
+            self.report.merge_camera(camera_name, fragment)
+        return CameraParams.from_intrinsics_extrinsics(state.intrinsics, state.extrinsics)
+
+    def _report_progress(self, n_done: int, n_cameras: int):
+        if self._progress_handler:
+            pct = round(100 * n_done / n_cameras)
+            self._progress_handler(pct)
+
+    def calibrate(
+        self,
+        workers: int = 1,
+        bundle_adjust: bool = False,
+        bundle_adjust_intrinsics: bool = False,
+    ):
+        """Calibrate all cameras.
 
-            if self._progress_handler:
-                pct = round(100 * (idx + 1) / n_cameras)
-                self._progress_handler(pct)
+        If workers > 1, cameras are calibrated concurrently in a pool of that many
+        processes. Per-camera report entries are merged back in camera order, so the
+        results are identical to a serial run.
 
+        If bundle_adjust is True, the per-camera results are then refined together over
+        the frames of the moved board seen by several cameras (see _bundle_adjust). This
+        requires the ExtrinsicsChessboardVideo method on synchronized extrinsics videos
+        in which the board is moved after its static segment: with a static board only,
+        there is nothing to refine jointly, and an exception is raised.
+
+        Spans of all stages (including those of worker processes) are recorded on
+        self.tracer.
+
+        With a session (see set_session), a camera which fails doesn't stop the others:
+        all other cameras are calibrated (and saved to the session) before an exception
+        naming the failed cameras is raised. Calibrating again only retries those."""
+        with active_tracer(self.tracer):
+            self._calibrate(workers, bundle_adjust, bundle_adjust_intrinsics)
+
+    def _calibrate(
+        self, workers: int, bundle_adjust: bool, bundle_adjust_intrinsics: bool
+    ):
+        if bundle_adjust:
+            # fail before the (long) per-camera calibration
+            self._check_bundle_adjust()
         camera_names = list(self._camera_data_dict.keys())
+        n_cameras = len(camera_names)
+        self._report_progress(0, n_cameras)
+
+        errors = {}
+        if workers > 1 and n_cameras > 1:
+            camera_params = self._calibrate_parallel(camera_names, workers, errors)
+        else:
+            camera_params = []
+            for idx, camera_name in enumerate(camera_names):
+                d = self._camera_data_dict[camera_name]
+                try:
+                    camera_params.append(self._calibrate_camera(camera_name, d))
+                except Exception as e:
+                    if self._session is None:
+                        raise
+                    self._record_failure(camera_name, e, errors)
+                    camera_params.append(None)
+                self._report_progress(idx + 1, n_cameras)
+
+        if self._session is not None:
+            self._session.write_summary(camera_names)
+        if errors:
+            error_lines = "\n".join(f"{name}: {e}" for name, e in errors.items())
+            raise Exception(
+                f"Calibration failed for {len(errors)} of {n_cameras} cameras (other cameras were saved to the session at {self._session.session_dir}; calibrate again to retry the failed cameras):\n{error_lines}"
+            )
+
+        if bundle_adjust:
+            camera_params = self._bundle_adjust(
+                camera_names, camera_params, refine_intrinsics=bundle_adjust_intrinsics
+            )
 
         self._calibrate_results = CustomCalibrationData(
             camera_params=camera_params,
@@ -202,10 +474,101 @@ class Calibrator(Generic[T_Int, T_Ext]):
             n_cameras=len(camera_names),
         )
 
+    def _record_failure(self, camera_name: str, error: Exception, errors: dict):
+        logging.error(f"Calibration failed (camera {camera_name}): {error}")
+        self._session.mark_failed(camera_name, error)
+        errors[camera_name] = error
+
+    def _calibrate_parallel(
+        self, camera_names: list[str], workers: int, errors: dict
+    ):
+        n_cameras = len(camera_names)
+        n_workers = min(workers, n_cameras)
+        logging.info(f"Calibrating {n_cameras} cameras using {n_workers} processes")
+
+        results = [None] * n_cameras
+        # spawn (rather than fork) so workers don't inherit GUI/OpenCV thread state
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context) as pool:
+            futures = {
+                pool.submit(
+                    _calibrate_camera_worker,
+                    self._intrinsics_method,
+                    self._extrinsics_method,
+                    camera_name,
+                    self._camera_data_dict[camera_name],
+                    self._session,
+                ): idx
+                for idx, camera_name in enumerate(camera_names)
+            }
+            for n_done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    if self._session is None:
+                        raise
+                    self._record_failure(camera_names[idx], e, errors)
+                self._report_progress(n_done, n_cameras)
+
+        # merge report fragments in a fixed (camera) order
+        camera_params = []
+        for camera_name, result in zip(camera_names, results):
+            if result is None:  # failed
+                camera_params.append(None)
+                continue
+            params, fragment, spans = result
+            camera_params.append(params)
+            self.tracer.extend(spans)
+            if self.report:
+                self.report.merge_camera(camera_name, fragment)
+        return camera_params
+
+    def _bundle_adjust(
+        self,
+        camera_names: list[str],
+        camera_params: list[CameraParams],
+        refine_intrinsics: bool = False,
+    ) -> list[CameraParams]:
+        """Refine camera poses (and optionally intrinsics) using the chessboard
+        observations recorded by the extrinsics method, coupled through the frames of
+        the moved board seen by several cameras. Stores before/after metrics in the
+        report."""
+        self._check_bundle_adjust()
+        observations = [
+            self.report.extrinsics_observations[camera_name]
+            for camera_name in camera_names
+        ]
+        moving_observations = [
+            self.report.extrinsics_moving_observations[camera_name]
+            for camera_name in camera_names
+        ]
+        with self.tracer.span("bundle_adjustment"):
+            refined, metrics = bundle_adjust(
+                camera_params,
+                observations,
+                self._extrinsics_method.object_points,
+                moving_observations=moving_observations,
+                refine_intrinsics=refine_intrinsics,
+            )
+        self.report.bundle_adjustment = metrics
+        return refined
+
+    def _check_bundle_adjust(self):
+        # ExtrinsicsChessboard records a single frame per camera, of the static board:
+        # nothing would be shared between cameras
+        if not isinstance(self._extrinsics_method, ExtrinsicsChessboardVideo):
+            raise Exception(
+                "Bundle adjustment requires the ExtrinsicsChessboardVideo method (board observations shared between cameras over several frames)"
+            )
+        if not self.report:
+            raise Exception("Bundle adjustment requires a report (call init_report)")
+
     def export_to_folder(self, output_dir):
-        write_calibration_params(
-            calibration_data=self._calibrate_results,
-            output_dir=output_dir,
-            disable_label3d_format=False,
-            include_calibration_json=True,
-        )
+        with active_tracer(self.tracer), self.tracer.span("export"):
+            write_calibration_params(
+                calibration_data=self._calibrate_results,
+                output_dir=output_dir,
+                disable_label3d_format=False,
+                include_calibration_json=True,
+            )
@@ -1,9 +1,10 @@
 # data classes for storing calibration parameters and metadata
 
 import json
+import logging
 from pathlib import Path
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from scipy.io import loadmat
 import textwrap
 
@@ -25,6 +26,8 @@ class CameraParams:
     """3x3 ndarray matrix"""
     translation_vector: np.ndarray
     """3x1 ndarray matrix"""
+    _projection_matrix: np.ndarray = field(init=False, repr=False, compare=False)
+    """Cached 3x4 projection matrix (see make_projection_matrix)"""
 
     def __post_init__(self):
         assert self.r_distort.shape == (2,), "r_distort must be 1d np array of size 2"
@@ -42,6 +45,8 @@ class CameraParams:
             1,
         ), "Translation vector [t] must be a 3x1 column array"
         assert is_upper(self.camera_matrix), "Camera matrix must be upper-triangular"
+        # params are immutable, so the projection matrix only needs computing once
+        object.__setattr__(self, "_projection_matrix", self.make_projection_matrix())
 
     @property
     def dist(self) -> np.ndarray:
@@ -71,8 +76,10 @@ class CameraParams:
     @staticmethod
     def load_from_hires_file(filename):
         """Generate a CaemraParams matrix from a file path to a hires file"""
-        intrinsics = IntrinsicsParams.load_from_mat_file(filename)
-        extrinsics = ExtrinsicsParams.load_from_mat_file(filename)
+        # load the file once for both intrinsics and extrinsics
+        mat_file = loadmat(filename)
+        intrinsics = IntrinsicsParams.from_mat_dict(mat_file)
+        extrinsics = ExtrinsicsParams.from_mat_dict(mat_file)
 
         return CameraParams.from_intrinsics_extrinsics(intrinsics, extrinsics)
 
@@ -106,13 +113,33 @@ class CameraParams:
     def load_list_from_hires_folder(
         calibration_folder: str | Path,
     ) -> list["CameraParams"]:
-        """Load a list of camera params from a folder containing hires_camX_params.mat files"""
+        """Load a list of camera params from a folder containing hires_camX_params.mat files
+
+        If the folder also holds a calibration store written from these exact hires files
+        (see caldannce.calibration_store), the params are read from it instead"""
+        # avoid a circular import (the store is built on CameraParams)
+        from .calibration_store import (
+            STORE_FILE_NAME,
+            CalibrationStore,
+            store_matches_hires_files,
+        )
+
         hires_folder = Path(calibration_folder)
         hires_files = [f for f in hires_folder.glob("hires_cam*params.mat")]
         if len(hires_files) == 0:
             raise Exception(
                 "No valid calibration files found (format=hires_camX_params.mat where X is 1,2,3...)"
             )
+
+        # the store is only used if it was written from the current hires files
+        store_path = hires_folder.joinpath(STORE_FILE_NAME)
+        if store_path.exists():
+            try:
+                store = CalibrationStore(store_path)
+                if store_matches_hires_files(store, hires_files):
+                    return store.load_list()
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable calibration store {store_path}: {e}")
         # sort the files so the hires_cam1 is before hires_cam2 (etc. )
         hires_files = sorted(
             hires_files,
@@ -180,6 +207,11 @@ class CameraParams:
         proj_mtx = self.camera_matrix @ rt_mtx
         return proj_mtx
 
+    @property
+    def projection_matrix(self) -> np.ndarray:
+        """Cached 3x4 projection matrix: K @ [ R | T ]"""
+        return self._projection_matrix
+
     def project_world_point(self, world_point):
         """Projection of world point in image-space.
         World point should be a 3d (non-homogeneous) np array
@@ -187,15 +219,7 @@ class CameraParams:
         Returns a numpy vector with size 2: (u,v) in pixels
         """
         assert world_point.size == 3, "world point must have 3 fields (x,y,z)"
-        world_point = world_point.reshape((3, 1))
-        # use homogeneous world point: (x , y , z , 1).T
-        world_point = np.vstack([world_point, 1])
-        proj_mtx = self.make_projection_matrix()
-        x_homog = proj_mtx @ world_point
-        # convert to non-homogeneous by dividing by last entry (w)
-        x = x_homog[0:2, 0] / [x_homog[2, 0]]
-        x = x.reshape((2,))  # return a vector instead of a 2d matrix
-        return x
+        return self.project_points(world_point.reshape((3,)))
 
     def project_multiple_world_points(self, world_points: np.ndarray):
         """Project M world_points from world coords to this camera image coords.
@@ -204,12 +228,59 @@ class CameraParams:
         Returns an ndarray of shape: (M, 2)
 
         """
+        return self.project_points(world_points)
+
+    def project_points(self, world_points: np.ndarray, distort=False) -> np.ndarray:
+        """Project world points of shape (..., 3) to image coords of shape (..., 2).
 
-        m_world_points = world_points.shape[0]
-        proj_points = np.zeros((m_world_points, 2))
-        for i in range(m_world_points):
-            proj_points[i, :] = self.project_world_point(world_points[i, :])
-        return proj_points
+        If distort is True, apply this camera's radial (k1, k2) and tangential (p1, p2)
+        lens distortion (OpenCV model), i.e. return coordinates in the raw (distorted)
+        image instead of the undistorted image.
+        """
+        return CameraParams.project_points_multi([self], world_points, distort)[0]
+
+    @staticmethod
+    def project_points_multi(
+        camera_params: list["CameraParams"], world_points: np.ndarray, distort=False
+    ) -> np.ndarray:
+        """Project world points of shape (..., 3) into every camera of a rig at once.
+
+        Returns an ndarray of shape (n_cams, ..., 2). See project_points for `distort`.
+        """
+        world_points = np.asarray(world_points, dtype=np.float64)
+        batch_shape = world_points.shape[:-1]
+        pts = world_points.reshape(-1, 3)
+        n_cams = len(camera_params)
+
+        if not distort:
+            # (n_cams, 3, 4) @ homogeneous points -> (n_cams, M, 3)
+            proj_mtx = np.stack([p.projection_matrix for p in camera_params])
+            x_homog = pts @ proj_mtx[:, :, 0:3].transpose(0, 2, 1)
+            x_homog += proj_mtx[:, None, :, 3]
+            x = x_homog[..., 0:2] / x_homog[..., 2:3]
+            return x.reshape((n_cams, *batch_shape, 2))
+
+        r = np.stack([p.rotation_matrix for p in camera_params])
+        t = np.stack([p.translation_vector.reshape(3) for p in camera_params])
+        k = np.stack([p.camera_matrix for p in camera_params])
+        r_dist = np.stack([p.r_distort for p in camera_params])[:, None, :]
+        t_dist = np.stack([p.t_distort for p in camera_params])[:, None, :]
+
+        # world -> camera coords -> normalized image coords: (n_cams, M, 2)
+        x_cam = pts @ r.transpose(0, 2, 1) + t[:, None, :]
+        xy = x_cam[..., 0:2] / x_cam[..., 2:3]
+        x, y = xy[..., 0], xy[..., 1]
+
+        r2 = x * x + y * y
+        radial = 1 + r_dist[..., 0] * r2 + r_dist[..., 1] * r2 * r2
+        p1, p2 = t_dist[..., 0], t_dist[..., 1]
+        x_d = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+        y_d = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+
+        # apply intrinsics (zero skew)
+        u = k[:, None, 0, 0] * x_d + k[:, None, 0, 2]
+        v = k[:, None, 1, 1] * y_d + k[:, None, 1, 2]
+        return np.stack([u, v], axis=-1).reshape((n_cams, *batch_shape, 2))
 
     def as_dict(self):
         return {
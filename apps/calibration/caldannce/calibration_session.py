@@ -0,0 +1,199 @@
+"""Resumable calibration sessions.
+
+A session directory persists each camera's results as soon as they complete:
+- the corner detections of every intrinsics image (see SessionDetectionCache)
+- the camera's intrinsics (with its report entries), once computed
+- the camera's extrinsics (with its report entries), once computed
+- the error, if the camera failed
+
+Each stage is stored with a fingerprint of its inputs (method settings, and the paths,
+sizes and modification times of the input files). When calibrating again with the same
+session, a stage is only recomputed if its fingerprint changed or it did not complete
+(e.g. it failed). New intrinsics images change the intrinsics fingerprint, but the
+detections of the existing images are reused, so only the new images are processed.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from caldannce.detection_cache import CornerCache
+from caldannce.extrinsics import ExtrinsicsParams
+from caldannce.intrinsics import IntrinsicsParams
+
+SESSION_FORMAT_VERSION = 3
+
+FINGERPRINT_IGNORED_ATTRIBUTES = {"calibrator", "cache", "n_threads"}
+"""Method attributes which don't change the results, so don't invalidate a session"""
+
+
+def _fingerprint_value(h, value: Any):
+    """Feed a (nested) value into a hash. Paths of existing files contribute their size
+    and modification time, so a changed or replaced file changes the fingerprint"""
+    if isinstance(value, np.ndarray):
+        h.update(f"ndarray{value.shape}{value.dtype}".encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}[{len(value)}]".encode())
+        for v in value:
+            _fingerprint_value(h, v)
+    elif isinstance(value, dict):
+        h.update(f"dict[{len(value)}]".encode())
+        for k in sorted(value, key=str):
+            _fingerprint_value(h, k)
+            _fingerprint_value(h, value[k])
+    elif dataclasses.is_dataclass(value):
+        h.update(type(value).__name__.encode())
+        for f in dataclasses.fields(value):
+            _fingerprint_value(h, f.name)
+            _fingerprint_value(h, getattr(value, f.name))
+    elif isinstance(value, (str, Path)) and os.path.isfile(value):
+        stat = os.stat(value)
+        h.update(f"file:{value}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    else:
+        h.update(f"{type(value).__name__}:{value!r}".encode())
+    h.update(b";")
+
+
+def fingerprint(method, camdata, *parents: str) -> str:
+    """Fingerprint of a calibration stage: the method's class and settings, its camdata
+    and the fingerprints of the stages it depends on"""
+    h = hashlib.blake2b(digest_size=20)
+    _fingerprint_value(h, SESSION_FORMAT_VERSION)
+    _fingerprint_value(h, type(method).__qualname__)
+    settings = {
+        k: v
+        for k, v in vars(method).items()
+        if k not in FINGERPRINT_IGNORED_ATTRIBUTES
+    }
+    _fingerprint_value(h, settings)
+    _fingerprint_value(h, camdata)
+    _fingerprint_value(h, list(parents))
+    return h.hexdigest()
+
+
+class SessionDetectionCache(CornerCache):
+    """Corner cache stored in the session directory.
+
+    Image files are identified by path, size and modification time instead of a hash of
+    their content, so unchanged images are never read again (which matters on network
+    storage). Entries are never evicted."""
+
+    @staticmethod
+    def hash_file(path: str | Path) -> str:
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        return hashlib.blake2b(key.encode(), digest_size=20).hexdigest()
+
+    def prune(self):
+        pass
+
+
+@dataclass(kw_only=True)
+class CameraSessionState:
+    """Persisted results of one camera. The report fragments are single-camera
+    CustomCalibrationReport objects (see caldannce.calibrate_stateful)"""
+
+    camera_name: str
+    intrinsics_fingerprint: Optional[str] = None
+    intrinsics: Optional[IntrinsicsParams] = None
+    intrinsics_report: Any = None
+    """Report fragment with the intrinsics entries only"""
+    extrinsics_fingerprint: Optional[str] = None
+    extrinsics: Optional[ExtrinsicsParams] = None
+    report: Any = None
+    """Report fragment with the intrinsics and extrinsics entries"""
+    error: Optional[str] = None
+    """Error of the last attempt, if it failed"""
+    updated_time: float = 0.0
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return "failed"
+        if self.extrinsics is not None:
+            return "done"
+        if self.intrinsics is not None:
+            return "intrinsics_done"
+        return "pending"
+
+
+class CalibrationSession:
+    """Persisted per-camera calibration state in a session directory (see module doc).
+
+    Only a path is held, so a session can be passed to worker processes: each camera's
+    state is written to its own file, atomically."""
+
+    session_dir: Path
+
+    def __init__(self, session_dir: str | Path) -> None:
+        self.session_dir = Path(session_dir)
+
+    @property
+    def detection_cache(self) -> SessionDetectionCache:
+        """Corner cache for the intrinsics/extrinsics methods, stored in this session"""
+        return SessionDetectionCache(cache_dir=self.session_dir.joinpath("detections"))
+
+    def _camera_path(self, camera_name: str) -> Path:
+        return self.session_dir.joinpath("cameras", f"{camera_name}.pkl")
+
+    def load_camera(self, camera_name: str) -> CameraSessionState:
+        """Load a camera's state (an empty state if there is none, or it is unreadable)"""
+        path = self._camera_path(camera_name)
+        try:
+            with open(path, "rb") as f:
+                version, state = pickle.load(f)
+            if version != SESSION_FORMAT_VERSION:
+                raise ValueError(f"unsupported session format version {version}")
+            return state
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable session state {path}: {e}")
+        return CameraSessionState(camera_name=camera_name)
+
+    def save_camera(self, state: CameraSessionState):
+        path = self._camera_path(state.camera_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state.updated_time = time.time()
+        # write to a temp file and rename so a crash never leaves a partial state
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((SESSION_FORMAT_VERSION, state), f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def mark_failed(self, camera_name: str, error: BaseException):
+        """Record a camera's error, keeping the stages which did complete"""
+        state = self.load_camera(camera_name)
+        state.error = f"{type(error).__name__}: {error}"
+        self.save_camera(state)
+
+    def write_summary(self, camera_names: list[str]):
+        """Write a human-readable session.json with the status of each camera"""
+        cameras = {}
+        for camera_name in camera_names:
+            state = self.load_camera(camera_name)
+            cameras[camera_name] = {
+                "status": state.status,
+                "error": state.error,
+                "updated_time": state.updated_time,
+            }
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.session_dir.joinpath("session.json"), "wt") as f:
+            json.dump(
+                {"version": SESSION_FORMAT_VERSION, "cameras": cameras}, f, indent=2
+            )
@@ -0,0 +1,277 @@
+"""Compact binary store of a rig's calibration (all cameras in one file).
+
+Layout (little endian):
+```
+magic     8 bytes   b"CDCALIB\\0"
+version   uint32    STORE_FORMAT_VERSION
+n_cameras uint32
+meta_len  uint64    length of the metadata
+metadata  meta_len  UTF-8 JSON: camera names, source, creation time, ...
+padding             zeros up to a multiple of 64 bytes
+params    float64   (n_cameras, PARAMS_WIDTH) contiguous array, one row per camera
+```
+Each row holds the OpenCV-convention (0-based principal point, world -> camera)
+parameters: camera_matrix (3x3, row major), rotation_matrix (3x3, row major),
+translation_vector (3), r_distort (2), t_distort (2).
+
+Reading a rig is a single read of the header plus a memory map of the params array,
+instead of one loadmat per camera file.
+
+A store written next to hires_camX_params.mat files (in Label3D format) lists their
+names, sizes and modification times in its metadata ("hires_files"). It is only used in
+place of the folder's hires files while they all still match (see
+store_matches_hires_files).
+
+Convert existing calibrations (a folder of hires_camX_params.mat files, a *dannce.mat
+file or a calibration JSON file):
+```
+python -m caldannce.calibration_store ./calibration_export ./calibration_export/calibration.cdcal
+```
+"""
+
+import argparse
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from caldannce.calibration_data import CameraParams
+from caldannce.logger import init_logger
+
+STORE_FILE_NAME = "calibration.cdcal"
+"""File name of the store written next to the hires_camX_params.mat files"""
+
+STORE_MAGIC = b"CDCALIB\0"
+STORE_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQ")
+_ALIGNMENT = 64
+_DTYPE = np.dtype("<f8")
+
+# column slices of a camera row
+_K = slice(0, 9)
+_R = slice(9, 18)
+_T = slice(18, 21)
+_R_DISTORT = slice(21, 23)
+_T_DISTORT = slice(23, 25)
+PARAMS_WIDTH = 25
+
+
+def params_to_array(camera_params: list[CameraParams]) -> np.ndarray:
+    """Pack camera params into a (n_cameras, PARAMS_WIDTH) float64 array"""
+    array = np.empty((len(camera_params), PARAMS_WIDTH), dtype=_DTYPE)
+    for i, p in enumerate(camera_params):
+        array[i, _K] = p.camera_matrix.reshape(9)
+        array[i, _R] = p.rotation_matrix.reshape(9)
+        array[i, _T] = p.translation_vector.reshape(3)
+        array[i, _R_DISTORT] = p.r_distort
+        array[i, _T_DISTORT] = p.t_distort
+    return array
+
+
+def params_from_row(row: np.ndarray) -> CameraParams:
+    # copy out of the memory map: CameraParams must not depend on the open file
+    return CameraParams(
+        camera_matrix=np.array(row[_K], dtype=np.float64).reshape(3, 3),
+        rotation_matrix=np.array(row[_R], dtype=np.float64).reshape(3, 3),
+        translation_vector=np.array(row[_T], dtype=np.float64).reshape(3, 1),
+        r_distort=np.array(row[_R_DISTORT], dtype=np.float64),
+        t_distort=np.array(row[_T_DISTORT], dtype=np.float64),
+    )
+
+
+def hires_files_metadata(hires_files: list[str | Path]) -> list[dict]:
+    """Names, sizes and modification times of hires files, sorted by name"""
+    entries = []
+    for f in sorted(Path(f) for f in hires_files):
+        stat = f.stat()
+        entries.append(
+            {"name": f.name, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+        )
+    return entries
+
+
+def store_matches_hires_files(
+    store: "CalibrationStore", hires_files: list[Path]
+) -> bool:
+    """Whether a store was written from exactly these hires files (same names, sizes and
+    modification times, to the second: copies which keep mtimes, e.g. cp -p or rsync -a,
+    may drop sub-second precision)"""
+    recorded = store.metadata.get("hires_files")
+    return recorded is not None and recorded == hires_files_metadata(hires_files)
+
+
+def write_calibration_store(
+    path: str | Path,
+    camera_params: list[CameraParams],
+    camera_names: list[str] = None,
+    metadata: dict = None,
+):
+    """Write a rig's camera params (and JSON-serializable metadata) to a store file.
+    The file is replaced atomically"""
+    path = Path(path)
+    n_cameras = len(camera_params)
+    if camera_names is None:
+        camera_names = [f"Camera{i + 1}" for i in range(n_cameras)]
+    if len(camera_names) != n_cameras:
+        raise Exception(
+            f"Got {len(camera_names)} camera names for {n_cameras} cameras"
+        )
+    meta = {
+        "camera_names": list(camera_names),
+        "created_time": time.time(),
+        **(metadata or {}),
+    }
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    header = _HEADER.pack(STORE_MAGIC, STORE_FORMAT_VERSION, n_cameras, len(meta_bytes))
+    data_offset = -(-(len(header) + len(meta_bytes)) // _ALIGNMENT) * _ALIGNMENT
+    padding = b"\0" * (data_offset - len(header) - len(meta_bytes))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temp file and rename so readers never see a partial store
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(meta_bytes)
+            f.write(padding)
+            f.write(params_to_array(camera_params).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    logging.info(f"Saved calibration store ({n_cameras} cameras) to {path}")
+
+
+class CalibrationStore:
+    """Read-only view of a store file: the header is parsed when opened, the params array
+    is memory-mapped and each camera's CameraParams is built on first access"""
+
+    path: Path
+    version: int
+    metadata: dict
+    params: np.ndarray
+    """(n_cameras, PARAMS_WIDTH) float64 array (memory-mapped, read-only)"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise Exception(f"Not a calibration store (truncated): {self.path}")
+            magic, version, n_cameras, meta_len = _HEADER.unpack(header)
+            if magic != STORE_MAGIC:
+                raise Exception(f"Not a calibration store: {self.path}")
+            if version != STORE_FORMAT_VERSION:
+                raise Exception(
+                    f"Unsupported calibration store version {version} (supported: {STORE_FORMAT_VERSION}): {self.path}"
+                )
+            self.metadata = json.loads(f.read(meta_len).decode("utf-8"))
+        self.version = version
+        data_offset = -(-(_HEADER.size + meta_len) // _ALIGNMENT) * _ALIGNMENT
+        self.params = np.memmap(
+            self.path,
+            dtype=_DTYPE,
+            mode="r",
+            offset=data_offset,
+            shape=(n_cameras, PARAMS_WIDTH),
+        )
+        self._camera_params: list[Optional[CameraParams]] = [None] * n_cameras
+
+    @property
+    def n_cameras(self) -> int:
+        return self.params.shape[0]
+
+    @property
+    def camera_names(self) -> list[str]:
+        return self.metadata["camera_names"]
+
+    def __len__(self) -> int:
+        return self.n_cameras
+
+    def __getitem__(self, idx: int) -> CameraParams:
+        params = self._camera_params[idx]
+        if params is None:
+            params = self._camera_params[idx] = params_from_row(self.params[idx])
+        return params
+
+    def load_list(self) -> list[CameraParams]:
+        return [self[i] for i in range(self.n_cameras)]
+
+
+def load_calibration_store(path: str | Path) -> list[CameraParams]:
+    """Load all camera params of a store file"""
+    return CalibrationStore(path).load_list()
+
+
+def load_camera_params_from_source(source: str | Path) -> list[CameraParams]:
+    """Load camera params from any supported source: a store file, a folder of
+    hires_camX_params.mat files, a *dannce.mat file, or a JSON file (a list of camera
+    param dicts, or a calibration.json with a "camera_params" list)"""
+    source = Path(source)
+    if source.is_dir():
+        return CameraParams.load_list_from_hires_folder(source)
+    suffix = source.suffix.lower()
+    if suffix == ".mat":
+        return CameraParams.load_list_from_dannce_mat_file(source)
+    if suffix == ".json":
+        with open(source, "rt") as f:
+            obj = json.load(f)
+        if isinstance(obj, dict):
+            obj = obj["camera_params"]
+        return [CameraParams.load_from_dict(x) for x in obj]
+    return load_calibration_store(source)
+
+
+def convert_to_store(
+    source: str | Path, dest: str | Path, camera_names: list[str] = None
+):
+    """Convert an existing calibration (see load_camera_params_from_source) to a store
+    file"""
+    camera_params = load_camera_params_from_source(source)
+    if camera_names is None and Path(source).suffix.lower() == ".json":
+        with open(source, "rt") as f:
+            obj = json.load(f)
+        if isinstance(obj, dict):
+            camera_names = obj.get("camera_names")
+    metadata = {"source": str(Path(source).absolute())}
+    if Path(source).is_dir():
+        metadata["hires_files"] = hires_files_metadata(
+            Path(source).glob("hires_cam*params.mat")
+        )
+    write_calibration_store(
+        dest, camera_params, camera_names=camera_names, metadata=metadata
+    )
+
+
+def parse_and_convert():
+    parser = argparse.ArgumentParser(
+        description="Convert a calibration (hires folder, *dannce.mat or JSON) to a binary calibration store"
+    )
+    parser.add_argument(
+        "source",
+        help="Folder of hires_cam#_params.mat files, *dannce.mat file or calibration JSON file",
+    )
+    parser.add_argument(
+        "dest", help=f"Store file to write (conventionally {STORE_FILE_NAME})"
+    )
+    parser.add_argument(
+        "--camera-names",
+        nargs="+",
+        default=None,
+        help="Camera names, in camera order. Default is Camera1, Camera2, ...",
+    )
+    args = parser.parse_args()
+
+    init_logger(log_level=logging.INFO)
+    convert_to_store(args.source, args.dest, camera_names=args.camera_names)
+
+
+if __name__ == "__main__":
+    parse_and_convert()
@@ -0,0 +1,194 @@
+# chessboard corner detection helpers shared by the intrinsics/extrinsics methods
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from caldannce.detection_cache import CornerCache
+from caldannce.instrumentation import span
+from caldannce.video_utils import load_image_gray
+
+FAST_CHECK_MAX_WIDTH = 1000
+"""Images are downscaled (by pyramid levels) to at most this width for the fast pre-check"""
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+
+def default_n_threads() -> int:
+    """Default number of detection threads: one per available core"""
+    return os.cpu_count() or 1
+
+
+def detect_chessboard(
+    gray: np.ndarray, rows: int, cols: int, fast_check: bool = False
+) -> Optional[np.ndarray]:
+    """Find internal chessboard corners in a single grayscale image.
+
+    Returns the corner coordinates (shape: (rows * cols, 1, 2)) or None if the pattern
+    was not found.
+
+    If fast_check is True, first look for the board on a downscaled pyramid level with
+    CALIB_CB_FAST_CHECK so that frames without a board are rejected quickly. When the
+    board is found, the corners are scaled back up and refined at full resolution with
+    cornerSubPix instead of re-running the full detection.
+    """
+    with span("detect", fast_check=fast_check):
+        return _find_corners(gray, rows, cols, fast_check)
+
+
+def _find_corners(
+    gray: np.ndarray, rows: int, cols: int, fast_check: bool
+) -> Optional[np.ndarray]:
+    if not fast_check:
+        # 2nd param is Size: (Width, Height)
+        success, corner_coords = cv2.findChessboardCorners(gray, (cols, rows), None)
+        return corner_coords if success else None
+
+    small = gray
+    scale = 1
+    while small.shape[1] > FAST_CHECK_MAX_WIDTH:
+        small = cv2.pyrDown(small)
+        scale *= 2
+
+    flags = (
+        cv2.CALIB_CB_ADAPTIVE_THRESH
+        + cv2.CALIB_CB_NORMALIZE_IMAGE
+        + cv2.CALIB_CB_FAST_CHECK
+    )
+    success, corner_coords = cv2.findChessboardCorners(
+        small, (cols, rows), flags=flags
+    )
+    if not success:
+        return None
+
+    corner_coords = (corner_coords * scale).astype(np.float32)
+    # search window must cover the error from upscaling the low-resolution corners
+    half_win = max(5, 2 * scale)
+    corner_coords = cv2.cornerSubPix(
+        gray, corner_coords, (half_win, half_win), (-1, -1), SUBPIX_CRITERIA
+    )
+    return corner_coords
+
+
+def detect_chessboard_image(
+    gray: np.ndarray,
+    rows: int,
+    cols: int,
+    fast_check: bool = False,
+    cache: Optional[CornerCache] = None,
+) -> Optional[np.ndarray]:
+    """detect_chessboard on a decoded image (e.g. a video frame). If a cache is provided,
+    it is consulted (by pixel content) before detecting."""
+    if cache is None:
+        return detect_chessboard(gray, rows, cols, fast_check=fast_check)
+
+    with span("detection_cache_lookup"):
+        key = cache.make_key(cache.hash_image(gray), rows, cols, fast_check)
+        cached = cache.get(key)
+    if cached is not None:
+        corners, _image_size = cached
+        return corners
+
+    corners = detect_chessboard(gray, rows, cols, fast_check=fast_check)
+    cache.put(key, corners, gray.shape[::-1])
+    return corners
+
+
+def detect_chessboards(
+    images: Iterable[np.ndarray],
+    rows: int,
+    cols: int,
+    n_threads: Optional[int] = None,
+    fast_check: bool = False,
+    cache: Optional[CornerCache] = None,
+) -> Iterator[Optional[np.ndarray]]:
+    """Run detect_chessboard over a stream of grayscale images using a thread pool.
+
+    OpenCV releases the GIL while detecting, so detection scales with the number of
+    threads. Results are yielded in the same order as the input images (None where no
+    pattern was found). At most 2 * n_threads images are held in flight at once.
+    If a cache is provided, see detect_chessboard_image.
+    """
+    if n_threads is None:
+        n_threads = default_n_threads()
+
+    if n_threads <= 1:
+        for gray in images:
+            yield detect_chessboard_image(gray, rows, cols, fast_check, cache)
+        return
+
+    max_in_flight = 2 * n_threads
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        pending = deque()
+        for gray in images:
+            pending.append(
+                pool.submit(
+                    detect_chessboard_image, gray, rows, cols, fast_check, cache
+                )
+            )
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def detect_chessboard_file(
+    image_path: str,
+    rows: int,
+    cols: int,
+    fast_check: bool = False,
+    cache: Optional[CornerCache] = None,
+) -> tuple[Optional[np.ndarray], tuple[int, int]]:
+    """Load an image as grayscale and detect the chessboard in it.
+
+    Returns a tuple of (corners or None, image_size) where image_size is (width, height).
+    If a cache is provided, it is consulted (by file content) before decoding the image.
+    """
+    if cache is not None:
+        with span("detection_cache_lookup", path=str(image_path)):
+            key = cache.make_key(cache.hash_file(image_path), rows, cols, fast_check)
+            cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    gray = load_image_gray(image_path)
+    corners = detect_chessboard(gray, rows, cols, fast_check=fast_check)
+    image_size = gray.shape[::-1]
+
+    if cache is not None:
+        cache.put(key, corners, image_size)
+    return corners, image_size
+
+
+def detect_chessboard_files(
+    image_paths: list[str],
+    rows: int,
+    cols: int,
+    n_threads: Optional[int] = None,
+    fast_check: bool = False,
+    cache: Optional[CornerCache] = None,
+) -> Iterator[tuple[Optional[np.ndarray], tuple[int, int]]]:
+    """Load and detect chessboards in a list of image files using a thread pool.
+
+    Each thread decodes its image straight to grayscale and detects on it, so disk reads
+    overlap with detection and at most 2 * n_threads images are in memory at once.
+    Yields (corners or None, image_size) in the same order as image_paths.
+    """
+    if n_threads is None:
+        n_threads = default_n_threads()
+
+    with ThreadPoolExecutor(max_workers=max(n_threads, 1)) as pool:
+        pending = deque()
+        for image_path in image_paths:
+            pending.append(
+                pool.submit(
+                    detect_chessboard_file, image_path, rows, cols, fast_check, cache
+                )
+            )
+            if len(pending) >= 2 * n_threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,14 +1,10 @@
 import logging
 from typing import TYPE_CHECKING
 
-import cv2
-import numpy as np
-
 from caldannce.calibrate_stateful import CustomCalibrationData
-from caldannce.math_utils import calculate_rpe, triangulate_all
 from caldannce.methods.extrinsics_chessboard import ExtrinsicsChessboard
-from caldannce.project_utils import get_verification_files
-from caldannce.video_utils import load_image_or_video
+from caldannce.project_utils import get_validation_sequences
+from caldannce.validation import ChessboardValidationResult, validate_chessboard
 
 if TYPE_CHECKING:
     from caldannce.gui import CalibrationWindow
@@ -41,10 +37,12 @@ class ValidationManager:
     #     static_axes: list
     #     """List of matplotlib axes for each of the n cameras"""
     calibration_data: CustomCalibrationData
+    result: ChessboardValidationResult | None
 
     def __init__(self, calibration_data: CalibrationData):
         self.calibration_data = calibration_data
         self.avg_rpe = None
+        self.result = None
 
 
 def setup_chessboard_validation_window(
@@ -103,15 +101,11 @@ def do_validation_samethread(
 
     camera_names = calibration_data.camera_names
     camera_params = calibration_data.camera_params
-    n_cameras = len(camera_names)
-
-    media_paths = get_verification_files(validate_dir, camera_names, ret_dict=True)
-    validation_imgs = {n: load_image_or_video(media_paths[n]) for n in camera_names}
 
-    logging.info(f"Loaded {len(validation_imgs)} images")
+    media_paths = get_validation_sequences(validate_dir, camera_names)
 
     calibrator = calibration_data.calibrator
-    if type(calibrator.get_extrinsics_method()) != ExtrinsicsChessboard:
+    if not isinstance(calibrator.get_extrinsics_method(), ExtrinsicsChessboard):
         raise Exception(
             "Can only run chessboard validation if extrinsics method was ExtrinsicsChessboard"
         )
@@ -120,40 +114,7 @@ def do_validation_samethread(
     cols = calibrator._extrinsics_method.cols
     logging.info("Using (rows, cols) for validaiton: ({},{})".format(rows, cols))
 
-    n_points = rows * cols
-    all_ipts = np.zeros([n_cameras, n_points, 2])
-    all_view_mtx = np.zeros([n_cameras, 3, 4])
-
-    # detect all image points
-
-    for idx in range(n_cameras):
-        n = camera_names[idx]
-        img = validation_imgs[n]
-        pth = media_paths[n]
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        success, imgs_pts = cv2.findChessboardCorners(gray, (cols, rows), None)
-        if success is False:
-            raise Exception(f"Chessboard corners not found in validation img: {pth}")
-
-        all_ipts[idx, :, :] = imgs_pts.squeeze()[:, :]
-        view_mtx = camera_params[idx].make_projection_matrix()
-        all_view_mtx[idx, :, :] = view_mtx
+    result = validate_chessboard(camera_params, camera_names, media_paths, rows, cols)
+    validation_manager.result = result
 
-    cam_rpes = np.zeros([n_cameras])
-    # triangulate using all points for each camera
-    for idx in range(n_cameras):
-        n = camera_names[idx]
-        img = validation_imgs[n].copy()
-
-        cam_wps = triangulate_all(all_ipts, all_view_mtx)
-
-        cam_ipts = all_ipts[idx, :, :]
-        cam_reproj_ipts = camera_params[idx].project_multiple_world_points(cam_wps)
-
-        cam_rpes[idx] = calculate_rpe(cam_ipts, cam_reproj_ipts)
-
-    rpe_string = (
-        f"RPE per camera (px): {', '.join(map(lambda x: f'{x:.3f}', cam_rpes))}"
-    )
-    results_label.setText(rpe_string)
+    results_label.setText(result.make_summary())
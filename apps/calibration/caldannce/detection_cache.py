@@ -0,0 +1,145 @@
+# on-disk cache of chessboard detections, keyed by image content
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get(
+        "CALDANNCE_CACHE_DIR", Path.home().joinpath(".cache", "caldannce", "corners")
+    )
+)
+"""Default cache location. Override with the CALDANNCE_CACHE_DIR environment variable"""
+
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class CornerCache:
+    """Content-addressed cache of chessboard corner detections.
+
+    Each entry is keyed by a hash of the image content plus the detection settings
+    (rows, cols, fast check) and stores the detected corners, or a "no pattern" verdict,
+    along with the image size. Entries are stored as small .npz files. prune() bounds the
+    cache to max_bytes on disk, evicting least recently used entries first (a hit
+    refreshes the entry's mtime); calibration runs call it once, when they finish.
+
+    Safe to share between threads and processes - entries are written atomically.
+    """
+
+    cache_dir: Path
+    max_bytes: int
+
+    def __init__(
+        self, cache_dir: str | Path = None, max_bytes: int = DEFAULT_MAX_CACHE_BYTES
+    ) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(content_hash: str, rows: int, cols: int, fast_check: bool) -> str:
+        settings = f"{content_hash}:{rows}x{cols}:fast_check={int(fast_check)}"
+        return hashlib.blake2b(settings.encode(), digest_size=20).hexdigest()
+
+    @staticmethod
+    def hash_file(path: str | Path) -> str:
+        """Hash the raw bytes of a file (e.g. an encoded image)"""
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK_SIZE):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def hash_image(img: np.ndarray) -> str:
+        """Hash the pixel data of a decoded image (e.g. a video frame)"""
+        h = hashlib.blake2b(digest_size=20)
+        h.update(str(img.shape).encode())
+        h.update(np.ascontiguousarray(img).data)
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(key[:2], f"{key}.npz")
+
+    def get(self, key: str) -> Optional[tuple[Optional[np.ndarray], tuple[int, int]]]:
+        """Look up a cached detection.
+
+        Returns None on a cache miss, otherwise a tuple of (corners, image_size) where
+        corners is None if no pattern was detected and image_size is (width, height)"""
+        entry_path = self._entry_path(key)
+        try:
+            with np.load(entry_path) as entry:
+                found = bool(entry["found"])
+                corners = entry["corners"] if found else None
+                image_size = tuple(int(x) for x in entry["image_size"])
+            # refresh access time for LRU eviction
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable corner cache entry {entry_path}: {e}")
+            return None
+        return corners, image_size
+
+    def put(
+        self, key: str, corners: Optional[np.ndarray], image_size: tuple[int, int]
+    ):
+        """Store a detection result (corners=None for a "no pattern" verdict)"""
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        found = corners is not None
+        if not found:
+            corners = np.zeros((0, 1, 2), dtype=np.float32)
+        # write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=entry_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    found=np.array(found),
+                    corners=corners,
+                    image_size=np.array(image_size),
+                )
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def prune(self):
+        """Evict least recently used entries until the cache is under max_bytes"""
+        if not self.cache_dir.is_dir():
+            return
+        entries = []
+        total_bytes = 0
+        for entry_path in self.cache_dir.glob("*/*.npz"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        entries.sort()
+        n_evicted = 0
+        for _mtime, size, entry_path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_bytes -= size
+            n_evicted += 1
+        logging.debug(f"Evicted {n_evicted} entries from corner cache")
+
+    def clear(self):
+        """Delete all cache entries"""
+        if self.cache_dir.is_dir():
+            shutil.rmtree(self.cache_dir)
+        logging.info(f"Cleared corner detection cache at {self.cache_dir}")
@@ -0,0 +1,245 @@
+# index of a calibration folder tree, shared by the project path helpers
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+DEFAULT_INDEX_DEPTH = 2
+"""Index depth used by the project path helpers (e.g. $extrinsics_dir/Camera1/0.mp4)"""
+
+DEFAULT_INDEX_CACHE_DIR = Path(
+    os.environ.get(
+        "CALDANNCE_INDEX_CACHE_DIR",
+        Path.home().joinpath(".cache", "caldannce", "directory_index"),
+    )
+)
+"""Default location of persisted indexes. Override with the CALDANNCE_INDEX_CACHE_DIR
+environment variable"""
+
+_INDEX_FORMAT_VERSION = 1
+
+
+class DirectoryIndex:
+    """Snapshot of the directories and files under a root folder, up to max_depth levels
+    deep, built with a single os.scandir pass.
+
+    Hidden entries (names starting with ".") are skipped, like glob does. Each listed
+    directory's mtime is recorded: adding, removing or renaming an entry changes the mtime
+    of its parent directory, so the index is stale as soon as any recorded mtime differs.
+    """
+
+    root: str
+    max_depth: int
+    listings: dict[tuple[str, ...], tuple[list[str], list[str]]]
+    """Relative directory parts -> (sorted subdirectory names, sorted file names) for
+    every directory less than max_depth levels below the root"""
+    dir_mtimes: dict[tuple[str, ...], int]
+    """Relative directory parts -> st_mtime_ns when the directory was listed"""
+
+    def __init__(self, root: str, max_depth: int, listings, dir_mtimes) -> None:
+        self.root = root
+        self.max_depth = max_depth
+        self.listings = listings
+        self.dir_mtimes = dir_mtimes
+
+    @classmethod
+    def build(cls, root: str, max_depth: int = DEFAULT_INDEX_DEPTH) -> "DirectoryIndex":
+        root = os.path.normpath(root)
+        start = time.perf_counter()
+        listings = {}
+        dir_mtimes = {}
+        pending = [()]
+        while pending:
+            rel_dir = pending.pop()
+            path = os.path.join(root, *rel_dir)
+            try:
+                dir_mtimes[rel_dir] = os.stat(path).st_mtime_ns
+                dirs, files = [], []
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        # (follows symlinks, like glob)
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+            except (FileNotFoundError, NotADirectoryError, PermissionError) as e:
+                logging.debug(f"Skipping unreadable directory {path}: {e}")
+                continue
+            dirs.sort()
+            files.sort()
+            listings[rel_dir] = (dirs, files)
+            # children at depth len(rel_dir) + 1 are listed only if within max_depth
+            if len(rel_dir) + 1 < max_depth:
+                pending.extend(rel_dir + (d,) for d in dirs)
+
+        end = time.perf_counter()
+        n_files = sum(len(files) for _dirs, files in listings.values())
+        logging.debug(
+            f"Indexed {len(listings)} directories, {n_files} files under {root} in {(end-start)*1000:.2f} ms"
+        )
+        return cls(root, max_depth, listings, dir_mtimes)
+
+    def is_stale(self) -> bool:
+        """True if any listed directory was modified (or removed) since indexing"""
+        for rel_dir, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(os.path.join(self.root, *rel_dir)).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def subindex(self, rel_dir: tuple[str, ...]) -> Optional["DirectoryIndex"]:
+        """Index of a subdirectory, sliced from this index (None if not listed)"""
+        if rel_dir not in self.listings:
+            return None
+        n = len(rel_dir)
+        listings = {
+            k[n:]: v for k, v in self.listings.items() if k[:n] == rel_dir
+        }
+        dir_mtimes = {
+            k[n:]: v for k, v in self.dir_mtimes.items() if k[:n] == rel_dir
+        }
+        return DirectoryIndex(
+            os.path.join(self.root, *rel_dir), self.max_depth - n, listings, dir_mtimes
+        )
+
+    def iter_dirs(self, depth: int) -> Iterator[tuple[tuple[str, ...], str]]:
+        """Yield (relative parts, full path) of the directories exactly depth levels
+        below the root, in sorted order"""
+        for rel_dir in sorted(k for k in self.listings if len(k) == depth - 1):
+            for name in self.listings[rel_dir][0]:
+                parts = rel_dir + (name,)
+                yield parts, os.path.join(self.root, *parts)
+
+    def iter_files(self, depth: int) -> Iterator[tuple[tuple[str, ...], str]]:
+        """Yield (relative parts, full path) of the files exactly depth levels below the
+        root (e.g. depth=2: $root/Camera1/0.mp4), in sorted order"""
+        for rel_dir in sorted(k for k in self.listings if len(k) == depth - 1):
+            for name in self.listings[rel_dir][1]:
+                parts = rel_dir + (name,)
+                yield parts, os.path.join(self.root, *parts)
+
+    def as_dict(self) -> dict:
+        return {
+            "version": _INDEX_FORMAT_VERSION,
+            "root": self.root,
+            "max_depth": self.max_depth,
+            "listings": [
+                [list(k), dirs, files] for k, (dirs, files) in self.listings.items()
+            ],
+            "dir_mtimes": [[list(k), v] for k, v in self.dir_mtimes.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DirectoryIndex":
+        if d.get("version") != _INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported directory index version: {d.get('version')}")
+        return cls(
+            d["root"],
+            d["max_depth"],
+            {tuple(k): (dirs, files) for k, dirs, files in d["listings"]},
+            {tuple(k): v for k, v in d["dir_mtimes"]},
+        )
+
+
+_indexes: dict[tuple[str, int], DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+_persist_dir: Optional[Path] = None
+
+
+def set_index_cache_dir(cache_dir: Optional[str | Path] = DEFAULT_INDEX_CACHE_DIR):
+    """Persist indexes to cache_dir (DEFAULT_INDEX_CACHE_DIR if not given), so later
+    runs skip the crawl while the folders are unchanged. Pass None to disable
+    persistence again. Indexes are only kept in memory until this is called"""
+    global _persist_dir
+    _persist_dir = Path(cache_dir) if cache_dir else None
+
+
+def clear_index_cache():
+    """Forget all in-memory indexes (persisted indexes are revalidated when loaded)"""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def _persisted_path(root: str, max_depth: int) -> Path:
+    key = hashlib.blake2b(f"{root}:{max_depth}".encode(), digest_size=16).hexdigest()
+    return _persist_dir.joinpath(f"{key}.json")
+
+
+def _load_persisted(root: str, max_depth: int) -> Optional[DirectoryIndex]:
+    path = _persisted_path(root, max_depth)
+    try:
+        with open(path, "rt") as f:
+            index = DirectoryIndex.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable directory index {path}: {e}")
+        return None
+    if index.root != root or index.max_depth != max_depth or index.is_stale():
+        return None
+    return index
+
+
+def _save_persisted(index: DirectoryIndex):
+    path = _persisted_path(index.root, index.max_depth)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temp file and rename so readers never see a partial index
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wt") as f:
+            json.dump(index.as_dict(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Unable to save directory index to {path}: {e}")
+
+
+def _from_ancestor(root: str, max_depth: int) -> Optional[DirectoryIndex]:
+    """Slice the index of root from an in-memory index of one of its ancestors"""
+    for (ancestor_root, ancestor_depth), index in _indexes.items():
+        try:
+            rel = os.path.relpath(root, ancestor_root)
+        except ValueError:  # different drives (Windows)
+            continue
+        if rel == "." or rel.startswith(os.pardir):
+            continue
+        rel_dir = tuple(rel.split(os.sep))
+        if ancestor_depth - len(rel_dir) >= max_depth:
+            return index.subindex(rel_dir)
+    return None
+
+
+def get_directory_index(
+    root: str, max_depth: int = DEFAULT_INDEX_DEPTH
+) -> DirectoryIndex:
+    """Return an up-to-date index of root, reusing (in order) an in-memory index of root
+    or of an ancestor, a persisted index (if enabled with set_index_cache_dir), or else
+    crawling the folder."""
+    root = os.path.normpath(root)
+    key = (root, max_depth)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _from_ancestor(root, max_depth)
+    if index is not None and not index.is_stale():
+        return index
+
+    index = None
+    if _persist_dir is not None:
+        index = _load_persisted(root, max_depth)
+    if index is None:
+        index = DirectoryIndex.build(root, max_depth)
+        if _persist_dir is not None:
+            _save_persisted(index)
+
+    with _indexes_lock:
+        _indexes[key] = index
+    return index
@@ -1,16 +1,31 @@
+import argparse
 import logging
 import time
 
 
 from caldannce.calibrate_stateful import Calibrator
+from caldannce.calibration_session import CalibrationSession
+from caldannce.detection_cache import DEFAULT_CACHE_DIR, CornerCache
+from caldannce.instrumentation import TRACE_FORMATS
+from caldannce.logger import init_logger
 from caldannce.methods.extrinsics_chessboard import ExtrinsicsChessboard
+from caldannce.methods.extrinsics_chessboard_video import (
+    DEFAULT_MAX_DETECTIONS,
+    ExtrinsicsChessboardVideo,
+)
 from caldannce.methods.intrinsics_chessboard import IntrinsicsChessboard
+from caldannce.methods.intrinsics_chessboard_video import IntrinsicsChessboardVideo
+from caldannce.methods.intrinsics_chessboard_warm_start import (
+    IntrinsicsChessboardWarmStart,
+)
 from caldannce.methods.intrinsics_hires_file import IntrinsicsHiresFile
+from caldannce.view_selection import DEFAULT_MAX_VIEWS
 from caldannce.project_utils import (
     get_camera_names,
     get_extrinsics_media_paths,
     get_hires_files,
     get_intrinsics_image_paths,
+    get_intrinsics_video_paths,
 )
 
 
@@ -23,8 +38,58 @@ def do_calibrate_stateful(
     square_size_mm: float,
     on_progress=None,
     override_intrinsics_dir=None,
+    workers: int = 1,
+    detection_threads: int = None,
+    fast_check: bool = False,
+    detection_cache: CornerCache = None,
+    max_views: int = DEFAULT_MAX_VIEWS,
+    intrinsics_video_frame_step: int = None,
+    bundle_adjust: bool = False,
+    bundle_adjust_intrinsics: bool = False,
+    extrinsics_video_frame_step: int = None,
+    trace_path: str = None,
+    trace_format: str = "chrome",
+    session_dir: str = None,
+    warm_start_intrinsics_dir: str = None,
+    prune_detection_cache: bool = True,
 ) -> None:
+    """Run the stateful calibration pipeline.
+
+    If intrinsics_video_frame_step is set, intrinsics are computed from one video per
+    camera in intrinsics_dir (sampling every Nth frame) instead of from still images.
+
+    If bundle_adjust is set, the camera poses (and the intrinsics too if
+    bundle_adjust_intrinsics is set) are refined after the per-camera calibration over
+    the frames of the moved board seen by several cameras (before/after metrics are
+    added to the report). This requires extrinsics_video_frame_step (synchronized
+    extrinsics videos, in which the board is moved after its static segment); the whole
+    extrinsics videos are then decoded, to reach the moving segment.
+
+    If extrinsics_video_frame_step is set, extrinsics are solved over every Nth frame of
+    the extrinsics videos (with outlier rejection) instead of from the first frame only.
+
+    If trace_path is set, the timing/memory spans of all stages are saved to that file
+    (trace_format: "chrome" or "json", see caldannce.instrumentation).
+
+    If session_dir is set, detections and per-camera results are persisted there as they
+    complete, and a rerun with the same session_dir only recomputes the cameras whose
+    inputs changed or which failed (see caldannce.calibration_session). The session's
+    detection cache replaces detection_cache.
+
+    If warm_start_intrinsics_dir is set (a folder with hires_camX_params.mat files of a
+    previous calibration of the same cameras), intrinsics are refined from the previous
+    parameters on a subset of the intrinsics images, falling back to a full solve for
+    cameras which changed beyond the tolerances (see IntrinsicsChessboardWarmStart).
+
+    The detection cache is pruned (see CornerCache.prune) once calibration finished,
+    unless prune_detection_cache is False (e.g. when the caller runs several calibrations
+    sharing the cache and prunes it once at the end)."""
     start = time.perf_counter()
+
+    session = None
+    if session_dir:
+        session = CalibrationSession(session_dir)
+        detection_cache = session.detection_cache
     # TODO: improve this, but an empty string for intrinsics_dir is not None
 
     camera_names = get_camera_names(extrinsics_dir)
@@ -34,10 +99,25 @@ def do_calibrate_stateful(
         extrinsics_dir, camera_names, ret_dict=True
     )
 
+    def make_extrinsics_method():
+        if extrinsics_video_frame_step:
+            return ExtrinsicsChessboardVideo(
+                rows,
+                cols,
+                square_size_mm,
+                frame_step=extrinsics_video_frame_step,
+                # the moved board frames follow the static segment
+                max_detections=None if bundle_adjust else DEFAULT_MAX_DETECTIONS,
+                n_threads=detection_threads,
+                fast_check=fast_check,
+                cache=detection_cache,
+            )
+        return ExtrinsicsChessboard(rows, cols, square_size_mm, cache=detection_cache)
+
     if override_intrinsics_dir:
         cal = Calibrator[IntrinsicsHiresFile, ExtrinsicsChessboard]()
         int_method = IntrinsicsHiresFile()
-        ext_method = ExtrinsicsChessboard(rows, cols, square_size_mm)
+        ext_method = make_extrinsics_method()
 
         cal.set_intrinsics_method(int_method)
         cal.set_extrinsics_method(ext_method)
@@ -55,10 +135,81 @@ def do_calibrate_stateful(
                 ),
             )
 
+    elif intrinsics_video_frame_step:
+        cal = Calibrator[IntrinsicsChessboardVideo, ExtrinsicsChessboard]()
+        int_method = IntrinsicsChessboardVideo(
+            rows,
+            cols,
+            square_size_mm,
+            frame_step=intrinsics_video_frame_step,
+            n_threads=detection_threads,
+            fast_check=fast_check,
+            cache=detection_cache,
+            max_views=max_views,
+        )
+        ext_method = make_extrinsics_method()
+        cal.set_intrinsics_method(int_method=int_method)
+        cal.set_extrinsics_method(ext_method=ext_method)
+
+        intrinsics_video_paths = get_intrinsics_video_paths(
+            intrinsics_dir, camera_names, ret_dict=True
+        )
+
+        for cam_name in camera_names:
+            cal.add_camera(
+                camera_name=cam_name,
+                intrinsics_camdata=IntrinsicsChessboardVideo.Camdata(
+                    intrinsics_video_path=intrinsics_video_paths[cam_name]
+                ),
+                extrinsics_camdata=ExtrinsicsChessboard.Camdata(
+                    extrinsics_path=extrinsics_paths[cam_name]
+                ),
+            )
+
+    elif warm_start_intrinsics_dir:
+        cal = Calibrator[IntrinsicsChessboardWarmStart, ExtrinsicsChessboard]()
+        int_method = IntrinsicsChessboardWarmStart(
+            rows,
+            cols,
+            square_size_mm,
+            n_threads=detection_threads,
+            fast_check=fast_check,
+            cache=detection_cache,
+            max_views=max_views,
+        )
+        ext_method = make_extrinsics_method()
+        cal.set_intrinsics_method(int_method=int_method)
+        cal.set_extrinsics_method(ext_method=ext_method)
+
+        intrinsics_paths = get_intrinsics_image_paths(
+            intrinsics_dir, camera_names, ret_dict=True
+        )
+        hires_files = get_hires_files(warm_start_intrinsics_dir, n_cameras)
+
+        for idx, cam_name in enumerate(camera_names):
+            cal.add_camera(
+                camera_name=cam_name,
+                intrinsics_camdata=IntrinsicsChessboardWarmStart.Camdata(
+                    intrinsics_paths=intrinsics_paths[cam_name],
+                    hires_file_path=hires_files[idx],
+                ),
+                extrinsics_camdata=ExtrinsicsChessboard.Camdata(
+                    extrinsics_path=extrinsics_paths[cam_name]
+                ),
+            )
+
     else:
         cal = Calibrator[IntrinsicsChessboard, ExtrinsicsChessboard]()
-        int_method = IntrinsicsChessboard(rows, cols, square_size_mm)
-        ext_method = ExtrinsicsChessboard(rows, cols, square_size_mm)
+        int_method = IntrinsicsChessboard(
+            rows,
+            cols,
+            square_size_mm,
+            n_threads=detection_threads,
+            fast_check=fast_check,
+            cache=detection_cache,
+            max_views=max_views,
+        )
+        ext_method = make_extrinsics_method()
         cal.set_intrinsics_method(int_method=int_method)
         cal.set_extrinsics_method(ext_method=ext_method)
 
@@ -79,10 +230,17 @@ def do_calibrate_stateful(
 
     if on_progress:
         cal.set_progress_handler(on_progress)
+    cal.set_session(session)
 
     cal.init_report(camera_names)
-    cal.calibrate()
+    cal.calibrate(
+        workers=workers,
+        bundle_adjust=bundle_adjust,
+        bundle_adjust_intrinsics=bundle_adjust_intrinsics,
+    )
     cal.export_to_folder(output_dir)
+    if detection_cache is not None and prune_detection_cache:
+        detection_cache.prune()
 
     ellapsed_seconds = time.perf_counter() - start
     cal.report.calibration_time_seconds = ellapsed_seconds
@@ -90,9 +248,179 @@ def do_calibrate_stateful(
     min = int(ellapsed_seconds // 60)
     logging.info(f"Finished calibration in {min:02d}:{sec:02d} (mm:ss)")
 
+    if trace_path:
+        cal.tracer.export(trace_path, trace_format=trace_format)
+
     results = cal.get_results()
     results.output_dir = output_dir
     results.report_summary = cal.report.make_summary()
     results.calibrator = cal
 
     return results
+
+
+def parse_and_calibrate_stateful():
+    parser = argparse.ArgumentParser(
+        description="Calibrate intrinsics and extrinsics of all cameras (stateful pipeline)"
+    )
+    parser.add_argument(
+        "--intrinsics-dir",
+        "-i",
+        required=True,
+        help="Intrinsics directory: one folder of chessboard images (or one video) per camera.",
+    )
+    parser.add_argument(
+        "--extrinsics-dir",
+        "-e",
+        required=True,
+        help="Extrinsics directory: one image or video per camera.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        required=True,
+        help="Output directory to create hires_cam#_params.mat files.",
+    )
+    parser.add_argument(
+        "--rows",
+        "-r",
+        type=int,
+        required=True,
+        help="# of internal verticies in a row of the chessboard pattern (note this is 1- #of square per row). E.g. 6",
+    )
+    parser.add_argument(
+        "--cols",
+        "-c",
+        type=int,
+        required=True,
+        help="# of internal verticies in a column of the chessboard pattern (note this is 1- #of square per column). E.g. 9",
+    )
+    parser.add_argument(
+        "--square-size-mm",
+        "-s",
+        type=float,
+        required=True,
+        help="Length of a single chessboard pattern square in mm (e.g. 23)",
+    )
+    parser.add_argument(
+        "--existing-intrinsics-dir",
+        default=None,
+        help="If provided, use the intrinsics of the hires_cam#_params.mat files in this directory instead of calibrating them.",
+    )
+    parser.add_argument(
+        "--warm-start-intrinsics-dir",
+        default=None,
+        help="If provided, refine the intrinsics of a previous calibration (hires_cam#_params.mat files in this directory) on a subset of the intrinsics images.",
+    )
+    parser.add_argument(
+        "--intrinsics-video-frame-step",
+        type=int,
+        default=None,
+        help="If provided, compute intrinsics from one video per camera in the intrinsics directory, sampling every Nth frame.",
+    )
+    parser.add_argument(
+        "--extrinsics-video-frame-step",
+        type=int,
+        default=None,
+        help="If provided, solve extrinsics over every Nth frame of the extrinsics videos (with outlier rejection) instead of the first frame only.",
+    )
+    parser.add_argument(
+        "--bundle-adjust",
+        default=False,
+        action="store_true",
+        help="Refine all camera poses over the extrinsics frames seen by several cameras. Requires --extrinsics-video-frame-step.",
+    )
+    parser.add_argument(
+        "--bundle-adjust-intrinsics",
+        default=False,
+        action="store_true",
+        help="With --bundle-adjust, refine the intrinsics as well.",
+    )
+    parser.add_argument(
+        "--session-dir",
+        default=None,
+        help="If provided, save detections and per-camera results to this directory, and only recompute the cameras whose inputs changed (or which failed) when rerun.",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of cameras to calibrate concurrently (one process per camera). Default is 1 (serial).",
+    )
+    parser.add_argument(
+        "--detection-threads",
+        type=int,
+        default=None,
+        help="Number of threads used for chessboard corner detection per camera. Default is one per CPU core.",
+    )
+    parser.add_argument(
+        "--fast-check",
+        default=False,
+        action="store_true",
+        help="Reject images without a chessboard using a quick check on a downscaled image, then refine detected corners at full resolution.",
+    )
+    parser.add_argument(
+        "--max-views",
+        type=int,
+        default=DEFAULT_MAX_VIEWS,
+        help=f"Max. no. of detected intrinsics views per camera used to solve for intrinsics. Default: {DEFAULT_MAX_VIEWS}",
+    )
+    parser.add_argument(
+        "--no-detection-cache",
+        default=False,
+        action="store_true",
+        help="Don't use (or update) the on-disk cache of chessboard detections from previous runs.",
+    )
+    parser.add_argument(
+        "--detection-cache-dir",
+        default=None,
+        help=f"Directory for the chessboard detection cache. Default: {DEFAULT_CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="If provided, save timing and peak memory spans of every calibration stage (per camera) to this file.",
+    )
+    parser.add_argument(
+        "--trace-format",
+        default="chrome",
+        choices=TRACE_FORMATS,
+        help="Format of the --trace file (see caldannce.instrumentation). Default: chrome",
+    )
+    parser.add_argument("--verbose", "-v", action="store_true", default=False)
+    args = parser.parse_args()
+
+    init_logger(log_level=logging.DEBUG if args.verbose else logging.INFO)
+
+    detection_cache = None
+    if not args.no_detection_cache:
+        detection_cache = CornerCache(cache_dir=args.detection_cache_dir)
+
+    results = do_calibrate_stateful(
+        intrinsics_dir=args.intrinsics_dir,
+        extrinsics_dir=args.extrinsics_dir,
+        output_dir=args.output_dir,
+        rows=args.rows,
+        cols=args.cols,
+        square_size_mm=args.square_size_mm,
+        override_intrinsics_dir=args.existing_intrinsics_dir,
+        workers=args.workers,
+        detection_threads=args.detection_threads,
+        fast_check=args.fast_check,
+        detection_cache=detection_cache,
+        max_views=args.max_views,
+        intrinsics_video_frame_step=args.intrinsics_video_frame_step,
+        bundle_adjust=args.bundle_adjust,
+        bundle_adjust_intrinsics=args.bundle_adjust_intrinsics,
+        extrinsics_video_frame_step=args.extrinsics_video_frame_step,
+        trace_path=args.trace,
+        trace_format=args.trace_format,
+        session_dir=args.session_dir,
+        warm_start_intrinsics_dir=args.warm_start_intrinsics_dir,
+    )
+    print(results.report_summary)
+
+
+if __name__ == "__main__":
+    parse_and_calibrate_stateful()
@@ -0,0 +1,319 @@
+"""Check whether an existing calibration still matches a rig, without recalibrating.
+
+One synchronized chessboard frame per camera is taken from an extrinsics folder (same
+layout as for calibration: $extrinsics_dir/Camera1/0.mp4, ...). For each camera, the
+board pose is solved with the stored intrinsics (solvePnP) and compared with the stored
+extrinsics; all cameras' detections are then triangulated with the stored parameters to
+compute the cross-camera reprojection error (RPE).
+
+The pose deltas are only meaningful if the board is placed where it was for the
+calibration (it defines the world frame). The triangulation RPE doesn't depend on the
+board position.
+
+Usage (headless; exit code 1 if a threshold is exceeded or a board is not detected):
+```
+python -m caldannce.drift_check -k ./calibration_export -e ./extrinsics -r 6 -c 9 -s 23
+```
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from caldannce.calibration_data import CameraParams
+from caldannce.chessboard_detection import default_n_threads, detect_chessboard
+from caldannce.instrumentation import span
+from caldannce.logger import init_logger
+from caldannce.math_utils import calculate_rpe, get_chessboard_coordinates
+from caldannce.project_utils import get_camera_names, get_extrinsics_media_paths
+from caldannce.validation import triangulation_rpes
+from caldannce.video_utils import ImageFormat, load_image_or_video
+
+DEFAULT_MAX_ROTATION_DEG = 0.5
+DEFAULT_MAX_TRANSLATION_MM = 5.0
+DEFAULT_MAX_RPE_PX = 2.0
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class DriftThresholds:
+    max_rotation_deg: float = DEFAULT_MAX_ROTATION_DEG
+    """Max. rotation between the stored and the solved camera orientation"""
+    max_translation_mm: float = DEFAULT_MAX_TRANSLATION_MM
+    """Max. distance between the stored and the solved camera center"""
+    max_rpe_px: float = DEFAULT_MAX_RPE_PX
+    """Max. mean triangulation RPE of a camera"""
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class DriftCheckResult:
+    """Per camera pose deltas and triangulation RPEs (NaN where the board was not
+    detected, or for the RPE, detected by fewer than 2 cameras)"""
+
+    camera_names: list[str]
+    rotation_deltas_deg: np.ndarray
+    translation_deltas_mm: np.ndarray
+    pnp_rpes: np.ndarray
+    """RPE (px) of the board pose solved for each camera alone"""
+    triangulation_rpes: np.ndarray
+    """RPE (px) of the board corners triangulated from all cameras (stored params)"""
+    time_seconds: float
+
+    def failures(self, thresholds: DriftThresholds) -> list[str]:
+        """Description of each failed check (empty if the calibration is still valid)"""
+        failures = []
+        for cam_idx, camera_name in enumerate(self.camera_names):
+            rotation = self.rotation_deltas_deg[cam_idx]
+            translation = self.translation_deltas_mm[cam_idx]
+            rpe = self.triangulation_rpes[cam_idx]
+            if np.isnan(rotation):
+                failures.append(f"{camera_name}: chessboard not detected")
+                continue
+            if rotation > thresholds.max_rotation_deg:
+                failures.append(
+                    f"{camera_name}: rotated by {rotation:.3f} deg (max {thresholds.max_rotation_deg})"
+                )
+            if translation > thresholds.max_translation_mm:
+                failures.append(
+                    f"{camera_name}: moved by {translation:.2f} mm (max {thresholds.max_translation_mm})"
+                )
+            if np.isnan(rpe):
+                failures.append(f"{camera_name}: not enough cameras to triangulate")
+            elif rpe > thresholds.max_rpe_px:
+                failures.append(
+                    f"{camera_name}: triangulation RPE {rpe:.3f} px (max {thresholds.max_rpe_px})"
+                )
+        return failures
+
+    def as_dict(self, thresholds: DriftThresholds = None):
+        def to_list(x):
+            return np.where(np.isnan(x), None, x).tolist()
+
+        d = {
+            "camera_names": self.camera_names,
+            "rotation_deltas_deg": to_list(self.rotation_deltas_deg),
+            "translation_deltas_mm": to_list(self.translation_deltas_mm),
+            "pnp_rpes": to_list(self.pnp_rpes),
+            "triangulation_rpes": to_list(self.triangulation_rpes),
+            "time_seconds": self.time_seconds,
+        }
+        if thresholds is not None:
+            d["failures"] = self.failures(thresholds)
+        return d
+
+    def make_summary(self) -> str:
+        def fmt(x, precision):
+            return "N/A" if np.isnan(x) else f"{x:.{precision}f}"
+
+        def fmt_all(values, precision):
+            return ", ".join(fmt(x, precision) for x in values)
+
+        summary_string = f"Checked {len(self.camera_names)} cameras in {self.time_seconds:.2f} seconds\n"
+        summary_string += f"Rotation delta per camera (deg): {fmt_all(self.rotation_deltas_deg, 3)}\n"
+        summary_string += f"Translation delta per camera (mm): {fmt_all(self.translation_deltas_mm, 2)}\n"
+        summary_string += f"Single camera RPE per camera (px): {fmt_all(self.pnp_rpes, 3)}\n"
+        summary_string += f"Triangulation RPE per camera (px): {fmt_all(self.triangulation_rpes, 3)}\n"
+        return summary_string
+
+
+def pose_delta(
+    params: CameraParams, rotation_matrix: np.ndarray, translation_vector: np.ndarray
+) -> tuple[float, float]:
+    """Rotation angle (deg) and camera center distance (mm) between stored params and a
+    solved pose (world -> camera)"""
+    r_delta = rotation_matrix @ params.rotation_matrix.T
+    cos_angle = np.clip((np.trace(r_delta) - 1) / 2, -1.0, 1.0)
+    rotation_deg = float(np.degrees(np.arccos(cos_angle)))
+    center_stored = -params.rotation_matrix.T @ params.translation_vector
+    center_solved = -rotation_matrix.T @ translation_vector.reshape(3, 1)
+    translation_mm = float(np.linalg.norm(center_solved - center_stored))
+    return rotation_deg, translation_mm
+
+
+def detect_first_frame(media_path: str, rows: int, cols: int):
+    """Detect the chessboard in the first frame of an image or video"""
+    img = load_image_or_video(media_path, output_image_format=ImageFormat.CV2_BGR)
+    with span("color_conversion"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return detect_chessboard(gray, rows, cols)
+
+
+def check_drift(
+    camera_params: list[CameraParams],
+    camera_names: list[str],
+    media_paths: dict[str, str],
+    rows: int,
+    cols: int,
+    square_size_mm: float,
+    n_threads: int = None,
+) -> DriftCheckResult:
+    """Compare stored params with the board poses of one synchronized frame per camera.
+
+    media_paths maps each camera name to its extrinsics image or video (see
+    get_extrinsics_media_paths with ret_dict=True). camera_params must be in the same
+    order as camera_names. Frames are loaded and detected concurrently."""
+    start = time.perf_counter()
+    n_cameras = len(camera_names)
+    n_points = rows * cols
+    object_points = get_chessboard_coordinates(rows, cols, square_size_mm)
+
+    with ThreadPoolExecutor(max_workers=n_threads or default_n_threads()) as pool:
+        detections = list(
+            pool.map(
+                lambda name: detect_first_frame(media_paths[name], rows, cols),
+                camera_names,
+            )
+        )
+
+    rotation_deltas = np.full(n_cameras, np.nan)
+    translation_deltas = np.full(n_cameras, np.nan)
+    pnp_rpes = np.full(n_cameras, np.nan)
+    raw_ipts = np.full((n_cameras, 1, n_points, 2), np.nan)
+    for cam_idx, (camera_name, corners) in enumerate(zip(camera_names, detections)):
+        if corners is None:
+            logging.warning(f"Chessboard not detected (camera {camera_name})")
+            continue
+        p = camera_params[cam_idx]
+        raw_ipts[cam_idx, 0] = corners.reshape(-1, 2)
+        with span("solve_pnp", camera=camera_name):
+            _success, r_vec, t_vec = cv2.solvePnP(
+                objectPoints=object_points,
+                imagePoints=corners,
+                cameraMatrix=p.camera_matrix,
+                distCoeffs=p.dist,
+            )
+        rotation_matrix, _jacobian = cv2.Rodrigues(r_vec)
+        rotation_deltas[cam_idx], translation_deltas[cam_idx] = pose_delta(
+            p, rotation_matrix, t_vec
+        )
+        re_ipts, _jacobian = cv2.projectPoints(
+            object_points, r_vec, t_vec, p.camera_matrix, p.dist
+        )
+        pnp_rpes[cam_idx] = calculate_rpe(corners.squeeze(), re_ipts.squeeze())
+
+    rpes, _world_points = triangulation_rpes(camera_params, raw_ipts)
+
+    end = time.perf_counter()
+    logging.info(f"Checked {n_cameras} cameras in {(end-start)*1000:.2f} ms")
+
+    return DriftCheckResult(
+        camera_names=list(camera_names),
+        rotation_deltas_deg=rotation_deltas,
+        translation_deltas_mm=translation_deltas,
+        pnp_rpes=pnp_rpes,
+        triangulation_rpes=rpes[:, 0],
+        time_seconds=end - start,
+    )
+
+
+def parse_and_check_drift():
+    parser = argparse.ArgumentParser(
+        description="Check whether an existing calibration still matches the rig (exit code 1 if not)"
+    )
+    parser.add_argument(
+        "--calibration-dir",
+        "-k",
+        required=True,
+        help="Directory containing the hires_cam#_params.mat files to check",
+    )
+    parser.add_argument(
+        "--extrinsics-dir",
+        "-e",
+        required=True,
+        help="Directory with one subfolder per camera, containing a synchronized chessboard image or video (e.g. Camera1/0.mp4)",
+    )
+    parser.add_argument(
+        "--rows",
+        "-r",
+        type=int,
+        required=True,
+        help="# of internal verticies in a row of the chessboard pattern. E.g. 6",
+    )
+    parser.add_argument(
+        "--cols",
+        "-c",
+        type=int,
+        required=True,
+        help="# of internal verticies in a column of the chessboard pattern. E.g. 9",
+    )
+    parser.add_argument(
+        "--square-size",
+        "-s",
+        type=float,
+        required=True,
+        help="Chessboard square size in mm. E.g. 23",
+    )
+    parser.add_argument(
+        "--max-rotation-deg",
+        type=float,
+        default=DEFAULT_MAX_ROTATION_DEG,
+        help=f"Max. camera rotation (deg). Default is {DEFAULT_MAX_ROTATION_DEG}.",
+    )
+    parser.add_argument(
+        "--max-translation-mm",
+        type=float,
+        default=DEFAULT_MAX_TRANSLATION_MM,
+        help=f"Max. camera displacement (mm). Default is {DEFAULT_MAX_TRANSLATION_MM}.",
+    )
+    parser.add_argument(
+        "--max-rpe-px",
+        type=float,
+        default=DEFAULT_MAX_RPE_PX,
+        help=f"Max. triangulation RPE per camera (px). Default is {DEFAULT_MAX_RPE_PX}.",
+    )
+    parser.add_argument(
+        "--output-json",
+        "-o",
+        default=None,
+        help="If provided, write per-camera results and failed checks to this JSON file.",
+    )
+    parser.add_argument("--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    init_logger(log_level=logging.DEBUG if args.verbose else logging.INFO)
+
+    camera_params = CameraParams.load_list_from_hires_folder(args.calibration_dir)
+    camera_names = get_camera_names(args.extrinsics_dir)
+    if len(camera_names) != len(camera_params):
+        raise Exception(
+            f"Found {len(camera_names)} camera folders in extrinsics dir, but {len(camera_params)} calibration files"
+        )
+    media_paths = get_extrinsics_media_paths(
+        args.extrinsics_dir, camera_names, ret_dict=True
+    )
+    thresholds = DriftThresholds(
+        max_rotation_deg=args.max_rotation_deg,
+        max_translation_mm=args.max_translation_mm,
+        max_rpe_px=args.max_rpe_px,
+    )
+
+    result = check_drift(
+        camera_params,
+        camera_names,
+        media_paths,
+        args.rows,
+        args.cols,
+        args.square_size,
+    )
+    print(result.make_summary())
+
+    if args.output_json:
+        with open(args.output_json, "wt") as f:
+            json.dump(result.as_dict(thresholds), f, indent=2)
+        logging.info(f"Saved drift check results to {args.output_json}")
+
+    failures = result.failures(thresholds)
+    if failures:
+        print("Calibration drift detected:\n" + "\n".join(failures))
+        sys.exit(1)
+    print("Calibration is still valid")
+
+
+if __name__ == "__main__":
+    parse_and_check_drift()
@@ -6,6 +6,7 @@ import cv2
 import numpy as np
 from scipy.io import loadmat
 
+from caldannce.instrumentation import span
 from caldannce.intrinsics import IntrinsicsParams
 from caldannce.video_utils import load_image_or_video, ImageFormat
 
@@ -32,7 +33,12 @@ class ExtrinsicsParams:
     def load_from_mat_file(path) -> "ExtrinsicsParams":
         """Load extrinsics from a single hires_camX_params.mat file
         If cvt_from_label3d_format is true: transpose the rotation matrix"""
-        mat_file = loadmat(path)
+        return ExtrinsicsParams.from_mat_dict(loadmat(path))
+
+    @staticmethod
+    def from_mat_dict(mat_file: dict) -> "ExtrinsicsParams":
+        """Convert the contents of a loaded hires_camX_params.mat file (see
+        load_from_mat_file)"""
         r = mat_file["r"]
         t = mat_file["t"].reshape(3, 1)  # make sure it's a column vector
         
@@ -59,8 +65,10 @@ def calibrate_extrinsics(
     ## undistorting not necessary for solvePnP
 
     # find corner positions
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    success, corner_coords = cv2.findChessboardCorners(gray, (cols, rows), None)
+    with span("color_conversion"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with span("detect"):
+        success, corner_coords = cv2.findChessboardCorners(gray, (cols, rows), None)
     if success is False:
         raise Exception(
             f"Chessboard corners not found - unable to calibrate extrinsics (camera {camera_idx})"
@@ -68,12 +76,13 @@ def calibrate_extrinsics(
 
     # solve for camera position using solvePnp instead of camera calibration function
     # ransac version fo solvePNP makes it more stable with possible outlier points
-    success, r_vec, t_vec = cv2.solvePnP(
-        objectPoints=object_points,
-        imagePoints=corner_coords,
-        cameraMatrix=intrinsics.camera_matrix,
-        distCoeffs=intrinsics.dist,
-    )
+    with span("solve_pnp"):
+        success, r_vec, t_vec = cv2.solvePnP(
+            objectPoints=object_points,
+            imagePoints=corner_coords,
+            cameraMatrix=intrinsics.camera_matrix,
+            distCoeffs=intrinsics.dist,
+        )
 
     rotation_matrix, _jacobian = cv2.Rodrigues(r_vec)
 
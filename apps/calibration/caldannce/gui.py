@@ -13,6 +13,7 @@ from PySide6.QtGui import QFont
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtWidgets import (
     QApplication,
+    QCheckBox,
     QGroupBox,
     QDoubleSpinBox,
     QFileDialog,
@@ -30,6 +31,8 @@ from PySide6.QtWidgets import (
 
 from caldannce.calibrate_stateful import CustomCalibrationData
 from caldannce.chessboard_validate_page import setup_chessboard_validation_window
+from caldannce.detection_cache import CornerCache
+from caldannce.directory_index import set_index_cache_dir
 from caldannce.point_validate_page import setup_point_validation_window
 
 # from calibration.calibrate import CalibrationData
@@ -132,6 +135,9 @@ class CalibrationWindow(QMainWindow):
             "intrinsicsHiresBrowse"
         )
         self.intrinsics_hires_edit: QLineEdit = self.findByName("intrinsicsHiresEdit")
+        self.resume_session_checkbox: QCheckBox = self.findByName(
+            "resumeSessionCheckBox"
+        )
 
         # TODO: DEBUG ITEM REMOVE
         self.skip_calibration_button: QPushButton = self.findByName(
@@ -148,6 +154,7 @@ class CalibrationWindow(QMainWindow):
         self.chessboard_validation_button: QPushButton = self.findByName(
             "chessboardValidationButton"
         )
+        self.save_trace_button: QPushButton = self.findByName("saveTraceButton")
         self.point_validation_back_button: QPushButton = self.findByName(
             "pointValidationBackButton"
         )
@@ -172,6 +179,7 @@ class CalibrationWindow(QMainWindow):
         self.mappings.append(
             ("override_intrinsics_dir", str, self.intrinsics_hires_edit)
         )
+        self.mappings.append(("resume_session", bool, self.resume_session_checkbox))
 
     def setInitialState(self):
         self.root_widget_stacked.setCurrentIndex(GuiPage.CALIBRATE.value)
@@ -221,6 +229,7 @@ class CalibrationWindow(QMainWindow):
             self.handleBrowseDirPartial(self.intrinsics_hires_edit, "Hires Folder")
         )
 
+        self.save_trace_button.clicked.connect(self.handleSaveTrace)
         self.point_validation_button.clicked.connect(self.handleGoToPointValidatePage)
         self.chessboard_validation_button.clicked.connect(
             self.handleGoToChessboardValidatePage
@@ -268,6 +277,28 @@ class CalibrationWindow(QMainWindow):
     def handleGoToChessboardValidatePage(self):
         self.switchStackToChessboardValidatePage()
 
+    @Slot(None)
+    def handleSaveTrace(self):
+        calibrator = getattr(self.calibration_data, "calibrator", None)
+        if calibrator is None:
+            logging.warning("No calibration trace to save")
+            return
+        chrome_filter = "Chrome trace (*.json)"
+        json_filter = "JSON spans (*.json)"
+        filepath, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Save Timing Trace",
+            str(Path(self.calibration_data.output_dir or Path.home()) / "trace.json"),
+            f"{chrome_filter};;{json_filter}",
+        )
+        if filepath is None or filepath == "":
+            return
+        trace_format = "json" if selected_filter == json_filter else "chrome"
+        try:
+            calibrator.tracer.export(filepath, trace_format=trace_format)
+        except Exception as e:
+            logging.error(f"Unable to save trace to {filepath}. Error= {e}")
+
     @Slot(None)
     def handleSkipCalibration(self):
         self.switchStackToCalibrationFinishedPage()
@@ -284,6 +315,7 @@ class CalibrationWindow(QMainWindow):
         output_dir = self.output_dir_edit.text()
         override_intrinsics_dir = self.intrinsics_hires_edit.text()
         override_intrinsics_enabled = self.intrinsics_hires_toggle.isChecked()
+        resume_session = self.resume_session_checkbox.isChecked()
 
         method_options = {}
 
@@ -301,10 +333,19 @@ class CalibrationWindow(QMainWindow):
 
         settings.setValue("override_intrinsics_dir", override_intrinsics_dir)
         settings.setValue("override_intrinsics_enabled", override_intrinsics_enabled)
+        settings.setValue("resume_session", resume_session)
 
         if not override_intrinsics_enabled:
             override_intrinsics_dir = None
 
+        if resume_session:
+            # resume from previous runs with the same output folder: only cameras
+            # whose images changed (or which failed) are recalibrated
+            method_options["session_dir"] = str(Path(output_dir, "calibration_session"))
+        else:
+            # reuse chessboard detections from previous runs on the same images
+            method_options["detection_cache"] = CornerCache()
+
         self.progress_bar.setVisible(True)
         self.calibrateInThread(
             intrinsics_dir=intrinsics_dir,
@@ -393,6 +434,9 @@ def start_gui():
     init_logger(log_level=logging.DEBUG if args.verbose else logging.INFO)
 
     logging.info("Running as GUI")
+    # remember folder listings between runs (revalidated by folder mtimes), so
+    # reopening the GUI on a large project doesn't crawl it again
+    set_index_cache_dir()
     global loader
     loader = QUiLoader()
     app = QApplication([])
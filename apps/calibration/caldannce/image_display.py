@@ -0,0 +1,199 @@
+# helpers for displaying (large, undistorted) camera images in the GUI
+import hashlib
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from caldannce.calibration_data import CameraParams
+
+DISPLAY_MAX_WIDTH = 1024
+"""The coarsest display pyramid level is at most this wide (pixels)"""
+
+TILE_MARGIN = 0.25
+"""Full-resolution tiles cover the visible region plus this fraction on each side, so
+small pans don't require a new tile"""
+
+
+def camera_params_fingerprint(camera_params: CameraParams) -> str:
+    """Hash of the parameters which affect undistortion (intrinsics and distortion)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(camera_params.camera_matrix, dtype=np.float64).data)
+    h.update(np.ascontiguousarray(camera_params.dist, dtype=np.float64).data)
+    return h.hexdigest()
+
+
+class UndistortMapCache:
+    """Per-camera cache of undistortion maps.
+
+    The maps are computed once per camera with cv2.initUndistortRectifyMap and applied
+    with cv2.remap, which is much cheaper than cv2.undistort (which rebuilds the maps on
+    every call). Each entry is keyed by a fingerprint of the camera's intrinsics and the
+    image size, so it is recomputed automatically when the calibration data changes.
+    """
+
+    _maps: dict[int, tuple[str, tuple[int, int], np.ndarray, np.ndarray]]
+
+    def __init__(self) -> None:
+        self._maps = {}
+
+    def get_maps(
+        self, camera_idx: int, camera_params: CameraParams, image_size: tuple[int, int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (map1, map2) pair for a camera. image_size is (width, height)"""
+        fingerprint = camera_params_fingerprint(camera_params)
+        entry = self._maps.get(camera_idx)
+        if entry is not None and entry[0] == fingerprint and entry[1] == image_size:
+            return entry[2], entry[3]
+
+        start = time.perf_counter()
+        map1, map2 = cv2.initUndistortRectifyMap(
+            camera_params.camera_matrix,
+            camera_params.dist,
+            None,
+            camera_params.camera_matrix,
+            image_size,
+            # fixed-point maps are smaller and remap faster than float maps
+            cv2.CV_16SC2,
+        )
+        self._maps[camera_idx] = (fingerprint, image_size, map1, map2)
+        end = time.perf_counter()
+        logging.debug(
+            f"Computed undistortion maps in {(end-start)*1000:.2f} ms (camera idx: {camera_idx})"
+        )
+        return map1, map2
+
+    def undistort(
+        self, img: np.ndarray, camera_idx: int, camera_params: CameraParams
+    ) -> np.ndarray:
+        """Undistort an image (equivalent to cv2.undistort with the camera's params)"""
+        image_size = (img.shape[1], img.shape[0])
+        map1, map2 = self.get_maps(camera_idx, camera_params, image_size)
+        return cv2.remap(img, map1, map2, interpolation=cv2.INTER_LINEAR)
+
+    def clear(self):
+        self._maps.clear()
+
+
+class DisplayPyramid:
+    """Image pyramid for display: level 0 is the full resolution image, each further
+    level is half the size of the previous one, down to at most max_width pixels wide.
+
+    Tiles are always described in full-resolution pixel coordinates (as a matplotlib
+    extent), so points picked on any level are in full-resolution image coordinates.
+    """
+
+    levels: list[np.ndarray]
+
+    def __init__(self, img: np.ndarray, max_width: int = DISPLAY_MAX_WIDTH) -> None:
+        self.levels = [img]
+        while self.levels[-1].shape[1] > max_width:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+
+    @property
+    def width(self) -> int:
+        return self.levels[0].shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.levels[0].shape[0]
+
+    @property
+    def full_extent(self) -> tuple[float, float, float, float]:
+        """matplotlib extent (left, right, bottom, top) of the whole image"""
+        return (-0.5, self.width - 0.5, self.height - 0.5, -0.5)
+
+    def coarsest(self) -> np.ndarray:
+        return self.levels[-1]
+
+    def level_for(
+        self, visible_size: tuple[float, float], display_size: tuple[float, float]
+    ) -> int:
+        """Coarsest level which still has at least one image pixel per screen pixel, for
+        a visible region of visible_size (full-res) pixels shown in display_size screen
+        pixels (both (width, height)). With a fixed aspect ratio, the image is fitted to
+        the limiting dimension."""
+        if min(display_size) <= 0:
+            return len(self.levels) - 1
+        ratio = max(
+            visible_size[0] / display_size[0], visible_size[1] / display_size[1], 1.0
+        )
+        level = int(np.floor(np.log2(ratio)))
+        return min(level, len(self.levels) - 1)
+
+    def tile(
+        self, level: int, x_range: tuple[float, float], y_range: tuple[float, float]
+    ) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+        """Crop the given level to a (full-res) region plus a margin.
+
+        Returns the tile and its matplotlib extent in full-resolution coordinates."""
+        img = self.levels[level]
+        scale = 2**level
+        x0, x1 = sorted(x_range)
+        y0, y1 = sorted(y_range)
+        margin_x = (x1 - x0) * TILE_MARGIN
+        margin_y = (y1 - y0) * TILE_MARGIN
+
+        # full-res pixel bounds -> this level's pixel bounds
+        h, w = img.shape[0:2]
+        c0 = int(np.clip(np.floor((x0 - margin_x + 0.5) / scale), 0, w - 1))
+        c1 = int(np.clip(np.ceil((x1 + margin_x + 0.5) / scale), c0 + 1, w))
+        r0 = int(np.clip(np.floor((y0 - margin_y + 0.5) / scale), 0, h - 1))
+        r1 = int(np.clip(np.ceil((y1 + margin_y + 0.5) / scale), r0 + 1, h))
+
+        extent = (c0 * scale - 0.5, c1 * scale - 0.5, r1 * scale - 0.5, r0 * scale - 0.5)
+        return img[r0:r1, c0:c1], extent
+
+
+class PyramidImageView:
+    """Show a DisplayPyramid on a matplotlib axes. Initially the coarsest level is shown;
+    when the view limits change (zoom/pan), a tile of the level matching the on-screen
+    resolution is swapped in."""
+
+    def __init__(self, axes, pyramid: DisplayPyramid) -> None:
+        self.axes = axes
+        self.pyramid = pyramid
+        self.level = len(pyramid.levels) - 1
+        self.extent = pyramid.full_extent
+        self.artist = axes.imshow(pyramid.coarsest(), extent=self.extent)
+        axes.set_xlim(self.extent[0], self.extent[1])
+        axes.set_ylim(self.extent[2], self.extent[3])
+        axes.set_autoscale_on(False)
+
+        axes.callbacks.connect("xlim_changed", self._on_view_changed)
+        axes.callbacks.connect("ylim_changed", self._on_view_changed)
+
+    def _on_view_changed(self, _axes=None):
+        x_range = self.axes.get_xlim()
+        y_range = self.axes.get_ylim()
+        visible_size = (abs(x_range[1] - x_range[0]), abs(y_range[1] - y_range[0]))
+        # screen area available to the axes (before the aspect ratio is applied)
+        figure_bbox = self.axes.figure.bbox
+        position = self.axes.get_position(original=True)
+        display_size = (
+            figure_bbox.width * position.width,
+            figure_bbox.height * position.height,
+        )
+        level = self.pyramid.level_for(visible_size, display_size)
+
+        left, right, bottom, top = self.extent
+        covered = (
+            min(x_range) >= left
+            and max(x_range) <= right
+            and min(y_range) >= top
+            and max(y_range) <= bottom
+        )
+        if level == self.level and covered:
+            return
+
+        if level == len(self.pyramid.levels) - 1:
+            tile, extent = self.pyramid.coarsest(), self.pyramid.full_extent
+        else:
+            tile, extent = self.pyramid.tile(level, x_range, y_range)
+
+        self.level = level
+        self.extent = extent
+        self.artist.set_data(tile)
+        self.artist.set_extent(extent)
+        self.axes.figure.canvas.draw_idle()
@@ -0,0 +1,253 @@
+"""Structured timing/memory instrumentation for the calibration pipeline.
+
+Pipeline stages record spans (image load, color conversion, detection, calibrateCamera,
+solvePnP, RPE, export, ...) on the active Tracer. Each span records its wall time, the
+camera being calibrated, the thread it ran on and the peak memory of the process when it
+ended. Spans are exported as plain JSON or in the Chrome trace event format (open it in
+chrome://tracing or https://ui.perfetto.dev).
+
+Code which may be traced calls the module-level span() helper, which is a no-op when no
+tracer is active:
+```
+with span("solve_pnp"):
+    cv2.solvePnP(...)
+```
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+TRACE_FORMATS = ("json", "chrome")
+"""Supported export formats: plain JSON spans (with a per-stage summary), Chrome trace"""
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far in MB (None if unavailable)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+    if sys.platform == "darwin":
+        return max_rss / 1024**2
+    return max_rss / 1024
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Span:
+    """A timed stage of the pipeline"""
+
+    name: str
+    camera: Optional[str]
+    """Name of the camera being calibrated when the span started (None: not per camera)"""
+    start_us: float
+    """Wall-clock start time in microseconds since the unix epoch (comparable between
+    worker processes)"""
+    duration_us: float
+    pid: int
+    tid: int
+    thread_name: str
+    peak_rss_mb: Optional[float]
+    """Peak memory of the process (MB) when the span ended"""
+    args: dict = field(default_factory=dict)
+
+
+class Tracer:
+    """Collects spans from all threads of a process.
+
+    The current camera is process-wide (not per thread), so spans recorded on detection
+    and decoding threads are attributed to the camera being calibrated."""
+
+    spans: list[Span]
+    camera: Optional[str]
+    """Camera being calibrated (set with camera_scope)"""
+
+    def __init__(self) -> None:
+        self.spans = []
+        self.camera = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, camera: str = None, **args):
+        """Time the body of the with-block as a span. args are stored with the span"""
+        if camera is None:
+            camera = self.camera
+        start_us = time.time() * 1e6
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_us = (time.perf_counter() - start) * 1e6
+            thread = threading.current_thread()
+            s = Span(
+                name=name,
+                camera=camera,
+                start_us=start_us,
+                duration_us=duration_us,
+                pid=os.getpid(),
+                tid=thread.ident,
+                thread_name=thread.name,
+                peak_rss_mb=peak_rss_mb(),
+                args=args,
+            )
+            with self._lock:
+                self.spans.append(s)
+
+    @contextmanager
+    def camera_scope(self, camera: str):
+        """Attribute spans recorded in the with-block to a camera"""
+        previous = self.camera
+        self.camera = camera
+        try:
+            yield
+        finally:
+            self.camera = previous
+
+    def extend(self, spans: Iterable[Span]):
+        """Add spans recorded by another tracer (e.g. in a worker process)"""
+        with self._lock:
+            self.spans.extend(spans)
+
+    def summary(self) -> list[dict]:
+        """Total time, count and peak memory per (camera, span name), in order of first
+        occurrence"""
+        rows = {}
+        for s in self.spans:
+            key = (s.camera, s.name)
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    "camera": s.camera,
+                    "name": s.name,
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "peak_rss_mb": None,
+                }
+            seconds = s.duration_us / 1e6
+            row["count"] += 1
+            row["total_seconds"] += seconds
+            row["max_seconds"] = max(row["max_seconds"], seconds)
+            if s.peak_rss_mb is not None:
+                row["peak_rss_mb"] = max(row["peak_rss_mb"] or 0.0, s.peak_rss_mb)
+        return list(rows.values())
+
+    def stage_seconds(self, names: Iterable[str]) -> dict[str, float]:
+        """Total time of the spans with each of the given names (summed over cameras).
+        Names without spans are left out"""
+        totals = {}
+        for s in self.spans:
+            if s.name in names:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration_us / 1e6
+        return {name: totals[name] for name in names if name in totals}
+
+    def as_dict(self) -> dict:
+        return {
+            "spans": [asdict(s) for s in self.spans],
+            "summary": self.summary(),
+        }
+
+    def as_chrome_trace(self) -> dict:
+        """Spans as Chrome trace "complete" events, plus a peak memory counter per
+        process"""
+        events = []
+        thread_names = {}
+        for s in sorted(self.spans, key=lambda s: s.start_us):
+            thread_names[(s.pid, s.tid)] = s.thread_name
+            args = dict(s.args)
+            if s.camera is not None:
+                args["camera"] = s.camera
+            if s.peak_rss_mb is not None:
+                args["peak_rss_mb"] = round(s.peak_rss_mb, 1)
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.camera or "calibration",
+                    "ph": "X",
+                    "ts": s.start_us,
+                    "dur": s.duration_us,
+                    "pid": s.pid,
+                    "tid": s.tid,
+                    "args": args,
+                }
+            )
+            if s.peak_rss_mb is not None:
+                events.append(
+                    {
+                        "name": "peak_rss_mb",
+                        "ph": "C",
+                        "ts": s.start_us + s.duration_us,
+                        "pid": s.pid,
+                        "args": {"peak_rss_mb": round(s.peak_rss_mb, 1)},
+                    }
+                )
+        for (pid, tid), thread_name in thread_names.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str, trace_format: str = "chrome"):
+        """Write the spans to a file, in one of TRACE_FORMATS"""
+        if trace_format == "json":
+            data = self.as_dict()
+        elif trace_format == "chrome":
+            data = self.as_chrome_trace()
+        else:
+            raise ValueError(
+                f"Unknown trace format: {trace_format}. Must be one of {TRACE_FORMATS}"
+            )
+        with open(path, "wt") as f:
+            # args may hold non-JSON values (e.g. paths); store them as strings
+            json.dump(data, f, default=str)
+        logging.info(f"Saved {len(self.spans)} trace spans ({trace_format}) to {path}")
+
+
+_active_tracer: Optional[Tracer] = None
+
+
+def get_active_tracer() -> Optional[Tracer]:
+    return _active_tracer
+
+
+@contextmanager
+def active_tracer(tracer: Optional[Tracer]):
+    """Make tracer the target of span() in the with-block (for all threads)"""
+    global _active_tracer
+    previous = _active_tracer
+    _active_tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _active_tracer = previous
+
+
+def span(name: str, **args):
+    """Record a span on the active tracer (no-op if tracing is not active)"""
+    if _active_tracer is None:
+        return nullcontext()
+    return _active_tracer.span(name, **args)
+
+
+def camera_scope(camera: str):
+    """Attribute spans to a camera on the active tracer (no-op if tracing is not active)"""
+    if _active_tracer is None:
+        return nullcontext()
+    return _active_tracer.camera_scope(camera)
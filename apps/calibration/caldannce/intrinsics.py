@@ -12,7 +12,10 @@ import numpy as np
 from matplotlib import pyplot as plt
 from scipy.io import loadmat
 
-from caldannce.video_utils import load_images
+from caldannce.chessboard_detection import detect_chessboard_files
+from caldannce.detection_cache import CornerCache
+from caldannce.instrumentation import span
+from caldannce.view_selection import DEFAULT_MAX_VIEWS, select_views
 
 from .math_utils import calculate_rpe
 
@@ -46,7 +49,12 @@ class IntrinsicsParams:
         """
         convert from matlab intrinsics matrix to cv2: adjust upper left px from (1,1) to (0,0) and transpose camera_matrix
         """
-        mat_file = loadmat(path)
+        return IntrinsicsParams.from_mat_dict(loadmat(path))
+
+    @staticmethod
+    def from_mat_dict(mat_file: dict) -> "IntrinsicsParams":
+        """Convert the contents of a loaded hires_camX_params.mat file (see
+        load_from_mat_file)"""
         r_distort = np.array(mat_file["RDistort"]).squeeze()
         t_distort = np.array(mat_file["TDistort"]).squeeze()
         dist = np.array([r_distort[0], r_distort[1], t_distort[0], t_distort[1]])
@@ -140,16 +148,16 @@ def calibrate_intrinsics(
     image_height: int,  # image height in px
     camera_idx: int = None,  # optionally provide the camera idx (only useful for logging/debugging)
     plot_rpe=False,
+    n_threads: int = None,  # no. of corner detection threads (None: one per core)
+    fast_check: bool = False,  # reject frames without a chessboard on a downscaled image first
+    cache: CornerCache = None,  # optional cache of corner detections from previous runs
+    max_views: int = DEFAULT_MAX_VIEWS,  # max. no. of views passed to calibrateCamera
 ) -> IntrinsicsParams:
     """Primary method to calibrate camera intrinsics given a set of images paths and metadata
 
     Returns an IntrinsicsParams object for a single camera"""
     n_images = len(image_paths)
 
-    raw_images = load_images(
-        image_paths=image_paths, image_width=image_width, image_height=image_height
-    )
-
     objpoints = []
     imgpoints = []
     failed_imgs = []
@@ -161,19 +169,24 @@ def calibrate_intrinsics(
 
     report = get_calibration_report()
 
-    for img_idx in range(n_images):
-        this_img = raw_images[img_idx, :, :, :].copy()
-        gray = cv2.cvtColor(this_img, cv2.COLOR_BGR2GRAY)
-
-        # Find the chess board corners
-        # 2nd param is Size: (Width, Height)
-        success, corner_coords = cv2.findChessboardCorners(gray, (cols, rows), None)
+    # images are streamed from disk as grayscale instead of preloaded into memory
+    detections = detect_chessboard_files(
+        image_paths,
+        rows,
+        cols,
+        n_threads=n_threads,
+        fast_check=fast_check,
+        cache=cache,
+    )
+    for img_idx, (corner_coords, image_size) in enumerate(detections):
+        success = corner_coords is not None
 
         if success is True:
             imgpoints.append(corner_coords)
             objpoints.append(object_points)
 
             if DEBUG_SHOW_DETECTED_CHESSBOARD is True:
+                this_img = cv2.imread(image_paths[img_idx])
                 cv2.drawChessboardCorners(this_img, (cols, rows), corner_coords, True)
         else:
             report.add_no_pattern_detected(
@@ -193,18 +206,25 @@ def calibrate_intrinsics(
         f"Found all corners in {(end-start)*1000:.2f} ms [{n_images - len(failed_imgs)}/{n_images} images]"
     )
 
+    # bound the cost of calibrateCamera by only keeping a pose-diverse subset of views
+    selection = select_views(imgpoints, rows, cols, image_size, max_views=max_views)
+    imgpoints = [imgpoints[i] for i in selection.selected_idxs]
+    objpoints = [objpoints[i] for i in selection.selected_idxs]
+    report.intrinsics_view_coverage.append(selection.as_dict())
+
     start = time.perf_counter()
 
     # note: we ignore r_vecs & t_vecs because we don't care about location of calibration target in each frame
-    reproject_err, camera_matrix, raw_dist, r_vecs, t_vecs = cv2.calibrateCamera(
-        objpoints,
-        imgpoints,
-        gray.shape[::-1],
-        None,
-        None,
-        # NOTE: CALIB_USE_LU speeds up calibration significantly on Windows Comptuers
-        flags=cv2.CALIB_FIX_K3 | cv2.CALIB_USE_LU,
-    )
+    with span("calibrate_camera", n_views=len(imgpoints)):
+        reproject_err, camera_matrix, raw_dist, r_vecs, t_vecs = cv2.calibrateCamera(
+            objpoints,
+            imgpoints,
+            image_size,
+            None,
+            None,
+            # NOTE: CALIB_USE_LU speeds up calibration significantly on Windows Comptuers
+            flags=cv2.CALIB_FIX_K3 | cv2.CALIB_USE_LU,
+        )
     end = time.perf_counter()
     logging.info(f"Intrinsics calculation took in {(end-start)*1000:.2f} ms")
 
@@ -23,10 +23,10 @@ def triangulate(
     # imgpoints: list of either np.ndarray((2,1)) or np.ndarray((2,));
     #     of length n
     # view_matrices: 3x4 camera projection matrices for each view
-    logging.info(
+    logging.debug(
         f"imgpoints len: {len(imgpoints)}; imgpoints[0] shape: {imgpoints[0].shape}"
     )
-    logging.info(
+    logging.debug(
         f"view_matrices len {len(view_matrices)}; view_matrices[0] shape: {view_matrices[0].shape}"
     )
 
@@ -57,40 +57,102 @@ def triangulate(
     return X
 
 
-def triangulate_all(imgpoints_all: np.ndarray, view_matrices: np.ndarray) -> np.ndarray:
-    """Triangulate M points in 3D using N cameras/views.
+def triangulate_batch(
+    imgpoints_all: np.ndarray,
+    view_matrices: np.ndarray,
+    visibility: np.ndarray = None,
+    weights: np.ndarray = None,
+    chunk_size: int = 100_000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Triangulate M points in 3D using N cameras/views with a batched (vectorized) DLT.
 
     `imgpoints_all` must have shape: (N, M, 2)
     `view_matrices` must have shape: (N, 3, 4)
+    `visibility` (optional) is a boolean array of shape (N, M); views where a point is
+        not visible are ignored for that point.
+    `weights` (optional) is an array of shape (N, M) of per-view confidences. Each view's
+        rows of the DLT system are scaled by its weight.
 
+    All (M, 2N, 4) DLT systems are built with broadcasting and solved together with a
+    single batched SVD (in chunks of chunk_size points to bound memory).
 
-    Returns an array of worldpoints in the shape: (M, 3)
+    Returns a tuple of:
+    - worldpoints: shape (M, 3). NaN for points visible in fewer than 2 views.
+    - residuals: shape (M,). Mean reprojection error (px) over the visible views.
     """
+    imgpoints_all = np.asarray(imgpoints_all, dtype=np.float64)
+    view_matrices = np.asarray(view_matrices, dtype=np.float64)
     assert (
         imgpoints_all.shape[0] == view_matrices.shape[0]
     ), "imgpoints_all and view_matrices must have same # of views (same first dimension size)"
-    n_cameras = imgpoints_all.shape[0]
+    assert view_matrices.shape[1:] == (3, 4), "view_matrices must contain 3x4 elements"
+    n_views, m_points, _ = imgpoints_all.shape
+
+    if visibility is None:
+        visibility = np.ones((n_views, m_points), dtype=bool)
+    visibility = visibility & np.all(np.isfinite(imgpoints_all), axis=2)
+    if weights is None:
+        weights = np.ones((n_views, m_points), dtype=np.float64)
+    weights = np.where(visibility, weights, 0.0)
+
+    worldpoints = np.full((m_points, 3), np.nan)
+    residuals = np.full(m_points, np.nan)
+
+    for start in range(0, m_points, chunk_size):
+        sl = slice(start, start + chunk_size)
+        # (M, N, 2) image points, (M, N) weights & visibility for this chunk
+        u = imgpoints_all[:, sl, :].transpose(1, 0, 2)
+        w = weights[:, sl].T
+        vis = visibility[:, sl].T
+
+        # rows per view: x * P[2] - P[0] and y * P[2] - P[1] -> (M, N, 2, 4)
+        P = view_matrices[None, :, :, :]
+        A = np.nan_to_num(u)[:, :, :, None] * P[:, :, 2:3, :] - P[:, :, 0:2, :]
+        A *= w[:, :, None, None]
+        A = A.reshape(A.shape[0], 2 * n_views, 4)
+
+        _U, _S, Vh = np.linalg.svd(A, full_matrices=False)
+        X_homog = Vh[:, -1, :]  # final row of Vh: value for x where Ax is closest to 0
+
+        # reproject into every view: (M, N, 3)
+        proj = np.einsum("nij,mj->mni", view_matrices, X_homog)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            X = X_homog[:, :3] / X_homog[:, 3:4]
+            reproj = proj[:, :, 0:2] / proj[:, :, 2:3]
+            errors = np.linalg.norm(reproj - u, axis=2)
+            n_visible = vis.sum(axis=1)
+            mean_errors = np.where(vis, errors, 0.0).sum(axis=1) / n_visible
+
+        # need at least 2 views to triangulate
+        underdetermined = n_visible < 2
+        X[underdetermined] = np.nan
+        mean_errors[underdetermined] = np.nan
+        worldpoints[sl] = X
+        residuals[sl] = mean_errors
+
+    return worldpoints, residuals
 
-    m_points = imgpoints_all.shape[1]
 
-    # imgpoints: list of either np.ndarray((2,1)) or np.ndarray((2,));
-    #     of length n
-    # view_matrices: 3x4 camera projection matrices for each view
-    worldpoint_out = np.zeros((m_points, 3))
-    for i in range(m_points):
-        this_impts = imgpoints_all[:, i, :]
-        worldpoint_out[i, :] = triangulate(this_impts, view_matrices)
-    return worldpoint_out
+def triangulate_all(imgpoints_all: np.ndarray, view_matrices: np.ndarray) -> np.ndarray:
+    """Triangulate M points in 3D using N cameras/views.
+
+    `imgpoints_all` must have shape: (N, M, 2)
+    `view_matrices` must have shape: (N, 3, 4)
+
+
+    Returns an array of worldpoints in the shape: (M, 3)
+    """
+    worldpoints, _residuals = triangulate_batch(imgpoints_all, view_matrices)
+    return worldpoints
 
 
 def triangulate_simple(points, camera_mats):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    camera_mats = np.asarray(camera_mats, dtype=np.float64)
     num_cams = len(camera_mats)
     A = np.zeros((num_cams * 2, 4))
-    for i in range(num_cams):
-        x, y = points[i]
-        mat = camera_mats[i]
-        A[(i * 2) : (i * 2 + 1)] = x * mat[2] - mat[0]
-        A[(i * 2 + 1) : (i * 2 + 2)] = y * mat[2] - mat[1]
+    A[0::2] = points[:, 0:1] * camera_mats[:, 2] - camera_mats[:, 0]
+    A[1::2] = points[:, 1:2] * camera_mats[:, 2] - camera_mats[:, 1]
     u, s, vh = np.linalg.svd(A, full_matrices=True)
     p3d = vh[-1]
     p3d = p3d[:3] / p3d[3]
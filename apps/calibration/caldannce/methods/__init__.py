@@ -36,6 +36,13 @@ class IntrinsicsMethod(metaclass=ABCMeta):
     def bind_calibrator(self, calibrator):
         self.calibrator = calibrator
 
+    def __getstate__(self):
+        # don't pickle the bound calibrator (e.g. when sending a method to a worker
+        # process); the method is re-bound to a calibrator on the other side
+        state = self.__dict__.copy()
+        state.pop("calibrator", None)
+        return state
+
 
 # Abstract class for all extrinsics methods
 class ExtrinsicsMethod(metaclass=ABCMeta):
@@ -67,3 +74,10 @@ class ExtrinsicsMethod(metaclass=ABCMeta):
 
     def bind_calibrator(self, calibrator):
         self.calibrator = calibrator
+
+    def __getstate__(self):
+        # don't pickle the bound calibrator (e.g. when sending a method to a worker
+        # process); the method is re-bound to a calibrator on the other side
+        state = self.__dict__.copy()
+        state.pop("calibrator", None)
+        return state
@@ -3,8 +3,11 @@ import logging
 import cv2
 import numpy as np
 
+from caldannce.chessboard_detection import detect_chessboard_image
+from caldannce.detection_cache import CornerCache
 from caldannce.methods import ExtrinsicsMethod
 from caldannce.extrinsics import ExtrinsicsParams
+from caldannce.instrumentation import span
 from caldannce.intrinsics import IntrinsicsParams
 from caldannce.math_utils import calculate_rpe, get_chessboard_coordinates
 from caldannce.video_utils import ImageFormat, load_image_or_video
@@ -20,14 +23,26 @@ class ExtrinsicsChessboard(ExtrinsicsMethod):
     rows: int
     cols: int
     square_size_mm: int
+    cache: CornerCache | None
+    """Optional cache of corner detections (skips detection for unchanged frames)"""
     _object_points: np.ndarray
 
-    def __init__(self, rows, cols, square_size_mm) -> None:
+    def __init__(self, rows, cols, square_size_mm, cache: CornerCache = None) -> None:
         self.rows = rows
         self.cols = cols
         self.square_size_mm = square_size_mm
+        self.cache = cache
         self._object_points = get_chessboard_coordinates(rows, cols, square_size_mm)
 
+    @property
+    def object_points(self) -> np.ndarray:
+        """Chessboard corner coordinates in the board (world) frame, in mm"""
+        return self._object_points
+
+    def _detect_corners(self, gray: np.ndarray):
+        """Detect chessboard corners, consulting the cache (keyed by frame content) first"""
+        return detect_chessboard_image(gray, self.rows, self.cols, cache=self.cache)
+
     def _compute_extrinsics(
         self,
         camera_name: str,
@@ -37,22 +52,22 @@ class ExtrinsicsChessboard(ExtrinsicsMethod):
         img = load_image_or_video(
             media_path=camdata.extrinsics_path, output_image_format=ImageFormat.CV2_BGR
         )
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        success, corner_coords = cv2.findChessboardCorners(
-            gray, (self.cols, self.rows), None
-        )
+        with span("color_conversion"):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        corner_coords = self._detect_corners(gray)
 
-        if success is False:
+        if corner_coords is None:
             raise Exception(
                 f"Chessboard corners not found - unable to calibrate extrinsics (camera {camera_name})"
             )
 
-        success, r_vec, t_vec = cv2.solvePnP(
-            objectPoints=self._object_points,
-            imagePoints=corner_coords,
-            cameraMatrix=intrinsics_params.camera_matrix,
-            distCoeffs=intrinsics_params.dist,
-        )
+        with span("solve_pnp"):
+            success, r_vec, t_vec = cv2.solvePnP(
+                objectPoints=self._object_points,
+                imagePoints=corner_coords,
+                cameraMatrix=intrinsics_params.camera_matrix,
+                distCoeffs=intrinsics_params.dist,
+            )
         rotation_matrix, _jacobian = cv2.Rodrigues(r_vec)
 
         ret_params = ExtrinsicsParams(
@@ -61,21 +76,26 @@ class ExtrinsicsChessboard(ExtrinsicsMethod):
 
         # Compute extrinsics RPE
 
-        ipts = corner_coords.squeeze()
-        re_ipts_raw, _jacobian = cv2.projectPoints(
-            objectPoints=self._object_points,
-            rvec=r_vec,
-            tvec=t_vec,
-            cameraMatrix=intrinsics_params.camera_matrix,
-            distCoeffs=intrinsics_params.dist,
-        )
+        with span("rpe"):
+            ipts = corner_coords.squeeze()
+            re_ipts_raw, _jacobian = cv2.projectPoints(
+                objectPoints=self._object_points,
+                rvec=r_vec,
+                tvec=t_vec,
+                cameraMatrix=intrinsics_params.camera_matrix,
+                distCoeffs=intrinsics_params.dist,
+            )
 
-        re_ipts = re_ipts_raw.squeeze()
-        rpe = calculate_rpe(ipts, re_ipts)
+            re_ipts = re_ipts_raw.squeeze()
+            rpe = calculate_rpe(ipts, re_ipts)
 
         logging.info(f"Extrinsics RPE (single camera): {rpe}")
 
         if self.calibrator.report:
             self.calibrator.report.extrinsics_rpes[camera_name] = rpe
+            # keep the detection (the reference frame of a bundle adjustment)
+            self.calibrator.report.extrinsics_observations[camera_name][0] = (
+                corner_coords
+            )
 
         return ret_params
@@ -0,0 +1,215 @@
+import logging
+from pathlib import Path
+import time
+import cv2
+import numpy as np
+
+from caldannce.chessboard_detection import detect_chessboards
+from caldannce.detection_cache import CornerCache
+from caldannce.extrinsics import ExtrinsicsParams
+from caldannce.instrumentation import span
+from caldannce.intrinsics import IntrinsicsParams
+from caldannce.math_utils import calculate_rpe
+from caldannce.methods.extrinsics_chessboard import ExtrinsicsChessboard
+from caldannce.video_utils import iter_video_frames_gray, load_image_gray
+
+# a frame is an outlier if its RPE is above both this value and OUTLIER_MEDIAN_FACTOR
+# times the median RPE of all frames
+OUTLIER_MIN_RPE_PX = 1.0
+OUTLIER_MEDIAN_FACTOR = 3.0
+# two frames show the board at the same pose if the pose solved from one reprojects onto
+# the other within this error
+SAME_POSE_MAX_RPE_PX = 2.0
+
+DEFAULT_MAX_DETECTIONS = 50
+
+
+class ExtrinsicsChessboardVideo(ExtrinsicsChessboard):
+    """Calibrate extrinsics using a (static) chessboard target seen over many frames of
+    the extrinsics video, instead of the first frame only.
+
+    The video is decoded once, forward-only, on a background thread; the board is
+    detected on every frame_step-th frame using a thread pool. Decoding stops early once
+    max_detections frames with a detected board were found.
+
+    The static board pose is the one which most detections agree with; the camera pose
+    is solved jointly over those, rejecting frames whose reprojection error is an
+    outlier (e.g. blur or partial occlusion). Frames in which the board was moved away
+    from its static pose, and which fit a pose of their own, are recorded in the report
+    for bundle adjustment (see Calibrator.calibrate), where they couple the cameras.
+
+    If the extrinsics path is an image, it is used as the single frame.
+    """
+
+    frame_step: int
+    """Sample every Nth frame of the video"""
+    max_detections: int | None
+    """Stop decoding after this many frames with a detected board (None: whole video)"""
+    n_threads: int | None
+    fast_check: bool
+
+    def __init__(
+        self,
+        rows,
+        cols,
+        square_size_mm,
+        frame_step: int = 5,
+        max_detections: int | None = DEFAULT_MAX_DETECTIONS,
+        n_threads=None,
+        fast_check=True,
+        cache: CornerCache = None,
+    ) -> None:
+        super().__init__(rows, cols, square_size_mm, cache=cache)
+        self.frame_step = frame_step
+        self.max_detections = max_detections
+        self.n_threads = n_threads
+        self.fast_check = fast_check
+
+    def _iter_frames(self, media_path: str):
+        if Path(media_path).suffix in [".mp4"]:
+            yield from iter_video_frames_gray(media_path, frame_step=self.frame_step)
+        else:
+            yield 0, load_image_gray(media_path)
+
+    def _detect_all(self, media_path: str) -> tuple[dict[int, np.ndarray], int]:
+        """Detect the board on the sampled frames. Returns ({frame_idx: corners}, no. of
+        sampled frames)"""
+        frames = self._iter_frames(media_path)
+        frame_idxs = []
+
+        def sampled_frames():
+            for frame_idx, gray in frames:
+                frame_idxs.append(frame_idx)
+                yield gray
+
+        detections = detect_chessboards(
+            sampled_frames(),
+            self.rows,
+            self.cols,
+            n_threads=self.n_threads,
+            fast_check=self.fast_check,
+            cache=self.cache,
+        )
+        corners_by_frame = {}
+        n_sampled = 0
+        try:
+            for i, corner_coords in enumerate(detections):
+                n_sampled += 1
+                if corner_coords is not None:
+                    corners_by_frame[frame_idxs[i]] = corner_coords
+                if (
+                    self.max_detections is not None
+                    and len(corners_by_frame) >= self.max_detections
+                ):
+                    break
+        finally:
+            # stop the detection pool and background decoding if we stopped early
+            detections.close()
+            frames.close()
+        return corners_by_frame, n_sampled
+
+    def _solve_pnp(self, corners: list[np.ndarray], intrinsics_params):
+        """Solve a single pose over all frames (the board and camera are static)"""
+        object_points = np.concatenate([self._object_points] * len(corners))
+        image_points = np.concatenate(corners)
+        with span("solve_pnp", n_frames=len(corners)):
+            _success, r_vec, t_vec = cv2.solvePnP(
+                objectPoints=object_points,
+                imagePoints=image_points,
+                cameraMatrix=intrinsics_params.camera_matrix,
+                distCoeffs=intrinsics_params.dist,
+            )
+        return r_vec, t_vec
+
+    def _frame_rpes(self, corners: list[np.ndarray], r_vec, t_vec, intrinsics_params):
+        """Reprojection error of each frame's detection for the pose (r_vec, t_vec)"""
+        with span("rpe", n_frames=len(corners)):
+            re_ipts_raw, _jacobian = cv2.projectPoints(
+                objectPoints=self._object_points,
+                rvec=r_vec,
+                tvec=t_vec,
+                cameraMatrix=intrinsics_params.camera_matrix,
+                distCoeffs=intrinsics_params.dist,
+            )
+            re_ipts = re_ipts_raw.squeeze()
+            return np.array([calculate_rpe(c.squeeze(), re_ipts) for c in corners])
+
+    def _static_frames(
+        self, corners: list[np.ndarray], intrinsics_params
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the frames showing the board at its static pose: the single-frame pose
+        which the most frames agree with (the earliest on ties).
+
+        Returns (boolean mask of the static frames, RPE of each frame for its own
+        pose)"""
+        agree = []
+        own_rpes = []
+        for i, frame_corners in enumerate(corners):
+            r_vec, t_vec = self._solve_pnp([frame_corners], intrinsics_params)
+            rpes = self._frame_rpes(corners, r_vec, t_vec, intrinsics_params)
+            agree.append(rpes <= SAME_POSE_MAX_RPE_PX)
+            own_rpes.append(rpes[i])
+        agree = np.array(agree)
+        return agree[np.argmax(agree.sum(axis=1))], np.array(own_rpes)
+
+    def _compute_extrinsics(
+        self,
+        camera_name: str,
+        camdata: ExtrinsicsChessboard.Camdata,
+        intrinsics_params: IntrinsicsParams,
+    ) -> ExtrinsicsParams:
+        start = time.perf_counter()
+        corners_by_frame, n_sampled = self._detect_all(camdata.extrinsics_path)
+
+        if len(corners_by_frame) == 0:
+            raise Exception(
+                f"Chessboard corners not found in any sampled frame - unable to calibrate extrinsics (camera {camera_name})"
+            )
+
+        frame_idxs = sorted(corners_by_frame.keys())
+        corners = [corners_by_frame[i] for i in frame_idxs]
+        static, own_rpes = self._static_frames(corners, intrinsics_params)
+        # frames of the moved board, sharp enough to fit a pose of their own
+        moving = {
+            f: c
+            for f, c, is_static, rpe in zip(frame_idxs, corners, static, own_rpes)
+            if not is_static and rpe <= OUTLIER_MIN_RPE_PX
+        }
+        frame_idxs = [f for f, ok in zip(frame_idxs, static) if ok]
+        corners = [c for c, ok in zip(corners, static) if ok]
+        r_vec, t_vec = self._solve_pnp(corners, intrinsics_params)
+
+        rpes = self._frame_rpes(corners, r_vec, t_vec, intrinsics_params)
+
+        # reject outlier frames and solve again using the inliers only
+        threshold = max(OUTLIER_MIN_RPE_PX, OUTLIER_MEDIAN_FACTOR * np.median(rpes))
+        inliers = rpes <= threshold
+        if not inliers.all():
+            frame_idxs = [f for f, ok in zip(frame_idxs, inliers) if ok]
+            corners = [c for c, ok in zip(corners, inliers) if ok]
+            r_vec, t_vec = self._solve_pnp(corners, intrinsics_params)
+            rpes = self._frame_rpes(corners, r_vec, t_vec, intrinsics_params)
+
+        rotation_matrix, _jacobian = cv2.Rodrigues(r_vec)
+        ret_params = ExtrinsicsParams(
+            rotation_matrix=rotation_matrix, translation_vector=t_vec
+        )
+
+        rpe = float(np.mean(rpes))
+        end = time.perf_counter()
+        logging.info(
+            f"Extrinsics from {len(corners)} frames ({len(corners_by_frame)} detected, {n_sampled} sampled, {np.sum(~inliers)} outliers rejected, {len(moving)} frames of the moved board) in {(end-start)*1000:.2f} ms (camera {camera_name})"
+        )
+        logging.info(f"Extrinsics RPE (single camera): {rpe}")
+
+        if self.calibrator.report:
+            self.calibrator.report.extrinsics_rpes[camera_name] = rpe
+            # keep the inlier detections for a joint (bundle adjustment) refinement
+            self.calibrator.report.extrinsics_observations[camera_name].update(
+                zip(frame_idxs, corners)
+            )
+            self.calibrator.report.extrinsics_moving_observations[camera_name].update(
+                moving
+            )
+
+        return ret_params
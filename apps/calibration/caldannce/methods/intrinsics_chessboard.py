@@ -4,10 +4,13 @@ import time
 import cv2
 import numpy as np
 
+from caldannce.chessboard_detection import detect_chessboard_files
+from caldannce.detection_cache import CornerCache
+from caldannce.instrumentation import span
 from caldannce.methods import IntrinsicsMethod
 from caldannce.intrinsics import IntrinsicsParams
 from caldannce.math_utils import calculate_rpe, get_chessboard_coordinates
-from caldannce.video_utils import load_images
+from caldannce.view_selection import DEFAULT_MAX_VIEWS, select_views
 
 
 class IntrinsicsChessboard(IntrinsicsMethod):
@@ -18,100 +21,182 @@ class IntrinsicsChessboard(IntrinsicsMethod):
     rows: int
     cols: int
     square_size_mm: int
+    n_threads: int | None
+    """Number of corner detection threads (None: one per core)"""
+    fast_check: bool
+    """Reject frames without a chessboard using a fast check on a downscaled image"""
+    cache: CornerCache | None
+    """Optional cache of corner detections (skips detection for unchanged images)"""
+    max_views: int
+    """Max. no. of (pose-diverse) detected views passed to cv2.calibrateCamera"""
     _object_points: np.ndarray
 
-    def __init__(self, rows, cols, square_size_mm) -> None:
+    def __init__(
+        self,
+        rows,
+        cols,
+        square_size_mm,
+        n_threads=None,
+        fast_check=False,
+        cache: CornerCache = None,
+        max_views: int = DEFAULT_MAX_VIEWS,
+    ) -> None:
         self.rows = rows
         self.cols = cols
         self.square_size_mm = square_size_mm
+        self.n_threads = n_threads
+        self.fast_check = fast_check
+        self.cache = cache
+        self.max_views = max_views
         self._object_points = get_chessboard_coordinates(rows, cols, square_size_mm)
 
-    def _compute_intrinsics(
-        self, camera_name: str, camdata: Camdata
-    ) -> IntrinsicsParams:
-        # get info from the first image in the list (assume all intrinsincs are same dimensions)
-        n_images = len(camdata.intrinsics_paths)
-        raw_images = load_images(camdata.intrinsics_paths)
+    def _detect_corners(
+        self, camera_name: str, paths: list[str]
+    ) -> tuple[list[np.ndarray], tuple[int, int], list[str]]:
+        """Detect the chessboard in each image. Returns the detected corners, the image
+        size and the paths of the images without a detected chessboard"""
         imgpoints = []
-        objpoints = []
-        failed_imgs = []
-
-        start = time.perf_counter()
-
-        # collect all object and image points for each intrinsics image
-        for img_idx in range(n_images):
-            this_img = raw_images[img_idx, :, :, :].copy()
-            gray = cv2.cvtColor(this_img, cv2.COLOR_BGR2GRAY)
-
-            # Find the chess board corners
-            # 2nd param is Size: (Width, Height)
-            success, corner_coords = cv2.findChessboardCorners(
-                gray, (self.cols, self.rows), None
-            )
-
-            if success is True:
+        failed_paths = []
+        image_size = None
+
+        # images are streamed from disk as grayscale instead of preloaded into memory
+        detections = detect_chessboard_files(
+            paths,
+            self.rows,
+            self.cols,
+            n_threads=self.n_threads,
+            fast_check=self.fast_check,
+            cache=self.cache,
+        )
+        for img_idx, (corner_coords, image_size) in enumerate(detections):
+            if corner_coords is not None:
                 imgpoints.append(corner_coords)
-                objpoints.append(self._object_points)
             else:
-                failed_image_path = camdata.intrinsics_paths[img_idx]
+                failed_image_path = paths[img_idx]
                 logging.warning(
                     f"No pattern detected: Cam# {camera_name}, path:{failed_image_path }"
                 )
-                failed_imgs.append(img_idx)
-
-                # record list of failed images
-                if self.calibrator.report:
-                    self.calibrator.report.intrinsics_no_pattern_dict[
-                        camera_name
-                    ].append(failed_image_path)
-
-        reproject_err, camera_matrix, raw_dist, r_vecs, t_vecs = cv2.calibrateCamera(
-            objpoints,
-            imgpoints,
-            gray.shape[::-1],
-            None,
-            None,
-            # NOTE: CALIB_USE_LU speeds up calibration significantly on Windows Comptuers
-            flags=cv2.CALIB_FIX_K3 | cv2.CALIB_USE_LU,
-        )
+                failed_paths.append(failed_image_path)
+        return imgpoints, image_size, failed_paths
+
+    def _solve(
+        self,
+        imgpoints: list[np.ndarray],
+        image_size: tuple[int, int],
+        max_views: int,
+        initial_params: IntrinsicsParams = None,
+    ):
+        """Run cv2.calibrateCamera on a pose-diverse subset of at most max_views views,
+        starting from initial_params if given (else from scratch).
+
+        Returns (params, view selection, selected imgpoints, r_vecs, t_vecs)"""
+        # bound the cost of calibrateCamera by only keeping a pose-diverse subset of views
+        with span("view_selection", n_detected=len(imgpoints)):
+            selection = select_views(
+                imgpoints, self.rows, self.cols, image_size, max_views=max_views
+            )
+        imgpoints = [imgpoints[i] for i in selection.selected_idxs]
+        objpoints = [self._object_points] * len(imgpoints)
+
+        # NOTE: CALIB_USE_LU speeds up calibration significantly on Windows Comptuers
+        flags = cv2.CALIB_FIX_K3 | cv2.CALIB_USE_LU
+        camera_matrix = None
+        dist = None
+        if initial_params is not None:
+            flags |= cv2.CALIB_USE_INTRINSIC_GUESS
+            camera_matrix = np.array(initial_params.camera_matrix, dtype=np.float64)
+            # k3 is fixed to 0
+            dist = np.zeros(5)
+            dist[:4] = initial_params.dist[:4]
+
+        with span("calibrate_camera", n_views=len(imgpoints)):
+            reproject_err, camera_matrix, raw_dist, r_vecs, t_vecs = (
+                cv2.calibrateCamera(
+                    objpoints,
+                    imgpoints,
+                    image_size,
+                    camera_matrix,
+                    dist,
+                    flags=flags,
+                )
+            )
         dist = raw_dist.squeeze()
 
         ret_params = IntrinsicsParams(
             camera_matrix=camera_matrix,
             dist=dist,
         )
-
-        end = time.perf_counter()
-
-        logging.info(
-            f"Found all corners in {(end-start)*1000:.2f} ms [{n_images - len(failed_imgs)}/{n_images} images]"
-        )
-
-        # compute reprojection error
-        if self.calibrator.report:
-            self.calibrator.report.total_intrinsics_images += n_images
-            self.calibrator.report.successful_intrinsics_images += n_images
-            rpes = []
-            n_images_success = len(imgpoints)
-            for i in range(n_images_success):
+        return ret_params, selection, imgpoints, r_vecs, t_vecs
+
+    def _mean_rpe(
+        self,
+        params: IntrinsicsParams,
+        imgpoints: list[np.ndarray],
+        r_vecs,
+        t_vecs,
+    ) -> float:
+        rpes = []
+        with span("rpe", n_views=len(imgpoints)):
+            for i in range(len(imgpoints)):
                 ipts = imgpoints[i].squeeze()
                 re_ipts = cv2.projectPoints(
-                    objpoints[i],
+                    self._object_points,
                     r_vecs[i],
                     t_vecs[i],
-                    camera_matrix,
-                    dist,
+                    params.camera_matrix,
+                    params.dist,
                 )
                 re_ipts = re_ipts[0].squeeze()
                 rpe = calculate_rpe(ipts, re_ipts)
                 rpes.append(rpe)
 
-            mean_rpe = np.mean(rpes)
+        logging.debug(f"Intrinsics mean RPE: {np.mean(rpes)}")
+        logging.debug(f"Intrinsics max  RPE: {np.max(rpes)}")
+        logging.debug(f"Intrinsics min  RPE: {np.min(rpes)}")
+        return np.mean(rpes)
+
+    def _update_report(
+        self,
+        camera_name: str,
+        n_images: int,
+        failed_paths: list[str],
+        selection,
+        mean_rpe: float,
+    ):
+        report = self.calibrator.report
+        # record list of failed images
+        report.intrinsics_no_pattern_dict[camera_name].extend(failed_paths)
+        report.total_intrinsics_images += n_images
+        report.successful_intrinsics_images += n_images - len(failed_paths)
+        report.intrinsics_view_coverage[camera_name] = selection.as_dict()
+        report.intrinsics_rpes[camera_name] = mean_rpe
+
+    def _compute_intrinsics(
+        self, camera_name: str, camdata: Camdata
+    ) -> IntrinsicsParams:
+        n_images = len(camdata.intrinsics_paths)
+
+        start = time.perf_counter()
+
+        # collect all image points for each intrinsics image
+        imgpoints, image_size, failed_paths = self._detect_corners(
+            camera_name, camdata.intrinsics_paths
+        )
+        ret_params, selection, imgpoints, r_vecs, t_vecs = self._solve(
+            imgpoints, image_size, self.max_views
+        )
 
-            self.calibrator.report.intrinsics_rpes[camera_name] = mean_rpe
+        end = time.perf_counter()
 
-            logging.debug(f"Intrinsics mean RPE: {mean_rpe}")
-            logging.debug(f"Intrinsics max  RPE: {np.max(rpes)}")
-            logging.debug(f"Intrinsics min  RPE: {np.min(rpes)}")
+        logging.info(
+            f"Found all corners in {(end-start)*1000:.2f} ms [{n_images - len(failed_paths)}/{n_images} images]"
+        )
+
+        # compute reprojection error
+        if self.calibrator.report:
+            mean_rpe = self._mean_rpe(ret_params, imgpoints, r_vecs, t_vecs)
+            self._update_report(
+                camera_name, n_images, failed_paths, selection, mean_rpe
+            )
 
         return ret_params
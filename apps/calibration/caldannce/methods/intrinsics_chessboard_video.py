@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+import logging
+import time
+import cv2
+import numpy as np
+
+from caldannce.chessboard_detection import detect_chessboards
+from caldannce.detection_cache import CornerCache
+from caldannce.instrumentation import span
+from caldannce.methods import IntrinsicsMethod
+from caldannce.intrinsics import IntrinsicsParams
+from caldannce.math_utils import calculate_rpe, get_chessboard_coordinates
+from caldannce.video_utils import iter_video_frames_gray
+from caldannce.view_selection import DEFAULT_MAX_VIEWS, select_views
+
+# width of the thumbnails compared to decide if the board has moved between frames
+MOTION_THUMBNAIL_WIDTH = 160
+
+
+def select_keyframes(frames, min_motion: float):
+    """Filter a stream of (frame_idx, gray) to frames which differ enough from the last
+    kept frame: the mean absolute difference of small thumbnails must be >= min_motion
+    (in grayscale levels 0-255). Drops runs of near-identical frames (e.g. a still board)
+    """
+    last_thumb = None
+    for frame_idx, gray in frames:
+        h, w = gray.shape
+        thumb_size = (MOTION_THUMBNAIL_WIDTH, max(1, h * MOTION_THUMBNAIL_WIDTH // w))
+        thumb = cv2.resize(gray, thumb_size, interpolation=cv2.INTER_AREA)
+        thumb = thumb.astype(np.int16)
+        if last_thumb is None or np.mean(np.abs(thumb - last_thumb)) >= min_motion:
+            last_thumb = thumb
+            yield frame_idx, gray
+
+
+class IntrinsicsChessboardVideo(IntrinsicsMethod):
+    """Calibrate intrinsics using a chessboard target, sampling frames directly from a
+    calibration video (instead of exported still images).
+
+    The video is decoded once, forward-only, on a background thread. Every frame_step-th
+    frame is sampled; if min_motion is set, sampled frames are further reduced to those
+    where the image changed since the last kept frame (motion-based keyframes).
+    """
+
+    @dataclass
+    class Camdata:
+        intrinsics_video_path: str
+
+    rows: int
+    cols: int
+    square_size_mm: int
+    frame_step: int
+    """Sample every Nth frame of the video"""
+    min_motion: float | None
+    """If set, only keep sampled frames whose mean abs. difference from the last kept
+    frame is at least this value (grayscale levels)"""
+    n_threads: int | None
+    fast_check: bool
+    cache: CornerCache | None
+    """Optional cache of corner detections (keyed by frame content)"""
+    max_views: int
+    _object_points: np.ndarray
+
+    def __init__(
+        self,
+        rows,
+        cols,
+        square_size_mm,
+        frame_step: int = 10,
+        min_motion: float = None,
+        n_threads=None,
+        fast_check=True,
+        cache: CornerCache = None,
+        max_views: int = DEFAULT_MAX_VIEWS,
+    ) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.square_size_mm = square_size_mm
+        self.frame_step = frame_step
+        self.min_motion = min_motion
+        self.n_threads = n_threads
+        self.fast_check = fast_check
+        self.cache = cache
+        self.max_views = max_views
+        self._object_points = get_chessboard_coordinates(rows, cols, square_size_mm)
+
+    def _compute_intrinsics(
+        self, camera_name: str, camdata: Camdata
+    ) -> IntrinsicsParams:
+        video_path = camdata.intrinsics_video_path
+        imgpoints = []
+        objpoints = []
+        failed_frames = []
+        frame_idxs = []
+        image_size = None
+
+        start = time.perf_counter()
+
+        frames = iter_video_frames_gray(video_path, frame_step=self.frame_step)
+        if self.min_motion is not None:
+            frames = select_keyframes(frames, self.min_motion)
+
+        def sampled_frames():
+            # keep track of the frame index (and size) of each frame sent to detection
+            nonlocal image_size
+            for frame_idx, gray in frames:
+                frame_idxs.append(frame_idx)
+                image_size = gray.shape[::-1]
+                yield gray
+
+        detections = detect_chessboards(
+            sampled_frames(),
+            self.rows,
+            self.cols,
+            n_threads=self.n_threads,
+            fast_check=self.fast_check,
+            cache=self.cache,
+        )
+        for i, corner_coords in enumerate(detections):
+            if corner_coords is not None:
+                imgpoints.append(corner_coords)
+                objpoints.append(self._object_points)
+            else:
+                failed_frames.append(f"{video_path}#frame={frame_idxs[i]}")
+
+        n_frames = len(frame_idxs)
+        end = time.perf_counter()
+        logging.info(
+            f"Found all corners in {(end-start)*1000:.2f} ms [{len(imgpoints)}/{n_frames} sampled frames] (camera {camera_name})"
+        )
+
+        if len(imgpoints) == 0:
+            raise Exception(
+                f"Chessboard corners not found in any sampled frame - unable to calibrate intrinsics (camera {camera_name})"
+            )
+
+        with span("view_selection", n_detected=len(imgpoints)):
+            selection = select_views(
+                imgpoints, self.rows, self.cols, image_size, max_views=self.max_views
+            )
+        imgpoints = [imgpoints[i] for i in selection.selected_idxs]
+        objpoints = [objpoints[i] for i in selection.selected_idxs]
+
+        with span("calibrate_camera", n_views=len(imgpoints)):
+            reproject_err, camera_matrix, raw_dist, r_vecs, t_vecs = (
+                cv2.calibrateCamera(
+                    objpoints,
+                    imgpoints,
+                    image_size,
+                    None,
+                    None,
+                    # NOTE: CALIB_USE_LU speeds up calibration significantly on Windows Comptuers
+                    flags=cv2.CALIB_FIX_K3 | cv2.CALIB_USE_LU,
+                )
+            )
+        dist = raw_dist.squeeze()
+
+        ret_params = IntrinsicsParams(
+            camera_matrix=camera_matrix,
+            dist=dist,
+        )
+
+        if self.calibrator.report:
+            report = self.calibrator.report
+            report.intrinsics_no_pattern_dict[camera_name].extend(failed_frames)
+            report.total_intrinsics_images += n_frames
+            report.successful_intrinsics_images += n_frames - len(failed_frames)
+            report.intrinsics_view_coverage[camera_name] = selection.as_dict()
+
+            rpes = []
+            with span("rpe", n_views=len(imgpoints)):
+                for i in range(len(imgpoints)):
+                    ipts = imgpoints[i].squeeze()
+                    re_ipts = cv2.projectPoints(
+                        objpoints[i],
+                        r_vecs[i],
+                        t_vecs[i],
+                        camera_matrix,
+                        dist,
+                    )
+                    re_ipts = re_ipts[0].squeeze()
+                    rpes.append(calculate_rpe(ipts, re_ipts))
+
+            mean_rpe = np.mean(rpes)
+            report.intrinsics_rpes[camera_name] = mean_rpe
+            logging.debug(f"Intrinsics mean RPE: {mean_rpe}")
+
+        return ret_params
@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+import logging
+import time
+import numpy as np
+
+from caldannce.detection_cache import CornerCache
+from caldannce.instrumentation import span
+from caldannce.intrinsics import IntrinsicsParams
+from caldannce.methods.intrinsics_chessboard import IntrinsicsChessboard
+from caldannce.view_selection import DEFAULT_MAX_VIEWS
+
+DEFAULT_WARM_START_IMAGES = 20
+DEFAULT_WARM_START_VIEWS = 10
+DEFAULT_MAX_FOCAL_CHANGE = 0.02
+DEFAULT_MAX_PRINCIPAL_POINT_SHIFT_PX = 10.0
+DEFAULT_MAX_WARM_START_RPE_PX = 1.0
+MIN_WARM_START_VIEWS = 4
+
+
+def intrinsics_change(
+    previous: IntrinsicsParams, current: IntrinsicsParams
+) -> tuple[float, float]:
+    """Relative change of the focal lengths (max of x and y) and shift of the principal
+    point (px) between two intrinsics"""
+    f_prev = np.diag(previous.camera_matrix)[:2]
+    f_cur = np.diag(current.camera_matrix)[:2]
+    focal_change = float(np.max(np.abs(f_cur - f_prev) / f_prev))
+    principal_point_shift = float(
+        np.linalg.norm(current.camera_matrix[:2, 2] - previous.camera_matrix[:2, 2])
+    )
+    return focal_change, principal_point_shift
+
+
+def spread_subset(paths: list[str], n: int) -> list[str]:
+    """At most n paths, evenly spread over the list (captures are usually taken while
+    moving the board, so neighbouring images have similar poses)"""
+    if len(paths) <= n:
+        return list(paths)
+    idxs = np.unique(np.linspace(0, len(paths) - 1, n).round().astype(int))
+    return [paths[i] for i in idxs]
+
+
+class IntrinsicsChessboardWarmStart(IntrinsicsChessboard):
+    """Recalibrate intrinsics of cameras which were calibrated before, starting from their
+    previous "hires" parameters.
+
+    Only an evenly spread subset of warm_start_images images is detected, and
+    cv2.calibrateCamera refines the previous parameters (CALIB_USE_INTRINSIC_GUESS) on at
+    most warm_start_views of them. The result is accepted if the focal lengths and the
+    principal point moved less than the tolerances and the RPE is low enough; otherwise
+    (e.g. the lens was refocused) the camera falls back to a full IntrinsicsChessboard
+    solve over all images.
+    """
+
+    @dataclass
+    class Camdata:
+        intrinsics_paths: list[str]
+        hires_file_path: str
+        """Previous parameters of this camera (hires_camX_params.mat)"""
+
+    warm_start_images: int
+    """Max. no. of images detected for the warm start"""
+    warm_start_views: int
+    """Max. no. of views passed to cv2.calibrateCamera for the warm start"""
+    max_focal_change: float
+    """Max. relative change of the focal lengths to accept the warm start"""
+    max_principal_point_shift_px: float
+    """Max. shift of the principal point (px) to accept the warm start"""
+    max_rpe_px: float
+    """Max. mean RPE (px) to accept the warm start"""
+
+    def __init__(
+        self,
+        rows,
+        cols,
+        square_size_mm,
+        n_threads=None,
+        fast_check=False,
+        cache: CornerCache = None,
+        max_views: int = DEFAULT_MAX_VIEWS,
+        warm_start_images: int = DEFAULT_WARM_START_IMAGES,
+        warm_start_views: int = DEFAULT_WARM_START_VIEWS,
+        max_focal_change: float = DEFAULT_MAX_FOCAL_CHANGE,
+        max_principal_point_shift_px: float = DEFAULT_MAX_PRINCIPAL_POINT_SHIFT_PX,
+        max_rpe_px: float = DEFAULT_MAX_WARM_START_RPE_PX,
+    ) -> None:
+        super().__init__(
+            rows,
+            cols,
+            square_size_mm,
+            n_threads=n_threads,
+            fast_check=fast_check,
+            cache=cache,
+            max_views=max_views,
+        )
+        self.warm_start_images = warm_start_images
+        self.warm_start_views = warm_start_views
+        self.max_focal_change = max_focal_change
+        self.max_principal_point_shift_px = max_principal_point_shift_px
+        self.max_rpe_px = max_rpe_px
+
+    def _warm_start(self, camera_name: str, camdata: Camdata) -> IntrinsicsParams:
+        """Refine the previous intrinsics on a subset of the images. Returns None (and logs
+        why) if the result is not within the tolerances"""
+        with span("load_hires_file", path=camdata.hires_file_path):
+            previous = IntrinsicsParams.load_from_mat_file(camdata.hires_file_path)
+
+        paths = spread_subset(camdata.intrinsics_paths, self.warm_start_images)
+        imgpoints, image_size, failed_paths = self._detect_corners(camera_name, paths)
+        outcome = {
+            "accepted": False,
+            "reason": None,
+            "n_images": len(paths),
+            "n_views": len(imgpoints),
+            "focal_change": None,
+            "principal_point_shift_px": None,
+            "rpe_px": None,
+        }
+        if self.calibrator.report:
+            self.calibrator.report.intrinsics_warm_start[camera_name] = outcome
+
+        if len(imgpoints) < MIN_WARM_START_VIEWS:
+            outcome["reason"] = f"only {len(imgpoints)} views detected"
+            logging.info(
+                f"Warm start rejected (camera {camera_name}): {outcome['reason']}"
+            )
+            return None
+
+        params, selection, imgpoints, r_vecs, t_vecs = self._solve(
+            imgpoints, image_size, self.warm_start_views, initial_params=previous
+        )
+        mean_rpe = self._mean_rpe(params, imgpoints, r_vecs, t_vecs)
+        focal_change, principal_point_shift = intrinsics_change(previous, params)
+        outcome.update(
+            n_views=len(imgpoints),
+            focal_change=focal_change,
+            principal_point_shift_px=principal_point_shift,
+            rpe_px=float(mean_rpe),
+        )
+
+        if focal_change > self.max_focal_change:
+            outcome["reason"] = f"focal length changed by {focal_change:.2%}"
+        elif principal_point_shift > self.max_principal_point_shift_px:
+            outcome["reason"] = f"principal point moved by {principal_point_shift:.1f} px"
+        elif mean_rpe > self.max_rpe_px:
+            outcome["reason"] = f"RPE is {mean_rpe:.3f} px"
+        if outcome["reason"] is not None:
+            logging.info(
+                f"Warm start rejected (camera {camera_name}): {outcome['reason']}"
+            )
+            return None
+
+        outcome["accepted"] = True
+        if self.calibrator.report:
+            self._update_report(
+                camera_name, len(paths), failed_paths, selection, mean_rpe
+            )
+        return params
+
+    def _compute_intrinsics(
+        self, camera_name: str, camdata: Camdata
+    ) -> IntrinsicsParams:
+        start = time.perf_counter()
+        with span("warm_start"):
+            params = self._warm_start(camera_name, camdata)
+        end = time.perf_counter()
+
+        if params is not None:
+            logging.info(
+                f"Warm-started intrinsics in {(end-start)*1000:.2f} ms (camera {camera_name})"
+            )
+            return params
+
+        # full solve over all images (detections of the subset are reused if cached)
+        return super()._compute_intrinsics(camera_name, camdata)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from caldannce.instrumentation import span
 from caldannce.methods import IntrinsicsMethod
 from caldannce.intrinsics import IntrinsicsParams
 
@@ -16,7 +17,8 @@ class IntrinsicsHiresFile(IntrinsicsMethod):
     def _compute_intrinsics(
         self, camera_name: str, camdata: Camdata
     ) -> IntrinsicsParams:
-        ret_params = IntrinsicsParams.load_from_mat_file(
-            camdata.hires_file_path
-        )
+        with span("load_hires_file", path=camdata.hires_file_path):
+            ret_params = IntrinsicsParams.load_from_mat_file(
+                camdata.hires_file_path
+            )
         return ret_params
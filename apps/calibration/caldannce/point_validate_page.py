@@ -1,7 +1,6 @@
 import logging
 import time
 from pathlib import Path
-import cv2
 
 import numpy as np
 import PySide6.QtWidgets as QtWidgets
@@ -17,6 +16,7 @@ from matplotlib.figure import Figure
 from PySide6.QtCore import Slot
 
 from caldannce.calibration_data import CalibrationData
+from caldannce.image_display import DisplayPyramid, PyramidImageView, UndistortMapCache
 from caldannce.math_utils import triangulate
 from caldannce.project_utils import get_verification_files
 from caldannce.video_utils import load_image_or_video, ImageFormat
@@ -42,6 +42,9 @@ class ValidationManager:
     """List of matplotlib paths used to redraw user-selected keypoints in gui"""
     static_axes: list
     """List of matplotlib axes for each of the n cameras"""
+    image_views: list[PyramidImageView]
+    """Displayed (undistorted) image of each camera, swapping in full-res tiles on zoom"""
+    undistort_maps: UndistortMapCache
     calibration_data: CalibrationData
 
     def __init__(self, calibration_data: CalibrationData):
@@ -52,6 +55,8 @@ class ValidationManager:
         self.scatter_paths = [None for _ in range(n_cameras)]
         self.reproj_paths = [None for _ in range(n_cameras)]
         self.static_axes = [None for _ in range(n_cameras)]
+        self.image_views = [None for _ in range(n_cameras)]
+        self.undistort_maps = UndistortMapCache()
         self.output_dir = calibration_data.output_dir
 
     def load_image(self, img_path, camera_idx):
@@ -63,20 +68,30 @@ class ValidationManager:
         logging.debug(
             f"Loading image at filepath: {img_path} for camera idx: {camera_idx}"
         )
+        self.image_views[camera_idx] = None
         try:
-            # img = np.asarray(image_f)
+            start = time.perf_counter()
             img = load_image_or_video(
                 media_path=img_path, output_image_format=ImageFormat.RGB
             )
             # UNDISTORT THE IMAGE to undo lens distortions (e.g. radial, tangential dist parameters)
-            img_undistorted = cv2.undistort(
+            # the maps are cached per camera (and recomputed if the calibration changes)
+            img_undistorted = self.undistort_maps.undistort(
                 img,
-                self.calibration_data.camera_params[camera_idx].camera_matrix,
-                distCoeffs=self.calibration_data.camera_params[camera_idx].dist,
+                camera_idx=camera_idx,
+                camera_params=self.calibration_data.camera_params[camera_idx],
             )
 
             self.validation_image_paths[camera_idx] = img_path
-            axes.imshow(img_undistorted)
+            # show a downsampled image; full-res tiles are swapped in when zooming.
+            # Axes coordinates stay in full-res pixels, so picked keypoints are too
+            self.image_views[camera_idx] = PyramidImageView(
+                axes, DisplayPyramid(img_undistorted)
+            )
+            end = time.perf_counter()
+            logging.debug(
+                f"Loaded validation image in {(end-start)*1000:.2f} ms (camera idx: {camera_idx})"
+            )
 
         except Exception:
             logging.warning(f"Unable to load image at path: {img_path}")
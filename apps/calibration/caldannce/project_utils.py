@@ -4,20 +4,26 @@ import logging
 import os
 import re
 from dataclasses import dataclass
-from functools import reduce
-from glob import iglob
 from pathlib import Path
 
 import git
 from scipy.io import savemat
 
 from caldannce.calibration_data import CalibrationData
+from caldannce.calibration_store import (
+    STORE_FILE_NAME,
+    hires_files_metadata,
+    write_calibration_store,
+)
+from caldannce.directory_index import get_directory_index
 
 from .intrinsics import IntrinsicsParams
 
 IMAGE_EXTENSIONS = [".tiff", ".tif", ".jpeg", ".jpg", ".png"]
 """Possible file extensions for intrinsics calibration images"""
 EXTRINSICS_EXTENSIONS = [".mp4", ".tiff", ".tif", ".jpeg", ".jpg", ".png"]
+VIDEO_EXTENSIONS = [".mp4"]
+"""Possible file extensions for intrinsics calibration videos"""
 
 FILENAME_CHARACTER_CLASS = r"[\w\-\. ]"
 """Regex character class representing valid filenames"""
@@ -35,6 +41,22 @@ def or_regex(alternative_list):
     return extensions_regex
 
 
+# patterns for single path components, matched against the directory index
+_CALIBRATION_DIR_RE = re.compile(r"[Cc]alibration")
+_EXTRINSICS_DIR_RE = re.compile(r"[Ee]xtrinsics?")
+_INTRINSICS_DIR_RE = re.compile(r"[Ii]ntrinsics?")
+_CAMERA_DIR_RE = re.compile(r"[Cc]amera.+")
+_ANY_DIR_RE = re.compile(f"{FILENAME_CHARACTER_CLASS}+")
+_CAMERA_MEDIA_RE = re.compile(f".+?{or_regex(EXTRINSICS_EXTENSIONS)}")
+_EXTRINSICS_FIRST_FILE_RE = re.compile(f"0{or_regex(EXTRINSICS_EXTENSIONS)}")
+_EXTRINSICS_FILE_RE = re.compile(
+    f"{FILENAME_CHARACTER_CLASS}+?{or_regex(EXTRINSICS_EXTENSIONS)}"
+)
+_INTRINSICS_FILE_RE = re.compile(
+    f"{FILENAME_CHARACTER_CLASS}+?({or_regex(IMAGE_EXTENSIONS)})"
+)
+
+
 @dataclass(frozen=True, slots=True, kw_only=True)
 class CameraFilesSingle:
     """Keep track of camera name and paths to extrinsics calibration video & intrinsics calibration images"""
@@ -137,19 +159,26 @@ def get_calibration_paths(
     return calibration_paths_data
 
 
+def _find_calibration_subdir(project_dir, name_re: re.Pattern) -> str:
+    """Find $project_dir(?:/calibration)?/$name_re, preferring the shallower folder"""
+    index = get_directory_index(project_dir)
+    for depth in (1, 2):
+        for parts, full_path in index.iter_dirs(depth):
+            if name_re.fullmatch(parts[-1]) and (
+                depth == 1 or _CALIBRATION_DIR_RE.fullmatch(parts[0])
+            ):
+                return full_path
+    raise Exception(
+        f"Unable to find folder matching (?:calibration/)?{name_re.pattern} in {project_dir}"
+    )
+
+
 def get_extrinsics_dir(project_dir):
     """
     Possible paths for extrinsics folder:
         (?:/calibration)?/[Ee]xtrisics?
     """
-    # strip trailing slashes if present
-    project_dir = os.path.normpath(project_dir)
-    all_files = list(iglob(os.path.join(project_dir, "**", "*"), recursive=True))
-    all_dirs = [x for x in all_files if os.path.isdir(x)]
-    search_re = f"{re.escape(project_dir)}(?:{SEP}[Cc]alibration)?{SEP}[Ee]xtrinsics?"
-    r = re.compile(search_re)
-    matching_paths = list(filter(r.fullmatch, all_dirs))
-    return matching_paths[0]
+    return _find_calibration_subdir(project_dir, _EXTRINSICS_DIR_RE)
 
 
 def get_intrinsics_dir(project_dir):
@@ -157,14 +186,7 @@ def get_intrinsics_dir(project_dir):
     Possible paths for intrinsics folder:
         (?:/calibration)?/[Ii]ntrinsics?
     """
-    # strip trailing slashes if present
-    project_dir = os.path.normpath(project_dir)
-    all_files = list(iglob(os.path.join(project_dir, "**", "*"), recursive=True))
-    all_dirs = [x for x in all_files if os.path.isdir(x)]
-    search_re = f"{re.escape(project_dir)}(?:{SEP}[Cc]alibration)?{SEP}[Ii]ntrinsics?"
-    r = re.compile(search_re)
-    matching_paths = list(filter(r.fullmatch, all_dirs))
-    return matching_paths[0]
+    return _find_calibration_subdir(project_dir, _INTRINSICS_DIR_RE)
 
 
 # E.g. extrinsics_dir='/Users/caxon/olveczky/dannce_data/setupCal11_010324/extrinsic'
@@ -173,20 +195,13 @@ def get_camera_names(extrinsics_dir) -> list[str]:
     Search the extrinsic folder for camera patterns and return the file names.
     Look for files with the format: /[Cc]amera/.+\\.mp4, and extract the camera names.
     """
-    # strip trailing slashes if present
-    extrinsics_dir = os.path.normpath(extrinsics_dir)
-    all_files = list(iglob(os.path.join(extrinsics_dir, "**", "*"), recursive=True))
-    # all_dirs = [a for a in all_files if os.path.isdir(a)]
-    extensions_regex = or_regex(EXTRINSICS_EXTENSIONS)
-
-    search_re = (
-        f"{re.escape(extrinsics_dir)}{SEP}([Cc]amera.+?){SEP}.+?(?:{extensions_regex})"
-    )
-    r = re.compile(search_re)
-    matching_paths = filter(None, map(lambda x: r.fullmatch(x), all_files))
-    camera_names = map(lambda x: x.groups(1)[0], matching_paths)
-    camera_names_unique = sorted(set(camera_names))
-    return camera_names_unique
+    index = get_directory_index(extrinsics_dir)
+    camera_names = {
+        camera_name
+        for (camera_name, file_name), _full_path in index.iter_files(2)
+        if _CAMERA_DIR_RE.fullmatch(camera_name) and _CAMERA_MEDIA_RE.fullmatch(file_name)
+    }
+    return sorted(camera_names)
 
 
 def get_extrinsics_media_paths(
@@ -211,56 +226,39 @@ def get_extrinsics_media_paths(
         "full_path": str
     }]
     ```
-    Note: return list is sorted by camera name alphabetically
+    Note: return list is sorted by camera name alphabetically (then by file name).
+    If a camera folder has several matching files, ret_dict uses the first one.
     """
-    extrinsics_dir = os.path.normpath(extrinsics_dir)
-    # Note: don't recurse - assume first-level files
-    all_files = list(iglob(os.path.join(extrinsics_dir, "**", "*"), recursive=True))
-    # create regex to match any camera folder name
-    camera_names_regex = or_regex(camera_names)
-    extensions_regex = or_regex(EXTRINSICS_EXTENSIONS)
+    index = get_directory_index(extrinsics_dir)
+    camera_names = set(camera_names)
+    camera_files = [
+        {"full_path": full_path, "camera_name": camera_name, "file_name": file_name}
+        for (camera_name, file_name), full_path in index.iter_files(2)
+        if camera_name in camera_names
+    ]
 
     # FIRST: look for `0.ext` file
-    search_re_1 = f"{re.escape(extrinsics_dir)}{SEP}({camera_names_regex}){SEP}(0{extensions_regex})"
-    r_1 = re.compile(search_re_1)
-    matching_paths_1 = list(filter(None, map(lambda x: r_1.fullmatch(x), all_files)))
-
-    if matching_paths_1:
-        matches = matching_paths_1
-    else:
+    matches = [
+        x for x in camera_files if _EXTRINSICS_FIRST_FILE_RE.fullmatch(x["file_name"])
+    ]
+    if not matches:
         # OTHERWISE: look for `*.ext` file
-        search_re_2 = f"{re.escape(extrinsics_dir)}{SEP}{camera_names_regex}{SEP}{FILENAME_CHARACTER_CLASS}+?{extensions_regex}"
-        r_2 = re.compile(search_re_2)
-        matching_paths_2 = list(
-            filter(None, map(lambda x: r_2.fullmatch(x), all_files))
-        )
-        matches = matching_paths_2
+        matches = [
+            x for x in camera_files if _EXTRINSICS_FILE_RE.fullmatch(x["file_name"])
+        ]
 
     if not matches:
         logging.warning("Unable to find extrinsic media files paths")
         return []
 
-    matches = list(
-        map(
-            lambda x: {
-                "full_path": x.group(0),
-                "camera_name": x.group(1),
-                "file_name": x.group(2),
-            },
-            matches,
-        )
-    )
-
     if ret_dict:
         # optionally return a key/value dict where key=camname, value=extrinsics_path
         d = {}
         for i in matches:
-            extrinsics_file = i["full_path"]
-            camera_name = i["camera_name"]
-            d[camera_name] = extrinsics_file
+            d.setdefault(i["camera_name"], i["full_path"])
         return d
 
-    matches.sort(key=lambda x: x["camera_name"])
+    # (index order is already sorted by camera name, then file name)
     return matches
 
 
@@ -288,43 +286,33 @@ def get_intrinsics_image_paths(
     ```
     NOTE: return list is sorted alphabetically by camera_name
     """
-
-    intrinsics_dir = os.path.normpath(intrinsics_dir)
-    all_files = list(iglob(os.path.join(intrinsics_dir, "**", "*"), recursive=True))
-    # create regex to match any camera folder name
-
-    extensions_regex = or_regex(IMAGE_EXTENSIONS)
-    camera_names_regex = or_regex(camera_names)
-
-    search_re_1 = f"{re.escape(intrinsics_dir)}{SEP}({camera_names_regex}){SEP}({FILENAME_CHARACTER_CLASS}+?({extensions_regex}))"
-    r_1 = re.compile(search_re_1)
-    matching_paths_1 = list(filter(None, map(lambda x: r_1.fullmatch(x), all_files)))
-
-    if matching_paths_1:
-        matches = matching_paths_1
-    else:
-        search_re_2 = f"{re.escape(intrinsics_dir)}{SEP}({FILENAME_CHARACTER_CLASS}+){SEP}({FILENAME_CHARACTER_CLASS}+?({extensions_regex}))"
-        r_2 = re.compile(search_re_2)
-        matching_paths_2 = list(
-            filter(None, map(lambda x: r_2.fullmatch(x), all_files))
-        )
-        matches = matching_paths_2
+    index = get_directory_index(intrinsics_dir)
+    camera_names = set(camera_names)
+
+    def find_matches(dir_filter):
+        matches = []
+        for (camera_name, file_name), full_path in index.iter_files(2):
+            if not dir_filter(camera_name):
+                continue
+            m = _INTRINSICS_FILE_RE.fullmatch(file_name)
+            if m:
+                matches.append(
+                    {
+                        "full_path": full_path,
+                        "camera_name": camera_name,
+                        "file_name": file_name,
+                        "file_extension": m.group(1),
+                    }
+                )
+        return matches
+
+    matches = find_matches(lambda name: name in camera_names)
+    if not matches:
+        matches = find_matches(_ANY_DIR_RE.fullmatch)
 
     if not matches:
         raise Exception("Unable to find intrinsics image files paths")
 
-    matches = list(
-        map(
-            lambda x: {
-                "full_path": x.group(0),
-                "camera_name": x.group(1),
-                "file_name": x.group(2),
-                "file_extension": x.group(3),
-            },
-            matches,
-        )
-    )
-
     # make sure all image files found are the same extension
     unique_extensions = set(map(lambda x: x["file_extension"], matches))
     if len(unique_extensions) > 1:
@@ -332,14 +320,10 @@ def get_intrinsics_image_paths(
             f"Multiple image extensions found in intrinsics folder: {list(unique_extensions)}"
         )
 
-    # group matches by camera name using the following reducer function
-    def group_matches(acc_dict, cur_item):
-        if cur_item["camera_name"] not in acc_dict:
-            acc_dict[cur_item["camera_name"]] = []
-        acc_dict[cur_item["camera_name"]].append(cur_item["full_path"])
-        return acc_dict
-
-    matches_dict = reduce(group_matches, matches, {})
+    # group matches by camera name (index order: sorted by camera, then file name)
+    matches_dict = {}
+    for match in matches:
+        matches_dict.setdefault(match["camera_name"], []).append(match["full_path"])
     if ret_dict:
         return matches_dict
 
@@ -355,6 +339,44 @@ def get_intrinsics_image_paths(
     return matches_grouped
 
 
+def get_intrinsics_video_paths(
+    intrinsics_dir, camera_names, ret_dict=False
+) -> list[dict]:
+    """
+    Get file paths of intrinsics calibration videos (one per camera), for calibrating
+    intrinsics directly from video instead of exported images.
+    Looks for: $intrinsics_dir/$CAMERA_NAME/*($VIDEO_EXTENSION_REGEX)
+    If a camera folder contains several videos, the first alphabetically is used.
+
+    If ret_dict is true, return a dict where the key is "camera_name" and the value is the video path [str].
+
+    Return format:
+    ```
+    list[{
+        "camera_name": str,
+        "full_path": str
+    }]
+    ```
+    NOTE: return list is sorted alphabetically by camera_name
+    """
+    intrinsics_dir = os.path.normpath(intrinsics_dir)
+    matches = []
+    for camera_name in sorted(camera_names):
+        camera_dir = Path(intrinsics_dir, camera_name)
+        videos = sorted(
+            f
+            for f in camera_dir.glob("*")
+            if f.suffix.lower() in VIDEO_EXTENSIONS and not f.name.startswith(".")
+        )
+        if not videos:
+            raise Exception(f"Unable to find intrinsics video in folder: {camera_dir}")
+        matches.append({"camera_name": camera_name, "full_path": str(videos[0])})
+
+    if ret_dict:
+        return {x["camera_name"]: x["full_path"] for x in matches}
+    return matches
+
+
 def get_hires_files(hires_file_dir: str, n_cameras: int) -> list[IntrinsicsParams]:
     """Load intrinsics specified by a directory containing hires_camX_params.mat files.
     Useful for re-calculating extrinsics with existing intrinsics"""
@@ -380,6 +402,7 @@ def write_calibration_params(
     output_dir: str,
     disable_label3d_format: bool = False,
     include_calibration_json: bool = True,
+    include_calibration_store: bool = True,
 ) -> None:
     """Each calibration file contains the following information in a matlab struct:
     - K [3x3 double] (camera intrinsic transformation matrix)
@@ -388,10 +411,15 @@ def write_calibration_params(
     - r [3x3 double] (camera pose position)
     - t [1x3 double] (camera pose translation
 
+    Unless include_calibration_store is False, all cameras are also written to a single
+    binary store file (see caldannce.calibration_store), which is faster to load. The
+    store is only written with the Label3D format (which the hires file loaders expect).
+
     ARGS:
     disable_label3d_format [default=False]: if true, DO NOT convert the intrinsics matrix to matlab format, and transpose the intrinsics matrix (K) for compatibility with Label3D
     """
     os.makedirs(output_dir, exist_ok=True)
+    hires_files = []
 
     for idx, camera_param in enumerate(calibration_data.camera_params):
         camera_name = f"cam{idx+1}"
@@ -424,9 +452,22 @@ def write_calibration_params(
             file_name=filename,
             mdict=mdict,
         )
+        hires_files.append(filename)
 
         logging.info(f"Saved to: {filename}")
 
+    store_path = Path(output_dir, STORE_FILE_NAME)
+    if include_calibration_store and not disable_label3d_format:
+        write_calibration_store(
+            store_path,
+            calibration_data.camera_params,
+            camera_names=calibration_data.camera_names,
+            metadata={"hires_files": hires_files_metadata(hires_files)},
+        )
+    else:
+        # a store of a previous export would no longer match the hires files
+        store_path.unlink(missing_ok=True)
+
     if include_calibration_json:
         calibration_data.DEV_export_to_file(Path(output_dir, "calibration.json"))
 
@@ -507,6 +548,55 @@ def get_verification_files(base_dir, camera_names, ret_dict=False):
         return d
 
 
+def get_validation_sequences(base_dir, camera_names) -> dict[str, list[str]]:
+    """Return the synchronized validation media for each camera in a folder: e.g.
+    root-folder:
+        /Camera1
+            /0.png
+            /1.png
+            ...
+        ...
+        /Camera6
+            /0.png
+            /1.png
+            ...
+
+    Each camera folder holds either a sequence of frames (images) or a video. Returns a
+    dict where the key is the camera name and the value is the list of image paths
+    (sorted by frame number), or a single-entry list with the video path.
+    """
+    base_dir = Path(base_dir)
+    assert base_dir.is_dir(), "base path must be a directory"
+
+    def frame_sort_key(path: Path):
+        # numeric file names sort by value (so 10.png comes after 9.png)
+        return (0, int(path.stem), "") if path.stem.isdigit() else (1, 0, path.stem)
+
+    sequences = {}
+    for camera_name in sorted(camera_names):
+        camera_dir = Path(base_dir, camera_name)
+        files = [
+            f
+            for f in camera_dir.iterdir()
+            if f.is_file() and not f.name.startswith(".")
+        ]
+        images = sorted(
+            (f for f in files if f.suffix.lower() in IMAGE_EXTENSIONS + [".bmp"]),
+            key=frame_sort_key,
+        )
+        videos = sorted(f for f in files if f.suffix.lower() in VIDEO_EXTENSIONS)
+
+        if images:
+            sequences[camera_name] = [str(f) for f in images]
+        elif videos:
+            sequences[camera_name] = [str(videos[0])]
+        else:
+            raise Exception(
+                f"Camera folder does not contain valid image or video files for validation: {camera_dir}"
+            )
+    return sequences
+
+
 @dataclass
 class HiresFileData:
     path: Path
@@ -10,17 +10,35 @@ class CalibrationReport:
     calibration_time_seconds: int = 0
     extrinsics_rpes: list[float] = []
     intrinsics_rpes: list[float] = []
+    intrinsics_view_coverage: list[dict] = []
     calibration_data: "calibration_data.CalibrationData" = None
 
     """Dict for intrinsics images where chessboard pattern was not found. key is camera index (number); value is list of paths"""
 
     def __init__(self, n_cameras):
         self.intrinsics_no_pattern_list = [[] for _ in range(n_cameras)]
+        # per-instance lists so reports from worker processes pickle their contents
+        self.extrinsics_rpes = []
+        self.intrinsics_rpes = []
+        self.intrinsics_view_coverage = []
 
     def add_no_pattern_detected(self, camera_idx: int, image_path: str):
         """Record that no pattern was detected for a camera index"""
         self.intrinsics_no_pattern_list[camera_idx].append(image_path)
 
+    def merge_camera(self, camera_idx: int, fragment: "CalibrationReport"):
+        """Merge the entries of a single-camera report fragment (e.g. one produced in a
+        worker process) into this report. Call in camera order to keep RPE lists ordered
+        """
+        self.intrinsics_no_pattern_list[camera_idx] = list(
+            fragment.intrinsics_no_pattern_list[camera_idx]
+        )
+        self.intrinsics_rpes.extend(fragment.intrinsics_rpes)
+        self.extrinsics_rpes.extend(fragment.extrinsics_rpes)
+        self.intrinsics_view_coverage.extend(fragment.intrinsics_view_coverage)
+        self.total_intrinsics_images += fragment.total_intrinsics_images
+        self.successful_intrinsics_images += fragment.successful_intrinsics_images
+
     def make_summary(self):
         avg_extrinsics_rpe = sum(self.extrinsics_rpes) / len(self.extrinsics_rpes)
         if not self.intrinsics_rpes.values()[0]:
@@ -0,0 +1,338 @@
+"""Validate a calibration by triangulating chessboard corners seen by all cameras.
+
+Boards are detected in a sequence of synchronized validation frames per camera (a folder
+of frames or a video), all corners of all frames are triangulated in one vectorized pass,
+and the reprojection error (RPE) is reported per camera and per frame.
+
+Usage (headless):
+```
+python -m caldannce.validation -k ./calibration_export -v ./validation -r 6 -c 9
+```
+"""
+
+import argparse
+import json
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from caldannce.calibration_data import CameraParams
+from caldannce.chessboard_detection import detect_chessboards
+from caldannce.logger import init_logger
+from caldannce.math_utils import triangulate_batch
+from caldannce.project_utils import get_validation_sequences
+from caldannce.video_utils import iter_images_gray, iter_video_frames_gray
+
+DEFAULT_MAX_FRAMES = 100
+"""Default max. no. of (sampled) validation frames per camera"""
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ChessboardValidationResult:
+    """Reprojection errors from triangulating validation chessboards"""
+
+    camera_names: list[str]
+    frame_idxs: list[int]
+    """Frame index (into each camera's validation sequence) of each result column"""
+    rpes: np.ndarray
+    """Mean RPE (px) per camera and frame, shape (n_cameras, n_frames). NaN where the
+    board was not detected by that camera, or by fewer than 2 cameras"""
+    world_points: np.ndarray
+    """Triangulated corners, shape (n_frames, rows * cols, 3). NaN where fewer than 2
+    cameras detected the board"""
+    time_seconds: float
+
+    def camera_stats(self) -> list[dict]:
+        """Distribution of the per-frame RPE for each camera"""
+        stats = []
+        for cam_idx, camera_name in enumerate(self.camera_names):
+            rpes = self.rpes[cam_idx]
+            rpes = rpes[~np.isnan(rpes)]
+            stats.append(
+                {
+                    "camera_name": camera_name,
+                    "n_frames": len(rpes),
+                    "mean": float(np.mean(rpes)) if len(rpes) else None,
+                    "median": float(np.median(rpes)) if len(rpes) else None,
+                    "p95": float(np.percentile(rpes, 95)) if len(rpes) else None,
+                    "max": float(np.max(rpes)) if len(rpes) else None,
+                }
+            )
+        return stats
+
+    def frame_rpes(self) -> np.ndarray:
+        """Mean RPE (px) over all cameras for each frame, shape (n_frames,)"""
+        with np.errstate(invalid="ignore"):
+            return np.nanmean(self.rpes, axis=0)
+
+    def as_dict(self):
+        return {
+            "camera_names": self.camera_names,
+            "frame_idxs": self.frame_idxs,
+            "rpes": np.where(np.isnan(self.rpes), None, self.rpes).tolist(),
+            "camera_stats": self.camera_stats(),
+            "time_seconds": self.time_seconds,
+        }
+
+    def make_summary(self) -> str:
+        stats = self.camera_stats()
+
+        def fmt(x):
+            return "N/A" if x is None else f"{x:.3f}"
+
+        summary_string = f"Validated {len(self.frame_idxs)} frames in {self.time_seconds:.2f} seconds\n"
+        summary_string += f"RPE per camera (px): {', '.join(fmt(s['mean']) for s in stats)}\n"
+        summary_string += f"Median RPE per camera (px): {', '.join(fmt(s['median']) for s in stats)}\n"
+        summary_string += f"95th percentile RPE per camera (px): {', '.join(fmt(s['p95']) for s in stats)}\n"
+        summary_string += f"Frames used per camera: {', '.join(str(s['n_frames']) for s in stats)}\n"
+        return summary_string
+
+
+def iter_validation_frames(media_paths: list[str], frame_step: int = 1):
+    """Yield (frame_idx, gray) for every frame_step-th frame of a validation sequence
+    (a list of image paths, or a single video)"""
+    if len(media_paths) == 1 and Path(media_paths[0]).suffix.lower() == ".mp4":
+        yield from iter_video_frames_gray(media_paths[0], frame_step=frame_step)
+    else:
+        image_paths = media_paths[::frame_step]
+        frame_idxs = range(0, len(media_paths), frame_step)
+        yield from zip(frame_idxs, iter_images_gray(image_paths))
+
+
+def detect_validation_boards(
+    media_paths: list[str],
+    rows: int,
+    cols: int,
+    frame_step: int = 1,
+    max_frames: int = DEFAULT_MAX_FRAMES,
+    n_threads: int = None,
+    fast_check: bool = True,
+) -> dict[int, np.ndarray]:
+    """Detect the chessboard in (at most max_frames) sampled frames of a validation
+    sequence. Returns {frame_idx: corners of shape (rows * cols, 2)}"""
+    frames = iter_validation_frames(media_paths, frame_step=frame_step)
+    frame_idxs = []
+
+    def sampled_frames():
+        for frame_idx, gray in frames:
+            if len(frame_idxs) >= max_frames:
+                return
+            frame_idxs.append(frame_idx)
+            yield gray
+
+    detections = {}
+    try:
+        for i, corners in enumerate(
+            detect_chessboards(
+                sampled_frames(), rows, cols, n_threads=n_threads, fast_check=fast_check
+            )
+        ):
+            if corners is not None:
+                detections[frame_idxs[i]] = corners.reshape(-1, 2)
+    finally:
+        frames.close()
+    return detections
+
+
+def triangulation_rpes(
+    camera_params: list[CameraParams], raw_ipts: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Triangulate detected points of a rig and compute each camera's RPE.
+
+    raw_ipts are raw (distorted) detections of shape (n_cameras, n_frames, n_points, 2),
+    NaN where a camera did not detect the frame. The detections are undistorted, all
+    points are triangulated in a single batched DLT and reprojected (with lens
+    distortion) onto the raw detections.
+
+    Returns the mean RPE (px) per camera and frame, shape (n_cameras, n_frames), and the
+    world points, shape (n_frames * n_points, 3). Both are NaN where a camera did not
+    detect the frame, or fewer than 2 cameras did."""
+    n_cameras, n_frames, n_points, _ = raw_ipts.shape
+    raw_ipts = raw_ipts.astype(np.float64)
+
+    undistorted_ipts = np.full_like(raw_ipts, np.nan)
+    for cam_idx, p in enumerate(camera_params):
+        detected = ~np.isnan(raw_ipts[cam_idx, :, 0, 0])
+        if not detected.any():
+            continue
+        corners = raw_ipts[cam_idx, detected]
+        undistorted_ipts[cam_idx, detected] = cv2.undistortPoints(
+            corners.reshape(-1, 1, 2), p.camera_matrix, p.dist, P=p.camera_matrix
+        ).reshape(-1, n_points, 2)
+
+    # triangulate every point of every frame at once
+    visibility = ~np.isnan(undistorted_ipts[..., 0]).reshape(n_cameras, -1)
+    proj_mtx = np.stack([p.projection_matrix for p in camera_params])
+    world_points, _residuals = triangulate_batch(
+        undistorted_ipts.reshape(n_cameras, -1, 2), proj_mtx, visibility=visibility
+    )
+
+    reproj_ipts = CameraParams.project_points_multi(
+        camera_params, world_points, distort=True
+    ).reshape(n_cameras, n_frames, n_points, 2)
+    # NaN propagates for frames not detected by the camera (or by < 2 cameras)
+    rpes = np.mean(np.linalg.norm(raw_ipts - reproj_ipts, axis=-1), axis=-1)
+    return rpes, world_points
+
+
+def validate_chessboard(
+    camera_params: list[CameraParams],
+    camera_names: list[str],
+    media_paths: dict[str, list[str]],
+    rows: int,
+    cols: int,
+    frame_step: int = 1,
+    max_frames: int = DEFAULT_MAX_FRAMES,
+    n_threads: int = None,
+    fast_check: bool = True,
+) -> ChessboardValidationResult:
+    """Validate a calibration using synchronized chessboard frames.
+
+    media_paths maps each camera name to its validation sequence (see
+    get_validation_sequences). camera_params must be in the same order as camera_names.
+
+    Detected corners are undistorted and all corners of all frames are triangulated in a
+    single batched DLT; each camera's RPE is computed by reprojecting the triangulated
+    points (with lens distortion) onto the raw detections.
+    """
+    start = time.perf_counter()
+    n_cameras = len(camera_names)
+    n_points = rows * cols
+
+    detections = []
+    for camera_name in camera_names:
+        cam_detections = detect_validation_boards(
+            media_paths[camera_name],
+            rows,
+            cols,
+            frame_step=frame_step,
+            max_frames=max_frames,
+            n_threads=n_threads,
+            fast_check=fast_check,
+        )
+        logging.info(
+            f"Detected validation chessboard in {len(cam_detections)} frames (camera {camera_name})"
+        )
+        detections.append(cam_detections)
+
+    frame_idxs = sorted(set().union(*[d.keys() for d in detections]))
+    n_frames = len(frame_idxs)
+    frame_pos = {f: i for i, f in enumerate(frame_idxs)}
+
+    # raw (distorted) detections: (n_cameras, n_frames, n_points, 2)
+    raw_ipts = np.full((n_cameras, n_frames, n_points, 2), np.nan)
+    for cam_idx, cam_detections in enumerate(detections):
+        if not cam_detections:
+            continue
+        cam_frames = [frame_pos[f] for f in cam_detections.keys()]
+        raw_ipts[cam_idx, cam_frames] = np.stack(list(cam_detections.values()))
+
+    rpes, world_points = triangulation_rpes(camera_params, raw_ipts)
+
+    end = time.perf_counter()
+    logging.info(
+        f"Validated {n_frames} frames from {n_cameras} cameras in {(end-start)*1000:.2f} ms"
+    )
+
+    return ChessboardValidationResult(
+        camera_names=list(camera_names),
+        frame_idxs=frame_idxs,
+        rpes=rpes,
+        world_points=world_points.reshape(n_frames, n_points, 3),
+        time_seconds=end - start,
+    )
+
+
+def parse_and_validate():
+    parser = argparse.ArgumentParser(
+        description="Validate a calibration by triangulating chessboard corners seen by all cameras"
+    )
+    parser.add_argument(
+        "--calibration-dir",
+        "-k",
+        required=True,
+        help="Directory containing hires_cam#_params.mat files to validate",
+    )
+    parser.add_argument(
+        "--validation-dir",
+        "-v",
+        required=True,
+        help="Directory with one subfolder per camera, containing synchronized validation frames (images) or a video",
+    )
+    parser.add_argument(
+        "--rows",
+        "-r",
+        type=int,
+        required=True,
+        help="# of internal verticies in a row of the chessboard pattern. E.g. 6",
+    )
+    parser.add_argument(
+        "--cols",
+        "-c",
+        type=int,
+        required=True,
+        help="# of internal verticies in a column of the chessboard pattern. E.g. 9",
+    )
+    parser.add_argument(
+        "--frame-step",
+        type=int,
+        default=1,
+        help="Use every Nth validation frame. Default is 1 (every frame).",
+    )
+    parser.add_argument(
+        "--max-frames",
+        type=int,
+        default=DEFAULT_MAX_FRAMES,
+        help=f"Max. no. of validation frames used per camera. Default is {DEFAULT_MAX_FRAMES}.",
+    )
+    parser.add_argument(
+        "--detection-threads",
+        type=int,
+        default=None,
+        help="Number of threads used for chessboard corner detection. Default is one per CPU core.",
+    )
+    parser.add_argument(
+        "--output-json",
+        "-o",
+        default=None,
+        help="If provided, write per-camera and per-frame RPEs to this JSON file.",
+    )
+    parser.add_argument("--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    init_logger(log_level=logging.DEBUG if args.verbose else logging.INFO)
+
+    camera_params = CameraParams.load_list_from_hires_folder(args.calibration_dir)
+    camera_names = sorted(
+        f.name for f in Path(args.validation_dir).iterdir() if f.is_dir()
+    )
+    if len(camera_names) != len(camera_params):
+        raise Exception(
+            f"Found {len(camera_names)} camera folders in validation dir, but {len(camera_params)} calibration files"
+        )
+    media_paths = get_validation_sequences(args.validation_dir, camera_names)
+
+    result = validate_chessboard(
+        camera_params,
+        camera_names,
+        media_paths,
+        args.rows,
+        args.cols,
+        frame_step=args.frame_step,
+        max_frames=args.max_frames,
+        n_threads=args.detection_threads,
+    )
+    print(result.make_summary())
+
+    if args.output_json:
+        with open(args.output_json, "wt") as f:
+            json.dump(result.as_dict(), f, indent=2)
+        logging.info(f"Saved validation results to {args.output_json}")
+
+
+if __name__ == "__main__":
+    parse_and_validate()
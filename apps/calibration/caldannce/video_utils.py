@@ -1,14 +1,21 @@
 # custom utilities/wrappers for handling media files (e.g. video & image)
 
 import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 from enum import Enum
 
+from caldannce.instrumentation import span
+
 
 class ImageFormat(Enum):
     CV2_BGR = "cv2_bgr"
@@ -49,7 +56,8 @@ def get_video_stats(video_path: str) -> VideoFileStats:
 
 
 def load_image(image_path) -> np.ndarray:
-    this_img = cv2.imread(image_path)
+    with span("load_image", path=str(image_path)):
+        this_img = cv2.imread(image_path)
     return this_img
 
 
@@ -80,11 +88,110 @@ def load_images(image_paths, image_width=-1, image_height=-1) -> np.ndarray:
     return raw_images
 
 
+def load_image_gray(image_path) -> np.ndarray:
+    """Load an image from disk, decoding it straight to a single-channel grayscale image"""
+    with span("load_image", path=str(image_path)):
+        img = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise Exception(f"Unable to load image at path: {image_path}")
+    return img
+
+
+def iter_images_gray(
+    image_paths: list[str], prefetch: int = 4, n_threads: int = 2
+) -> Iterator[np.ndarray]:
+    """Lazily load a list of images as grayscale, yielding them one at a time in order.
+
+    Up to `prefetch` images are decoded ahead of the consumer by `n_threads` background
+    threads (cv2.imread releases the GIL), so disk reads overlap with processing of the
+    current frame while peak memory stays bounded by the prefetch window.
+    """
+    prefetch = max(prefetch, 1)
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        pending = deque()
+        paths = iter(image_paths)
+
+        for path in paths:
+            pending.append(pool.submit(load_image_gray, path))
+            if len(pending) >= prefetch:
+                break
+
+        while pending:
+            img = pending.popleft().result()
+            # keep the prefetch window full before handing the frame to the consumer
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append(pool.submit(load_image_gray, next_path))
+            yield img
+
+
+def iter_video_frames_gray(
+    video_path: str, frame_step: int = 1, queue_size: int = 8
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Read a video in a single forward pass (no seeking), yielding (frame_idx, gray)
+    for every frame_step-th frame.
+
+    Decoding runs on a background thread which stays at most queue_size frames ahead of
+    the consumer. Skipped frames are only grabbed (not retrieved/converted).
+    """
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    end_of_video = object()
+
+    def put(item):
+        # give up if the consumer has gone away (e.g. the generator was closed)
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode():
+        vcap = cv2.VideoCapture(video_path)
+        try:
+            if not vcap.isOpened():
+                raise Exception(f"Failed to read video at {video_path}")
+            frame_idx = 0
+            while vcap.grab():
+                if frame_idx % frame_step == 0:
+                    with span("decode_frame", frame_idx=frame_idx):
+                        success, frame = vcap.retrieve()
+                    if not success:
+                        break
+                    with span("color_conversion"):
+                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    if not put((frame_idx, gray)):
+                        return
+                frame_idx += 1
+            put(end_of_video)
+        except Exception as e:
+            put(e)
+        finally:
+            vcap.release()
+
+    decode_thread = threading.Thread(target=decode, daemon=True)
+    decode_thread.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is end_of_video:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        decode_thread.join()
+
+
 def get_first_frame_video(video_path: str):
     """Returns a cv2 image from the first frame of a video, specified by path"""
-    vcap = cv2.VideoCapture(video_path)
-    success, image = vcap.read()
-    vcap.release()
+    with span("decode_frame", path=str(video_path), frame_idx=0):
+        vcap = cv2.VideoCapture(video_path)
+        success, image = vcap.read()
+        vcap.release()
     if not success:
         raise Exception(f"Failed to read video at {video_path}")
     return image
@@ -103,7 +210,8 @@ def load_image_or_video(media_path: str, output_image_format=ImageFormat.RGB):
         )
     # possibly convert BGR to RGB
     if output_image_format == ImageFormat.RGB:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        with span("color_conversion"):
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
     return img
 
@@ -0,0 +1,150 @@
+# select a bounded, pose-diverse subset of chessboard views for cv2.calibrateCamera
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_MAX_VIEWS = 400
+"""Max. no. of chessboard views passed to cv2.calibrateCamera for a single camera"""
+
+COVERAGE_GRID_SIZE = 10
+"""Sensor coverage is measured on a COVERAGE_GRID_SIZE x COVERAGE_GRID_SIZE grid of cells"""
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ViewSelection:
+    """Result of selecting a subset of views"""
+
+    selected_idxs: list[int]
+    """Indices (into the list of detected views) of the selected views, ascending"""
+    n_views: int
+    """Total number of detected views before selection"""
+    coverage_selected: float
+    """Fraction of sensor grid cells containing a corner from a selected view"""
+    coverage_all: float
+    """Fraction of sensor grid cells containing a corner from any detected view"""
+
+    def as_dict(self):
+        return {
+            "n_selected": len(self.selected_idxs),
+            "n_views": self.n_views,
+            "coverage_selected": self.coverage_selected,
+            "coverage_all": self.coverage_all,
+        }
+
+
+def view_features(corners: np.ndarray, rows: int, cols: int, image_size) -> np.ndarray:
+    """Describe the pose of each chessboard view in image space.
+
+    corners must have shape (n_views, rows * cols, 2).
+    Returns an array of shape (n_views, 5): [center x, center y, scale, x tilt, y tilt]
+    where center and scale are relative to the image size, and the tilts are the
+    (absolute) log ratios of opposite board edge lengths (0 for a fronto-parallel board).
+    """
+    width, height = image_size
+    center = corners.mean(axis=1) / np.array([width, height])
+
+    top_left = corners[:, 0]
+    top_right = corners[:, cols - 1]
+    bottom_left = corners[:, (rows - 1) * cols]
+    bottom_right = corners[:, rows * cols - 1]
+
+    top = np.linalg.norm(top_right - top_left, axis=1)
+    bottom = np.linalg.norm(bottom_right - bottom_left, axis=1)
+    left = np.linalg.norm(bottom_left - top_left, axis=1)
+    right = np.linalg.norm(bottom_right - top_right, axis=1)
+
+    # board size relative to the image diagonal
+    scale = np.sqrt((top + bottom) * (left + right) / 4) / np.hypot(width, height)
+    tilt_x = np.abs(np.log(top / bottom))
+    tilt_y = np.abs(np.log(left / right))
+
+    return np.column_stack([center, scale, tilt_x, tilt_y])
+
+
+def coverage_cells(corners: np.ndarray, image_size) -> np.ndarray:
+    """Return a boolean array of shape (n_views, n_cells) marking the sensor grid cells
+    which contain at least one corner of each view"""
+    width, height = image_size
+    n_views = corners.shape[0]
+    g = COVERAGE_GRID_SIZE
+    cell_x = np.clip((corners[..., 0] / width * g).astype(int), 0, g - 1)
+    cell_y = np.clip((corners[..., 1] / height * g).astype(int), 0, g - 1)
+    cell_idx = cell_y * g + cell_x
+
+    cells = np.zeros((n_views, g * g), dtype=bool)
+    cells[np.arange(n_views)[:, None], cell_idx] = True
+    return cells
+
+
+def select_views(
+    imgpoints: list[np.ndarray],
+    rows: int,
+    cols: int,
+    image_size: tuple[int, int],
+    max_views: int = DEFAULT_MAX_VIEWS,
+) -> ViewSelection:
+    """Greedily select at most max_views pose-diverse chessboard views.
+
+    Each step picks the view which covers the most not-yet-covered sensor grid cells,
+    breaking ties (and, once the sensor is covered, choosing) by the largest distance in
+    pose-feature space (position, scale & tilt) to the views already selected. This
+    drops near-duplicate views of the same board pose first.
+
+    imgpoints is a list of detected corner arrays (each of shape (rows * cols, 1, 2)).
+    image_size is (width, height).
+    """
+    n_views = len(imgpoints)
+    if n_views == 0:
+        return ViewSelection(
+            selected_idxs=[], n_views=0, coverage_selected=0.0, coverage_all=0.0
+        )
+
+    corners = np.stack([np.asarray(x).reshape(-1, 2) for x in imgpoints])
+    cells = coverage_cells(corners, image_size)
+    n_cells = cells.shape[1]
+    coverage_all = float(cells.any(axis=0).sum() / n_cells)
+
+    if n_views <= max_views:
+        return ViewSelection(
+            selected_idxs=list(range(n_views)),
+            n_views=n_views,
+            coverage_selected=coverage_all,
+            coverage_all=coverage_all,
+        )
+
+    features = view_features(corners, rows, cols, image_size)
+
+    # start with the view covering the most cells
+    first = int(np.argmax(cells.sum(axis=1)))
+    selected = [first]
+    covered = cells[first].copy()
+    available = np.ones(n_views, dtype=bool)
+    available[first] = False
+    min_dist = np.linalg.norm(features - features[first], axis=1)
+
+    while len(selected) < max_views:
+        new_cells = (cells & ~covered).sum(axis=1)
+        # features are O(1), so covering a new cell always outweighs pose distance
+        score = new_cells * 10.0 + min_dist
+        score[~available] = -np.inf
+        idx = int(np.argmax(score))
+
+        selected.append(idx)
+        available[idx] = False
+        covered |= cells[idx]
+        min_dist = np.minimum(
+            min_dist, np.linalg.norm(features - features[idx], axis=1)
+        )
+
+    coverage_selected = covered.sum() / n_cells
+    logging.info(
+        f"Selected {len(selected)}/{n_views} views for calibration (sensor coverage: {coverage_selected:.1%}, all views: {coverage_all:.1%})"
+    )
+
+    return ViewSelection(
+        selected_idxs=sorted(selected),
+        n_views=n_views,
+        coverage_selected=float(coverage_selected),
+        coverage_all=float(coverage_all),
+    )
@@ -70,6 +70,7 @@ id INTEGER PRIMARY KEY NOT NULL,
     n_frames INTEGER DEFAULT 30000,
     duration_s FLOAT DEFAULT 1800,
     fps FLOAT DEFAULT 50,
+    import_progress JSON, -- per-file progress of the import
     created_at INTEGER DEFAULT (STRFTIME('%s', 'now'))
 );
 
@@ -127,7 +128,7 @@ CREATE TABLE global_state (
     id INTEGER PRIMARY KEY CHECK (id=0),
     last_update_jobs INTEGER DEFAULT 0,
     skeleton_file TEXT DEFAULT null,
-    migration_version INTEGER DEFAULT 2
+    migration_version INTEGER DEFAULT 3
 );
 
 -- Create singleton row entry in global_state for storing settings
@@ -2,6 +2,7 @@
 /prediction
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, HTTPException
 from pathlib import Path
 
@@ -12,7 +13,7 @@ from app.utils.dannce_mat_processing import (
     get_com_pred_data_3d,
     get_dannce_pred_data_3d,
 )
-from app.utils.video import get_one_frame
+from app.utils.frame_server import frame_server
 from app.core.config import settings
 from caldannce.calibration_data import CameraParams
 from app.base_logger import logger
@@ -80,30 +81,40 @@ WHERE t1.id=?
     n_joints = pred_3d.shape[1]
     n_frames = len(data.frames)
 
-    pred_3d_unrolled = pred_3d.reshape(n_joints * n_frames, 3)
-
-    im_cam1_unrolled = cam1_params.project_multiple_world_points(pred_3d_unrolled)
-    im_cam2_unrolled = cam2_params.project_multiple_world_points(pred_3d_unrolled)
-    im_cam1 = im_cam1_unrolled.reshape(n_frames, n_joints, 2)
-    im_cam2 = im_cam2_unrolled.reshape(n_frames, n_joints, 2)
+    # project into both cameras at once: (2, N_FRAMES, N_JOINTS, 2)
+    # frames are raw video, so apply each camera's lens distortion
+    im_cams = CameraParams.project_points_multi(
+        [cam1_params, cam2_params], pred_3d, distort=True
+    )
+    im_cam1 = im_cams[0]
+    im_cam2 = im_cams[1]
+
+    # decode the frames of both cameras concurrently. Frames are cached in the static tmp
+    # folder, so repeated previews don't decode them again
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(
+                frame_server.get_frame_files,
+                video_folder_id,
+                camera_name,
+                Path(video_folder_path, "videos", camera_name, "0.mp4"),
+                data.frames,
+            )
+            for camera_name in [data.camera_name_1, data.camera_name_2]
+        ]
+        try:
+            frame_files_1, frame_files_2 = [future.result() for future in futures]
+        except Exception as e:
+            raise HTTPException(400, f"Unable to extract frames from video {e}")
 
     for frame_idx, f in enumerate(data.frames):
-        # SLOW STEP TO EXTRACT SINGLE FRAME
-        frame_image_file_1 = get_one_frame(
-            Path(video_folder_path, "videos", data.camera_name_1, "0.mp4"), f
-        )
-        frame_image_file_2 = get_one_frame(
-            Path(video_folder_path, "videos", data.camera_name_2, "0.mp4"), f
-        )
         frame_info.append(
             {
                 "absolute_frameno": data.frames[frame_idx],
                 "frame_idx": frame_idx,
-                # "filename_cam1": frame_image_file_1,
-                "static_url_cam1": f"{settings.FRONTEND_STATIC_URL}/{frame_image_file_1}",
+                "static_url_cam1": f"{settings.FRONTEND_STATIC_URL}/{frame_files_1[f]}",
                 "pts_cam1": im_cam1[frame_idx, :, :].tolist(),
-                # "filename_cam2": frame_image_file_2,
-                "static_url_cam2": f"{settings.FRONTEND_STATIC_URL}/{frame_image_file_2}",
+                "static_url_cam2": f"{settings.FRONTEND_STATIC_URL}/{frame_files_2[f]}",
                 "pts_cam2": im_cam2[frame_idx, :, :].tolist(),
             }
         )
@@ -2,11 +2,11 @@
 /video_folder
 """
 
+import json
 from pathlib import Path
 import sqlite3
 from typing import Any
-from fastapi import APIRouter, HTTPException, Header, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.api.deps import SessionDep
 from app.core.db import (
     TABLE_GPU_JOB,
@@ -19,7 +19,8 @@ from app.models import  ImportVideoFoldersModel
 from app.utils.dannce_mat_processing import (
     get_labeled_data_in_dir,
 )
-from app.utils.video import get_one_frame
+from app.utils.file_streaming import file_range_response
+from app.utils.frame_server import IMAGE_FORMATS, frame_server, media_type
 
 from app.core.config import settings
 from app.base_logger import logger
@@ -107,7 +108,15 @@ def get_frame_route(
     id: int,
     frame_index: int,
     camera_name: str,
+    image_format: str = "jpeg",
 ) -> Any:
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            400, f"Unsupported image format: {image_format}. Must be one of {list(IMAGE_FORMATS)}"
+        )
+    if frame_index < 0:
+        raise HTTPException(400, "Frame index must be >= 0")
+
     row = conn.execute(
         f"SELECT * FROM {TABLE_VIDEO_FOLDER} WHERE ID=?", (id,)
     ).fetchone()
@@ -115,20 +124,20 @@ def get_frame_route(
         raise HTTPException(status_code=404)
 
     row = dict(row)
-    video_path = Path(row["path"], "videos", camera_name, "0.mp4")
+    video_path = Path(
+        settings.VIDEO_FOLDERS_FOLDER, row["path"], "videos", camera_name, "0.mp4"
+    )
     if not video_path.exists():
         raise HTTPException(404, "Video does not exist")
 
-    out_filename = make_resource_name(f"frame_{id}_{frame_index}_{camera_name}_", ".png")
-
     try:
-        get_one_frame(
-            video_path=video_path, frame_index=frame_index, output_name=out_filename
+        data = frame_server.get_frame(
+            id, camera_name, video_path, frame_index, image_format=image_format
         )
     except Exception as e:
         raise HTTPException(400, f"Unable to extract frame from video {e}")
 
-    return FileResponse(out_filename, status_code=200)
+    return Response(content=data, status_code=200, media_type=media_type(image_format))
 
 
 @router.get("/{id}")
@@ -156,6 +165,7 @@ def get_video_folder_details(
             t1.fps AS fps,
             t1.created_at AS created_at,
             t1.status AS status,
+            t1.import_progress AS import_progress,
             t2.name AS current_com_prediction_name
         FROM {TABLE_VIDEO_FOLDER} t1
         LEFT JOIN {TABLE_PREDICTION} t2
@@ -186,6 +196,9 @@ def get_video_folder_details(
     return_dict["fps"] = row["fps"]
     return_dict["created_at"] = row["created_at"]
     return_dict["current_com_prediction_name"] = row["current_com_prediction_name"]
+    return_dict["import_progress"] = (
+        json.loads(row["import_progress"]) if row["import_progress"] else None
+    )
 
     # derived data
     return_dict["path_external"] = Path(
@@ -240,12 +253,9 @@ WHERE video_folder = ?
     return return_dict
 
 
-CHUNK_SIZE = 4 * 1024 * 1024
-
-
 @router.get("/{id}/stream")
-def stream_video_route(
-    conn: SessionDep, id: int, camera_name: str, range: str = Header(None)
+async def stream_video_route(
+    conn: SessionDep, request: Request, id: int, camera_name: str
 ) -> Any:
     logger.info(f"Video folder preview {id}")
     row = conn.execute(
@@ -265,19 +275,8 @@ def stream_video_route(
             status_code=404, detail="Cannot locate file on local machine"
         )
 
-    start, end = range.replace("bytes=", "").split("-")
-    start = int(start)
-    end = int(end) if end else start + CHUNK_SIZE
-
-    with open(video_path, "rb") as video:
-        video.seek(start)
-        data = video.read(end - start)
-        filesize = str(video_path.stat().st_size)
-        headers = {
-            "Content-Range": f"bytes {str(start)}-{str(end)}/{filesize}",
-            "Accept-Ranges": "bytes",
-        }
-        return Response(data, status_code=206, headers=headers, media_type="video/mp4")
+    # Range/If-Range/ETag handling, streamed asynchronously (see app.utils.file_streaming)
+    return file_range_response(video_path, request.headers, media_type="video/mp4")
 
 
 @router.delete("/{id}")
@@ -294,4 +293,7 @@ def delete_video_folder_route(
             "Message": "Delete dependent video predictions first",
         }
 
+    frame_server.cache.invalidate(id)
+    frame_server.decoders.close(id)
+
     return {"Result": "success"}
@@ -71,6 +71,15 @@ class _Settings(BaseSettings):
 
     STATIC_TMP_FOLDER: Path = Path(DATA_FOLDER, "static-tmp")
     """A folder to store temporary server resources E.g. generated images, etc."""
+    STATIC_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    """Max. total size of STATIC_TMP_FOLDER (least recently used files are deleted)"""
+    STATIC_CACHE_SWEEP_INTERVAL_S: int = 300
+
+    # in-process frame server (single frames of video folders, see app.utils.frame_server)
+    FRAME_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    """Max. total size of the encoded frames kept in memory"""
+    FRAME_DECODER_POOL_SIZE: int = 12
+    """Max. no. of videos kept open for decoding (e.g. 2 per previewed video folder)"""
 
     # name of slurm node the backend is running on
     NODE_NAME: str = ENV_SLURM_NODELIST
@@ -83,6 +92,13 @@ class _Settings(BaseSettings):
 
     REACT_APP_DIST_FOLDER: Path = ENV_REACT_APP_DIST_FOLDER
 
+    # video folder import (see app.utils.video_ingest)
+    VIDEO_IMPORT_PARALLELISM: int = 6
+    """Max. no. of video files copied/remuxed at the same time"""
+    VIDEO_IMPORT_VERIFY_CHECKSUM: bool = False
+    """Compare checksums of copied videos with their source (reads both again), in
+    addition to their sizes"""
+
     N_CAMERAS: int = 6
     SKELETON_FILE: Path = Path(RESOURCES_FOLDER, "skeleton.mat")
 
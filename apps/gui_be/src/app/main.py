@@ -11,6 +11,7 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.base_logger import logger
+from app.utils.frame_server import static_cache
 
 from jinja2 import BaseLoader, Environment
 import os
@@ -34,6 +35,17 @@ app.include_router(api_router, prefix="/v1")
 
 app.mount("/static", StaticFiles(directory=settings.STATIC_TMP_FOLDER), name="static")
 
+
+@app.on_event("startup")
+def start_static_cache_sweeper():
+    # keep the size of STATIC_TMP_FOLDER bounded
+    static_cache.start_sweeper(settings.STATIC_CACHE_SWEEP_INTERVAL_S)
+
+
+@app.on_event("shutdown")
+def stop_static_cache_sweeper():
+    static_cache.stop_sweeper()
+
 # Serve frontend unless disabled (e.g. for devleopment)
 if not os.environ.get("NO_SERVE_FE", False):
     logger.info("Mounting frontend")
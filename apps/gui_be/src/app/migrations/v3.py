@@ -0,0 +1,24 @@
+import sqlite3
+
+from app.core.db import TABLE_VIDEO_FOLDER
+from app.migrations.migration_util import Migration
+
+
+# per-file progress of video folder imports (see app.utils.video_ingest)
+def up(curr: sqlite3.Cursor):
+    curr.execute(
+        f"""
+ALTER TABLE {TABLE_VIDEO_FOLDER}
+ADD COLUMN import_progress JSON"""
+    )
+
+
+def down(curr: sqlite3.Cursor):
+    curr.execute(
+        f"""
+ALTER TABLE {TABLE_VIDEO_FOLDER}
+DROP COLUMN import_progress"""
+    )
+
+
+v3 = Migration("v3", up, None)
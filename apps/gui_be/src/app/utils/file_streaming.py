@@ -0,0 +1,181 @@
+"""Serve (parts of) files with HTTP range requests (RFC 7233), e.g. for video playback.
+
+Files are sent asynchronously in chunks, so a slow client doesn't hold a threadpool worker.
+With an ASGI server which supports the "http.response.zerocopy" extension the file is
+handed to the server instead (sendfile).
+"""
+
+from email.utils import formatdate, parsedate_to_datetime
+import os
+from pathlib import Path
+
+import anyio
+from fastapi import Response
+from starlette.types import Receive, Scope, Send
+
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(range_header: str, size: int) -> tuple[int, int] | None:
+    """Parse a Range header into an (inclusive) (start, end) byte range of a file of `size`
+    bytes. Returns None if the header must be ignored (not a byte range, malformed, or
+    multiple ranges, which aren't supported), and raises RangeNotSatisfiable if the range
+    starts after the end of the file"""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep:
+        return None
+    first = first.strip()
+    last = last.strip()
+    if not (first or last) or any(x and not x.isdigit() for x in [first, last]):
+        return None
+
+    if not first:
+        # suffix range: the last N bytes
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix_length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def make_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def if_range_matches(if_range: str, etag: str, stat: os.stat_result) -> bool:
+    """Whether the representation still matches an If-Range validator (strong ETag
+    comparison, or an exact Last-Modified date)"""
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(stat.st_mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def if_none_match_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison)"""
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class FileRangeResponse(Response):
+    """Send bytes [start, end] (inclusive) of a file"""
+
+    def __init__(
+        self,
+        path: str | Path,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: dict = None,
+        media_type: str = None,
+    ) -> None:
+        headers = {**(headers or {}), "Content-Length": str(max(0, end - start + 1))}
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        count = self.end - self.start + 1
+        if count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": f,
+                        "offset": self.start,
+                        "count": count,
+                    }
+                )
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            while count > 0:
+                chunk = await f.read(min(READ_CHUNK_SIZE, count))
+                if not chunk:
+                    # the file was truncated while sending
+                    break
+                count -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": count > 0,
+                    }
+                )
+        if count > 0:
+            await send({"type": "http.response.body", "body": b""})
+
+
+def file_range_response(
+    path: str | Path, request_headers, media_type: str = None
+) -> Response:
+    """Response to a GET of a file, honouring Range, If-Range and If-None-Match:
+    - 304 if If-None-Match matches the ETag
+    - 206 with the requested range (a single byte range: "a-b", "a-" or "-n")
+    - 416 if the range starts after the end of the file
+    - 200 with the whole file otherwise (no Range, If-Range doesn't match, or a range
+      which must be ignored)
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = make_etag(stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and if_none_match_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if range_header and (not if_range or if_range_matches(if_range, etag, stat)):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        return FileRangeResponse(
+            path, 0, size - 1, status_code=200, headers=headers, media_type=media_type
+        )
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(
+        path, start, end, status_code=206, headers=headers, media_type=media_type
+    )
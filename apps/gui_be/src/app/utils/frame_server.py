@@ -0,0 +1,392 @@
+"""Serve single video frames as encoded image bytes.
+
+Decoders (cv2.VideoCapture) are kept open per (video folder, camera) in a bounded pool,
+so consecutive requests for the same video don't reopen and re-probe the file. A decoder
+reads forward from its current position when the requested frame is a little ahead of
+it, and otherwise seeks (the ffmpeg backend seeks to the preceding keyframe and decodes
+up to the frame). Encoded frames are kept in an LRU cache keyed by (video folder,
+camera, frame index, image format) and bounded by their total size in bytes.
+
+Encoded frames are also written to the static tmp folder (served at /static) with names
+derived from the video file and the frame (see frame_file_name), which is bounded by a
+StaticFileCache. Frames evicted from memory, or decoded before a restart, are read back
+from there instead of decoded again.
+
+Both caches are checked before a decoder is taken from the pool, so cached frames never
+open a video. Frames cached in memory are dropped when their video file changes (path
+or modification time).
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import threading
+
+import cv2
+
+from app.base_logger import logger
+from app.core.config import settings
+from app.utils.static_cache import StaticFileCache, content_key
+
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg"),
+    "png": (".png", "image/png"),
+}
+"""Supported output formats: cv2 encoder extension, media type"""
+
+JPEG_QUALITY = 90
+
+MAX_FORWARD_DECODE_FRAMES = 60
+"""Decode forward (instead of seeking) if the requested frame is at most this many frames
+after the decoder's position"""
+
+MAX_DECODER_ATTEMPTS = 3
+"""Times a decode is retried with a new decoder when the one it got was closed meanwhile"""
+
+
+@dataclass(frozen=True, slots=True)
+class FrameKey:
+    video_folder_id: int
+    camera_name: str
+    frame_index: int
+    image_format: str
+
+
+class FrameCache:
+    """Thread-safe LRU cache of encoded frames, bounded by total size in bytes"""
+
+    max_bytes: int
+    size_bytes: int
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: OrderedDict[FrameKey, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: FrameKey) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: FrameKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= len(old)
+            self._entries[key] = data
+            self.size_bytes += len(data)
+            while self.size_bytes > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+    def invalidate(self, video_folder_id: int, camera_name: str = None):
+        """Drop all frames of a video folder (or of one of its cameras)"""
+        with self._lock:
+            for key in list(self._entries):
+                if key.video_folder_id == video_folder_id and (
+                    camera_name is None or key.camera_name == camera_name
+                ):
+                    self.size_bytes -= len(self._entries.pop(key))
+
+
+class VideoDecoder:
+    """An open video with its current position. Not thread-safe: hold self.lock"""
+
+    video_path: Path
+    mtime_ns: int
+    """Modification time of the video when opened (a changed file needs a new decoder)"""
+    position: int
+    """Index of the next frame read() returns"""
+    closed: bool
+    """Whether the decoder was closed (e.g. evicted from the pool while a request was
+    waiting for its lock)"""
+
+    def __init__(self, video_path: Path) -> None:
+        self.video_path = video_path
+        self.mtime_ns = video_path.stat().st_mtime_ns
+        self.lock = threading.Lock()
+        self._capture = cv2.VideoCapture(str(video_path))
+        if not self._capture.isOpened():
+            raise Exception(f"Unable to open video: {video_path}")
+        self.position = 0
+        self.closed = False
+
+    def read(self, frame_index: int):
+        """Decode a frame (BGR)"""
+        skip = frame_index - self.position
+        if not 0 <= skip <= MAX_FORWARD_DECODE_FRAMES:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            skip = 0
+        # grab() skips frames without converting them to BGR
+        for _ in range(skip):
+            if not self._capture.grab():
+                break
+        success, frame = self._capture.read()
+        if not success:
+            # the position is unknown after a failed read
+            self.position = -1
+            raise Exception(f"Unable to read frame {frame_index} of {self.video_path}")
+        self.position = frame_index + 1
+        return frame
+
+    def close(self):
+        self._capture.release()
+        self.closed = True
+
+
+class DecoderPool:
+    """Bounded pool of open decoders keyed by (video folder, camera). The least recently
+    used decoder is closed when the pool is full.
+
+    Videos are opened outside of the pool lock (opening probes the file, which may be
+    slow on network storage), so requests for other videos aren't blocked meanwhile.
+    Concurrent requests for a video being opened wait for it instead of opening it
+    again.
+    """
+
+    max_decoders: int
+
+    def __init__(self, max_decoders: int) -> None:
+        self.max_decoders = max_decoders
+        self._decoders: OrderedDict[tuple[int, str], VideoDecoder] = OrderedDict()
+        self._opening: dict[tuple[int, str], threading.Event] = {}
+        """Placeholders of the decoders being opened (set once opened, or failed)"""
+        self._lock = threading.Lock()
+
+    def get(
+        self, video_folder_id: int, camera_name: str, video_path: Path
+    ) -> VideoDecoder:
+        """Return the decoder for a video, opening it if needed (or if the video file
+        changed). The decoder may be closed by a concurrent get() before its lock is
+        acquired: check VideoDecoder.closed"""
+        key = (video_folder_id, camera_name)
+        mtime_ns = video_path.stat().st_mtime_ns
+        while True:
+            closed = []
+            with self._lock:
+                decoder = self._decoders.get(key)
+                if decoder is not None and (
+                    decoder.video_path != video_path or decoder.mtime_ns != mtime_ns
+                ):
+                    closed.append(self._decoders.pop(key))
+                    decoder = None
+                if decoder is not None:
+                    self._decoders.move_to_end(key)
+                    break
+                opening = self._opening.get(key)
+                if opening is None:
+                    opening = self._opening[key] = threading.Event()
+                    break
+            _close(closed)
+            # opened (or failed) by another request: look it up again
+            opening.wait()
+
+        if decoder is not None:
+            return decoder
+
+        try:
+            decoder = VideoDecoder(video_path)
+        except BaseException:
+            with self._lock:
+                del self._opening[key]
+            opening.set()
+            raise
+        with self._lock:
+            del self._opening[key]
+            self._decoders[key] = decoder
+            while len(self._decoders) > self.max_decoders:
+                _key, evicted = self._decoders.popitem(last=False)
+                closed.append(evicted)
+        opening.set()
+        _close(closed)
+        return decoder
+
+    def close(self, video_folder_id: int):
+        """Close the decoders of a video folder (e.g. once it was deleted)"""
+        with self._lock:
+            keys = [k for k in self._decoders if k[0] == video_folder_id]
+            decoders = [self._decoders.pop(k) for k in keys]
+        _close(decoders)
+
+    def close_all(self):
+        with self._lock:
+            decoders = list(self._decoders.values())
+            self._decoders.clear()
+        _close(decoders)
+
+
+def _close(decoders: list[VideoDecoder]):
+    # wait for in-flight reads before releasing a decoder
+    for d in decoders:
+        with d.lock:
+            d.close()
+
+
+def frame_file_name(
+    video_path: Path, frame_index: int, image_format: str, stat: os.stat_result = None
+) -> str:
+    """Deterministic file name of a frame, which changes if the video file changes (stat:
+    of the video file, if already known)"""
+    stat = stat or video_path.stat()
+    key = content_key(
+        video_path.resolve(), stat.st_size, stat.st_mtime_ns, frame_index, image_format
+    )
+    extension, _media_type = IMAGE_FORMATS[image_format]
+    return f"frame_{key}{extension}"
+
+
+class FrameServer:
+    """Decode, encode and cache single frames of the videos of video folders"""
+
+    cache: FrameCache
+    decoders: DecoderPool
+    files: StaticFileCache | None
+    """On-disk cache of encoded frames (None: frames are only cached in memory)"""
+
+    def __init__(
+        self, max_cache_bytes: int, max_decoders: int, files: StaticFileCache = None
+    ) -> None:
+        self.cache = FrameCache(max_cache_bytes)
+        self.decoders = DecoderPool(max_decoders)
+        self.files = files
+        self._videos: dict[tuple[int, str], tuple[Path, int]] = {}
+        """(video path, mtime) of each (video folder, camera) whose frames are cached"""
+        self._videos_lock = threading.Lock()
+
+    def get_frame(
+        self,
+        video_folder_id: int,
+        camera_name: str,
+        video_path: str | Path,
+        frame_index: int,
+        image_format: str = "jpeg",
+    ) -> bytes:
+        """Encoded image bytes of a frame (see IMAGE_FORMATS)"""
+        if image_format not in IMAGE_FORMATS:
+            raise Exception(
+                f"Unsupported image format: {image_format}. Must be one of {list(IMAGE_FORMATS)}"
+            )
+        video_path = Path(video_path)
+        stat = video_path.stat()
+        self._check_video(video_folder_id, camera_name, video_path, stat.st_mtime_ns)
+
+        key = FrameKey(video_folder_id, camera_name, frame_index, image_format)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        file_name = None
+        if self.files is not None:
+            file_name = frame_file_name(video_path, frame_index, image_format, stat)
+            path = self.files.get(file_name)
+            if path is not None:
+                try:
+                    data = path.read_bytes()
+                except FileNotFoundError:
+                    # deleted by the sweeper in the meantime
+                    data = None
+                if data is not None:
+                    self.cache.put(key, data)
+                    return data
+
+        frame = self._decode(video_folder_id, camera_name, video_path, frame_index)
+        data = encode_frame(frame, image_format)
+        self.cache.put(key, data)
+        if file_name is not None:
+            self.files.put(file_name, data)
+        return data
+
+    def _check_video(
+        self, video_folder_id: int, camera_name: str, video_path: Path, mtime_ns: int
+    ):
+        """Drop the cached frames of a camera if its video file changed since they were
+        cached (frames on disk are keyed by the video's mtime, see frame_file_name)"""
+        video_key = (video_folder_id, camera_name)
+        version = (video_path, mtime_ns)
+        with self._videos_lock:
+            previous = self._videos.get(video_key)
+            self._videos[video_key] = version
+        if previous is not None and previous != version:
+            self.cache.invalidate(video_folder_id, camera_name)
+
+    def _decode(
+        self, video_folder_id: int, camera_name: str, video_path: Path, frame_index: int
+    ):
+        for _ in range(MAX_DECODER_ATTEMPTS):
+            decoder = self.decoders.get(video_folder_id, camera_name, video_path)
+            with decoder.lock:
+                # evicted (and closed) while waiting for the lock: get a new decoder
+                if not decoder.closed:
+                    return decoder.read(frame_index)
+        raise Exception(f"Unable to get an open decoder for {video_path}")
+
+    def get_frame_file(
+        self,
+        video_folder_id: int,
+        camera_name: str,
+        video_path: str | Path,
+        frame_index: int,
+        image_format: str = "jpeg",
+    ) -> str:
+        """Name of the file of a frame in the static tmp folder (decoding it if it isn't
+        cached). Requires a FrameServer with files"""
+        if self.files is None:
+            raise Exception("Frame server has no static file cache")
+        video_path = Path(video_path)
+        data = self.get_frame(
+            video_folder_id, camera_name, video_path, frame_index, image_format
+        )
+        file_name = frame_file_name(video_path, frame_index, image_format)
+        # the frame may have come from memory after its file was swept
+        if self.files.get(file_name) is None:
+            self.files.put(file_name, data)
+        return file_name
+
+    def get_frame_files(
+        self,
+        video_folder_id: int,
+        camera_name: str,
+        video_path: str | Path,
+        frame_indexes: list[int],
+        image_format: str = "jpeg",
+    ) -> dict[int, str]:
+        """File names (see get_frame_file) of several frames of one video, decoded in
+        increasing frame order (so nearby frames are decoded forward instead of seeking)"""
+        return {
+            f: self.get_frame_file(
+                video_folder_id, camera_name, video_path, f, image_format
+            )
+            for f in sorted(set(frame_indexes))
+        }
+
+
+def encode_frame(frame, image_format: str) -> bytes:
+    extension, _media_type = IMAGE_FORMATS[image_format]
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if image_format == "jpeg" else []
+    success, buffer = cv2.imencode(extension, frame, params)
+    if not success:
+        raise Exception(f"Unable to encode frame as {image_format}")
+    return buffer.tobytes()
+
+
+def media_type(image_format: str) -> str:
+    return IMAGE_FORMATS[image_format][1]
+
+
+static_cache = StaticFileCache(
+    settings.STATIC_TMP_FOLDER, max_bytes=settings.STATIC_CACHE_MAX_BYTES
+)
+frame_server = FrameServer(
+    max_cache_bytes=settings.FRAME_CACHE_MAX_BYTES,
+    max_decoders=settings.FRAME_DECODER_POOL_SIZE,
+    files=static_cache,
+)
+logger.info(
+    f"Frame server: cache {settings.FRAME_CACHE_MAX_BYTES // 2**20} MB, {settings.FRAME_DECODER_POOL_SIZE} decoders, static cache {settings.STATIC_CACHE_MAX_BYTES // 2**20} MB"
+)
@@ -0,0 +1,224 @@
+"""Read the structure and video properties of MP4 (ISO-BMFF) files without ffmpeg.
+
+Only box headers and the few small boxes needed are read, seeking over everything else
+(e.g. the media data and the sample tables), so inspecting a file costs a handful of small
+reads whatever its size:
+```
+moov
+  mvhd                    movie timescale, duration
+  trak
+    tkhd                  display width, height
+    mdia
+      mdhd                media timescale, duration
+      hdlr                track type ("vide")
+      minf/stbl
+        stts              sample durations (frame rate)
+        stsz              no. of samples (frames)
+```
+Fragmented MP4s (samples in moof boxes) are not supported.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import struct
+from typing import BinaryIO, Iterator
+
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+MAX_STTS_ENTRIES = 4096
+"""Read at most this many stts entries (constant frame rate videos have one)"""
+
+
+@dataclass
+class Box:
+    type: bytes
+    offset: int
+    """Offset of the box (its header) in the file"""
+    size: int
+    """Size of the box, including its header"""
+    header_size: int
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def data_size(self) -> int:
+        return self.size - self.header_size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+@dataclass
+class Mp4Track:
+    handler_type: bytes = None
+    """e.g. b"vide", b"soun" """
+    width: float = None
+    height: float = None
+    timescale: int = None
+    duration: int = None
+    """In timescale units"""
+    n_samples: int = None
+    sample_deltas: list[tuple[int, int]] = field(default_factory=list)
+    """stts entries: (sample count, sample duration in timescale units)"""
+
+    @property
+    def duration_s(self) -> float | None:
+        """None if the track has no (valid) timescale or duration"""
+        if not self.timescale or self.duration is None:
+            return None
+        return self.duration / self.timescale
+
+    @property
+    def fps(self) -> float | None:
+        """None if the track has no (valid) timescale, or neither sample durations nor a
+        duration and sample count"""
+        if not self.timescale:
+            return None
+        if len(self.sample_deltas) == 1 and self.sample_deltas[0][1] > 0:
+            # constant frame rate
+            return self.timescale / self.sample_deltas[0][1]
+        if not self.duration or self.n_samples is None:
+            return None
+        return self.n_samples / self.duration_s
+
+
+@dataclass
+class Mp4Info:
+    top_level_boxes: list[Box]
+    timescale: int = None
+    duration: int = None
+    """In timescale units"""
+    tracks: list[Mp4Track] = field(default_factory=list)
+
+    def _top_level_index(self, box_type: bytes) -> int | None:
+        return next(
+            (i for i, b in enumerate(self.top_level_boxes) if b.type == box_type), None
+        )
+
+    @property
+    def is_faststart(self) -> bool:
+        """Whether moov (the metadata) comes before mdat (the media data), i.e. the video
+        can be played while it is downloaded"""
+        moov = self._top_level_index(b"moov")
+        mdat = self._top_level_index(b"mdat")
+        if moov is None or mdat is None:
+            raise Exception("Video file does not have the expected moov and mdat boxes")
+        return moov < mdat
+
+    @property
+    def duration_s(self) -> float | None:
+        """None if the file has no (valid) movie timescale or duration"""
+        if not self.timescale or self.duration is None:
+            return None
+        return self.duration / self.timescale
+
+    @property
+    def video_track(self) -> Mp4Track:
+        track = next((t for t in self.tracks if t.handler_type == b"vide"), None)
+        if track is None:
+            raise Exception("Video file has no video track")
+        return track
+
+
+def iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Box]:
+    """Headers of the boxes between start and end (seeking over their data)"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            # 64-bit size follows the type
+            largesize = f.read(8)
+            if len(largesize) < 8:
+                return
+            (size,) = struct.unpack(">Q", largesize)
+            header_size = 16
+        elif size == 0:
+            # box extends to the end of the file
+            size = end - offset
+        if size < header_size:
+            raise Exception(f"Invalid MP4 box size {size} at offset {offset}")
+        yield Box(box_type, offset, size, header_size)
+        offset += size
+
+
+def _read_box_data(f: BinaryIO, box: Box, max_size: int) -> bytes:
+    f.seek(box.data_offset)
+    return f.read(min(box.data_size, max_size))
+
+
+def _parse_mvhd(data: bytes) -> tuple[int, int]:
+    version = data[0]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, 12)
+    return timescale, duration
+
+
+def _parse_tkhd(data: bytes) -> tuple[float, float]:
+    # width and height are 16.16 fixed point, at the end of the box
+    version = data[0]
+    offset = 88 if version == 1 else 76
+    width, height = struct.unpack_from(">II", data, offset)
+    return width / 65536, height / 65536
+
+
+def _read_track(f: BinaryIO, trak: Box) -> Mp4Track:
+    track = Mp4Track()
+    stack = [trak]
+    while stack:
+        parent = stack.pop()
+        for box in iter_boxes(f, parent.data_offset, parent.end):
+            if box.type in CONTAINER_BOXES:
+                stack.append(box)
+            elif box.type == b"tkhd":
+                track.width, track.height = _parse_tkhd(_read_box_data(f, box, 96))
+            elif box.type == b"mdhd":
+                # same layout as mvhd up to the duration
+                track.timescale, track.duration = _parse_mvhd(
+                    _read_box_data(f, box, 32)
+                )
+            elif box.type == b"hdlr":
+                track.handler_type = _read_box_data(f, box, 12)[8:12]
+            elif box.type in (b"stsz", b"stz2"):
+                # version/flags, sample_size (stz2: field_size), sample_count
+                (track.n_samples,) = struct.unpack_from(
+                    ">I", _read_box_data(f, box, 12), 8
+                )
+            elif box.type == b"stts":
+                header = _read_box_data(f, box, 8)
+                (n_entries,) = struct.unpack_from(">I", header, 4)
+                n_entries = min(n_entries, MAX_STTS_ENTRIES)
+                f.seek(box.data_offset + 8)
+                entries = f.read(8 * n_entries)
+                track.sample_deltas = list(
+                    struct.iter_unpack(">II", entries[: len(entries) // 8 * 8])
+                )
+    return track
+
+
+def read_mp4_info(path: str | Path) -> Mp4Info:
+    """Top-level box order, movie duration and tracks of an MP4 file"""
+    path = Path(path)
+    if not path.exists():
+        raise Exception("Video file does not exist or is not mounted properly")
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        info = Mp4Info(top_level_boxes=list(iter_boxes(f, 0, file_size)))
+        moov = next((b for b in info.top_level_boxes if b.type == b"moov"), None)
+        if moov is None:
+            return info
+        for box in iter_boxes(f, moov.data_offset, moov.end):
+            if box.type == b"mvhd":
+                info.timescale, info.duration = _parse_mvhd(_read_box_data(f, box, 32))
+            elif box.type == b"trak":
+                info.tracks.append(_read_track(f, box))
+    return info
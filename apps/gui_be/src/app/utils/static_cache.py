@@ -0,0 +1,171 @@
+"""Size-bounded cache of generated files in settings.STATIC_TMP_FOLDER (served at /static).
+
+Files have deterministic names derived from what they were generated from (see
+content_key), so a repeated request finds the file of the previous one instead of
+generating a new one. A file's modification time is its last use: it is refreshed on
+every cache hit, and when the folder grows over its size cap the least recently used
+files are deleted. A background sweeper also enforces the cap periodically, and removes
+leftovers: interrupted writes, and files whose name isn't a content key name (e.g. the
+uniquely named frames of older server versions) once unused for LEGACY_MAX_AGE_S.
+
+Every file in the folder is managed by the cache: don't store anything there which must
+be kept.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import re
+import tempfile
+import threading
+import time
+
+from app.base_logger import logger
+
+TMP_SUFFIX = ".tmp"
+
+SWEEP_TARGET_FRACTION = 0.9
+"""A sweep deletes files until the folder is below this fraction of the size cap, so that
+it isn't swept again on the next write"""
+
+MIN_AGE_S = 60
+"""Files used more recently than this are never deleted: their URL may just have been sent
+to a client"""
+
+LEGACY_MAX_AGE_S = 24 * 60 * 60
+"""Files not named after a content key are deleted once unused for this long"""
+
+CONTENT_KEY_NAME = re.compile(r"[a-z]+_[0-9a-f]{32}\.[a-z0-9]+")
+"""Names of the files written through the cache: <prefix>_<content_key><extension>,
+e.g. frame_<key>.jpg"""
+
+
+def content_key(*parts) -> str:
+    """Deterministic key of the parts (str() of each)"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+class StaticFileCache:
+    """LRU cache of the files of a folder, bounded by their total size"""
+
+    folder: Path
+    max_bytes: int
+
+    def __init__(self, folder: str | Path, max_bytes: int) -> None:
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size_bytes = None
+        """Estimated total size of the folder (None: unknown until the first sweep)"""
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+
+    def get(self, name: str) -> Path | None:
+        """Path of a cached file (marking it as used), or None"""
+        path = Path(self.folder, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name: str, data: bytes) -> Path:
+        """Write a file (atomically: readers never see a partial file)"""
+        path = Path(self.folder, name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix=TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if self._size_bytes is not None:
+                self._size_bytes += len(data)
+            over_cap = self._size_bytes is None or self._size_bytes > self.max_bytes
+        if over_cap:
+            self.sweep()
+        return path
+
+    def sweep(self) -> tuple[int, int]:
+        """Delete the least recently used files until the folder is within its size cap,
+        stale temporary files and old files not named after a content key. Returns the
+        no. of files and bytes deleted"""
+        now = time.time()
+        entries = []
+        n_deleted = 0
+        bytes_deleted = 0
+        with self._lock:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    age = now - stat.st_mtime
+                    if (entry.name.endswith(TMP_SUFFIX) and age > MIN_AGE_S) or (
+                        not CONTENT_KEY_NAME.fullmatch(entry.name)
+                        and age > LEGACY_MAX_AGE_S
+                    ):
+                        # left over by an interrupted write, or not (or no longer)
+                        # requested under a deterministic name
+                        Path(entry.path).unlink(missing_ok=True)
+                        n_deleted += 1
+                        bytes_deleted += stat.st_size
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            size_bytes = sum(size for _mtime, size, _path in entries)
+            if size_bytes > self.max_bytes:
+                target = self.max_bytes * SWEEP_TARGET_FRACTION
+                # least recently used first
+                for mtime, size, path in sorted(entries):
+                    if size_bytes <= target or now - mtime < MIN_AGE_S:
+                        break
+                    Path(path).unlink(missing_ok=True)
+                    size_bytes -= size
+                    n_deleted += 1
+                    bytes_deleted += size
+            self._size_bytes = size_bytes
+
+        if n_deleted:
+            logger.info(
+                f"Static cache: deleted {n_deleted} files ({bytes_deleted / 2**20:.1f} MB), {size_bytes / 2**20:.1f} MB in {self.folder}"
+            )
+        return n_deleted, bytes_deleted
+
+    def start_sweeper(self, interval_s: float):
+        """Sweep now and then every interval_s seconds, in a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Static cache sweep failed: {e}")
+                if self._stop_sweeper.wait(interval_s):
+                    return
+
+        self._stop_sweeper.clear()
+        self._sweeper = threading.Thread(
+            target=run, name="static-cache-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        if self._sweeper is None:
+            return
+        self._stop_sweeper.set()
+        self._sweeper.join()
+        self._sweeper = None
@@ -0,0 +1,314 @@
+"""Copy (or remux) the video files of a video folder into the instance folder.
+
+Files are ingested concurrently (settings.VIDEO_IMPORT_PARALLELISM at a time). A plain copy
+is a reflink (copy-on-write clone: no data is copied) where the filesystem supports it,
+otherwise copy_file_range (in-kernel copy, server-side on NFS 4.2), otherwise a buffered
+copy. Every file is written next to its destination and renamed once verified, so a
+failed import never leaves a partial video behind.
+
+Progress of each file is published as JSON into the import_progress column of the
+video_folder row, e.g.:
+```
+{"Camera1": {"mode": "COPY", "status": "COPYING", "bytes_done": 1048576, "bytes_total": 4194304}, ...}
+```
+The column is cleared once all files were ingested. After a failure it keeps the status
+of every file: files not started yet when the first error occurred are CANCELLED.
+"""
+
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+import errno
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import subprocess
+import threading
+import time
+from typing import Callable, Literal
+
+from app.base_logger import logger
+from app.core.config import settings
+from app.core.db import TABLE_VIDEO_FOLDER, get_db_context
+from app.utils.video_processing import check_faststart_flag
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+"""Bytes per copy_file_range call (the granularity of progress updates)"""
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+PROGRESS_UPDATE_INTERVAL_S = 1.0
+"""Min. time between two writes of the progress to the database"""
+
+PART_SUFFIX = ".part"
+
+# from linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+IngestMode = Literal["COPY", "REMUX"]
+"""COPY: copy the file as is. REMUX: rewrite it with the moov atom first (faststart)"""
+
+
+@dataclass
+class IngestFile:
+    name: str
+    """Name shown in the progress (e.g. the camera name)"""
+    src: Path
+    dest: Path
+    mode: IngestMode
+
+
+@dataclass
+class FileProgress:
+    mode: IngestMode
+    status: Literal[
+        "PENDING", "COPYING", "VERIFYING", "DONE", "FAILED", "CANCELLED"
+    ] = "PENDING"
+    bytes_done: int = 0
+    bytes_total: int = 0
+    copy_method: str = None
+    """How the file was copied: reflink, copy_file_range, read_write or ffmpeg"""
+
+
+class IngestProgress:
+    """Thread-safe progress of all files of an import, written to the video_folder row.
+
+    Snapshots are taken under a lock but written outside of it (the database may be
+    slow); each has a version, and a snapshot older than the last one written is
+    skipped, so a slow writer never overwrites newer progress."""
+
+    def __init__(self, video_folder_id: int | None, files: list[IngestFile]) -> None:
+        self.video_folder_id = video_folder_id
+        self.files = {
+            f.name: FileProgress(mode=f.mode, bytes_total=f.src.stat().st_size)
+            for f in files
+        }
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._version = 0
+        self._write_lock = threading.Lock()
+        self._written_version = 0
+
+    def update(self, name: str, force: bool = False, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                setattr(self.files[name], key, value)
+            now = time.monotonic()
+            if not force and now - self._last_write < PROGRESS_UPDATE_INTERVAL_S:
+                return
+            self._last_write = now
+            self._version += 1
+            version = self._version
+            progress_json = self.as_json()
+        self._write(version, progress_json)
+
+    def clear(self):
+        """Remove the progress from the video_folder row (once the import finished)"""
+        with self._lock:
+            self._version += 1
+            version = self._version
+        self._write(version, None)
+
+    def as_json(self) -> str:
+        return json.dumps({name: asdict(p) for name, p in self.files.items()})
+
+    def _write(self, version: int, progress_json: str | None):
+        if self.video_folder_id is None:
+            return
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+            self._written_version = version
+            self._write_db(progress_json)
+
+    def _write_db(self, progress_json: str | None):
+        try:
+            with get_db_context() as conn:
+                conn.execute(
+                    f"UPDATE {TABLE_VIDEO_FOLDER} SET import_progress=? WHERE id=?",
+                    (progress_json, self.video_folder_id),
+                )
+                conn.commit()
+        except Exception as e:
+            # progress is informative only: never fail the import because of it
+            logger.warning(f"Unable to write import progress: {e}")
+
+
+def _try_reflink(src_fd: int, dest_fd: int) -> bool:
+    try:
+        fcntl.ioctl(dest_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        # e.g. EOPNOTSUPP (filesystem without reflinks) or EXDEV (different filesystems)
+        return False
+
+
+def copy_file(
+    src: Path, dest: Path, on_progress: Callable[[int], None] = None
+) -> str:
+    """Copy a file's data, using the fastest method the filesystems support. Calls
+    on_progress(bytes_done) while copying. Returns the method used"""
+    size = src.stat().st_size
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        src_fd = fsrc.fileno()
+        dest_fd = fdest.fileno()
+        if _try_reflink(src_fd, dest_fd):
+            if on_progress:
+                on_progress(size)
+            return "reflink"
+
+        done = 0
+        # copy_file_range is only available on Linux (and Python >= 3.8)
+        method = "copy_file_range" if hasattr(os, "copy_file_range") else "read_write"
+        while done < size:
+            n = 0
+            if method == "copy_file_range":
+                try:
+                    n = os.copy_file_range(src_fd, dest_fd, min(COPY_CHUNK_SIZE, size - done))
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                        raise
+                    # not supported between these filesystems: copy through user space
+                    method = "read_write"
+            if method == "read_write":
+                os.lseek(src_fd, done, os.SEEK_SET)
+                os.lseek(dest_fd, done, os.SEEK_SET)
+                chunk = os.read(src_fd, min(COPY_CHUNK_SIZE, size - done))
+                n = len(chunk)
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(dest_fd, view):]
+            if n == 0:
+                raise Exception(f"Source file shrank while copying: {src}")
+            done += n
+            if on_progress:
+                on_progress(done)
+        return method
+
+
+def file_checksum(path: Path) -> str:
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def remux_faststart(
+    src: Path, dest: Path, on_progress: Callable[[int], None] = None
+):
+    """Rewrite a video with the moov atom before the media data (no re-encoding). Calls
+    on_progress(bytes written so far)"""
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-y",
+            "-nostats",
+            "-progress",
+            "pipe:1",
+            "-i",
+            str(src),
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            "-abort_on",
+            "empty_output",
+            "-f",
+            "mp4",
+            str(dest),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    # drain stderr in the background so ffmpeg can't block on a full pipe
+    stderr_lines = []
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_lines.extend(process.stderr), daemon=True
+    )
+    stderr_reader.start()
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        if key == "total_size" and value.isdigit() and on_progress:
+            on_progress(int(value))
+    process.wait()
+    stderr_reader.join()
+    if process.returncode != 0:
+        logger.warning(f"Error processing: {''.join(stderr_lines[-20:])}")
+        raise Exception(f"Unable to process video file:{src}")
+
+
+def ingest_file(file: IngestFile, progress: IngestProgress, verify_checksum: bool):
+    part = file.dest.with_name(file.dest.name + PART_SUFFIX)
+    file.dest.parent.mkdir(mode=0o777, parents=True, exist_ok=True)
+    progress.update(file.name, force=True, status="COPYING")
+    try:
+        if file.mode == "COPY":
+            method = copy_file(
+                file.src, part, lambda n: progress.update(file.name, bytes_done=n)
+            )
+        else:
+            remux_faststart(
+                file.src, part, lambda n: progress.update(file.name, bytes_done=n)
+            )
+            method = "ffmpeg"
+
+        progress.update(file.name, force=True, status="VERIFYING", copy_method=method)
+        if file.mode == "COPY":
+            src_size = file.src.stat().st_size
+            dest_size = part.stat().st_size
+            if src_size != dest_size:
+                raise Exception(
+                    f"Copy of {file.src} has {dest_size} bytes instead of {src_size}"
+                )
+            if verify_checksum and file_checksum(file.src) != file_checksum(part):
+                raise Exception(f"Copy of {file.src} does not match the source checksum")
+        else:
+            if part.stat().st_size == 0 or not check_faststart_flag(part):
+                raise Exception(f"Remuxed video is not a faststart MP4: {file.src}")
+
+        os.replace(part, file.dest)
+        progress.update(
+            file.name, force=True, status="DONE", bytes_done=file.dest.stat().st_size
+        )
+    except BaseException:
+        part.unlink(missing_ok=True)
+        progress.update(file.name, force=True, status="FAILED")
+        raise
+
+
+def ingest_files(
+    files: list[IngestFile],
+    video_folder_id: int = None,
+    parallelism: int = None,
+    verify_checksum: bool = None,
+):
+    """Ingest files concurrently (see module doc). Raises the first error, after the
+    files already being copied finished (files not started yet are cancelled). The
+    progress is cleared from the video_folder row once all files were ingested"""
+    parallelism = parallelism or settings.VIDEO_IMPORT_PARALLELISM
+    if verify_checksum is None:
+        verify_checksum = settings.VIDEO_IMPORT_VERIFY_CHECKSUM
+    progress = IngestProgress(video_folder_id, files)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        futures = {
+            pool.submit(ingest_file, f, progress, verify_checksum): f for f in files
+        }
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            if future.cancel():
+                progress.update(futures[future].name, force=True, status="CANCELLED")
+    errors = [f.exception() for f in futures if not f.cancelled() and f.exception()]
+    if errors:
+        raise errors[0]
+    progress.clear()
+
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(p.bytes_total for p in progress.files.values())
+    logger.info(
+        f"Ingested {len(files)} video files ({total_bytes / 2**20:.0f} MB) in {elapsed:.1f} s ({total_bytes / 2**20 / max(elapsed, 1e-6):.0f} MB/s)"
+    )
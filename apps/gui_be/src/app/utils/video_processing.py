@@ -1,13 +1,12 @@
 from dataclasses import dataclass
+import math
 from sqlite3 import Connection
 import subprocess
 from pathlib import Path
-import re
-import json
-import math
 import shutil
 
 from app.core.db import TABLE_VIDEO_FOLDER
+from app.utils.mp4 import read_mp4_info
 
 
 def process_video_folder_faststart(video_folder_path, camera_names, backup_video=True):
@@ -44,6 +43,13 @@ def process_video_folder_faststart(video_folder_path, camera_names, backup_video
             raise Exception(f"Unable to process video file:{vid_file}")
 
 
+def check_faststart_flag(video_file: str | Path):
+    """Test if a video has the faststart flag (i.e. ready for web streaming)
+    If not, you may want to run process_video_folder_faststart"""
+    # faststart: the moov box (metadata) comes before the mdat box (media data)
+    return read_mp4_info(video_file).is_faststart
+
+
 #  example ffmpeg command to add frame numbers to top of video
 # ffmpeg -i 0.mp4 -vf "drawtext=fontfile=Arial.ttf: text=%{n}: x=(w-tw): y=0: fontcolor=white: box=1: boxcolor=0x00000099" with-frames.mp4
 
@@ -52,8 +58,8 @@ def process_video_folder_faststart(video_folder_path, camera_names, backup_video
 class VideoStats:
     width: int
     height: int
-    fps: float
-    duration_s: float
+    fps: float | None
+    duration_s: float | None
     n_frames: int
     n_cameras: int
     camera_names: list[str]
@@ -71,34 +77,22 @@ def get_video_metadata(video_folder: str | Path):
     vid0 = Path(video_folder, "videos", camera_folder_names[0], "0.mp4")
 
     # get stats for first video (assuming all videso are same size,duration,framerate)
-    output = subprocess.run(
-        (
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "v",
-            "-of",
-            "json",
-            "-show_entries",
-            "stream=r_frame_rate,width,height,duration",
-            str(vid0),
-        ),
-        capture_output=True,
-        text=True,
-    )
-
-    data = json.loads(output.stdout)
-
-    width = int(data["streams"][0]["width"])
-    height = int(data["streams"][0]["height"])
-    duration_s = float(data["streams"][0]["duration"])
-
-    match_fps_fraction = re.match(r"(\d+)/(\d+)", data["streams"][0]["r_frame_rate"])
-    fps_numerator = int(match_fps_fraction.group(1))
-    fps_denominator = int(match_fps_fraction.group(2))
-    fps = fps_numerator / fps_denominator
-    n_frames = math.ceil(duration_s * fps)
+    info = read_mp4_info(vid0)
+    track = info.video_track
+    width = int(track.width)
+    height = int(track.height)
+    # fall back to the movie duration (mvhd) if the track has no valid timescale
+    duration_s = track.duration_s if track.duration_s is not None else info.duration_s
+    fps = track.fps
+    n_frames = track.n_samples
+    if fps is None and n_frames and duration_s:
+        fps = n_frames / duration_s
+    if n_frames is None and fps and duration_s:
+        n_frames = math.ceil(duration_s * fps)
+    if not duration_s or not fps or n_frames is None:
+        raise Exception(
+            f"Unable to read the duration and frame rate of the video (duration: {duration_s} s, fps: {fps}, frames: {n_frames}): {vid0}"
+        )
 
     return VideoStats(
         width=width,
@@ -109,7 +103,6 @@ def get_video_metadata(video_folder: str | Path):
         n_cameras=len(camera_folder_names),
         camera_names=camera_folder_names,
     )
-    # ffprobe -v error -select_streams v -of json -show_entries stream=r_frame_rate,width,height,duration 0.mp4
 
 
 def check_video_folder_already_imported(conn: Connection, video_folder_path_src: Path):
@@ -1,7 +1,5 @@
 from dataclasses import dataclass
 from pathlib import Path
-import re
-import subprocess
 import shutil
 from typing import Literal
 from app.utils.helpers import make_resource_name
@@ -15,7 +13,8 @@ import logging as logger
 
 from app.utils.dannce_mat_processing import MatFileInfo
 from app.core.db import TABLE_PREDICTION, TABLE_VIDEO_FOLDER, get_db_context
-from app.utils.video_processing import get_video_metadata
+from app.utils.video_ingest import IngestFile, ingest_files
+from app.utils.video_processing import check_faststart_flag, get_video_metadata
 
 # from taskqueue.celery import celery_app
 from taskqueue.celery import celery_app
@@ -61,7 +60,9 @@ def import_video_folder_worker(video_folder_id):
         video_metadata = get_video_metadata(video_folder_path_src)
 
         # 3. copy and reencode files
-        _copy_reencode_video_folder(video_folder_path_src, video_folder_path_dest)
+        _copy_reencode_video_folder(
+            video_folder_path_src, video_folder_path_dest, video_folder_id
+        )
 
         # 4. identify calibration parameters and any label3d files
         ret = _identify_copy_calibration_params(
@@ -95,8 +96,8 @@ def import_video_folder_worker(video_folder_id):
         _update_db_failed(video_folder_id)
 
 
-        logger.info(f"Runtime until failure: {ellapsed_seconds} s")
         ellapsed_seconds = time.time() - start
+        logger.info(f"Runtime until failure: {ellapsed_seconds} s")
         return {
             "success": False,
             "video_folder_id": video_folder_id,
@@ -106,106 +107,38 @@ def import_video_folder_worker(video_folder_id):
 
 # video tasks:
 # 1. clone video and reencode
-def _copy_reencode_video_folder(src: Path, dest: Path):
+def _copy_reencode_video_folder(src: Path, dest: Path, video_folder_id: int = None):
     """For each video folder:
     1. copy the video into the instance folder
-    2. (simulatneous) re-save the video with fast-start enabled
+    2. (simulatneous) re-save the video with fast-start enabled, if it isn't already
+    Files are processed concurrently, verified, and their progress is written to the
+    video_folder row (see app.utils.video_ingest)
     """
     src_path = Path(src)
     dest_path = Path(dest)
 
-    # 1. check if fast-start is enabled
-    vid0 = next(_enumerate_video_files(src_path, dest_path))[0]
-    if _check_faststart_flag(vid0):
-        COPY_MODE = "FFMPEG"
-    else:
-        COPY_MODE = "OS"
-
-    logger.info(f"Copying videos from {src_path} to {dest_path} using {COPY_MODE}")
-    for i, [src_file, dest_file] in enumerate(
-        _enumerate_video_files(src_path, dest_path)
-    ):
-        dest_file.parent.mkdir(mode=0o777, parents=True, exist_ok=True)
-        if COPY_MODE == "FFMPEG":
-            output = subprocess.run(
-                [
-                    "ffmpeg",
-                    "-i",
-                    str(src_file),
-                    "-c",
-                    "copy",
-                    "-movflags",
-                    "+faststart",
-                    "-abort_on",
-                    "empty_output",
-                    str(dest_file),
-                ],
-                capture_output=True,
-                text=True,
-            )
-        else:
-            # Use subprocess because these are big files and performance matters
-            assert COPY_MODE == "OS"
-            output = subprocess.run(
-                [
-                    "cp",
-                    str(src_file),
-                    str(dest_file),
-                ],
-                capture_output=True,
-                text=True,
-            )
-        try:
-            output.check_returncode()
-        except subprocess.CalledProcessError:
-            logger.warning(f"Error processing: {output.stderr}")
-            raise Exception(f"Unable to process video file:{src_file}")
-        logger.info(f"Copied file {i}")
-    logger.info("Copied all video files")
-
+    files = []
+    for camname, src_file, dest_file in _enumerate_video_files(src_path, dest_path):
+        # videos without fast-start must be remuxed for web streaming
+        mode = "COPY" if check_faststart_flag(src_file) else "REMUX"
+        files.append(IngestFile(name=camname, src=src_file, dest=dest_file, mode=mode))
 
-def _check_faststart_flag(video_file: str | Path):
-    """Test if a video has the faststart flag (i.e. ready for web streaming)
-    If not, you may want to run process_video_folder_faststart"""
-    # ffmpeg -v trace -i "%%i" NUL 2>&1 | grep -m 1 -o -e "type:'mdat'" -e "type:'moov'"
-    vid0 = Path(video_file)
-    if not vid0.exists():
-        raise Exception("Video file does not exist or is not mounted properly")
-
-    output = subprocess.run(
-        (
-            "ffmpeg",
-            "-v",
-            "trace",
-            "-i",
-            str(vid0),
-        ),
-        capture_output=True,
-        text=True,
+    logger.info(
+        f"Copying videos from {src_path} to {dest_path}: {[(f.name, f.mode) for f in files]}"
     )
-    match_mdat = re.search(r"type:'mdat'", output.stderr)
-    match_moov = re.search(r"type:'moov'", output.stderr)
-    if not match_mdat and not match_moov:
-        raise Exception(
-            f"Video file does not have expected H.264 Atoms: file={str(vid0)}"
-        )
-    if match_mdat.span()[0] < match_moov.span()[0]:
-        # mdat before moov: not web ready
-        return False
-    else:
-        # moov before mdat: is web ready
-        return True
+    ingest_files(files, video_folder_id=video_folder_id)
+    logger.info("Copied all video files")
 
 
 def _enumerate_video_files(src_video_folder_path: Path, dest_video_folder_path: Path):
     """Return a generator which enumerates all video files to copy.
-    Each yield returns a tuple with: [src: Path, dest: Path]"""
+    Each yield returns a tuple with: [camera name: str, src: Path, dest: Path]"""
     metadata = get_video_metadata(src_video_folder_path)
     camnames = metadata.camera_names
     for camname in camnames:
         src_path = src_video_folder_path.joinpath("videos", camname, "0.mp4")
         dest_path = dest_video_folder_path.joinpath("videos", camname, "0.mp4")
-        yield (src_path, dest_path)
+        yield (camname, src_path, dest_path)
     return
 
 
@@ -0,0 +1,440 @@
+# FILE PURPOSE:
+# Benchmark calibration speed and accuracy on synthetic multi-camera rigs.
+#
+# A rig with known intrinsics (K, distortion) and extrinsics (R, t) is generated, and
+# chessboard images are rendered for every camera (intrinsics: random board poses,
+# extrinsics: a board at the world origin seen by all cameras). The stateful pipeline
+# (do_calibrate_stateful) is then run on the rendered images in a separate process, and
+# per-stage wall time, peak RSS and the parameter error against the ground truth are
+# recorded and compared against a stored baseline (benchmark_baseline.json).
+#
+# Runs offline and CPU-only. From the repo root (with caldannce installed):
+#   python -m tests.calibration.benchmark                   # all cases, compare to baseline
+#   python -m tests.calibration.benchmark --case small      # a single case
+#   python -m tests.calibration.benchmark --update-baseline # store the results as baseline
+# Exits with status 1 if any metric regressed.
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from caldannce.calibration_data import CameraParams
+from caldannce.math_utils import get_chessboard_coordinates
+
+BASELINE_PATH = Path(__file__).parent.joinpath("benchmark_baseline.json")
+
+BACKGROUND_LEVEL = 100
+"""Gray level of the scene around the chessboard"""
+
+
+@dataclass(frozen=True)
+class RigConfig:
+    name: str
+    n_cameras: int = 4
+    width: int = 1280
+    height: int = 720
+    n_intrinsics_images: int = 30
+    rows: int = 6
+    cols: int = 9
+    square_size_mm: float = 25.0
+    seed: int = 0
+    workers: int = 1
+
+
+CASES = {
+    "small": RigConfig(
+        name="small", n_cameras=3, width=640, height=480, n_intrinsics_images=15
+    ),
+    "default": RigConfig(name="default"),
+}
+
+# a metric regresses if it exceeds baseline * rel_tolerance + abs_slack
+TOLERANCES = {
+    "time": (1.5, 0.5),  # seconds
+    "peak_rss_mb": (1.25, 50.0),
+    "focal_err_px": (1.5, 0.5),
+    "principal_point_err_px": (1.5, 1.0),
+    "k1_err": (1.5, 0.005),
+    "rotation_err_deg": (1.5, 0.05),
+    "translation_err_mm": (1.5, 1.0),
+}
+
+
+# ---------------------------------------------------------------------------
+# Synthetic rig
+# ---------------------------------------------------------------------------
+
+
+def look_at(camera_center: np.ndarray, target: np.ndarray, up: np.ndarray):
+    """World -> camera rotation for a camera at camera_center looking at target"""
+    z = target - camera_center
+    z /= np.linalg.norm(z)
+    x = np.cross(z, up)
+    x /= np.linalg.norm(x)
+    y = np.cross(z, x)
+    return np.stack([x, y, z])
+
+
+def make_rig(config: RigConfig, rng: np.random.Generator) -> list[CameraParams]:
+    """Cameras on an arc above the board (at the world origin), all looking at it.
+
+    The arc spans 120 degrees so every camera sees the board in a similar orientation
+    (i.e. corners are detected in a consistent order)."""
+    board_center = np.array(
+        [
+            (config.rows - 1) * config.square_size_mm / 2,
+            (config.cols - 1) * config.square_size_mm / 2,
+            0.0,
+        ]
+    )
+    board_extent = max(config.rows, config.cols) * config.square_size_mm
+
+    cameras = []
+    for idx in range(config.n_cameras):
+        f = config.width * rng.uniform(0.8, 1.0)
+        camera_matrix = np.array(
+            [
+                [f, 0.0, config.width / 2 + rng.uniform(-10, 10)],
+                [0.0, f * rng.uniform(0.998, 1.002), config.height / 2 + rng.uniform(-10, 10)],
+                [0.0, 0.0, 1.0],
+            ]
+        )
+        r_distort = np.array([rng.uniform(-0.2, -0.05), rng.uniform(0.0, 0.1)])
+        t_distort = rng.uniform(-0.001, 0.001, size=2)
+
+        # distance at which the board spans ~40% of the image width
+        distance = f * board_extent / (0.4 * config.width)
+        azimuth = np.deg2rad(-60 + 120 * idx / max(config.n_cameras - 1, 1))
+        elevation = np.deg2rad(rng.uniform(45, 60))
+        direction = np.array(
+            [
+                np.cos(elevation) * np.cos(azimuth),
+                np.cos(elevation) * np.sin(azimuth),
+                -np.sin(elevation),
+            ]
+        )
+        camera_center = board_center + distance * direction
+        rotation_matrix = look_at(camera_center, board_center, np.array([0, 0, -1.0]))
+        translation_vector = (-rotation_matrix @ camera_center).reshape(3, 1)
+
+        cameras.append(
+            CameraParams(
+                camera_matrix=camera_matrix,
+                r_distort=r_distort,
+                t_distort=t_distort,
+                rotation_matrix=rotation_matrix,
+                translation_vector=translation_vector,
+            )
+        )
+    return cameras
+
+
+class ChessboardRenderer:
+    """Render a chessboard seen by one camera (with lens distortion), by casting a ray
+    through every (2x2 supersampled) pixel and intersecting it with the board plane"""
+
+    def __init__(self, camera: CameraParams, config: RigConfig, supersample: int = 2):
+        self.config = config
+        self.supersample = supersample
+        w, h, s = config.width, config.height, supersample
+        offsets = (np.arange(s) + 0.5) / s - 0.5
+        u = (np.arange(w)[:, None] + offsets[None, :]).ravel()
+        v = (np.arange(h)[:, None] + offsets[None, :]).ravel()
+        uu, vv = np.meshgrid(u, v)
+        pixels = np.stack([uu, vv], axis=-1).reshape(-1, 1, 2)
+        # normalized (undistorted) ray directions for every sub-pixel, computed once
+        rays = cv2.undistortPoints(pixels, camera.camera_matrix, camera.dist)
+        rays = rays.reshape(h * s, w * s, 2).astype(np.float32)
+        self.ray_x = np.ascontiguousarray(rays[..., 0])
+        self.ray_y = np.ascontiguousarray(rays[..., 1])
+
+    def _dot_ray(self, v: np.ndarray) -> np.ndarray:
+        """Dot product of every ray (x, y, 1) with the vector v"""
+        return self.ray_x * np.float32(v[0]) + self.ray_y * np.float32(v[1]) + np.float32(v[2])
+
+    def render(self, board_rotation: np.ndarray, board_translation: np.ndarray):
+        """Render the board with pose board -> camera. Returns a grayscale uint8 image"""
+        sq = self.config.square_size_mm
+        board_translation = np.asarray(board_translation, dtype=np.float64).reshape(3)
+        normal = board_rotation[:, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            depth = np.float32(normal @ board_translation) / self._dot_ray(normal)
+        # board coords of the ray/plane intersection: R^T (depth * ray - t)
+        axis_x, axis_y = board_rotation[:, 0], board_rotation[:, 1]
+        bx = (depth * self._dot_ray(axis_x) - np.float32(axis_x @ board_translation)) / sq
+        by = (depth * self._dot_ray(axis_y) - np.float32(axis_y @ board_translation)) / sq
+
+        rows, cols = self.config.rows, self.config.cols
+        squares = (bx >= -1) & (bx < rows) & (by >= -1) & (by < cols)
+        # one square wide white border around the pattern
+        board = (bx >= -2) & (bx < rows + 1) & (by >= -2) & (by < cols + 1) & (depth > 0)
+        black = (np.floor(bx) + np.floor(by)) % 2 == 0
+
+        img = np.full(depth.shape, BACKGROUND_LEVEL, dtype=np.float32)
+        img[board] = 235
+        img[board & squares & black] = 20
+
+        s = self.supersample
+        h, w = self.config.height, self.config.width
+        img = img.reshape(h, s, w, s).mean(axis=(1, 3))
+        return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def random_board_pose(
+    camera: CameraParams, config: RigConfig, rng: np.random.Generator
+):
+    """Random board pose (board -> camera) which keeps the board fully in view"""
+    sq = config.square_size_mm
+    board_center = np.array(
+        [(config.rows - 1) * sq / 2, (config.cols - 1) * sq / 2, 0.0]
+    )
+    object_points = get_chessboard_coordinates(config.rows, config.cols, sq)
+    f = camera.camera_matrix[0, 0]
+    base_depth = f * max(config.rows, config.cols) * sq / (0.5 * config.width)
+    margin = 0.05 * config.width
+
+    for _ in range(1000):
+        rvec = np.deg2rad(rng.uniform(-35, 35, size=3)) * np.array([1, 1, 0.5])
+        rotation = cv2.Rodrigues(rvec)[0]
+        depth = base_depth * rng.uniform(0.8, 1.6)
+        target = np.array([rng.uniform(0, config.width), rng.uniform(0, config.height)])
+        ray = np.linalg.inv(camera.camera_matrix) @ np.array([*target, 1.0])
+        translation = ray * depth - rotation @ board_center
+
+        corners_cam = object_points @ rotation.T + translation
+        if np.any(corners_cam[:, 2] <= 0):
+            continue
+        corners, _ = cv2.projectPoints(
+            object_points, rvec, translation, camera.camera_matrix, camera.dist
+        )
+        corners = corners.reshape(-1, 2)
+        inside = (
+            (corners[:, 0] > margin)
+            & (corners[:, 0] < config.width - margin)
+            & (corners[:, 1] > margin)
+            & (corners[:, 1] < config.height - margin)
+        )
+        if inside.all():
+            return rotation, translation
+    raise Exception("Unable to place the board in view of the camera")
+
+
+def render_dataset(config: RigConfig, root_dir: Path) -> list[CameraParams]:
+    """Render intrinsics and extrinsics images for a synthetic rig into root_dir.
+    Returns the ground-truth camera params"""
+    rng = np.random.default_rng(config.seed)
+    cameras = make_rig(config, rng)
+    for idx, camera in enumerate(cameras):
+        camera_name = f"Camera{idx + 1}"
+        intrinsics_dir = Path(root_dir, "intrinsics", camera_name)
+        extrinsics_dir = Path(root_dir, "extrinsics", camera_name)
+        intrinsics_dir.mkdir(parents=True)
+        extrinsics_dir.mkdir(parents=True)
+
+        renderer = ChessboardRenderer(camera, config)
+        for i in range(config.n_intrinsics_images):
+            rotation, translation = random_board_pose(camera, config, rng)
+            img = renderer.render(rotation, translation)
+            cv2.imwrite(str(Path(intrinsics_dir, f"{i}.png")), img)
+
+        # the board defines the world frame, so board -> camera is the camera's pose
+        img = renderer.render(
+            camera.rotation_matrix, camera.translation_vector.reshape(3)
+        )
+        cv2.imwrite(str(Path(extrinsics_dir, "0.png")), img)
+    return cameras
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+
+def _run_calibration(config: RigConfig, root_dir: str) -> dict:
+    """Run in a fresh process so peak RSS only covers calibration"""
+    from caldannce.do_calibrate_stateful import do_calibrate_stateful
+
+    start = time.perf_counter()
+    results = do_calibrate_stateful(
+        intrinsics_dir=str(Path(root_dir, "intrinsics")),
+        extrinsics_dir=str(Path(root_dir, "extrinsics")),
+        output_dir=str(Path(root_dir, "output")),
+        rows=config.rows,
+        cols=config.cols,
+        square_size_mm=config.square_size_mm,
+        workers=config.workers,
+    )
+    total = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "camera_params": [p.as_dict() for p in results.camera_params],
+        "stage_seconds": results.calibrator.stage_seconds(),
+        "total_seconds": total,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def parameter_errors(
+    truth: list[CameraParams], estimate: list[CameraParams]
+) -> dict[str, float]:
+    """Max. error over all cameras. Extrinsics are compared as poses relative to the
+    first camera, which doesn't depend on the choice of world frame"""
+    focal, principal, k1, rotation, translation = [], [], [], [], []
+    for t, e in zip(truth, estimate):
+        focal.append(np.abs(np.diag(t.camera_matrix)[0:2] - np.diag(e.camera_matrix)[0:2]).max())
+        principal.append(np.abs(t.camera_matrix[0:2, 2] - e.camera_matrix[0:2, 2]).max())
+        k1.append(abs(t.r_distort[0] - e.r_distort[0]))
+
+    def relative_pose(a: CameraParams, b: CameraParams):
+        r = b.rotation_matrix @ a.rotation_matrix.T
+        return r, b.translation_vector.reshape(3) - r @ a.translation_vector.reshape(3)
+
+    for t, e in zip(truth[1:], estimate[1:]):
+        r_t, t_t = relative_pose(truth[0], t)
+        r_e, t_e = relative_pose(estimate[0], e)
+        angle = np.rad2deg(np.linalg.norm(cv2.Rodrigues(r_e @ r_t.T)[0]))
+        rotation.append(angle)
+        translation.append(np.linalg.norm(t_e - t_t))
+
+    return {
+        "focal_err_px": float(max(focal)),
+        "principal_point_err_px": float(max(principal)),
+        "k1_err": float(max(k1)),
+        "rotation_err_deg": float(max(rotation, default=0.0)),
+        "translation_err_mm": float(max(translation, default=0.0)),
+    }
+
+
+def run_case(config: RigConfig) -> dict:
+    with tempfile.TemporaryDirectory() as root_dir:
+        start = time.perf_counter()
+        truth = render_dataset(config, Path(root_dir))
+        render_seconds = time.perf_counter() - start
+
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as pool:
+            result = pool.submit(_run_calibration, config, root_dir).result()
+
+    estimate = [CameraParams.load_from_dict(x) for x in result["camera_params"]]
+    return {
+        "config": asdict(config),
+        "render_seconds": render_seconds,
+        "time": {
+            "total": result["total_seconds"],
+            **result["stage_seconds"],
+        },
+        "peak_rss_mb": result["peak_rss_mb"],
+        "errors": parameter_errors(truth, estimate),
+    }
+
+
+def compare_to_baseline(name: str, result: dict, baseline: dict) -> list[str]:
+    """Return a list of regressions (empty if none)"""
+    regressions = []
+
+    def check(metric: str, value: float, base: float, tolerance_key: str):
+        rel, slack = TOLERANCES[tolerance_key]
+        limit = base * rel + slack
+        if value > limit:
+            regressions.append(
+                f"{name}: {metric} regressed: {value:.4g} > {limit:.4g} (baseline {base:.4g})"
+            )
+
+    for stage, seconds in result["time"].items():
+        if stage in baseline["time"]:
+            check(f"time[{stage}]", seconds, baseline["time"][stage], "time")
+    check("peak_rss_mb", result["peak_rss_mb"], baseline["peak_rss_mb"], "peak_rss_mb")
+    for metric, value in result["errors"].items():
+        check(metric, value, baseline["errors"][metric], metric)
+    return regressions
+
+
+def print_result(name: str, result: dict):
+    times = ", ".join(f"{k}={v:.2f}s" for k, v in result["time"].items())
+    errors = ", ".join(f"{k}={v:.4f}" for k, v in result["errors"].items())
+    print(f"[{name}] render={result['render_seconds']:.1f}s | {times}")
+    print(f"[{name}] peak RSS={result['peak_rss_mb']:.0f} MB | {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark calibration speed and accuracy on synthetic rigs"
+    )
+    parser.add_argument(
+        "--case",
+        choices=list(CASES.keys()),
+        action="append",
+        help="Benchmark case to run (can be repeated). Default is all cases.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Override the number of calibration worker processes",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        default=False,
+        help=f"Write the results to {BASELINE_PATH.name} instead of comparing",
+    )
+    parser.add_argument(
+        "--output-json", default=None, help="Also write the results to this file"
+    )
+    args = parser.parse_args()
+
+    case_names = args.case or list(CASES.keys())
+    results = {}
+    for name in case_names:
+        config = CASES[name]
+        if args.workers is not None:
+            config = RigConfig(**{**asdict(config), "workers": args.workers})
+        results[name] = run_case(config)
+        print_result(name, results[name])
+
+    if args.output_json:
+        with open(args.output_json, "wt") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH, "rt") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "wt") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Updated baseline at {BASELINE_PATH}")
+        return 0
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"[{name}] no baseline stored (run with --update-baseline)")
+            continue
+        if baseline[name]["config"] != result["config"]:
+            print(f"[{name}] config differs from baseline - skipping comparison")
+            continue
+        regressions += compare_to_baseline(name, result, baseline[name])
+
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
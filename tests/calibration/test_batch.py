@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import time
+
+import pytest
+
+from caldannce import batch
+from caldannce.batch import (
+    BatchJob,
+    format_summary_table,
+    load_manifest,
+    run_batch,
+    write_summary,
+)
+from tests.calibration.benchmark import CASES, render_dataset
+
+CONFIG = CASES["small"]
+BOARD = {
+    "rows": CONFIG.rows,
+    "cols": CONFIG.cols,
+    "square_size_mm": CONFIG.square_size_mm,
+}
+
+
+@pytest.fixture(scope="module")
+def rig(tmp_path_factory):
+    root_dir = tmp_path_factory.mktemp("rig")
+    render_dataset(CONFIG, root_dir)
+    return root_dir
+
+
+def write_manifest(path, manifest: dict):
+    with open(path, "wt") as f:
+        json.dump(manifest, f)
+    return path
+
+
+def make_job(name: str, intrinsics_dir, extrinsics_dir, output_dir, **options):
+    return BatchJob(
+        name=name,
+        intrinsics_dir=str(intrinsics_dir),
+        extrinsics_dir=str(extrinsics_dir),
+        output_dir=str(output_dir),
+        options={**BOARD, **options},
+    )
+
+
+def timed_job(job: BatchJob, cache_dir: str, detection_threads: int) -> dict:
+    """Stand-in for batch._run_job (run in the worker processes), recording when it
+    ran"""
+    start = time.time()
+    time.sleep(0.3)
+    end = time.time()
+    return {
+        "name": job.name,
+        "status": "ok",
+        "time_seconds": end - start,
+        "start": start,
+        "end": end,
+    }
+
+
+def crashing_job(job: BatchJob, cache_dir: str, detection_threads: int) -> dict:
+    """Stand-in for batch._run_job whose worker process dies, breaking the pool"""
+    os._exit(1)
+
+
+def test_load_manifest_defaults(tmp_path):
+    manifest = {
+        "defaults": {**BOARD, "workers": 2},
+        "jobs": [
+            {
+                "name": "rig1",
+                "intrinsics_dir": "/data/rig1/intrinsic",
+                "extrinsics_dir": "/data/rig1/extrinsic",
+                "output_dir": "/data/rig1/calibration",
+                "workers": 4,
+            },
+            {
+                "intrinsics_dir": "/data/rig2/intrinsic",
+                "extrinsics_dir": "/data/rig2/extrinsic",
+                "output_dir": "/data/rig2/calibration",
+            },
+        ],
+    }
+
+    jobs = load_manifest(write_manifest(tmp_path.joinpath("manifest.json"), manifest))
+
+    assert [job.name for job in jobs] == ["rig1", "job2"]
+    assert jobs[0].intrinsics_dir == "/data/rig1/intrinsic"
+    assert jobs[0].output_dir == "/data/rig1/calibration"
+    # job options override the defaults, and the dirs are not passed as options
+    assert jobs[0].options == {**BOARD, "workers": 4}
+    assert jobs[1].options == {**BOARD, "workers": 2}
+
+
+def test_load_manifest_project_dir(rig, tmp_path):
+    manifest = {
+        "defaults": BOARD,
+        "jobs": [
+            {"name": "rig", "project_dir": str(rig), "output_dir": "out"},
+            {
+                "name": "override",
+                "project_dir": str(rig),
+                "extrinsics_dir": "/data/extrinsic",
+                "output_dir": "out",
+            },
+        ],
+    }
+
+    jobs = load_manifest(write_manifest(tmp_path.joinpath("manifest.json"), manifest))
+
+    assert jobs[0].intrinsics_dir == str(rig.joinpath("intrinsics"))
+    assert jobs[0].extrinsics_dir == str(rig.joinpath("extrinsics"))
+    assert jobs[1].intrinsics_dir == str(rig.joinpath("intrinsics"))
+    assert jobs[1].extrinsics_dir == "/data/extrinsic"
+    assert "project_dir" not in jobs[0].options
+
+
+def test_load_manifest_errors(tmp_path):
+    job = {"intrinsics_dir": "a", "extrinsics_dir": "b", "output_dir": "c"}
+    duplicate = {"jobs": [{"name": "rig", **job}, {"name": "rig", **job}]}
+    with pytest.raises(Exception, match="Duplicate job name in manifest: rig"):
+        load_manifest(write_manifest(tmp_path.joinpath("duplicate.json"), duplicate))
+
+    no_output = {
+        "jobs": [{"name": "rig", "intrinsics_dir": "a", "extrinsics_dir": "b"}]
+    }
+    with pytest.raises(Exception, match="Job rig: requires output_dir"):
+        load_manifest(write_manifest(tmp_path.joinpath("no_output.json"), no_output))
+
+
+def test_detection_group_held_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "_run_job", timed_job)
+    jobs = [
+        make_job("a1", "/data/a/intrinsic", "/data/a/extrinsic1", tmp_path),
+        make_job("a2", "/data/a/intrinsic/", "/data/a/extrinsic2", tmp_path),
+        make_job("b", "/data/b/intrinsic", "/data/b/extrinsic", tmp_path),
+    ]
+
+    rows = run_batch(jobs, workers=3, cache_dir=tmp_path.joinpath("cache"))
+
+    assert [row["name"] for row in rows] == ["a1", "a2", "b"]
+    a1, a2, b = rows
+    # same intrinsics folder: a2 waits for a1, b runs alongside a1
+    assert a2["start"] >= a1["end"]
+    assert b["start"] < a1["end"]
+
+
+def test_run_batch(rig, tmp_path):
+    jobs = [
+        make_job(
+            "rig",
+            rig.joinpath("intrinsics"),
+            rig.joinpath("extrinsics"),
+            tmp_path.joinpath("rig"),
+        ),
+        make_job(
+            "same_intrinsics",
+            rig.joinpath("intrinsics"),
+            rig.joinpath("extrinsics"),
+            tmp_path.joinpath("same_intrinsics"),
+        ),
+        make_job(
+            "missing",
+            tmp_path.joinpath("missing", "intrinsics"),
+            tmp_path.joinpath("missing", "extrinsics"),
+            tmp_path.joinpath("missing", "calibration"),
+        ),
+    ]
+
+    rows = run_batch(jobs, workers=2, cache_dir=tmp_path.joinpath("cache"))
+
+    for row in rows[:2]:
+        assert row["status"] == "ok"
+        assert row["error"] is None
+        assert row["n_cameras"] == CONFIG.n_cameras
+        assert row["intrinsics_rpe_px"] < 0.5
+        assert row["extrinsics_rpe_px"] < 0.5
+        assert os.path.isfile(os.path.join(row["output_dir"], batch.REPORT_FILE_NAME))
+    failed = rows[2]
+    assert failed["status"] == "failed"
+    assert failed["error"]
+    assert failed["n_cameras"] is None
+    assert failed["time_seconds"] >= 0
+
+    table = format_summary_table(rows)
+    assert f"missing: {failed['error']}" in table
+    write_summary(rows, tmp_path.joinpath("summary.csv"))
+    with open(tmp_path.joinpath("summary.csv"), newline="") as f:
+        csv_rows = list(csv.DictReader(f))
+    assert [row["status"] for row in csv_rows] == ["ok", "ok", "failed"]
+
+
+def test_broken_pool_failure_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "_run_job", crashing_job)
+    jobs = [
+        make_job("a1", "/data/a/intrinsic", "/data/a/extrinsic1", tmp_path),
+        make_job("a2", "/data/a/intrinsic", "/data/a/extrinsic2", tmp_path),
+    ]
+
+    rows = run_batch(jobs, workers=1, cache_dir=tmp_path.joinpath("cache"))
+
+    # a1's worker died; a2, held back until then, can't be submitted to the pool
+    for row, job in zip(rows, jobs):
+        assert row["name"] == job.name
+        assert row["status"] == "failed"
+        assert row["error"].startswith("BrokenProcessPool")
@@ -0,0 +1,225 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from scipy.io import savemat
+
+from caldannce.bundle_adjustment import bundle_adjust
+from caldannce.calibrate_stateful import Calibrator
+from caldannce.calibration_data import CameraParams
+from caldannce.math_utils import get_chessboard_coordinates
+from caldannce.methods.extrinsics_chessboard import ExtrinsicsChessboard
+from caldannce.methods.extrinsics_chessboard_video import ExtrinsicsChessboardVideo
+from caldannce.methods.intrinsics_hires_file import IntrinsicsHiresFile
+from tests.calibration.benchmark import (
+    CASES,
+    ChessboardRenderer,
+    make_rig,
+    parameter_errors,
+)
+
+CONFIG = CASES["small"]
+
+
+def observe(camera: CameraParams, board_rotation, board_translation, object_points):
+    """Image points of the board at a (board -> world) pose"""
+    world_points = object_points @ board_rotation.T + board_translation
+    ipts, _ = cv2.projectPoints(
+        world_points,
+        cv2.Rodrigues(camera.rotation_matrix)[0],
+        camera.translation_vector,
+        camera.camera_matrix,
+        camera.dist,
+    )
+    return ipts.reshape(-1, 2)
+
+
+def perturb(camera: CameraParams, rng: np.random.Generator) -> CameraParams:
+    r_vec = cv2.Rodrigues(camera.rotation_matrix)[0].ravel() + rng.normal(0, 0.01, 3)
+    return CameraParams(
+        camera_matrix=camera.camera_matrix,
+        r_distort=camera.r_distort,
+        t_distort=camera.t_distort,
+        rotation_matrix=cv2.Rodrigues(r_vec)[0],
+        translation_vector=camera.translation_vector + rng.normal(0, 5, (3, 1)),
+    )
+
+
+@pytest.fixture
+def rig():
+    rng = np.random.default_rng(CONFIG.seed)
+    cameras = make_rig(CONFIG, rng)
+    object_points = get_chessboard_coordinates(
+        chessboard_rows=CONFIG.rows,
+        chessboard_cols=CONFIG.cols,
+        square_size_mm=CONFIG.square_size_mm,
+    ).reshape(-1, 3)
+    return cameras, object_points, rng
+
+
+def moved_board_poses(cameras, object_points, rng, n_poses):
+    """Small (board -> world) motions away from the world origin which keep the board in
+    view of every camera"""
+    poses = []
+    while len(poses) < n_poses:
+        r = cv2.Rodrigues(rng.normal(0, 0.1, 3))[0]
+        t = rng.normal(0, 20, 3)
+        in_view = [
+            (ipts > 20).all()
+            and (ipts[:, 0] < CONFIG.width - 20).all()
+            and (ipts[:, 1] < CONFIG.height - 20).all()
+            for ipts in (observe(c, r, t, object_points) for c in cameras)
+        ]
+        if all(in_view):
+            poses.append((r, t))
+    return poses
+
+
+def test_bundle_adjust_moving_frames(rig):
+    cameras, object_points, rng = rig
+    # frames 0-2: the static board at the world origin, then board motions seen by all
+    # cameras
+    static = [
+        {f: observe(c, np.eye(3), np.zeros(3), object_points) for f in range(3)}
+        for c in cameras
+    ]
+    poses = moved_board_poses(cameras, object_points, rng, 4)
+    moving = [
+        {f + 3: observe(c, r, t, object_points) for f, (r, t) in enumerate(poses)}
+        for c in cameras
+    ]
+    # a moving frame seen by a single camera is ignored
+    moving[0][10] = observe(cameras[0], *poses[0], object_points)
+    initial = [perturb(c, rng) for c in cameras]
+
+    refined, metrics = bundle_adjust(
+        initial, static, object_points, moving_observations=moving
+    )
+
+    assert metrics["n_static_frames"] == 3
+    assert metrics["n_shared_frames"] == 4
+    assert metrics["n_observations"] == 3 * (3 + 4)
+    assert metrics["rpe_px_after"] < 1e-3 < metrics["rpe_px_before"]
+    for truth, estimate in zip(cameras, refined):
+        assert np.allclose(truth.rotation_matrix, estimate.rotation_matrix, atol=1e-5)
+        assert np.allclose(
+            truth.translation_vector, estimate.translation_vector, atol=1e-2
+        )
+
+
+def test_bundle_adjust_requires_moving_frames(rig):
+    cameras, object_points, _rng = rig
+    # a static board only (however many frames): each camera is only refined on its own
+    static = [
+        {f: observe(c, np.eye(3), np.zeros(3), object_points) for f in range(5)}
+        for c in cameras
+    ]
+    with pytest.raises(Exception, match="moving board seen by at least 2 cameras"):
+        bundle_adjust(cameras, static, object_points)
+
+    # frames of the moved board, but each seen by a single camera
+    moving = [
+        {idx + 5: observe(c, np.eye(3), np.array([10.0, 0, 0]), object_points)}
+        for idx, c in enumerate(cameras)
+    ]
+    with pytest.raises(Exception, match="moving board seen by at least 2 cameras"):
+        bundle_adjust(cameras, static, object_points, moving_observations=moving)
+
+
+def write_video(path: Path, frames: list[np.ndarray]):
+    writer = cv2.VideoWriter(
+        str(path),
+        cv2.VideoWriter_fourcc(*"mp4v"),
+        30,
+        (CONFIG.width, CONFIG.height),
+        False,
+    )
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+def write_hires_file(path: Path, camera: CameraParams):
+    """Intrinsics in the Label3D (matlab) format, see write_calibration_params"""
+    k = camera.camera_matrix.copy()
+    k[0:2, 2] += 1
+    savemat(
+        path,
+        {
+            "K": k.T,
+            "RDistort": camera.r_distort,
+            "TDistort": camera.t_distort,
+            "r": camera.rotation_matrix.T,
+            "t": camera.translation_vector.reshape((1, 3)),
+        },
+    )
+
+
+def make_calibrator(cameras, tmp_path: Path, board_poses) -> Calibrator:
+    """Calibrator on synthetic synchronized extrinsics videos of the board at
+    board_poses (board -> world), with the true intrinsics"""
+    cal = Calibrator[IntrinsicsHiresFile, ExtrinsicsChessboard]()
+    cal.set_intrinsics_method(IntrinsicsHiresFile())
+    cal.set_extrinsics_method(
+        ExtrinsicsChessboardVideo(
+            CONFIG.rows,
+            CONFIG.cols,
+            CONFIG.square_size_mm,
+            frame_step=1,
+            max_detections=None,
+        )
+    )
+    camera_names = [f"Camera{idx + 1}" for idx in range(len(cameras))]
+    for cam_name, camera in zip(camera_names, cameras):
+        renderer = ChessboardRenderer(camera, CONFIG)
+        r_cam, t_cam = camera.rotation_matrix, camera.translation_vector.reshape(3)
+        # board -> camera = (world -> camera) o (board -> world)
+        frames = [renderer.render(r_cam @ r, r_cam @ t + t_cam) for r, t in board_poses]
+        video_path = tmp_path.joinpath(f"{cam_name}.mp4")
+        write_video(video_path, frames)
+        hires_path = tmp_path.joinpath(f"hires_{cam_name}_params.mat")
+        write_hires_file(hires_path, camera)
+        cal.add_camera(
+            camera_name=cam_name,
+            intrinsics_camdata=IntrinsicsHiresFile.Camdata(hires_file_path=hires_path),
+            extrinsics_camdata=ExtrinsicsChessboard.Camdata(extrinsics_path=video_path),
+        )
+    cal.init_report(camera_names)
+    return cal
+
+
+def test_calibrate_bundle_adjust_videos(rig, tmp_path):
+    cameras, object_points, rng = rig
+    # the board held still at the world origin, then moved around
+    static_poses = [(np.eye(3), np.zeros(3))] * 4
+    moved_poses = moved_board_poses(cameras, object_points, rng, 6)
+    cal = make_calibrator(cameras, tmp_path, static_poses + moved_poses)
+
+    cal.calibrate(bundle_adjust=True, bundle_adjust_intrinsics=True)
+
+    report = cal.report
+    for cam_name in report.camera_names:
+        assert sorted(report.extrinsics_observations[cam_name]) == [0, 1, 2, 3]
+        assert sorted(report.extrinsics_moving_observations[cam_name]) == list(
+            range(4, 10)
+        )
+    metrics = report.bundle_adjustment
+    assert metrics["n_static_frames"] == 4
+    assert metrics["n_shared_frames"] == 6
+    assert metrics["rpe_px_after"] <= metrics["rpe_px_before"]
+    report.calibration_time_seconds = 0.0
+    assert "6 moving board frames shared" in report.make_summary()
+
+    errors = parameter_errors(cameras, cal.get_results().camera_params)
+    assert errors["rotation_err_deg"] < 0.2
+    assert errors["translation_err_mm"] < 2.0
+    assert errors["focal_err_px"] < 5.0
+
+
+def test_calibrate_bundle_adjust_static_board(rig, tmp_path):
+    cameras, _object_points, _rng = rig
+    cal = make_calibrator(cameras, tmp_path, [(np.eye(3), np.zeros(3))] * 4)
+
+    with pytest.raises(Exception, match="moving board seen by at least 2 cameras"):
+        cal.calibrate(bundle_adjust=True)
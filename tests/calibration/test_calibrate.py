@@ -0,0 +1,191 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import caldannce
+from caldannce.calibrate import do_calibrate
+from caldannce.calibration_data import CameraParams
+from tests.calibration.benchmark import CASES, parameter_errors, render_dataset
+
+CONFIG = CASES["small"]
+
+
+@pytest.fixture(scope="module")
+def rig(tmp_path_factory):
+    """Rendered images of a synthetic rig and its ground-truth camera params"""
+    root_dir = tmp_path_factory.mktemp("rig")
+    truth = render_dataset(CONFIG, root_dir)
+    return root_dir, truth
+
+
+def run_do_calibrate(root_dir, output_dir, **kwargs):
+    return do_calibrate(
+        intrinsics_dir=str(root_dir.joinpath("intrinsics")),
+        extrinsics_dir=str(root_dir.joinpath("extrinsics")),
+        output_dir=str(output_dir),
+        rows=CONFIG.rows,
+        cols=CONFIG.cols,
+        square_size_mm=CONFIG.square_size_mm,
+        **kwargs,
+    )
+
+
+def run_cli(module: str, root_dir, output_dir, *args: str) -> subprocess.CompletedProcess:
+    """Run a calibration command line in a subprocess (in output_dir, which also gets
+    the logs folder)"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            [str(Path(caldannce.__file__).parents[1]), os.environ.get("PYTHONPATH", "")]
+        ),
+    }
+    # fmt: off
+    command = [
+        sys.executable, "-m", module,
+        "-i", str(root_dir.joinpath("intrinsics")),
+        "-e", str(root_dir.joinpath("extrinsics")),
+        "-o", str(output_dir),
+        "-r", str(CONFIG.rows),
+        "-c", str(CONFIG.cols),
+        "-s", f"{CONFIG.square_size_mm:g}",
+        *args,
+    ]
+    # fmt: on
+    return subprocess.run(
+        command, cwd=output_dir, env=env, capture_output=True, text=True, timeout=600
+    )
+
+
+def test_do_calibrate_workers(rig, tmp_path):
+    root_dir, truth = rig
+    assert CONFIG.n_cameras >= 2
+
+    progress = []
+    parallel = run_do_calibrate(
+        root_dir, tmp_path.joinpath("parallel"), workers=2, on_progress=progress.append
+    )
+    serial = run_do_calibrate(root_dir, tmp_path.joinpath("serial"), workers=1)
+
+    assert parallel.camera_names == serial.camera_names
+    assert len(parallel.camera_params) == CONFIG.n_cameras
+    # cameras are returned in camera order, whichever worker finishes first
+    for a, b in zip(parallel.camera_params, serial.camera_params):
+        assert CameraParams.compare(a, b)
+    assert progress[-1] == 100
+
+    errors = parameter_errors(truth, parallel.camera_params)
+    assert errors["focal_err_px"] < 5
+    assert errors["rotation_err_deg"] < 1
+
+    for idx in range(CONFIG.n_cameras):
+        param_file = tmp_path.joinpath("parallel", f"hires_cam{idx + 1}_params.mat")
+        saved = CameraParams.load_from_hires_file(param_file)
+        assert np.allclose(
+            saved.translation_vector.reshape(3),
+            parallel.camera_params[idx].translation_vector.reshape(3),
+        )
+
+
+def test_calibrate_cli(rig, tmp_path):
+    root_dir, _truth = rig
+    output_dir = tmp_path.joinpath("output")
+    process = run_cli(
+        "caldannce.calibrate",
+        root_dir,
+        output_dir,
+        "-w",
+        "2",
+        "--detection-cache-dir",
+        str(tmp_path.joinpath("cache")),
+        "--trace",
+        str(tmp_path.joinpath("trace.json")),
+    )
+    assert process.returncode == 0, process.stderr
+    assert tmp_path.joinpath("trace.json").exists()
+    calibrated = CameraParams.load_list_from_hires_folder(output_dir)
+    assert len(calibrated) == CONFIG.n_cameras
+
+    # extrinsics only, with the intrinsics of the first run
+    existing_dir = tmp_path.joinpath("existing")
+    process = run_cli(
+        "caldannce.calibrate",
+        root_dir,
+        existing_dir,
+        "--no-detection-cache",
+        "--existing-intrinsics-dir",
+        str(output_dir),
+    )
+    assert process.returncode == 0, process.stderr
+    for a, b in zip(calibrated, CameraParams.load_list_from_hires_folder(existing_dir)):
+        assert np.allclose(a.camera_matrix, b.camera_matrix)
+        assert np.allclose(a.r_distort, b.r_distort)
+        assert np.allclose(a.rotation_matrix, b.rotation_matrix, atol=1e-6)
+
+
+def test_do_calibrate_stateful_workers(rig, tmp_path):
+    from caldannce.do_calibrate_stateful import do_calibrate_stateful
+
+    root_dir, truth = rig
+
+    def run(name, workers):
+        return do_calibrate_stateful(
+            intrinsics_dir=str(root_dir.joinpath("intrinsics")),
+            extrinsics_dir=str(root_dir.joinpath("extrinsics")),
+            output_dir=str(tmp_path.joinpath(name)),
+            rows=CONFIG.rows,
+            cols=CONFIG.cols,
+            square_size_mm=CONFIG.square_size_mm,
+            workers=workers,
+        )
+
+    parallel = run("parallel", workers=2)
+    serial = run("serial", workers=1)
+
+    assert len(parallel.camera_params) == CONFIG.n_cameras
+    for a, b in zip(parallel.camera_params, serial.camera_params):
+        assert CameraParams.compare(a, b)
+    report = parallel.calibrator.report
+    assert set(report.intrinsics_rpes) == set(serial.calibrator.report.intrinsics_rpes)
+    assert all(rpe is not None for rpe in report.intrinsics_rpes.values())
+
+    errors = parameter_errors(truth, parallel.camera_params)
+    assert errors["focal_err_px"] < 5
+    assert errors["rotation_err_deg"] < 1
+
+
+def test_do_calibrate_stateful_cli(rig, tmp_path):
+    root_dir, _truth = rig
+    output_dir = tmp_path.joinpath("output")
+    process = run_cli(
+        "caldannce.do_calibrate_stateful",
+        root_dir,
+        output_dir,
+        "--detection-cache-dir",
+        str(tmp_path.joinpath("cache")),
+        "--fast-check",
+        "--trace",
+        str(tmp_path.joinpath("trace.json")),
+    )
+    assert process.returncode == 0, process.stderr
+    n_images = CONFIG.n_cameras * CONFIG.n_intrinsics_images
+    assert f"Intrinsics images detected: {n_images} / {n_images}" in process.stdout
+    for idx in range(CONFIG.n_cameras):
+        assert output_dir.joinpath(f"hires_cam{idx + 1}_params.mat").exists()
+    assert tmp_path.joinpath("trace.json").exists()
+    assert any(tmp_path.joinpath("cache").iterdir())
+
+    # bundle adjustment needs the extrinsics videos: rejected before calibrating
+    process = run_cli(
+        "caldannce.do_calibrate_stateful",
+        root_dir,
+        tmp_path.joinpath("bundle_adjust"),
+        "--no-detection-cache",
+        "--bundle-adjust",
+    )
+    assert process.returncode != 0
+    assert "ExtrinsicsChessboardVideo" in process.stderr
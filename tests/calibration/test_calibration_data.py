@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+from caldannce.calibration_data import CameraParams
+from tests.calibration.benchmark import CASES, make_rig
+
+CONFIG = CASES["small"]
+
+
+@pytest.fixture
+def camera_params():
+    return make_rig(CONFIG, np.random.default_rng(0))
+
+
+@pytest.fixture
+def worldpoints():
+    # points around the board, in front of every camera
+    return np.random.default_rng(1).uniform(-50, 250, size=(20, 3))
+
+
+def cv2_project_points(p: CameraParams, worldpoints, distort: bool) -> np.ndarray:
+    dist_coeffs = np.zeros(5)
+    if distort:
+        dist_coeffs[[0, 1]] = p.r_distort
+        dist_coeffs[[2, 3]] = p.t_distort
+    imgpoints, _jacobian = cv2.projectPoints(
+        worldpoints,
+        cv2.Rodrigues(p.rotation_matrix)[0],
+        p.translation_vector,
+        p.camera_matrix,
+        dist_coeffs,
+    )
+    return imgpoints.reshape(-1, 2)
+
+
+@pytest.mark.parametrize("distort", [False, True])
+def test_project_points_matches_opencv(camera_params, worldpoints, distort):
+    for p in camera_params:
+        np.testing.assert_allclose(
+            p.project_points(worldpoints, distort=distort),
+            cv2_project_points(p, worldpoints, distort),
+            atol=1e-6,
+        )
+
+
+@pytest.mark.parametrize("distort", [False, True])
+def test_project_points_multi(camera_params, worldpoints, distort):
+    batched = worldpoints.reshape(4, 5, 3)
+    projected = CameraParams.project_points_multi(camera_params, batched, distort)
+    assert projected.shape == (len(camera_params), 4, 5, 2)
+    for p, x in zip(camera_params, projected):
+        np.testing.assert_allclose(
+            x.reshape(-1, 2), cv2_project_points(p, worldpoints, distort), atol=1e-6
+        )
@@ -0,0 +1,142 @@
+import json
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from caldannce.calibration_data import CameraParams
+from caldannce.calibration_session import CalibrationSession, fingerprint
+from caldannce.do_calibrate_stateful import do_calibrate_stateful
+from caldannce.methods.intrinsics_chessboard import IntrinsicsChessboard
+from tests.calibration.benchmark import CASES, render_dataset
+
+CONFIG = CASES["small"]
+CAMERA_NAMES = [f"Camera{idx + 1}" for idx in range(CONFIG.n_cameras)]
+
+
+@pytest.fixture(scope="module")
+def rendered_rig(tmp_path_factory):
+    root_dir = tmp_path_factory.mktemp("rig")
+    render_dataset(CONFIG, root_dir)
+    return root_dir
+
+
+@pytest.fixture
+def rig(rendered_rig, tmp_path):
+    """A copy of the rendered images, which a test may modify"""
+    root_dir = tmp_path.joinpath("rig")
+    shutil.copytree(rendered_rig, root_dir)
+    return root_dir
+
+
+def calibrate(root_dir, session_dir, output_name="output"):
+    return do_calibrate_stateful(
+        intrinsics_dir=str(root_dir.joinpath("intrinsics")),
+        extrinsics_dir=str(root_dir.joinpath("extrinsics")),
+        output_dir=str(root_dir.joinpath(output_name)),
+        rows=CONFIG.rows,
+        cols=CONFIG.cols,
+        square_size_mm=CONFIG.square_size_mm,
+        session_dir=str(session_dir),
+    )
+
+
+def session_statuses(session_dir) -> dict[str, str]:
+    with open(session_dir.joinpath("session.json")) as f:
+        summary = json.load(f)
+    return {name: camera["status"] for name, camera in summary["cameras"].items()}
+
+
+def test_fingerprint():
+    method = IntrinsicsChessboard(CONFIG.rows, CONFIG.cols, CONFIG.square_size_mm)
+    camdata = IntrinsicsChessboard.Camdata(intrinsics_paths=["a.png", "b.png"])
+    base = fingerprint(method, camdata)
+    assert fingerprint(method, camdata) == base
+
+    # settings which don't change the results are ignored
+    method.n_threads = 7
+    assert fingerprint(method, camdata) == base
+
+    other = IntrinsicsChessboard(CONFIG.rows, CONFIG.cols, CONFIG.square_size_mm + 1)
+    assert fingerprint(other, camdata) != base
+    assert fingerprint(method, IntrinsicsChessboard.Camdata(["a.png"])) != base
+    # dependent stages change with their parents
+    assert fingerprint(method, camdata, "parent") != base
+
+
+def test_resume_session(rig, tmp_path):
+    session_dir = tmp_path.joinpath("session")
+    first = calibrate(rig, session_dir)
+    report = first.calibrator.report
+    assert all(report.reused_stages[name] == [] for name in CAMERA_NAMES)
+    assert list(first.calibrator.stage_seconds()) == [
+        "intrinsics",
+        "extrinsics",
+        "export",
+    ]
+    assert session_statuses(session_dir) == {name: "done" for name in CAMERA_NAMES}
+
+    second = calibrate(rig, session_dir, output_name="output2")
+    report = second.calibrator.report
+    for name in CAMERA_NAMES:
+        assert report.reused_stages[name] == ["intrinsics", "extrinsics"]
+    # reused stages are not timed again
+    assert list(second.calibrator.stage_seconds()) == ["export"]
+    for a, b in zip(first.camera_params, second.camera_params):
+        assert CameraParams.compare(a, b)
+    assert "Reused from session: intrinsics of 3 cameras" in second.report_summary
+
+
+def test_new_image_invalidates_camera(rig, tmp_path):
+    session_dir = tmp_path.joinpath("session")
+    calibrate(rig, session_dir)
+
+    # a new intrinsics image for Camera2 (a copy of an existing one)
+    camera_dir = rig.joinpath("intrinsics", "Camera2")
+    shutil.copy(camera_dir.joinpath("0.png"), camera_dir.joinpath("100.png"))
+
+    results = calibrate(rig, session_dir, output_name="output2")
+    report = results.calibrator.report
+    # intrinsics recomputed, and the extrinsics which depended on them discarded
+    assert report.reused_stages["Camera2"] == []
+    n_images = CONFIG.n_cameras * CONFIG.n_intrinsics_images
+    assert report.total_intrinsics_images == n_images + 1
+    for name in ["Camera1", "Camera3"]:
+        assert report.reused_stages[name] == ["intrinsics", "extrinsics"]
+
+    state = CalibrationSession(session_dir).load_camera("Camera2")
+    assert state.status == "done"
+    assert state.intrinsics_report.total_intrinsics_images == (
+        CONFIG.n_intrinsics_images + 1
+    )
+
+
+def test_retry_failed_camera(rig, tmp_path):
+    session_dir = tmp_path.joinpath("session")
+    # no chessboard in Camera2's extrinsics image
+    extrinsics_image = rig.joinpath("extrinsics", "Camera2", "0.png")
+    original = extrinsics_image.read_bytes()
+    blank = np.full((CONFIG.height, CONFIG.width), 128, dtype=np.uint8)
+    cv2.imwrite(str(extrinsics_image), blank)
+
+    with pytest.raises(Exception, match="Calibration failed for 1 of 3 cameras"):
+        calibrate(rig, session_dir)
+    assert session_statuses(session_dir) == {
+        "Camera1": "done",
+        "Camera2": "failed",
+        "Camera3": "done",
+    }
+    state = CalibrationSession(session_dir).load_camera("Camera2")
+    assert state.error
+    # the intrinsics completed before the failure
+    assert state.intrinsics is not None
+
+    extrinsics_image.write_bytes(original)
+    results = calibrate(rig, session_dir)
+    report = results.calibrator.report
+    assert report.reused_stages["Camera1"] == ["intrinsics", "extrinsics"]
+    assert report.reused_stages["Camera2"] == ["intrinsics"]
+    assert report.reused_stages["Camera3"] == ["intrinsics", "extrinsics"]
+    assert session_statuses(session_dir) == {name: "done" for name in CAMERA_NAMES}
+    assert CalibrationSession(session_dir).load_camera("Camera2").error is None
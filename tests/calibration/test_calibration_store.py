@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+
+from caldannce.calibrate_stateful import CustomCalibrationData
+from caldannce.calibration_data import CameraParams
+from caldannce.calibration_store import STORE_FILE_NAME, CalibrationStore
+from caldannce.project_utils import write_calibration_params
+from tests.calibration.benchmark import CASES, make_rig
+
+
+@pytest.fixture
+def calibration_data():
+    config = CASES["small"]
+    camera_params = make_rig(config, np.random.default_rng(config.seed))
+    return CustomCalibrationData(
+        camera_params=camera_params,
+        camera_names=[f"Camera{i + 1}" for i in range(len(camera_params))],
+        n_cameras=len(camera_params),
+    )
+
+
+def no_hires_file_loads(monkeypatch):
+    def fail(filename):
+        raise AssertionError(f"Unexpected hires file load: {filename}")
+
+    monkeypatch.setattr(CameraParams, "load_from_hires_file", staticmethod(fail))
+
+
+def assert_params_equal(a: list[CameraParams], b: list[CameraParams]):
+    assert len(a) == len(b)
+    for x, y in zip(a, b):
+        assert CameraParams.compare(x, y)
+
+
+def test_store_used_for_matching_hires_files(tmp_path, calibration_data, monkeypatch):
+    write_calibration_params(calibration_data, tmp_path)
+    store = CalibrationStore(tmp_path.joinpath(STORE_FILE_NAME))
+    assert [f["name"] for f in store.metadata["hires_files"]] == [
+        "hires_cam1_params.mat",
+        "hires_cam2_params.mat",
+        "hires_cam3_params.mat",
+    ]
+
+    from_files = CameraParams.load_list_from_hires_folder(tmp_path)
+    assert_params_equal(from_files, calibration_data.camera_params)
+
+    no_hires_file_loads(monkeypatch)
+    from_store = CameraParams.load_list_from_hires_folder(tmp_path)
+    assert_params_equal(from_store, calibration_data.camera_params)
+
+
+def test_store_ignored_for_replaced_hires_file(tmp_path, calibration_data):
+    write_calibration_params(calibration_data, tmp_path.joinpath("a"))
+    other = CustomCalibrationData(
+        camera_params=calibration_data.camera_params[::-1],
+        camera_names=calibration_data.camera_names,
+        n_cameras=calibration_data.n_cameras,
+    )
+    write_calibration_params(other, tmp_path.joinpath("b"))
+
+    # replace a file with an older one, keeping its mtime (like cp -p or rsync -a): the
+    # store is still newer than every hires file
+    replaced = tmp_path.joinpath("a", "hires_cam1_params.mat")
+    source = tmp_path.joinpath("b", "hires_cam1_params.mat")
+    replaced.write_bytes(source.read_bytes())
+    stat = source.stat()
+    os.utime(replaced, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+
+    loaded = CameraParams.load_list_from_hires_folder(tmp_path.joinpath("a"))
+    assert CameraParams.compare(loaded[0], other.camera_params[0])
+    assert_params_equal(loaded[1:], calibration_data.camera_params[1:])
+
+
+def test_no_store_without_label3d_format(tmp_path, calibration_data):
+    write_calibration_params(calibration_data, tmp_path)
+    assert tmp_path.joinpath(STORE_FILE_NAME).exists()
+
+    write_calibration_params(calibration_data, tmp_path, disable_label3d_format=True)
+    assert not tmp_path.joinpath(STORE_FILE_NAME).exists()
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+
+from caldannce import chessboard_detection
+from caldannce.chessboard_detection import detect_chessboard, detect_chessboards
+from caldannce.detection_cache import CornerCache
+
+ROWS = 6
+COLS = 9
+
+
+def make_board_image(square_px: int, margin_px: int) -> np.ndarray:
+    """Grayscale image of a chessboard with ROWS x COLS internal corners on a white
+    background"""
+    squares = (np.indices((ROWS + 1, COLS + 1)).sum(axis=0) % 2) * 255
+    board = np.kron(squares, np.ones((square_px, square_px))).astype(np.uint8)
+    return cv2.copyMakeBorder(
+        board, margin_px, margin_px, margin_px, margin_px, cv2.BORDER_CONSTANT, value=255
+    )
+
+
+@pytest.fixture
+def find_corners_calls(monkeypatch):
+    """Record the keyword arguments of every cv2.findChessboardCorners call"""
+    calls = []
+    find_corners = cv2.findChessboardCorners
+
+    def spy(*args, **kwargs):
+        calls.append(kwargs)
+        return find_corners(*args, **kwargs)
+
+    monkeypatch.setattr(chessboard_detection.cv2, "findChessboardCorners", spy)
+    return calls
+
+
+@pytest.mark.parametrize("square_px", [40, 150])
+def test_fast_check_finds_board(square_px, find_corners_calls):
+    # 150 px squares give a 1600 px wide image, which is downscaled for the fast check
+    gray = make_board_image(square_px, margin_px=square_px)
+
+    corners = detect_chessboard(gray, ROWS, COLS, fast_check=True)
+
+    assert corners is not None
+    assert corners.reshape(-1, 2).shape == (ROWS * COLS, 2)
+    # the refined corners lie on the square boundaries of the full resolution image
+    grid = np.round(corners.reshape(-1, 2) / square_px - 1)
+    assert np.allclose(corners.reshape(-1, 2), (grid + 1) * square_px, atol=1.0)
+
+    assert find_corners_calls[-1]["flags"] & cv2.CALIB_CB_FAST_CHECK
+
+
+def test_fast_check_rejects_frame_without_board(find_corners_calls):
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, size=(480, 640), dtype=np.uint8)
+
+    assert detect_chessboard(gray, ROWS, COLS, fast_check=True) is None
+    assert find_corners_calls[-1]["flags"] & cv2.CALIB_CB_FAST_CHECK
+
+
+def test_fast_check_matches_full_detection():
+    gray = make_board_image(40, margin_px=40)
+
+    full = detect_chessboard(gray, ROWS, COLS, fast_check=False)
+    fast = detect_chessboard(gray, ROWS, COLS, fast_check=True)
+
+    assert full is not None and fast is not None
+    assert np.allclose(full, fast, atol=0.5)
+
+
+def test_detect_chessboards_cache(tmp_path, find_corners_calls):
+    cache = CornerCache(tmp_path)
+    images = [make_board_image(40, margin_px=40), np.full((480, 640), 128, np.uint8)]
+
+    first = list(detect_chessboards(images, ROWS, COLS, n_threads=2, cache=cache))
+    n_calls = len(find_corners_calls)
+    second = list(detect_chessboards(images, ROWS, COLS, n_threads=2, cache=cache))
+
+    assert len(find_corners_calls) == n_calls
+    assert second[1] is None and first[1] is None
+    assert np.array_equal(first[0], second[0])
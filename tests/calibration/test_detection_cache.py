@@ -0,0 +1,97 @@
+import os
+import time
+
+import numpy as np
+
+from caldannce.detection_cache import CornerCache
+
+
+def make_corners(n: int = 54, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 640, size=(n, 1, 2)).astype(np.float32)
+
+
+def test_make_key_depends_on_settings():
+    keys = {
+        CornerCache.make_key("a" * 40, 6, 9, False),
+        CornerCache.make_key("b" * 40, 6, 9, False),
+        CornerCache.make_key("a" * 40, 9, 6, False),
+        CornerCache.make_key("a" * 40, 6, 9, True),
+    }
+    assert len(keys) == 4
+    assert CornerCache.make_key("a" * 40, 6, 9, False) == CornerCache.make_key(
+        "a" * 40, 6, 9, False
+    )
+
+
+def test_hash_image_depends_on_shape_and_content():
+    img = np.zeros((4, 6), dtype=np.uint8)
+    assert CornerCache.hash_image(img) == CornerCache.hash_image(img.copy())
+    assert CornerCache.hash_image(img) != CornerCache.hash_image(img.reshape(6, 4))
+    other = img.copy()
+    other[0, 0] = 1
+    assert CornerCache.hash_image(img) != CornerCache.hash_image(other)
+
+
+def test_get_put_round_trip(tmp_path):
+    cache = CornerCache(tmp_path)
+    found_key = cache.make_key("a" * 40, 6, 9, False)
+    not_found_key = cache.make_key("b" * 40, 6, 9, False)
+    assert cache.get(found_key) is None
+
+    corners = make_corners()
+    cache.put(found_key, corners, (640, 480))
+    cache.put(not_found_key, None, (1280, 1024))
+
+    cached_corners, image_size = cache.get(found_key)
+    np.testing.assert_array_equal(cached_corners, corners)
+    assert image_size == (640, 480)
+    assert cache.get(not_found_key) == (None, (1280, 1024))
+
+    # entries are shared between instances
+    assert CornerCache(tmp_path).get(not_found_key) == (None, (1280, 1024))
+
+
+def test_get_unreadable_entry(tmp_path):
+    cache = CornerCache(tmp_path)
+    key = cache.make_key("a" * 40, 6, 9, False)
+    cache.put(key, make_corners(), (640, 480))
+    cache._entry_path(key).write_bytes(b"not an npz file")
+    assert cache.get(key) is None
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = CornerCache(tmp_path)
+    keys = [cache.make_key(f"{i:040x}", 6, 9, False) for i in range(5)]
+    now = time.time()
+    for i, key in enumerate(keys):
+        cache.put(key, make_corners(seed=i), (640, 480))
+        os.utime(cache._entry_path(key), (now - 100 + i, now - 100 + i))
+    entry_size = cache._entry_path(keys[0]).stat().st_size
+
+    # a hit makes the oldest entry the most recently used
+    assert cache.get(keys[0]) is not None
+
+    cache.max_bytes = 3 * entry_size
+    cache.prune()
+    assert [cache._entry_path(key).exists() for key in keys] == [
+        True,
+        False,
+        False,
+        True,
+        True,
+    ]
+
+    # under the limit: nothing else is evicted
+    cache.prune()
+    assert sum(cache._entry_path(key).exists() for key in keys) == 3
+
+
+def test_clear(tmp_path):
+    cache = CornerCache(tmp_path.joinpath("corners"))
+    cache.prune()
+    key = cache.make_key("a" * 40, 6, 9, False)
+    cache.put(key, None, (640, 480))
+    cache.clear()
+    assert cache.get(key) is None
+    assert not cache.cache_dir.exists()
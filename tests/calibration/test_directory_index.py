@@ -0,0 +1,185 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from caldannce import directory_index
+from caldannce.directory_index import (
+    DirectoryIndex,
+    clear_index_cache,
+    get_directory_index,
+    set_index_cache_dir,
+)
+from caldannce.project_utils import (
+    get_camera_names,
+    get_extrinsics_dir,
+    get_extrinsics_media_paths,
+    get_intrinsics_dir,
+    get_intrinsics_image_paths,
+)
+
+CAMERA_NAMES = ["Camera1", "Camera2", "Camera3"]
+
+
+@pytest.fixture
+def project(tmp_path) -> Path:
+    """$project/calibration/{extrinsics,intrinsics}/CameraX/..., with distractors"""
+    calibration = tmp_path.joinpath("project", "calibration")
+    for camera_name in CAMERA_NAMES:
+        extrinsics = calibration.joinpath("extrinsics", camera_name)
+        extrinsics.mkdir(parents=True)
+        extrinsics.joinpath("0.mp4").touch()
+        extrinsics.joinpath("1.mp4").touch()
+        extrinsics.joinpath(".0.mp4").touch()
+        intrinsics = calibration.joinpath("intrinsics", camera_name)
+        intrinsics.mkdir(parents=True)
+        for i in [0, 1, 10, 2]:
+            intrinsics.joinpath(f"{i}.png").touch()
+    calibration.joinpath("extrinsics", "notes.txt").touch()
+    calibration.joinpath("extrinsics", "Camera1", "nested").mkdir()
+    return tmp_path.joinpath("project")
+
+
+@pytest.fixture(autouse=True)
+def fresh_index_cache():
+    clear_index_cache()
+    yield
+    set_index_cache_dir(None)
+    clear_index_cache()
+
+
+@pytest.fixture
+def n_builds(monkeypatch) -> list[str]:
+    """Roots crawled by DirectoryIndex.build"""
+    roots = []
+    build = DirectoryIndex.build.__func__
+
+    def counting_build(cls, root, max_depth=directory_index.DEFAULT_INDEX_DEPTH):
+        roots.append(root)
+        return build(cls, root, max_depth)
+
+    monkeypatch.setattr(DirectoryIndex, "build", classmethod(counting_build))
+    return roots
+
+
+def touch_later(path: Path):
+    """Create a file, making sure its directory's mtime changes (coarse timestamps)"""
+    path.touch()
+    stat = path.parent.stat()
+    os.utime(path.parent, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_build(project):
+    extrinsics = project.joinpath("calibration", "extrinsics")
+    index = DirectoryIndex.build(str(extrinsics))
+    assert index.listings[()] == (CAMERA_NAMES, ["notes.txt"])
+    # hidden files are skipped, subdirectories are listed but not crawled (depth 2)
+    assert index.listings[("Camera1",)] == (["nested"], ["0.mp4", "1.mp4"])
+    assert ("Camera1", "nested") not in index.listings
+    assert [parts for parts, _ in index.iter_files(2)][:2] == [
+        ("Camera1", "0.mp4"),
+        ("Camera1", "1.mp4"),
+    ]
+    assert [path for _, path in index.iter_dirs(1)] == [
+        str(extrinsics.joinpath(c)) for c in CAMERA_NAMES
+    ]
+
+
+def test_stale_after_adding_and_removing_files(project, n_builds):
+    extrinsics = str(project.joinpath("calibration", "extrinsics"))
+    index = get_directory_index(extrinsics)
+    assert get_directory_index(extrinsics) is index
+    assert len(n_builds) == 1
+
+    new_file = project.joinpath("calibration", "extrinsics", "Camera2", "2.mp4")
+    touch_later(new_file)
+    assert index.is_stale()
+    index = get_directory_index(extrinsics)
+    assert ("Camera2", "2.mp4") in [parts for parts, _ in index.iter_files(2)]
+
+    new_file.unlink()
+    stat = new_file.parent.stat()
+    os.utime(new_file.parent, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert index.is_stale()
+    index = get_directory_index(extrinsics)
+    assert ("Camera2", "2.mp4") not in [parts for parts, _ in index.iter_files(2)]
+    assert len(n_builds) == 3
+
+
+def test_subindex_from_ancestor(project, n_builds):
+    calibration = project.joinpath("calibration")
+    parent = get_directory_index(str(calibration), max_depth=3)
+    extrinsics = str(calibration.joinpath("extrinsics"))
+
+    index = get_directory_index(extrinsics)
+    assert n_builds == [str(calibration)]
+    assert index.root == extrinsics
+    assert index.max_depth == 2
+    built = DirectoryIndex.build(extrinsics, 2)
+    assert index.listings == built.listings
+    assert index.dir_mtimes == built.dir_mtimes
+    assert parent.subindex(("missing",)) is None
+
+    # not deep enough: crawled
+    get_directory_index(str(calibration.joinpath("extrinsics", "Camera1")), 3)
+    assert len(n_builds) == 3
+
+
+def test_persisted_index(project, tmp_path, n_builds):
+    set_index_cache_dir(tmp_path.joinpath("cache"))
+    intrinsics = str(project.joinpath("calibration", "intrinsics"))
+    index = get_directory_index(intrinsics)
+    assert len(list(tmp_path.joinpath("cache").iterdir())) == 1
+
+    # a later run loads it instead of crawling
+    clear_index_cache()
+    loaded = get_directory_index(intrinsics)
+    assert len(n_builds) == 1
+    assert loaded is not index
+    assert loaded.listings == index.listings
+    assert loaded.dir_mtimes == index.dir_mtimes
+    assert DirectoryIndex.from_dict(index.as_dict()).listings == index.listings
+
+    # ... unless the folder changed
+    clear_index_cache()
+    touch_later(project.joinpath("calibration", "intrinsics", "Camera1", "3.png"))
+    get_directory_index(intrinsics)
+    assert len(n_builds) == 2
+
+    # unreadable persisted index: crawled again
+    for path in tmp_path.joinpath("cache").iterdir():
+        path.write_text("{")
+    clear_index_cache()
+    get_directory_index(intrinsics)
+    assert len(n_builds) == 3
+
+
+def test_project_utils_match_glob(project):
+    """The path helpers find the same files as globbing the folders"""
+    calibration = project.joinpath("calibration")
+    extrinsics_dir = get_extrinsics_dir(str(project))
+    intrinsics_dir = get_intrinsics_dir(str(project))
+    assert extrinsics_dir == str(calibration.joinpath("extrinsics"))
+    assert intrinsics_dir == str(calibration.joinpath("intrinsics"))
+
+    camera_names = get_camera_names(extrinsics_dir)
+    assert camera_names == sorted(
+        {p.parent.name for p in Path(extrinsics_dir).glob("[Cc]amera*/*.mp4")}
+    )
+
+    assert get_extrinsics_media_paths(extrinsics_dir, camera_names, ret_dict=True) == {
+        c: str(p) for c in camera_names for p in Path(extrinsics_dir, c).glob("0.mp4")
+    }
+    media = get_extrinsics_media_paths(extrinsics_dir, camera_names)
+    assert [(m["camera_name"], m["file_name"]) for m in media] == [
+        (c, "0.mp4") for c in camera_names
+    ]
+
+    intrinsics = get_intrinsics_image_paths(intrinsics_dir, camera_names)
+    assert intrinsics == [
+        {
+            "camera_name": c,
+            "full_paths": sorted(str(p) for p in Path(intrinsics_dir, c).glob("*.png")),
+        }
+        for c in camera_names
+    ]
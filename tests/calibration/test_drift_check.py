@@ -0,0 +1,197 @@
+import json
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from caldannce.calibrate_stateful import CustomCalibrationData
+from caldannce.calibration_data import CameraParams
+from caldannce.drift_check import (
+    DriftThresholds,
+    check_drift,
+    parse_and_check_drift,
+    pose_delta,
+)
+from caldannce.do_calibrate_stateful import do_calibrate_stateful
+from caldannce.project_utils import (
+    get_extrinsics_media_paths,
+    write_calibration_params,
+)
+from tests.calibration.benchmark import CASES, render_dataset
+
+CONFIG = CASES["small"]
+CAMERA_NAMES = [f"Camera{idx + 1}" for idx in range(CONFIG.n_cameras)]
+
+
+@pytest.fixture(scope="module")
+def rig(tmp_path_factory):
+    """Synthetic rig and its calibration (the detected board orientation defines the
+    world frame, so the checks compare against a calibration, not the ground truth)"""
+    root_dir = tmp_path_factory.mktemp("rig")
+    render_dataset(CONFIG, root_dir)
+    results = do_calibrate_stateful(
+        intrinsics_dir=str(root_dir.joinpath("intrinsics")),
+        extrinsics_dir=str(root_dir.joinpath("extrinsics")),
+        output_dir=str(root_dir.joinpath("output")),
+        rows=CONFIG.rows,
+        cols=CONFIG.cols,
+        square_size_mm=CONFIG.square_size_mm,
+    )
+    return root_dir, results.camera_params
+
+
+def rotation_z(angle_deg: float) -> np.ndarray:
+    rotation_matrix, _jacobian = cv2.Rodrigues(np.array([0, 0, np.radians(angle_deg)]))
+    return rotation_matrix
+
+
+def moved(camera: CameraParams, angle_deg: float, offset_mm: np.ndarray):
+    """Copy of the camera rotated about its optical axis and with its center moved"""
+    rotation_matrix = rotation_z(angle_deg) @ camera.rotation_matrix
+    center = -camera.rotation_matrix.T @ camera.translation_vector.reshape(3, 1)
+    center = center + np.reshape(offset_mm, (3, 1))
+    return CameraParams(
+        camera_matrix=camera.camera_matrix,
+        r_distort=camera.r_distort,
+        t_distort=camera.t_distort,
+        rotation_matrix=rotation_matrix,
+        translation_vector=-rotation_matrix @ center,
+    )
+
+
+def run_check(root_dir, cameras):
+    media_paths = get_extrinsics_media_paths(
+        str(root_dir.joinpath("extrinsics")), CAMERA_NAMES, ret_dict=True
+    )
+    return check_drift(
+        cameras,
+        CAMERA_NAMES,
+        media_paths,
+        CONFIG.rows,
+        CONFIG.cols,
+        CONFIG.square_size_mm,
+    )
+
+
+def write_calibration(output_dir, cameras):
+    write_calibration_params(
+        CustomCalibrationData(
+            camera_params=cameras, camera_names=CAMERA_NAMES, n_cameras=len(cameras)
+        ),
+        output_dir=str(output_dir),
+        include_calibration_json=False,
+        include_calibration_store=False,
+    )
+    return str(output_dir)
+
+
+def test_pose_delta(rig):
+    _root_dir, calibration = rig
+    camera = calibration[0]
+
+    rotation_deg, translation_mm = pose_delta(
+        camera, camera.rotation_matrix, camera.translation_vector
+    )
+    assert rotation_deg == pytest.approx(0, abs=1e-5)
+    assert translation_mm == pytest.approx(0, abs=1e-9)
+
+    solved = moved(camera, 2.0, np.array([3.0, -4.0, 0.0]))
+    rotation_deg, translation_mm = pose_delta(
+        camera, solved.rotation_matrix, solved.translation_vector
+    )
+    assert rotation_deg == pytest.approx(2.0)
+    assert translation_mm == pytest.approx(5.0)
+
+
+def test_check_drift_unchanged_rig(rig):
+    root_dir, calibration = rig
+
+    result = run_check(root_dir, calibration)
+
+    assert result.camera_names == CAMERA_NAMES
+    assert np.all(result.rotation_deltas_deg < 0.1)
+    assert np.all(result.translation_deltas_mm < 1.0)
+    assert np.all(result.pnp_rpes < 0.5)
+    assert np.all(result.triangulation_rpes < 0.5)
+    assert result.failures(DriftThresholds()) == []
+
+
+def test_check_drift_moved_camera(rig):
+    root_dir, calibration = rig
+    stored = [moved(calibration[0], 2.0, np.array([0.0, 0.0, 20.0]))] + calibration[1:]
+
+    result = run_check(root_dir, stored)
+
+    assert result.rotation_deltas_deg[0] == pytest.approx(2.0, abs=0.1)
+    assert result.translation_deltas_mm[0] == pytest.approx(20.0, abs=1.0)
+    assert np.all(result.rotation_deltas_deg[1:] < 0.1)
+    failures = result.failures(DriftThresholds())
+    assert any(f.startswith("Camera1: rotated by") for f in failures)
+    assert any(f.startswith("Camera1: moved by") for f in failures)
+    # the triangulation RPE is shared, but only the moved camera's pose changed
+    pose_failures = ("Camera2: rotated", "Camera2: moved")
+    assert not any(f.startswith(pose_failures) for f in failures)
+    assert result.triangulation_rpes[0] > DriftThresholds().max_rpe_px
+
+
+def test_check_drift_board_not_detected(rig, tmp_path):
+    root_dir, calibration = rig
+    for camera_name in CAMERA_NAMES:
+        camera_dir = tmp_path.joinpath("extrinsics", camera_name)
+        camera_dir.mkdir(parents=True)
+        img = cv2.imread(str(root_dir.joinpath("extrinsics", camera_name, "0.png")))
+        if camera_name == "Camera2":
+            img[:] = 127
+        cv2.imwrite(str(camera_dir.joinpath("0.png")), img)
+
+    result = run_check(tmp_path, calibration)
+
+    assert np.isnan(result.rotation_deltas_deg[1])
+    assert np.isnan(result.pnp_rpes[1])
+    assert not np.isnan(result.triangulation_rpes[0])
+    failures = result.failures(DriftThresholds())
+    assert failures == ["Camera2: chessboard not detected"]
+    assert result.as_dict()["rotation_deltas_deg"][1] is None
+
+
+def drift_check_main(monkeypatch, calibration_dir, extrinsics_dir, output_json):
+    argv = [
+        "drift_check",
+        "-k",
+        calibration_dir,
+        "-e",
+        extrinsics_dir,
+        "-r",
+        str(CONFIG.rows),
+        "-c",
+        str(CONFIG.cols),
+        "-s",
+        str(CONFIG.square_size_mm),
+        "-o",
+        str(output_json),
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    parse_and_check_drift()
+
+
+def test_exit_code(rig, tmp_path, monkeypatch):
+    root_dir, calibration = rig
+    extrinsics_dir = str(root_dir.joinpath("extrinsics"))
+    output_json = tmp_path.joinpath("drift.json")
+
+    valid_dir = str(root_dir.joinpath("output"))
+    drift_check_main(monkeypatch, valid_dir, extrinsics_dir, output_json)
+    with open(output_json) as f:
+        assert json.load(f)["failures"] == []
+
+    offset = np.array([10.0, 0.0, 0.0])
+    stored = calibration[:-1] + [moved(calibration[-1], 0.0, offset)]
+    moved_dir = write_calibration(tmp_path.joinpath("moved"), stored)
+    with pytest.raises(SystemExit) as exc_info:
+        drift_check_main(monkeypatch, moved_dir, extrinsics_dir, output_json)
+    assert exc_info.value.code == 1
+    with open(output_json) as f:
+        failures = json.load(f)["failures"]
+    assert f"Camera{CONFIG.n_cameras}: moved by 10.00 mm (max 5.0)" in failures
+    assert not any(f.startswith("Camera1: moved") for f in failures)
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import pytest
+
+from caldannce.calibration_data import CameraParams
+from caldannce.image_display import DisplayPyramid, UndistortMapCache
+
+WIDTH, HEIGHT = 640, 480
+
+
+def make_camera(focal: float = 600.0) -> CameraParams:
+    return CameraParams(
+        camera_matrix=np.array(
+            [[focal, 0, WIDTH / 2], [0, focal, HEIGHT / 2], [0, 0, 1]], dtype=np.float64
+        ),
+        r_distort=np.array([-0.2, 0.05]),
+        t_distort=np.array([0.001, -0.001]),
+        rotation_matrix=np.eye(3),
+        translation_vector=np.zeros((3, 1)),
+    )
+
+
+@pytest.fixture
+def image():
+    """Smooth random texture (so interpolation differences stay small)"""
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(img, (0, 0), 3)
+
+
+def gradient(width: int, height: int) -> np.ndarray:
+    """Image whose value is the (full-res) x coordinate of the pixel center"""
+    return np.tile(np.arange(width, dtype=np.float32), (height, 1))
+
+
+def test_undistort_matches_cv2(image):
+    camera = make_camera()
+    cache = UndistortMapCache()
+
+    undistorted = cache.undistort(image, 0, camera)
+
+    expected = cv2.undistort(image, camera.camera_matrix, camera.dist)
+    diff = np.abs(undistorted.astype(np.int16) - expected.astype(np.int16))
+    # fixed-point maps: interpolation differs slightly from cv2.undistort
+    assert np.mean(diff) < 0.5
+    assert np.max(diff) <= 3
+
+
+def test_undistort_maps_cached(image):
+    camera = make_camera()
+    cache = UndistortMapCache()
+
+    map1, map2 = cache.get_maps(0, camera, (WIDTH, HEIGHT))
+    cached = cache.get_maps(0, camera, (WIDTH, HEIGHT))
+    assert cached[0] is map1 and cached[1] is map2
+
+    # other camera, calibration data or image size: new maps
+    assert cache.get_maps(1, camera, (WIDTH, HEIGHT))[0] is not map1
+    changed = cache.get_maps(0, make_camera(focal=650.0), (WIDTH, HEIGHT))
+    assert changed[0] is not map1
+    resized = cache.get_maps(0, make_camera(focal=650.0), (WIDTH // 2, HEIGHT // 2))
+    assert resized[0].shape[0:2] == (HEIGHT // 2, WIDTH // 2)
+
+    cache.clear()
+    assert cache.get_maps(0, camera, (WIDTH, HEIGHT))[0] is not map1
+
+
+def test_pyramid_levels():
+    pyramid = DisplayPyramid(np.zeros((3000, 4000), np.uint8), max_width=1024)
+
+    assert [level.shape[1] for level in pyramid.levels] == [4000, 2000, 1000]
+    assert (pyramid.width, pyramid.height) == (4000, 3000)
+    assert pyramid.coarsest() is pyramid.levels[-1]
+    assert pyramid.full_extent == (-0.5, 3999.5, 2999.5, -0.5)
+
+    small = DisplayPyramid(np.zeros((480, 640), np.uint8), max_width=1024)
+    assert len(small.levels) == 1
+
+
+def test_pyramid_level_for():
+    pyramid = DisplayPyramid(np.zeros((3000, 4000), np.uint8), max_width=1024)
+
+    # whole image: 4 (full-res) pixels per screen pixel
+    assert pyramid.level_for((4000, 3000), (1000, 750)) == 2
+    assert pyramid.level_for((4000, 3000), (2000, 1500)) == 1
+    # the limiting dimension decides
+    assert pyramid.level_for((4000, 3000), (2000, 750)) == 2
+    # zoomed in
+    assert pyramid.level_for((500, 375), (1000, 750)) == 0
+    # clamped to the coarsest level
+    assert pyramid.level_for((4000, 3000), (100, 75)) == 2
+    assert pyramid.level_for((4000, 3000), (0, 0)) == 2
+
+
+def test_pyramid_tile_extent():
+    pyramid = DisplayPyramid(gradient(4000, 3000), max_width=1024)
+
+    tile, extent = pyramid.tile(1, (1000, 2000), (1500, 500))
+
+    left, right, bottom, top = extent
+    # the requested region plus the margin (on each side) is covered
+    assert left <= 750 and right >= 2250
+    assert top <= 250 and bottom >= 1750
+    scale = 2
+    assert tile.shape == ((bottom - top) / scale, (right - left) / scale)
+    # tile pixel centers, in full-res coordinates, match the image content (pyrDown
+    # samples the even pixels, so within half a full-res pixel per level)
+    centers = left + scale * (np.arange(tile.shape[1]) + 0.5)
+    np.testing.assert_allclose(tile[tile.shape[0] // 2], centers, atol=0.5)
+
+
+def test_pyramid_tile_clipped():
+    pyramid = DisplayPyramid(gradient(4000, 3000), max_width=1024)
+
+    tile, extent = pyramid.tile(0, (-100, 300), (2900, 3100))
+
+    assert extent == (-0.5, 400.5, 2999.5, 2849.5)
+    assert tile.shape == (150, 401)
+    assert tile[0, 0] == 0
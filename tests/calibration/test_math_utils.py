@@ -0,0 +1,52 @@
+import numpy as np
+
+from caldannce.math_utils import triangulate_batch, triangulate_simple
+from tests.calibration.benchmark import CASES, make_rig
+
+CONFIG = CASES["small"]
+
+
+def make_views(n_points: int = 50, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    camera_params = make_rig(CONFIG, rng)
+    view_matrices = np.stack([p.projection_matrix for p in camera_params])
+    worldpoints = rng.uniform(-50, 250, size=(n_points, 3))
+    imgpoints = np.stack(
+        [p.project_points(worldpoints) for p in camera_params]
+    )  # (N, M, 2)
+    return view_matrices, worldpoints, imgpoints
+
+
+def test_triangulate_batch_matches_simple():
+    view_matrices, worldpoints, imgpoints = make_views()
+    rng = np.random.default_rng(1)
+    noisy = imgpoints + rng.normal(scale=0.5, size=imgpoints.shape)
+
+    batch, residuals = triangulate_batch(noisy, view_matrices, chunk_size=16)
+    simple = np.stack(
+        [
+            triangulate_simple(noisy[:, i], view_matrices)
+            for i in range(noisy.shape[1])
+        ]
+    )
+    np.testing.assert_allclose(batch, simple, atol=1e-6)
+    np.testing.assert_allclose(batch, worldpoints, atol=5)
+    assert np.all(residuals < 2)
+
+    exact, exact_residuals = triangulate_batch(imgpoints, view_matrices)
+    np.testing.assert_allclose(exact, worldpoints, atol=1e-6)
+    np.testing.assert_allclose(exact_residuals, 0, atol=1e-6)
+
+
+def test_triangulate_batch_visibility():
+    view_matrices, worldpoints, imgpoints = make_views(n_points=4)
+    imgpoints[0, 1] = np.nan  # point 1: not detected by the first camera
+    visibility = np.ones(imgpoints.shape[:2], dtype=bool)
+    visibility[1:, 2] = False  # point 2: only seen by the first camera
+
+    batch, residuals = triangulate_batch(imgpoints, view_matrices, visibility)
+    np.testing.assert_allclose(batch[[0, 1, 3]], worldpoints[[0, 1, 3]], atol=1e-6)
+    simple = triangulate_simple(imgpoints[1:, 1], view_matrices[1:])
+    np.testing.assert_allclose(batch[1], simple, atol=1e-6)
+    assert np.all(np.isnan(batch[2]))
+    assert np.isnan(residuals[2])
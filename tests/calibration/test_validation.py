@@ -0,0 +1,199 @@
+import json
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from caldannce.calibrate_stateful import CustomCalibrationData
+from caldannce.math_utils import get_chessboard_coordinates
+from caldannce.project_utils import get_validation_sequences, write_calibration_params
+from caldannce.validation import (
+    detect_validation_boards,
+    parse_and_validate,
+    triangulation_rpes,
+    validate_chessboard,
+)
+from tests.calibration.benchmark import CASES, ChessboardRenderer, make_rig
+from tests.calibration.test_bundle_adjustment import moved_board_poses, observe
+
+CONFIG = CASES["small"]
+CAMERA_NAMES = [f"Camera{idx + 1}" for idx in range(CONFIG.n_cameras)]
+N_FRAMES = 6
+
+
+@pytest.fixture(scope="module")
+def rig(tmp_path_factory):
+    """Synthetic rig (ground truth params) with rendered validation frames"""
+    root_dir = tmp_path_factory.mktemp("rig")
+    rng = np.random.default_rng(CONFIG.seed)
+    cameras = make_rig(CONFIG, rng)
+    object_points = get_chessboard_coordinates(
+        CONFIG.rows, CONFIG.cols, CONFIG.square_size_mm
+    )
+    poses = moved_board_poses(cameras, object_points, rng, N_FRAMES)
+    for camera_name, camera in zip(CAMERA_NAMES, cameras):
+        camera_dir = root_dir.joinpath("validation", camera_name)
+        camera_dir.mkdir(parents=True)
+        renderer = ChessboardRenderer(camera, CONFIG)
+        for frame_idx, (r, t) in enumerate(poses):
+            # board -> camera
+            img = renderer.render(
+                camera.rotation_matrix @ r,
+                camera.rotation_matrix @ t + camera.translation_vector.reshape(3),
+            )
+            cv2.imwrite(str(camera_dir.joinpath(f"{frame_idx}.png")), img)
+    return root_dir, cameras, object_points, poses
+
+
+def validation_sequences(root_dir):
+    return get_validation_sequences(root_dir.joinpath("validation"), CAMERA_NAMES)
+
+
+def board_centers(world_points: np.ndarray) -> np.ndarray:
+    """Center of the board in each frame (independent of the corner order)"""
+    return np.mean(world_points, axis=-2)
+
+
+def test_triangulation_rpes(rig):
+    _root_dir, cameras, object_points, poses = rig
+    raw_ipts = np.stack(
+        [
+            np.stack([observe(c, r, t, object_points) for r, t in poses[:3]])
+            for c in cameras
+        ]
+    )
+    truth = np.concatenate([object_points @ r.T + t for r, t in poses[:3]])
+
+    rpes, world_points = triangulation_rpes(cameras, raw_ipts)
+    assert rpes.shape == (CONFIG.n_cameras, 3)
+    assert np.all(rpes < 1e-3)
+    np.testing.assert_allclose(world_points, truth, atol=1e-3)
+
+    # frame 1 not detected by camera 1, frame 2 only detected by camera 1
+    raw_ipts[0, 1] = np.nan
+    raw_ipts[1:, 2] = np.nan
+    n_points = len(object_points)
+    rpes, world_points = triangulation_rpes(cameras, raw_ipts)
+    assert np.isnan(rpes[0, 1])
+    assert np.all(rpes[1:, 1] < 1e-3)
+    assert np.all(np.isnan(rpes[:, 2]))
+    assert np.all(np.isnan(world_points[2 * n_points :]))
+    np.testing.assert_allclose(
+        world_points[: 2 * n_points], truth[: 2 * n_points], atol=1e-3
+    )
+
+
+def test_validate_chessboard(rig):
+    root_dir, cameras, object_points, poses = rig
+
+    result = validate_chessboard(
+        cameras,
+        CAMERA_NAMES,
+        validation_sequences(root_dir),
+        CONFIG.rows,
+        CONFIG.cols,
+    )
+
+    assert result.frame_idxs == list(range(N_FRAMES))
+    assert result.rpes.shape == (CONFIG.n_cameras, N_FRAMES)
+    assert np.all(result.rpes < 0.5)
+    assert np.all(result.frame_rpes() < 0.5)
+    truth = np.stack([object_points @ r.T + t for r, t in poses])
+    np.testing.assert_allclose(
+        board_centers(result.world_points), board_centers(truth), atol=1.0
+    )
+    stats = result.camera_stats()
+    assert [s["camera_name"] for s in stats] == CAMERA_NAMES
+    assert all(s["n_frames"] == N_FRAMES for s in stats)
+    assert result.make_summary().startswith(f"Validated {N_FRAMES} frames")
+
+
+def test_validate_chessboard_missing_detections(rig, tmp_path):
+    root_dir, cameras, _object_points, _poses = rig
+    media_paths = validation_sequences(root_dir)
+    # Camera2 doesn't see the board in its first frame
+    blank_path = str(tmp_path.joinpath("blank.png"))
+    cv2.imwrite(blank_path, np.full((CONFIG.height, CONFIG.width), 127, np.uint8))
+    media_paths["Camera2"] = [blank_path] + media_paths["Camera2"][1:]
+
+    result = validate_chessboard(
+        cameras, CAMERA_NAMES, media_paths, CONFIG.rows, CONFIG.cols
+    )
+
+    assert np.isnan(result.rpes[1, 0])
+    assert not np.isnan(result.rpes[0, 0])
+    assert result.camera_stats()[1]["n_frames"] == N_FRAMES - 1
+    assert result.as_dict()["rpes"][1][0] is None
+
+
+def test_detect_validation_boards_sampling(rig):
+    root_dir, _cameras, _object_points, _poses = rig
+    media_paths = validation_sequences(root_dir)["Camera1"]
+
+    detections = detect_validation_boards(
+        media_paths, CONFIG.rows, CONFIG.cols, frame_step=2, max_frames=2
+    )
+
+    assert sorted(detections.keys()) == [0, 2]
+    assert detections[0].shape == (CONFIG.rows * CONFIG.cols, 2)
+
+
+def test_detect_validation_boards_video(rig, tmp_path):
+    root_dir, _cameras, _object_points, _poses = rig
+    video_path = tmp_path.joinpath("0.mp4")
+    writer = cv2.VideoWriter(
+        str(video_path),
+        cv2.VideoWriter_fourcc(*"mp4v"),
+        30,
+        (CONFIG.width, CONFIG.height),
+        False,
+    )
+    for image_path in validation_sequences(root_dir)["Camera1"]:
+        writer.write(cv2.imread(image_path, cv2.IMREAD_GRAYSCALE))
+    writer.release()
+
+    detections = detect_validation_boards(
+        [str(video_path)], CONFIG.rows, CONFIG.cols, frame_step=2
+    )
+
+    assert sorted(detections.keys()) == list(range(0, N_FRAMES, 2))
+
+
+def test_parse_and_validate(rig, tmp_path, monkeypatch):
+    root_dir, cameras, _object_points, _poses = rig
+    calibration_dir = tmp_path.joinpath("calibration")
+    write_calibration_params(
+        CustomCalibrationData(
+            camera_params=cameras, camera_names=CAMERA_NAMES, n_cameras=len(cameras)
+        ),
+        output_dir=str(calibration_dir),
+        include_calibration_json=False,
+        include_calibration_store=False,
+    )
+    output_json = tmp_path.joinpath("validation.json")
+    argv = [
+        "validation",
+        "-k",
+        str(calibration_dir),
+        "-v",
+        str(root_dir.joinpath("validation")),
+        "-r",
+        str(CONFIG.rows),
+        "-c",
+        str(CONFIG.cols),
+        "--max-frames",
+        "4",
+        "-o",
+        str(output_json),
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    parse_and_validate()
+
+    with open(output_json) as f:
+        result = json.load(f)
+    assert result["camera_names"] == CAMERA_NAMES
+    assert result["frame_idxs"] == [0, 1, 2, 3]
+    assert all(s["n_frames"] == 4 for s in result["camera_stats"])
+    assert all(s["mean"] < 0.5 for s in result["camera_stats"])
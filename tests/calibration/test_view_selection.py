@@ -0,0 +1,59 @@
+import numpy as np
+
+from caldannce.view_selection import select_views, view_features
+
+ROWS, COLS = 6, 9
+IMAGE_SIZE = (640, 480)
+
+
+def make_view(cx: float, cy: float, scale: float, tilt: float = 0.0) -> np.ndarray:
+    """Corners (rows * cols, 1, 2) of a board centered at (cx, cy), scale px per square;
+    tilt shrinks its right edge (perspective-like)"""
+    x, y = np.meshgrid(np.arange(COLS) - (COLS - 1) / 2, np.arange(ROWS) - (ROWS - 1) / 2)
+    shrink = 1 - tilt * (x / (COLS - 1) + 0.5)
+    corners = np.stack([cx + scale * x, cy + scale * y * shrink], axis=-1)
+    return corners.reshape(-1, 1, 2).astype(np.float32)
+
+
+def test_view_features():
+    flat = make_view(320, 240, 20)
+    tilted = make_view(160, 120, 20, tilt=0.5)
+    features = view_features(
+        np.stack([flat, tilted]).reshape(2, -1, 2), ROWS, COLS, IMAGE_SIZE
+    )
+    np.testing.assert_allclose(features[0, 0:2], [0.5, 0.5])
+    np.testing.assert_allclose(features[1, 0:2], [0.25, 0.25], atol=0.01)
+    np.testing.assert_allclose(features[0, 3:5], 0, atol=1e-6)
+    assert features[1, 4] > 0.1
+
+
+def test_select_views_all_under_max_views():
+    views = [make_view(320, 240, 20), make_view(200, 200, 15)]
+    selection = select_views(views, ROWS, COLS, IMAGE_SIZE, max_views=2)
+    assert selection.selected_idxs == [0, 1]
+    assert selection.n_views == 2
+    assert selection.coverage_selected == selection.coverage_all
+
+    empty = select_views([], ROWS, COLS, IMAGE_SIZE)
+    assert empty.selected_idxs == [] and empty.n_views == 0
+
+
+def test_select_views_drops_near_duplicates():
+    # 4 distinct poses covering the sensor's quadrants, each repeated with tiny jitter
+    poses = [(160, 120), (480, 120), (160, 360), (480, 360)]
+    rng = np.random.default_rng(0)
+    views = []
+    for cx, cy in poses:
+        for _ in range(10):
+            views.append(make_view(cx + rng.uniform(-1, 1), cy + rng.uniform(-1, 1), 15))
+
+    selection = select_views(views, ROWS, COLS, IMAGE_SIZE, max_views=4)
+    assert selection.n_views == 40
+    assert selection.selected_idxs == sorted(selection.selected_idxs)
+    # one view of each pose
+    assert sorted(idx // 10 for idx in selection.selected_idxs) == [0, 1, 2, 3]
+    assert selection.coverage_selected == selection.coverage_all
+
+    selection = select_views(views, ROWS, COLS, IMAGE_SIZE, max_views=10)
+    assert len(selection.selected_idxs) == 10
+    assert len(set(selection.selected_idxs)) == 10
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from caldannce.calibrate_stateful import Calibrator, CustomCalibrationData
+from caldannce.calibration_data import CameraParams
+from caldannce.do_calibrate_stateful import do_calibrate_stateful
+from caldannce.methods.extrinsics_chessboard import ExtrinsicsChessboard
+from caldannce.methods.intrinsics_chessboard_warm_start import (
+    IntrinsicsChessboardWarmStart,
+    spread_subset,
+)
+from caldannce.project_utils import (
+    get_hires_files,
+    get_intrinsics_image_paths,
+    write_calibration_params,
+)
+from tests.calibration.benchmark import CASES, parameter_errors, render_dataset
+
+CONFIG = CASES["small"]
+CAMERA_NAMES = [f"Camera{idx + 1}" for idx in range(CONFIG.n_cameras)]
+
+
+@pytest.fixture(scope="module")
+def rig(tmp_path_factory):
+    root_dir = tmp_path_factory.mktemp("rig")
+    truth = render_dataset(CONFIG, root_dir)
+    return root_dir, truth
+
+
+def write_previous(output_dir, cameras: list[CameraParams], focal_scale: float = 1.0):
+    """Previous calibration of the cameras (hires files), with scaled focal lengths"""
+    previous = []
+    for camera in cameras:
+        camera_matrix = camera.camera_matrix.copy()
+        camera_matrix[0, 0] *= focal_scale
+        camera_matrix[1, 1] *= focal_scale
+        previous.append(
+            CameraParams(
+                camera_matrix=camera_matrix,
+                r_distort=camera.r_distort,
+                t_distort=camera.t_distort,
+                rotation_matrix=camera.rotation_matrix,
+                translation_vector=camera.translation_vector,
+            )
+        )
+    write_calibration_params(
+        CustomCalibrationData(
+            camera_params=previous, camera_names=CAMERA_NAMES, n_cameras=len(previous)
+        ),
+        output_dir=str(output_dir),
+        include_calibration_json=False,
+        include_calibration_store=False,
+    )
+    return str(output_dir)
+
+
+def warm_start_calibrate(root_dir, tmp_path, previous_dir):
+    return do_calibrate_stateful(
+        intrinsics_dir=str(root_dir.joinpath("intrinsics")),
+        extrinsics_dir=str(root_dir.joinpath("extrinsics")),
+        output_dir=str(tmp_path.joinpath("output")),
+        rows=CONFIG.rows,
+        cols=CONFIG.cols,
+        square_size_mm=CONFIG.square_size_mm,
+        warm_start_intrinsics_dir=previous_dir,
+    )
+
+
+def test_spread_subset():
+    paths = [str(i) for i in range(10)]
+    assert spread_subset(paths, 20) == paths
+    assert spread_subset(paths, 4) == ["0", "3", "6", "9"]
+
+
+def test_warm_start_accepted(rig, tmp_path):
+    root_dir, truth = rig
+    previous_dir = write_previous(tmp_path.joinpath("previous"), truth)
+
+    results = warm_start_calibrate(root_dir, tmp_path, previous_dir)
+
+    outcomes = results.calibrator.report.intrinsics_warm_start
+    for name in CAMERA_NAMES:
+        assert outcomes[name]["accepted"]
+        assert outcomes[name]["reason"] is None
+        assert outcomes[name]["focal_change"] < 0.02
+    assert "accepted for 3 / 3 cameras" in results.report_summary
+    errors = parameter_errors(truth, results.camera_params)
+    assert errors["focal_err_px"] < 5.0
+    assert errors["rotation_err_deg"] < 0.5
+
+
+def test_warm_start_falls_back_to_full_solve(rig, tmp_path):
+    root_dir, truth = rig
+    # e.g. the lenses were refocused since the previous calibration
+    previous_dir = write_previous(tmp_path.joinpath("previous"), truth, 1.1)
+
+    results = warm_start_calibrate(root_dir, tmp_path, previous_dir)
+
+    report = results.calibrator.report
+    for name in CAMERA_NAMES:
+        outcome = report.intrinsics_warm_start[name]
+        assert not outcome["accepted"]
+        assert outcome["reason"].startswith("focal length changed")
+        # the full solve used all images
+        assert report.intrinsics_view_coverage[name]["n_selected"] > 0
+    assert report.successful_intrinsics_images == (
+        CONFIG.n_cameras * CONFIG.n_intrinsics_images
+    )
+    assert "accepted for 0 / 3 cameras" in results.report_summary
+    errors = parameter_errors(truth, results.camera_params)
+    assert errors["focal_err_px"] < 5.0
+
+
+def test_warm_start_too_few_views(rig, tmp_path):
+    root_dir, truth = rig
+    previous_dir = write_previous(tmp_path.joinpath("previous"), truth)
+    cal = Calibrator[IntrinsicsChessboardWarmStart, ExtrinsicsChessboard]()
+    cal.set_intrinsics_method(
+        IntrinsicsChessboardWarmStart(
+            CONFIG.rows, CONFIG.cols, CONFIG.square_size_mm, warm_start_images=3
+        )
+    )
+    cal.set_extrinsics_method(
+        ExtrinsicsChessboard(CONFIG.rows, CONFIG.cols, CONFIG.square_size_mm)
+    )
+    intrinsics_paths = get_intrinsics_image_paths(
+        str(root_dir.joinpath("intrinsics")), CAMERA_NAMES, ret_dict=True
+    )
+    hires_files = get_hires_files(previous_dir, CONFIG.n_cameras)
+    for name, hires_file in zip(CAMERA_NAMES, hires_files):
+        cal.add_camera(
+            camera_name=name,
+            intrinsics_camdata=IntrinsicsChessboardWarmStart.Camdata(
+                intrinsics_paths=intrinsics_paths[name], hires_file_path=hires_file
+            ),
+            extrinsics_camdata=ExtrinsicsChessboard.Camdata(
+                extrinsics_path=str(root_dir.joinpath("extrinsics", name, "0.png"))
+            ),
+        )
+    cal.init_report(CAMERA_NAMES)
+
+    cal.calibrate()
+
+    for name in CAMERA_NAMES:
+        outcome = cal.report.intrinsics_warm_start[name]
+        assert outcome["accepted"] is False
+        assert outcome["reason"] == "only 3 views detected"
+        assert outcome["n_views"] == 3
+        assert outcome["rpe_px"] is None
+    errors = parameter_errors(truth, cal.get_results().camera_params)
+    assert np.isfinite(errors["focal_err_px"])
+    assert errors["focal_err_px"] < 5.0
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+# app.core.config requires these env variables (see scripts/start_from_container.sh):
+# point them to a scratch instance so modules importing the settings can be tested
+_instance_dir = tempfile.mkdtemp(prefix="gui_be_tests_")
+for _name, _value in {
+    "INSTANCE_DIR": os.path.join(_instance_dir, "instance"),
+    "TMP_DIR": os.path.join(_instance_dir, "tmp"),
+    "APP_SRC_DIR": _instance_dir,
+    "APP_RESOURCES_DIR": os.path.join(_instance_dir, "resources"),
+    "REACT_APP_DIST_FOLDER": os.path.join(_instance_dir, "dist"),
+    "SERVER_BASE_URL": "http://localhost:7000",
+    "API_BASE_URL": "http://localhost:7000/v1",
+    "REACT_APP_BASE_URL": "http://localhost:7000/app",
+    "SDANNCE_SINGULARITY_IMG_PATH": os.path.join(_instance_dir, "sdannce.sif"),
+    "CELERY_BEAT_FILES": os.path.join(_instance_dir, "celery"),
+    "BASE_MOUNT": _instance_dir,
+}.items():
+    os.environ.setdefault(_name, _value)
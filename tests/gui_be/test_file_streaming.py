@@ -0,0 +1,84 @@
+import os
+from email.utils import formatdate
+
+import pytest
+
+from app.utils.file_streaming import (
+    RangeNotSatisfiable,
+    if_range_matches,
+    make_etag,
+    parse_range_header,
+)
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize(
+    "range_header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-199", (100, 199)),
+        ("bytes=0-0", (0, 0)),
+        ("bytes=990-2000", (990, 999)),  # end clamped to the last byte
+        ("bytes=500-", (500, 999)),
+        ("bytes=999-", (999, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),  # suffix longer than the file
+        (" bytes = 10 - 20 ", (10, 20)),
+        ("BYTES=10-20", (10, 20)),
+        # ignored: multiple ranges, other units, malformed
+        ("bytes=0-99,200-299", None),
+        ("bytes=0-99, -100", None),
+        ("items=0-99", None),
+        ("bytes=", None),
+        ("bytes=-", None),
+        ("bytes=100", None),
+        ("bytes=a-b", None),
+        ("bytes=-1-2", None),
+        ("bytes=200-100", None),
+    ],
+)
+def test_parse_range_header(range_header, expected):
+    assert parse_range_header(range_header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "range_header, size",
+    [
+        ("bytes=-0", SIZE),
+        ("bytes=1000-", SIZE),
+        ("bytes=1000-1100", SIZE),
+        ("bytes=5000-", SIZE),
+        ("bytes=0-", 0),
+        ("bytes=-100", 0),
+    ],
+)
+def test_parse_range_header_not_satisfiable(range_header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(range_header, size)
+
+
+@pytest.fixture
+def file_stat(tmp_path):
+    path = tmp_path.joinpath("video.mp4")
+    path.write_bytes(b"\0" * SIZE)
+    os.utime(path, (1_700_000_000.25, 1_700_000_000.25))
+    return os.stat(path)
+
+
+def test_if_range_matches_etag(file_stat):
+    etag = make_etag(file_stat)
+    assert if_range_matches(etag, etag, file_stat)
+    assert if_range_matches(f" {etag} ", etag, file_stat)
+    assert not if_range_matches('"0-0"', etag, file_stat)
+    # If-Range requires a strong comparison: a weak validator never matches
+    assert not if_range_matches(f"W/{etag}", etag, file_stat)
+
+
+def test_if_range_matches_date(file_stat):
+    etag = make_etag(file_stat)
+    last_modified = formatdate(file_stat.st_mtime, usegmt=True)
+    assert if_range_matches(last_modified, etag, file_stat)
+    earlier = formatdate(file_stat.st_mtime - 60, usegmt=True)
+    assert not if_range_matches(earlier, etag, file_stat)
+    assert not if_range_matches("not a date", etag, file_stat)
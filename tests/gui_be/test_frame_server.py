@@ -0,0 +1,192 @@
+import os
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils.frame_server import (
+    DecoderPool,
+    FrameCache,
+    FrameKey,
+    FrameServer,
+    frame_file_name,
+)
+from app.utils.static_cache import StaticFileCache
+
+WIDTH, HEIGHT = 64, 48
+N_FRAMES = 20
+
+
+def write_video(path: Path, levels: list[int]) -> Path:
+    """Video of uniform gray frames (one gray level per frame)"""
+    writer = cv2.VideoWriter(
+        str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (WIDTH, HEIGHT), False
+    )
+    for level in levels:
+        writer.write(np.full((HEIGHT, WIDTH), level, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def gray_level(data: bytes) -> float:
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    return float(img.mean())
+
+
+@pytest.fixture
+def video(tmp_path) -> Path:
+    return write_video(tmp_path / "Camera1.mp4", [10 * i for i in range(N_FRAMES)])
+
+
+def key(frame_index: int, camera_name: str = "Camera1") -> FrameKey:
+    return FrameKey(1, camera_name, frame_index, "jpeg")
+
+
+def test_frame_cache_evicts_least_recently_used_bytes():
+    cache = FrameCache(max_bytes=10)
+    cache.put(key(0), b"aaaa")
+    cache.put(key(1), b"bbbb")
+    assert cache.get(key(0)) == b"aaaa"  # key(1) is now the least recently used
+    cache.put(key(2), b"cccc")
+    assert cache.get(key(1)) is None
+    assert cache.get(key(0)) == b"aaaa"
+    assert cache.get(key(2)) == b"cccc"
+    assert cache.size_bytes == 8
+
+    # replacing an entry accounts for the size of the old one
+    cache.put(key(2), b"cc")
+    assert cache.size_bytes == 6
+    # larger than the whole cache: not cached, nothing evicted
+    cache.put(key(3), b"x" * 11)
+    assert cache.get(key(3)) is None
+    assert cache.size_bytes == 6
+
+    cache.put(key(4, "Camera2"), b"dd")
+    cache.invalidate(1, "Camera1")
+    assert cache.get(key(0)) is None
+    assert cache.get(key(4, "Camera2")) == b"dd"
+    assert cache.size_bytes == 2
+
+
+def test_get_frame(video):
+    server = FrameServer(max_cache_bytes=2**20, max_decoders=2)
+    # out of order: seeks back, then decodes forward
+    for frame_index in [5, 2, 3, 15]:
+        data = server.get_frame(1, "Camera1", video, frame_index)
+        assert gray_level(data) == pytest.approx(10 * frame_index, abs=3)
+    png = server.get_frame(1, "Camera1", video, 4, image_format="png")
+    assert png.startswith(b"\x89PNG")
+    with pytest.raises(Exception, match="Unsupported image format"):
+        server.get_frame(1, "Camera1", video, 4, image_format="bmp")
+
+
+def test_cached_frames_dont_open_decoders(video, tmp_path):
+    files = StaticFileCache(tmp_path / "static", max_bytes=2**20)
+    files.folder.mkdir()
+    server = FrameServer(max_cache_bytes=2**20, max_decoders=2, files=files)
+    data = server.get_frame(1, "Camera1", video, 7)
+    assert files.get(frame_file_name(video, 7, "jpeg")) is not None
+
+    # from memory
+    server.decoders.close_all()
+    assert server.get_frame(1, "Camera1", video, 7) == data
+    assert len(server.decoders._decoders) == 0
+
+    # from the static folder (e.g. after a restart)
+    restarted = FrameServer(max_cache_bytes=2**20, max_decoders=2, files=files)
+    assert restarted.get_frame(1, "Camera1", video, 7) == data
+    assert len(restarted.decoders._decoders) == 0
+    assert restarted.cache.get(key(7)) == data
+
+
+def test_changed_video_invalidates_frames(video):
+    server = FrameServer(max_cache_bytes=2**20, max_decoders=2)
+    assert gray_level(server.get_frame(1, "Camera1", video, 3)) == pytest.approx(
+        30, abs=3
+    )
+    decoder = server.decoders.get(1, "Camera1", video)
+
+    write_video(video, [200 - 10 * i for i in range(N_FRAMES)])
+    stat = video.stat()
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert gray_level(server.get_frame(1, "Camera1", video, 3)) == pytest.approx(
+        170, abs=3
+    )
+    # the decoder of the old file was replaced
+    assert decoder.closed
+    assert server.decoders.get(1, "Camera1", video) is not decoder
+
+
+class SignalingPool(DecoderPool):
+    """Signals when get() returned a decoder"""
+
+    def __init__(self, max_decoders: int) -> None:
+        super().__init__(max_decoders)
+        self.got = threading.Event()
+
+    def get(self, video_folder_id, camera_name, video_path):
+        decoder = super().get(video_folder_id, camera_name, video_path)
+        self.got.set()
+        return decoder
+
+
+def test_decode_retries_closed_decoder(video):
+    server = FrameServer(max_cache_bytes=2**20, max_decoders=2)
+    server.decoders = pool = SignalingPool(max_decoders=2)
+    decoder = pool.get(1, "Camera1", video)
+    pool.got.clear()
+
+    result = {}
+    with decoder.lock:
+        thread = threading.Thread(
+            target=lambda: result.update(data=server.get_frame(1, "Camera1", video, 9))
+        )
+        thread.start()
+        # the request got the decoder and waits for its lock: evict it meanwhile
+        assert pool.got.wait(5)
+        with pool._lock:
+            del pool._decoders[(1, "Camera1")]
+        decoder.close()
+    thread.join(5)
+
+    assert gray_level(result["data"]) == pytest.approx(90, abs=3)
+    assert pool.get(1, "Camera1", video) is not decoder
+
+
+def test_decoder_pool(video, tmp_path):
+    pool = DecoderPool(max_decoders=2)
+    video2 = write_video(tmp_path / "Camera2.mp4", [0] * 3)
+
+    # concurrent requests for a video share a single decoder
+    decoders = []
+    threads = [
+        threading.Thread(target=lambda: decoders.append(pool.get(1, "Camera1", video)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(decoders) == 8
+    assert all(d is decoders[0] for d in decoders)
+
+    # least recently used decoder is closed when full
+    d2 = pool.get(1, "Camera2", video2)
+    d3 = pool.get(2, "Camera1", video)
+    assert decoders[0].closed
+    assert not d2.closed and not d3.closed
+
+    # closing a video folder leaves the others open
+    pool.close(1)
+    assert d2.closed and not d3.closed
+
+    # a failed open doesn't leave a placeholder behind
+    not_a_video = tmp_path / "Camera3.mp4"
+    not_a_video.write_bytes(b"not a video")
+    for _ in range(2):
+        with pytest.raises(Exception, match="Unable to open video"):
+            pool.get(1, "Camera3", not_a_video)
+    assert pool._opening == {}
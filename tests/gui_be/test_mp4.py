@@ -0,0 +1,166 @@
+import struct
+
+import pytest
+
+from app.utils.mp4 import Mp4Info, Mp4Track, iter_boxes, read_mp4_info
+from app.utils.video_processing import get_video_metadata
+
+
+def box(box_type: bytes, payload: bytes = b"", largesize: bool = False) -> bytes:
+    if largesize:
+        # size == 1: 64-bit size after the type
+        return struct.pack(">I4sQ", 1, box_type, 16 + len(payload)) + payload
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type: bytes, version: int, payload: bytes) -> bytes:
+    return box(box_type, struct.pack(">B3x", version) + payload)
+
+
+def mvhd(version: int, timescale: int, duration: int, box_type=b"mvhd") -> bytes:
+    if version == 1:
+        # creation & modification time (64-bit), timescale, duration (64-bit)
+        payload = struct.pack(">QQIQ", 0, 0, timescale, duration)
+    else:
+        payload = struct.pack(">IIII", 0, 0, timescale, duration)
+    return full_box(box_type, version, payload + b"\0" * 80)
+
+
+def tkhd(version: int, width: float, height: float) -> bytes:
+    # fields before width/height: 72 bytes (v0) or 84 bytes (v1) after version/flags
+    before = b"\0" * (84 if version == 1 else 72)
+    size = struct.pack(">II", int(width * 65536), int(height * 65536))
+    return full_box(b"tkhd", version, before + size)
+
+
+def video_trak(
+    version: int,
+    timescale: int = 30000,
+    sample_delta: int = 1001,
+    n_samples: int = 300,
+    width: float = 1280,
+    height: float = 720,
+) -> bytes:
+    hdlr = full_box(b"hdlr", 0, b"\0" * 4 + b"vide" + b"\0" * 12)
+    stts = full_box(b"stts", 0, struct.pack(">III", 1, n_samples, sample_delta))
+    stsz = full_box(b"stsz", 0, struct.pack(">II", 0, n_samples))
+    stbl = box(b"stbl", stts + stsz)
+    mdia = box(
+        b"mdia",
+        mvhd(version, timescale, n_samples * sample_delta, box_type=b"mdhd")
+        + hdlr
+        + box(b"minf", stbl),
+    )
+    return box(b"trak", tkhd(version, width, height) + mdia)
+
+
+def write_mp4(path, *boxes: bytes):
+    path.write_bytes(b"".join(boxes))
+    return path
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_read_mp4_info(tmp_path, version):
+    moov = box(b"moov", mvhd(version, 1000, 10010) + video_trak(version))
+    path = write_mp4(
+        tmp_path.joinpath("video.mp4"),
+        box(b"ftyp", b"isom" + b"\0" * 4),
+        moov,
+        box(b"mdat", b"\0" * 100),
+    )
+
+    info = read_mp4_info(path)
+    assert [b.type for b in info.top_level_boxes] == [b"ftyp", b"moov", b"mdat"]
+    assert info.is_faststart
+    assert info.timescale == 1000
+    assert info.duration_s == pytest.approx(10.01)
+
+    track = info.video_track
+    assert (track.width, track.height) == (1280, 720)
+    assert track.timescale == 30000
+    assert track.n_samples == 300
+    assert track.fps == pytest.approx(30000 / 1001)
+    assert track.duration_s == pytest.approx(300 * 1001 / 30000)
+
+
+def test_tkhd_fixed_point(tmp_path):
+    moov = box(b"moov", mvhd(0, 1000, 1000) + video_trak(1, width=640.5, height=360.25))
+    info = read_mp4_info(write_mp4(tmp_path.joinpath("video.mp4"), moov))
+    assert (info.video_track.width, info.video_track.height) == (640.5, 360.25)
+
+
+def test_largesize_and_to_end_boxes(tmp_path):
+    # mdat with a 64-bit size before moov, then a free box extending to the end of file
+    mdat = box(b"mdat", b"\0" * 100, largesize=True)
+    moov = box(b"moov", mvhd(0, 1000, 5000) + video_trak(0), largesize=True)
+    to_end = struct.pack(">I4s", 0, b"free") + b"\0" * 50
+    path = write_mp4(tmp_path.joinpath("video.mp4"), mdat, moov, to_end)
+
+    info = read_mp4_info(path)
+    boxes = info.top_level_boxes
+    assert [b.type for b in boxes] == [b"mdat", b"moov", b"free"]
+    assert [b.header_size for b in boxes] == [16, 16, 8]
+    assert boxes[0].size == 116
+    assert boxes[1].offset == 116
+    assert boxes[2].end == path.stat().st_size
+    assert not info.is_faststart
+    assert info.duration_s == 5
+    assert info.video_track.n_samples == 300
+
+
+def test_invalid_box_size(tmp_path):
+    path = write_mp4(tmp_path.joinpath("video.mp4"), struct.pack(">I4s", 4, b"moov"))
+    with open(path, "rb") as f, pytest.raises(Exception, match="Invalid MP4 box size"):
+        list(iter_boxes(f, 0, path.stat().st_size))
+
+
+def test_zero_timescale():
+    info = Mp4Info(top_level_boxes=[], timescale=0, duration=100)
+    assert info.duration_s is None
+
+    track = Mp4Track(timescale=0, duration=100, n_samples=10, sample_deltas=[(10, 10)])
+    assert track.duration_s is None
+    assert track.fps is None
+
+    # variable frame rate with an empty track
+    track = Mp4Track(timescale=1000, duration=0, n_samples=0, sample_deltas=[])
+    assert track.duration_s == 0
+    assert track.fps is None
+
+    track = Mp4Track(
+        timescale=1000, duration=2000, n_samples=50, sample_deltas=[(25, 30), (25, 50)]
+    )
+    assert track.fps == 25
+
+
+def write_video_folder(root, moov: bytes):
+    for camera_name in ["Camera1", "Camera2"]:
+        video_dir = root.joinpath("videos", camera_name)
+        video_dir.mkdir(parents=True)
+        write_mp4(video_dir.joinpath("0.mp4"), moov)
+    return root
+
+
+def test_get_video_metadata(tmp_path):
+    moov = box(b"moov", mvhd(0, 1000, 10010) + video_trak(0))
+    metadata = get_video_metadata(write_video_folder(tmp_path, moov))
+    assert metadata.camera_names == ["Camera1", "Camera2"]
+    assert (metadata.width, metadata.height) == (1280, 720)
+    assert metadata.fps == pytest.approx(30000 / 1001)
+    assert metadata.duration_s == pytest.approx(10.01)
+    assert metadata.n_frames == 300
+
+
+def test_get_video_metadata_falls_back_to_movie_duration(tmp_path):
+    # track without a valid timescale: duration from mvhd, fps from the sample count
+    moov = box(b"moov", mvhd(0, 1000, 10000) + video_trak(0, timescale=0))
+    metadata = get_video_metadata(write_video_folder(tmp_path, moov))
+    assert metadata.duration_s == 10
+    assert metadata.fps == 30
+    assert metadata.n_frames == 300
+
+
+def test_get_video_metadata_without_duration(tmp_path):
+    moov = box(b"moov", mvhd(0, 0, 10000) + video_trak(0, timescale=0))
+    with pytest.raises(Exception, match="Unable to read the duration and frame rate"):
+        get_video_metadata(write_video_folder(tmp_path, moov))
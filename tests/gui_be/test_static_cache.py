@@ -0,0 +1,88 @@
+import os
+import time
+
+from app.utils.static_cache import (
+    LEGACY_MAX_AGE_S,
+    MIN_AGE_S,
+    StaticFileCache,
+    content_key,
+)
+
+
+def frame_name(*parts) -> str:
+    return f"frame_{content_key(*parts)}.jpg"
+
+
+def set_age(path, age_s: float):
+    t = time.time() - age_s
+    os.utime(path, (t, t))
+
+
+def test_content_key():
+    assert content_key("a", 1) == content_key("a", 1)
+    assert content_key("a", 1) != content_key("a", 2)
+    # parts are separated: ("ab", "c") != ("a", "bc")
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert len(content_key("a")) == 32
+
+
+def test_put_get(tmp_path):
+    cache = StaticFileCache(tmp_path, max_bytes=10_000)
+    name = frame_name("video.mp4", 0)
+    assert cache.get(name) is None
+
+    path = cache.put(name, b"x" * 100)
+    assert path.read_bytes() == b"x" * 100
+    set_age(path, 1000)
+    assert cache.get(name) == path
+    # a hit marks the file as used
+    assert time.time() - path.stat().st_mtime < 10
+
+
+def test_sweep_evicts_least_recently_used(tmp_path):
+    cache = StaticFileCache(tmp_path, max_bytes=10_000)
+    names = [frame_name("video.mp4", i) for i in range(5)]
+    for i, name in enumerate(names):
+        set_age(cache.put(name, b"x" * 300), MIN_AGE_S + 100 - i)
+    # recently used files are kept even over the cap
+    recent = cache.put(frame_name("video.mp4", 5), b"x" * 300)
+
+    cache.max_bytes = 1000
+    n_deleted, bytes_deleted = cache.sweep()
+    # down to SWEEP_TARGET_FRACTION of the cap
+    assert (n_deleted, bytes_deleted) == (3, 900)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [*names[3:], recent.name]
+    )
+
+    # the recently used file isn't deleted, whatever the cap
+    cache.max_bytes = 0
+    cache.sweep()
+    assert [p.name for p in tmp_path.iterdir()] == [recent.name]
+
+
+def test_sweep_removes_leftovers(tmp_path):
+    cache = StaticFileCache(tmp_path, max_bytes=10_000)
+    keep = {
+        "frame": cache.put(frame_name("video.mp4", 0), b"x"),
+        "recent tmp": tmp_path.joinpath("abc.tmp"),
+        "recent legacy": tmp_path.joinpath("frame_1234.png"),
+    }
+    delete = {
+        "old tmp": tmp_path.joinpath("def.tmp"),
+        "old legacy": tmp_path.joinpath("frame_5678.png"),
+        "old other": tmp_path.joinpath("preview.jpg"),
+    }
+    for path in [*keep.values(), *delete.values()]:
+        path.write_bytes(b"x")
+    set_age(keep["frame"], LEGACY_MAX_AGE_S + 100)
+    set_age(keep["recent legacy"], LEGACY_MAX_AGE_S - 100)
+    set_age(delete["old tmp"], MIN_AGE_S + 10)
+    set_age(delete["old legacy"], LEGACY_MAX_AGE_S + 100)
+    set_age(delete["old other"], LEGACY_MAX_AGE_S + 100)
+    tmp_path.joinpath("subfolder").mkdir()
+
+    assert cache.sweep() == (3, 3)
+    assert all(path.exists() for path in keep.values())
+    assert not any(path.exists() for path in delete.values())
+    assert tmp_path.joinpath("subfolder").is_dir()
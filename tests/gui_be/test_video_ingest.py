@@ -0,0 +1,223 @@
+import errno
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app.utils import video_ingest
+from app.utils.video_ingest import (
+    PART_SUFFIX,
+    IngestFile,
+    IngestProgress,
+    copy_file,
+    ingest_file,
+    ingest_files,
+)
+
+DATA = os.urandom(3 * 1024 + 17)
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src" / "0.mp4"
+    path.parent.mkdir()
+    path.write_bytes(DATA)
+    return path
+
+
+@pytest.fixture
+def db_writes(monkeypatch):
+    """Progress written to the database (None: the column was cleared)"""
+    writes = []
+    monkeypatch.setattr(
+        IngestProgress,
+        "_write_db",
+        lambda self, progress_json: writes.append(progress_json),
+    )
+    return writes
+
+
+def no_reflink(monkeypatch):
+    monkeypatch.setattr(video_ingest, "_try_reflink", lambda src_fd, dest_fd: False)
+
+
+def test_copy_file(src, tmp_path, monkeypatch):
+    # reflink if the filesystem supports it, else copy_file_range
+    progress = []
+    method = copy_file(src, tmp_path / "a.mp4", progress.append)
+    assert method in ("reflink", "copy_file_range")
+    assert (tmp_path / "a.mp4").read_bytes() == DATA
+    assert progress[-1] == len(DATA)
+
+    no_reflink(monkeypatch)
+    monkeypatch.setattr(video_ingest, "COPY_CHUNK_SIZE", 1024)
+    progress = []
+    assert copy_file(src, tmp_path / "b.mp4", progress.append) == "copy_file_range"
+    assert (tmp_path / "b.mp4").read_bytes() == DATA
+    assert progress == [1024, 2048, 3072, len(DATA)]
+
+
+def test_copy_file_falls_back_to_read_write(src, tmp_path, monkeypatch):
+    no_reflink(monkeypatch)
+    monkeypatch.setattr(video_ingest, "COPY_CHUNK_SIZE", 1024)
+
+    # copy_file_range not supported between the filesystems (after a first chunk)
+    real_copy_file_range = os.copy_file_range
+    calls = []
+
+    def copy_file_range(src_fd, dest_fd, count):
+        calls.append(count)
+        if len(calls) > 1:
+            raise OSError(errno.EXDEV, "cross-device")
+        return real_copy_file_range(src_fd, dest_fd, count)
+
+    monkeypatch.setattr(os, "copy_file_range", copy_file_range)
+    assert copy_file(src, tmp_path / "a.mp4") == "read_write"
+    assert (tmp_path / "a.mp4").read_bytes() == DATA
+    assert len(calls) == 2
+
+    # other errors are raised
+    def failing_copy_file_range(src_fd, dest_fd, count):
+        raise OSError(errno.EIO, "I/O error")
+
+    monkeypatch.setattr(os, "copy_file_range", failing_copy_file_range)
+    with pytest.raises(OSError):
+        copy_file(src, tmp_path / "b.mp4")
+
+    # not available on this platform
+    monkeypatch.delattr(os, "copy_file_range")
+    assert copy_file(src, tmp_path / "c.mp4") == "read_write"
+    assert (tmp_path / "c.mp4").read_bytes() == DATA
+
+
+def test_ingest_file(src, tmp_path):
+    file = IngestFile(
+        name="Camera1", src=src, dest=tmp_path / "dest" / "0.mp4", mode="COPY"
+    )
+    progress = IngestProgress(None, [file])
+    ingest_file(file, progress, verify_checksum=True)
+    assert file.dest.read_bytes() == DATA
+    assert list(file.dest.parent.iterdir()) == [file.dest]
+    assert progress.files["Camera1"].status == "DONE"
+    assert progress.files["Camera1"].bytes_done == len(DATA)
+
+
+@pytest.mark.parametrize(
+    "copy, verify_checksum, error",
+    [
+        # truncated copy: detected by its size
+        (lambda src, dest: dest.write_bytes(DATA[:-1]), False, "bytes instead of"),
+        # corrupted copy of the same size: only detected by the checksum
+        (lambda src, dest: dest.write_bytes(DATA[::-1]), True, "checksum"),
+    ],
+)
+def test_ingest_file_verifies_copy(
+    src, tmp_path, monkeypatch, copy, verify_checksum, error
+):
+    def bad_copy_file(src, dest, on_progress=None):
+        copy(src, dest)
+        return "read_write"
+
+    monkeypatch.setattr(video_ingest, "copy_file", bad_copy_file)
+    file = IngestFile(
+        name="Camera1", src=src, dest=tmp_path / "dest" / "0.mp4", mode="COPY"
+    )
+    progress = IngestProgress(None, [file])
+    with pytest.raises(Exception, match=error):
+        ingest_file(file, progress, verify_checksum=verify_checksum)
+
+    # neither the partial file nor the destination are left behind
+    assert list(file.dest.parent.iterdir()) == []
+    assert progress.files["Camera1"].status == "FAILED"
+
+
+def test_ingest_file_removes_part_on_error(src, tmp_path, monkeypatch):
+    def interrupted_copy_file(src, dest, on_progress=None):
+        dest.write_bytes(DATA[:100])
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(video_ingest, "copy_file", interrupted_copy_file)
+    file = IngestFile(
+        name="Camera1", src=src, dest=tmp_path / "dest" / "0.mp4", mode="COPY"
+    )
+    with pytest.raises(KeyboardInterrupt):
+        ingest_file(file, IngestProgress(None, [file]), verify_checksum=False)
+    assert not file.dest.with_name(file.dest.name + PART_SUFFIX).exists()
+    assert not file.dest.exists()
+
+
+def make_files(tmp_path, n: int) -> list[IngestFile]:
+    files = []
+    for idx in range(n):
+        src = tmp_path / "src" / f"Camera{idx + 1}" / "0.mp4"
+        src.parent.mkdir(parents=True)
+        src.write_bytes(DATA)
+        dest = tmp_path / "dest" / f"Camera{idx + 1}" / "0.mp4"
+        files.append(
+            IngestFile(name=f"Camera{idx + 1}", src=src, dest=dest, mode="COPY")
+        )
+    return files
+
+
+def test_ingest_files_clears_progress(tmp_path, db_writes):
+    files = make_files(tmp_path, 3)
+    ingest_files(files, video_folder_id=1, parallelism=2, verify_checksum=True)
+    for f in files:
+        assert f.dest.read_bytes() == DATA
+    assert db_writes[-1] is None
+    assert all(json.loads(w) for w in db_writes[:-1])
+
+
+def test_ingest_files_cancels_after_first_failure(tmp_path, monkeypatch, db_writes):
+    files = make_files(tmp_path, 4)
+    real_copy_file = video_ingest.copy_file
+
+    def copy_file(src, dest, on_progress=None):
+        if src == files[0].src:
+            raise Exception("disk full")
+        time.sleep(0.2)
+        return real_copy_file(src, dest, on_progress)
+
+    monkeypatch.setattr(video_ingest, "copy_file", copy_file)
+    with pytest.raises(Exception, match="disk full"):
+        ingest_files(files, video_folder_id=1, parallelism=1)
+
+    # a file may have started before the failure was seen: the others are cancelled
+    statuses = {name: p["status"] for name, p in json.loads(db_writes[-1]).items()}
+    assert statuses["Camera1"] == "FAILED"
+    assert statuses["Camera4"] == "CANCELLED"
+    assert set(statuses.values()) <= {"FAILED", "DONE", "CANCELLED"}
+    for f in files:
+        assert f.dest.exists() == (statuses[f.name] == "DONE")
+
+
+def test_progress_skips_stale_snapshots(src, db_writes):
+    file = IngestFile(name="Camera1", src=src, dest=src, mode="COPY")
+    progress = IngestProgress(1, [file])
+
+    # the first snapshot's write is delayed until a newer one was written
+    first_writing = threading.Event()
+    newer_written = threading.Event()
+    real_write = progress._write
+
+    def write(version, progress_json):
+        if version == 1:
+            first_writing.set()
+            newer_written.wait(5)
+        real_write(version, progress_json)
+        if version == 2:
+            newer_written.set()
+
+    progress._write = write
+    first = threading.Thread(
+        target=lambda: progress.update("Camera1", force=True, bytes_done=1)
+    )
+    first.start()
+    assert first_writing.wait(5)
+    progress.update("Camera1", force=True, bytes_done=2)
+    first.join(5)
+
+    assert len(db_writes) == 1
+    assert json.loads(db_writes[0])["Camera1"]["bytes_done"] == 2